@@ -3,9 +3,10 @@ Database models per DAPX-Unified
 Con supporto autenticazione integrata Proxmox
 """
 
-from sqlalchemy import create_engine, Column, Integer, BigInteger, String, Boolean, DateTime, Text, ForeignKey, JSON, Enum
+from sqlalchemy import create_engine, Column, Integer, BigInteger, String, Boolean, DateTime, Text, ForeignKey, JSON, Enum, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from datetime import datetime
 import logging
 import os
@@ -79,6 +80,25 @@ def _sqlite_pragmas(dbapi_connection, connection_record):
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+# Engine async (aiosqlite) per gli handler async e gli executor: le query
+# girano nel thread della connessione aiosqlite invece di bloccare l'event
+# loop (polling progress SSH, endpoint live). Stesso file e stessi pragma
+# WAL/busy_timeout dell'engine sync, che resta per il codice non migrato.
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DATABASE_PATH}"
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    connect_args={"timeout": 30},
+)
+_sa_event.listen(async_engine.sync_engine, "connect", _sqlite_pragmas)
+
+# expire_on_commit=False: dopo il commit gli oggetti restano leggibili senza
+# un refresh implicito (che in async richiederebbe un await).
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
 def get_db():
@@ -89,6 +109,20 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """Dipendenza FastAPI: sessione async per gli endpoint sul loop."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def run_with_async_session(fn, *args, **kwargs):
+    """Esegue ``fn(db, *args, **kwargs)`` (codice ORM sincrono) su una
+    sessione async: I/O su aiosqlite, loop libero. Per riusare helper sync
+    esistenti dagli executor async senza riscriverli."""
+    async with AsyncSessionLocal() as db:
+        return await db.run_sync(fn, *args, **kwargs)
+
+
 # ============== ENUMS ==============
 
 class AuthMethod(str, enum.Enum):
@@ -803,6 +837,13 @@ class FileReplicationJob(Base):
     exclude_patterns = Column(JSON, nullable=False, default=list)
     bandwidth_limit_kb = Column(Integer, nullable=True)
     extra_rsync_args = Column(String(500), nullable=True)
+    # Staging del pull conservato tra i run (services/file_replication/staging_cache.py)
+    persistent_staging = Column(Boolean, default=False)
+    # sync_method="tar_stream" (services/file_replication/direct_stream.py):
+    # compressione sul filo (zstd, lz4; null = nessuna) e blocchi conclusi
+    # per path del run interrotto, con i byte per blocco dell'ultimo run
+    stream_compression = Column(String(10), nullable=True)
+    stream_checkpoint = Column(JSON, nullable=True)
     immutability_strategy = Column(String(50), default="qnap_immutable_snapshot")
     snapshot_policy_hint = Column(JSON, nullable=True, default=dict)
     schedule = Column(String(100), nullable=True)
@@ -858,6 +899,11 @@ class MigrationJob(Base):
     create_snapshot = Column(Boolean, default=True)  # Crea snapshot prima della migrazione
     keep_snapshots = Column(Integer, default=1)  # Numero snapshot da mantenere (1 per migrazione, più per replica)
     start_after_migration = Column(Boolean, default=False)  # Avvia VM dopo migrazione
+    # Trasferimento per "copy": staged (archivio vzdump su disco) o stream
+    # (vzdump --stdout in pipe SSH nel restore, senza file intermedi)
+    transfer_mode = Column(String(20), default="staged")
+    stream_compress_level = Column(Integer, nullable=True)  # zstd sul pipe (null = non compresso)
+    stream_mbuffer = Column(String(20), nullable=True)  # es. "256M" (null = senza mbuffer)
     
     # Riconfigurazione Hardware (JSON per flessibilità)
     # Esempio: {"memory": 4096, "cores": 2, "network": {"net0": "bridge=vmbr1"}, "storage": {"scsi0": "local-lvm:vm-100-disk-0"}}
@@ -907,6 +953,8 @@ class JobLog(Base):
     
     duration = Column(Integer, nullable=True)  # secondi
     transferred = Column(String(50), nullable=True)
+    # Stessa quantità in byte, valorizzata al flush (services/job_log_rollup.py)
+    transferred_bytes = Column(BigInteger, nullable=True)
     
     # PBS specific
     backup_id = Column(String(100), nullable=True)  # ID backup PBS
@@ -921,6 +969,42 @@ class JobLog(Base):
     trigger_source = Column(String(20), nullable=True)  # 'scheduled' | 'manual' (NON è il FK triggered_by)
 
 
+class JobLogChunk(Base):
+    """Blocchi di output di un JobLog, scritti in append durante l'esecuzione.
+
+    L'output completo = ``JobLog.output`` (header/legacy) + chunk in ordine di
+    ``seq``. Vedi services/job_log_output.py.
+    """
+    __tablename__ = "job_log_chunks"
+    __table_args__ = (UniqueConstraint("log_id", "seq", name="uq_job_log_chunk_seq"),)
+
+    id = Column(Integer, primary_key=True)
+    log_id = Column(Integer, ForeignKey("job_logs.id", ondelete="CASCADE"), nullable=False, index=True)
+    seq = Column(Integer, nullable=False)
+    ts = Column(DateTime, default=datetime.utcnow)
+    text = Column(Text, nullable=False)
+
+
+class JobLogRollup(Base):
+    """Aggregati dei JobLog conclusi per ora/giorno e tipo job, mantenuti
+    al flush dei log (vedi services/job_log_rollup.py). Restano anche dopo
+    la pulizia dei job_logs."""
+    __tablename__ = "job_log_rollups"
+    __table_args__ = (UniqueConstraint("period", "bucket_start", "job_type", name="uq_job_log_rollup_bucket"),)
+
+    id = Column(Integer, primary_key=True)
+    period = Column(String(10), nullable=False)  # hour, day
+    bucket_start = Column(DateTime, nullable=False)
+    job_type = Column(String(50), nullable=False)
+    runs = Column(Integer, default=0, nullable=False)
+    success = Column(Integer, default=0, nullable=False)
+    failed = Column(Integer, default=0, nullable=False)
+    duration_sum = Column(BigInteger, default=0, nullable=False)
+    duration_count = Column(Integer, default=0, nullable=False)
+    transferred_bytes = Column(BigInteger, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
 class Settings(Base):
     """Impostazioni globali (legacy, usare SystemConfig)"""
     __tablename__ = "settings"
@@ -1174,3 +1258,4 @@ def set_config_value(db_session, key: str, value, value_type: str = "string"):
         db_session.add(config)
     
     db_session.commit()
+
@@ -13,7 +13,7 @@ from contextlib import asynccontextmanager
 import os
 import logging
 
-from database import engine, Base, get_db, init_default_config, SessionLocal
+from database import engine, async_engine, Base, get_db, init_default_config, SessionLocal
 from routers import nodes, snapshots, sync_jobs, vms, logs, settings, auth, ssh_keys
 from routers import recovery_jobs, backup_jobs, host_info, host_backup, migration_jobs, updates, pve_replication_jobs
 from routers import ha, clusters
@@ -21,6 +21,7 @@ from routers import file_endpoints, file_replication_jobs
 from routers import nas_sync_jobs
 from routers import vm_snapshot_jobs
 from routers import schedule as schedule_router
+from routers import events as events_router
 from services.scheduler import scheduler_service
 from services.logging_config import setup_logging, get_logger
 
@@ -62,6 +63,10 @@ async def lifespan(app: FastAPI):
         logger.error(f"update_db_schema FALLITO (schema potenzialmente incompleto): {e}", exc_info=True)
         app.state.schema_error = str(e)
 
+    # Listener di sessione che mantengono job_log_rollups ad ogni flush
+    from services.job_log_rollup import install_listeners as _install_job_log_rollup
+    _install_job_log_rollup()
+
     try:
         from services.nas_sync.execution import reconcile_stale_running_jobs as _nas2_reconcile
         _nas2_reconcile()
@@ -88,6 +93,9 @@ async def lifespan(app: FastAPI):
         db.close()
     
     await scheduler.start()
+    # Stato live dei job sync in background: la lista job non fa più SSH
+    from services.sync_job_live_state import sync_job_live_aggregator
+    await sync_job_live_aggregator.start()
     logger.info("DAPX-backandrepl avviato")
     
     yield
@@ -95,12 +103,24 @@ async def lifespan(app: FastAPI):
     # Shutdown
     logger.info("Arresto DAPX-backandrepl...")
     await scheduler.stop()
+    await sync_job_live_aggregator.stop()
     # P-14/B11: chiudi tutte le connessioni SSH del pool per non lasciare socket aperte.
     try:
         from services.ssh_service import ssh_service
         ssh_service.close_all()
     except Exception as _exc:  # noqa: BLE001
         logger.warning(f"close_all pool SSH allo shutdown fallito: {_exc}")
+    try:
+        from services.http_pool import http_pool
+        await http_pool.close_all()
+    except Exception as _exc:  # noqa: BLE001
+        logger.warning(f"close_all client HTTP allo shutdown fallito: {_exc}")
+    # Le connessioni aiosqlite hanno un thread worker ciascuna: vanno chiuse
+    # esplicitamente o il processo non termina.
+    try:
+        await async_engine.dispose()
+    except Exception as _exc:  # noqa: BLE001
+        logger.warning(f"dispose engine async allo shutdown fallito: {_exc}")
     logger.info("DAPX-backandrepl arrestato")
 
 
@@ -182,6 +202,7 @@ if dapx_mode == "full":
     app.include_router(nas_sync_jobs.router, prefix="/api/nas-sync", tags=["Repliche dati (NAS Sync v2)"])
     app.include_router(vm_snapshot_jobs.router, prefix="/api/vm-snapshots", tags=["Snapshot VM"])
     app.include_router(schedule_router.router, prefix="/api/schedule", tags=["Schedule"])
+    app.include_router(events_router.router, prefix="/api/events", tags=["Events"])
 
 
 # Health check (non richiede autenticazione).
@@ -5,11 +5,13 @@ Supporta autenticazione locale e integrata Proxmox VE
 
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
 from typing import Optional, List
 from datetime import datetime, timedelta
 from pydantic import BaseModel, EmailStr, validator
 import logging
+import os
 
 from database import (
     get_db, User, UserSession, AuditLog, SystemConfig, Node,
@@ -17,6 +19,7 @@ from database import (
 )
 from services.auth_service import auth_service, ACCESS_TOKEN_EXPIRE_MINUTES
 from services.proxmox_auth_service import proxmox_auth_service, ProxmoxUser
+from services.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -102,6 +105,33 @@ class AuthConfigResponse(BaseModel):
 
 # ============== Dipendenze ==============
 
+# Principal verificati (utente attivo + sessione non revocata) per token:
+# evita le query User/UserSession a ogni richiesta autenticata. Chiave
+# "<user_id>:<jti>", così logout e modifiche utente invalidano per prefisso.
+AUTH_CACHE_TTL_SEC = float(os.environ.get("DAPX_AUTH_CACHE_TTL_SEC", "30"))
+_principal_cache = TTLCache("auth_principals", ttl=AUTH_CACHE_TTL_SEC, max_entries=1024)
+
+
+def _principal_key(user_id, payload: dict, token: str) -> Optional[str]:
+    """Chiave cache del token, ``None`` se il principal non va in cache."""
+    if AUTH_CACHE_TTL_SEC <= 0 or not str(user_id).isdigit():
+        return None
+    # Token emessi prima del jti: impronta del token intero
+    return f"{user_id}:{payload.get('jti') or auth_service.token_fingerprint(token)}"
+
+
+def _principal_snapshot(user: User) -> dict:
+    """Colonne dell'utente, sufficienti a ricostruire un'istanza detached."""
+    return {attr.key: getattr(user, attr.key) for attr in sa_inspect(User).column_attrs}
+
+
+def invalidate_principals(user_id: Optional[int] = None) -> int:
+    """Invalida i principal in cache di un utente (o di tutti)."""
+    if user_id is None:
+        return _principal_cache.invalidate()
+    return _principal_cache.invalidate(prefix=f"{user_id}:")
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
@@ -140,6 +170,16 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    cache_key = _principal_key(user_id, payload, token)
+    snapshot = _principal_cache.get(cache_key) if cache_key else None
+    if snapshot is not None:
+        # Principal già verificato (utente attivo, sessione non revocata):
+        # nessuna query, l'istanza viene agganciata alla sessione della
+        # richiesta così eventuali modifiche vengono salvate con il commit.
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
+
     user = None
     try:
         user = db.query(User).filter(User.id == int(user_id)).first()
@@ -161,12 +201,10 @@ async def get_current_user(
 
     # Verifica revoca: il logout marca tutte le UserSession dell'utente
     # come is_active=False. Se l'utente ha fatto logout, il token JWT
-    # ancora valido NON deve passare. Confrontiamo l'hash del token con
-    # le UserSession attive.
+    # ancora valido NON deve passare.
     try:
-        token_hash = auth_service.get_password_hash(token[:32])
         active = (
-            db.query(UserSession)
+            db.query(UserSession.id)
             .filter(
                 UserSession.user_id == user.id,
                 UserSession.is_active == True,  # noqa: E712
@@ -177,7 +215,7 @@ async def get_current_user(
         # disattivate per questo utente, il token e' stato revocato.
         if not active:
             had_session = (
-                db.query(UserSession).filter(UserSession.user_id == user.id).first()
+                db.query(UserSession.id).filter(UserSession.user_id == user.id).first()
             )
             if had_session is not None:
                 raise HTTPException(
@@ -191,9 +229,12 @@ async def get_current_user(
         # Best-effort: un errore transitorio del DB non deve bloccare
         # l'autenticazione. S-09/Q-04: non silenziare — logghiamo a warning
         # così un problema di revoca è diagnosticabile invece di sparire.
+        # Esito non verificato: non va in cache.
         logger.warning("Verifica revoca sessione fallita (fail-open): %s", revoke_exc)
-    _ = token_hash  # placeholder per future blacklist hash-based
+        return user
 
+    if cache_key:
+        _principal_cache.set(cache_key, _principal_snapshot(user))
     return user
 
 
@@ -548,7 +589,7 @@ async def login(
     # Crea sessione
     session = UserSession(
         user_id=user.id,
-        token_hash=auth_service.get_password_hash(access_token[:32]),
+        token_hash=auth_service.token_fingerprint(access_token),
         ip_address=client_ip,
         user_agent=request.headers.get("user-agent"),
         expires_at=datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
@@ -563,6 +604,8 @@ async def login(
     _login_clear_failures(client_ip)
 
     db.commit()
+    # Ruolo/nodi possono essere cambiati (sync utente Proxmox)
+    invalidate_principals(user.id)
     
     return TokenResponse(
         access_token=access_token,
@@ -658,6 +701,7 @@ async def logout(
               ip_address=request.client.host if request.client else None)
     
     db.commit()
+    invalidate_principals(user.id)
     
     return {"message": "Logout effettuato"}
 
@@ -695,6 +739,7 @@ async def change_password(
     user.password_hash = auth_service.get_password_hash(password_data.new_password)
     user.must_change_password = False
     db.commit()
+    invalidate_principals(user.id)
     
     return {"message": "Password aggiornata con successo"}
 
@@ -783,6 +828,7 @@ async def update_user(
               details=f"Updated: {target_user.username}",
               ip_address=request.client.host if request.client else None)
     db.commit()
+    invalidate_principals(user_id)
     db.refresh(target_user)
     
     return target_user
@@ -814,6 +860,7 @@ async def delete_user(
               details=f"Deleted: {username}",
               ip_address=request.client.host if request.client else None)
     db.commit()
+    invalidate_principals(user_id)
     
     return {"message": "Utente eliminato"}
 
@@ -19,6 +19,7 @@ from routers.auth import get_current_user, require_operator, User, log_audit
 from services import ssh_service
 from services.schedule_translator import to_cron as _sched_to_cron, from_cron as _sched_from_cron
 from services.scheduler import scheduler_service
+from services.job_events import job_events
 
 
 def _resolve_schedule_pair(schedule: Optional[str], schedule_config: Optional[Dict[str, Any]]):
@@ -38,6 +39,9 @@ def _resolve_schedule_pair(schedule: Optional[str], schedule_config: Optional[Di
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Avanzamento per job dei backup in batch (stream SSE /api/events/jobs)
+_progress = job_events.registry("backup_pbs", node_scoped=True)
+
 
 # ============== SCHEMAS ==============
 
@@ -388,6 +392,93 @@ async def delete_backup_job(
 
 # ============== EXECUTION ==============
 
+def _parse_transferred_size(output: Optional[str]) -> Optional[int]:
+    size_match = re.search(r'transferred (\d+(?:\.\d+)?)\s*([KMGT]?B)', output or "")
+    if not size_match:
+        return None
+    multipliers = {'B': 1, 'KB': 1024, 'MB': 1024**2, 'GB': 1024**3, 'TB': 1024**4}
+    return int(float(size_match.group(1)) * multipliers.get(size_match.group(2), 1))
+
+
+def _record_backup_result(
+    job: BackupJob,
+    log: JobLog,
+    success: bool,
+    output: Optional[str],
+    error: Optional[str],
+    duration: int,
+    end_time: datetime,
+    backup_id: Optional[str] = None,
+    backup_size: Optional[int] = None,
+) -> None:
+    """Aggiorna job e JobLog con l'esito di un backup (senza commit)."""
+    if success:
+        job.current_status = BackupJobStatus.COMPLETED.value
+        job.last_status = "success"
+        job.last_backup_time = end_time
+        job.last_backup_id = backup_id
+        job.last_backup_size = backup_size
+        job.run_count += 1
+        job.consecutive_failures = 0
+        job.last_error = None
+        
+        log.status = "success"
+        log.message = f"Backup completato in {duration}s"
+        log.output = output[:5000] if output else None
+        
+        logger.info(f"Backup job {job.id} completato con successo")
+        # Nuovo snapshot sul PBS: l'inventario in cache non è più completo
+        from services.pbs_service import invalidate_inventory
+        invalidate_inventory(job.pbs_node_id)
+    else:
+        job.current_status = BackupJobStatus.FAILED.value
+        job.last_status = "failed"
+        job.error_count += 1
+        job.consecutive_failures += 1
+        job.last_error = error[:1000] if error else "Errore sconosciuto"
+        
+        log.status = "failed"
+        log.message = f"Backup fallito: {error[:500] if error else 'Errore'}"
+        log.error = error[:5000] if error else None
+        
+        logger.error(f"Backup job {job.id} fallito: {error}")
+    
+    job.last_duration = duration
+    log.completed_at = end_time
+    log.duration = duration
+
+
+async def _notify_backup_result(job: BackupJob, source_node: Node, pbs_node: Node, duration: int, error: Optional[str]) -> None:
+    """Notifica se richiesto"""
+    if not (job.notify_on_each_run or (job.notify_on_failure and job.last_status == "failed")):
+        return
+    try:
+        from services.notification_service import notification_service
+        await notification_service.send_job_notification(
+            job_type="backup",
+            job_name=job.name,
+            status=job.last_status,
+            source=f"{source_node.name}:vm/{job.vm_id}",
+            destination=f"{pbs_node.name}:{job.pbs_storage_id}",
+            duration=duration,
+            error=error if job.last_status == "failed" else None,
+            details=(
+                f"VM: {job.vm_name or '—'} (ID {job.vm_id})\n"
+                f"Storage PBS: {job.pbs_storage_id}\n"
+                f"Nodo sorgente: {source_node.name}"
+            ),
+            job_id=job.id,
+            is_scheduled=bool(job.schedule),
+            notify_mode=job.notify_mode or "daily",
+            source_node_name=source_node.name,
+            dest_node_name=pbs_node.name,
+            vm_name=job.vm_name,
+            vm_id=job.vm_id
+        )
+    except Exception as e:
+        logger.warning(f"Errore invio notifica: {e}")
+
+
 async def execute_backup_task(job_id: int, db_path: str):
     """Task asincrono per eseguire il backup"""
     from database import SessionLocal
@@ -454,95 +545,132 @@ async def execute_backup_task(job_id: int, db_path: str):
         output = result.stdout
         error = result.stderr
         
+        backup_id = None
+        backup_size = None
         if success:
             # Estrai info backup dall'output
-            backup_id = None
-            backup_size = None
-            
-            # Cerca ID backup nell'output
-            import re
             id_match = re.search(r'creating vzdump archive.*?(\S+\.vma)', output or "")
             if id_match:
                 backup_id = id_match.group(1)
-            
-            size_match = re.search(r'transferred (\d+(?:\.\d+)?)\s*([KMGT]?B)', output or "")
-            if size_match:
-                size_val = float(size_match.group(1))
-                size_unit = size_match.group(2)
-                multipliers = {'B': 1, 'KB': 1024, 'MB': 1024**2, 'GB': 1024**3, 'TB': 1024**4}
-                backup_size = int(size_val * multipliers.get(size_unit, 1))
-            
-            job.current_status = BackupJobStatus.COMPLETED.value
-            job.last_status = "success"
-            job.last_backup_time = end_time
-            job.last_backup_id = backup_id
-            job.last_backup_size = backup_size
-            job.run_count += 1
-            job.consecutive_failures = 0
-            job.last_error = None
-            
-            log.status = "success"
-            log.message = f"Backup completato in {duration}s"
-            log.output = output[:5000] if output else None
-            
-            logger.info(f"Backup job {job.id} completato con successo")
-        else:
+            backup_size = _parse_transferred_size(output)
+        
+        _record_backup_result(job, log, success, output, error, duration, end_time, backup_id, backup_size)
+        db.commit()
+        await _notify_backup_result(job, source_node, pbs_node, duration, error)
+        
+    except Exception as e:
+        logger.exception(f"Errore esecuzione backup job {job_id}")
+        if job:
             job.current_status = BackupJobStatus.FAILED.value
             job.last_status = "failed"
+            job.last_error = str(e)[:1000]
             job.error_count += 1
             job.consecutive_failures += 1
-            job.last_error = error[:1000] if error else "Errore sconosciuto"
-            
-            log.status = "failed"
-            log.message = f"Backup fallito: {error[:500] if error else 'Errore'}"
-            log.error = error[:5000] if error else None
-            
-            logger.error(f"Backup job {job.id} fallito: {error}")
-        
-        job.last_duration = duration
-        log.completed_at = end_time
-        log.duration = duration
+            db.commit()
+    finally:
+        db.close()
+
+
+async def execute_backup_batch_task(job_ids: List[int]):
+    """Esegue con un solo ``vzdump <id1> <id2> ...`` i backup di più job con
+    stesso nodo sorgente, storage PBS e opzioni (fire coalescenti dello
+    scheduler). Ogni job riceve il proprio JobLog, esito e notifica."""
+    if len(job_ids) == 1:
+        await execute_backup_task(job_ids[0], "")
+        return
+
+    from database import SessionLocal
+    from services.pbs_service import pbs_service
+    db = SessionLocal()
+    jobs: List[BackupJob] = []
+    logs: Dict[int, JobLog] = {}
+    
+    try:
+        jobs = db.query(BackupJob).filter(BackupJob.id.in_(job_ids)).order_by(BackupJob.id).all()
+        if not jobs:
+            return
+        first = jobs[0]
+        source_node = db.query(Node).filter(Node.id == first.source_node_id).first()
+        pbs_node = db.query(Node).filter(Node.id == first.pbs_node_id).first()
+        if not source_node or not pbs_node:
+            raise Exception("Nodi non trovati")
         
+        start_time = datetime.utcnow()
+        jobs_by_vm: Dict[int, List[BackupJob]] = {}
+        for job in jobs:
+            job.current_status = BackupJobStatus.RUNNING.value
+            job.last_run = start_time
+            logs[job.id] = JobLog(
+                job_type="backup",
+                job_id=job.id,
+                node_name=source_node.name,
+                status="running",
+                message=(
+                    f"Avvio backup VM {job.vm_id} ({job.name}) verso PBS {pbs_node.name} "
+                    f"(batch di {len(jobs)} VM)"
+                ),
+                started_at=start_time
+            )
+            db.add(logs[job.id])
+            jobs_by_vm.setdefault(job.vm_id, []).append(job)
+            _progress.set_nodes(job.id, [source_node.id, pbs_node.id])
+            _progress[job.id] = {"status": "queued", "vm_id": job.vm_id, "percent": 0}
         db.commit()
         
-        # Notifica se richiesto
-        if job.notify_on_each_run or (job.notify_on_failure and job.last_status == "failed"):
-            try:
-                from services.notification_service import notification_service
-                await notification_service.send_job_notification(
-                    job_type="backup",
-                    job_name=job.name,
-                    status=job.last_status,
-                    source=f"{source_node.name}:vm/{job.vm_id}",
-                    destination=f"{pbs_node.name}:{job.pbs_storage_id}",
-                    duration=duration,
-                    error=error if job.last_status == "failed" else None,
-                    details=(
-                        f"VM: {job.vm_name or '—'} (ID {job.vm_id})\n"
-                        f"Storage PBS: {job.pbs_storage_id}\n"
-                        f"Nodo sorgente: {source_node.name}"
-                    ),
-                    job_id=job_id,
-                    is_scheduled=bool(job.schedule),
-                    notify_mode=job.notify_mode or "daily",
-                    source_node_name=source_node.name,
-                    dest_node_name=pbs_node.name,
-                    vm_name=job.vm_name,
-                    vm_id=job.vm_id
-                )
-            except Exception as e:
-                logger.warning(f"Errore invio notifica: {e}")
+        def _on_progress(vm_id: int, entry: Dict[str, Any]) -> None:
+            for job in jobs_by_vm.get(vm_id, []):
+                _progress[job.id] = {
+                    "status": entry["status"], "vm_id": vm_id, "percent": entry["percent"],
+                }
         
+        storage_id = await _resolve_backup_storage(source_node, first.pbs_storage_id)
+        batch = await pbs_service.run_backup_batch(
+            source_node_hostname=source_node.hostname,
+            vm_ids=list(jobs_by_vm),
+            pbs_hostname=pbs_node.hostname,
+            datastore=first.pbs_datastore or pbs_node.pbs_datastore,
+            pbs_storage_id=storage_id,
+            mode=first.backup_mode,
+            compress=first.backup_compress,
+            bwlimit_kb=first.bandwidth_limit,
+            exclude_tmp=not first.include_all_disks,
+            source_node_port=source_node.ssh_port,
+            source_node_user=source_node.ssh_user,
+            source_node_key=source_node.ssh_key_path or "/root/.ssh/id_rsa",
+            progress_callback=_on_progress,
+        )
+        
+        end_time = datetime.utcnow()
+        for job in jobs:
+            r = batch["results"][job.vm_id]
+            _record_backup_result(
+                job, logs[job.id], r["success"], r["output"], r["error"], r["duration"],
+                end_time, r["backup_id"], r["transferred_bytes"],
+            )
+        db.commit()
+        ok = sum(1 for job in jobs if job.last_status == "success")
+        logger.info(f"Batch backup su {source_node.name}: {ok}/{len(jobs)} VM in {batch['duration']}s")
+        for job in jobs:
+            await _notify_backup_result(job, source_node, pbs_node, job.last_duration or 0, job.last_error)
+    
     except Exception as e:
-        logger.exception(f"Errore esecuzione backup job {job_id}")
-        if job:
+        logger.exception(f"Errore esecuzione batch backup {job_ids}")
+        for job in jobs:
+            if job.current_status != BackupJobStatus.RUNNING.value:
+                continue
             job.current_status = BackupJobStatus.FAILED.value
             job.last_status = "failed"
             job.last_error = str(e)[:1000]
             job.error_count += 1
             job.consecutive_failures += 1
-            db.commit()
+            if job.id in logs:
+                logs[job.id].status = "failed"
+                logs[job.id].error = str(e)[:5000]
+                logs[job.id].completed_at = datetime.utcnow()
+        db.commit()
     finally:
+        for job_id in job_ids:
+            _progress.pop(job_id, None)
         db.close()
 
 
@@ -19,7 +19,7 @@ import base64
 
 from sqlalchemy.orm import Session
 from database import get_db, SessionLocal
-from routers.auth import require_admin, User
+from routers.auth import require_admin, User, invalidate_principals
 
 router = APIRouter(prefix="/api/config-backup", tags=["Configuration Backup"])
 logger = logging.getLogger(__name__)
@@ -408,6 +408,8 @@ async def restore_backup(
                 os.makedirs(os.path.dirname(db_dest), exist_ok=True)
                 shutil.copy2(db_src, db_dest)
                 restored_items.append("Database")
+                # Utenti e sessioni possono essere cambiati: niente principal in cache
+                invalidate_principals()
                 logger.info("Database ripristinato")
             else:
                 warnings.append("Database non trovato nel backup")
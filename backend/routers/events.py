@@ -0,0 +1,126 @@
+"""
+Events API
+----------
+Stream SSE dell'avanzamento job (``GET /api/events/jobs``): stato e progresso
+di repliche syncoid, snapshot VM, Repliche dati NAS e file replication
+arrivano in push dal bus ``services/job_events.py`` invece del polling dei
+singoli ``/progress``. Ogni utente riceve solo gli eventi dei job sui nodi a
+cui ha accesso (``check_node_access``).
+
+``EventSource`` non permette header custom: il token si può passare anche
+come ``?token=`` (come per i download).
+"""
+
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
+
+from database import Node, SessionLocal, User
+from routers.auth import get_current_user, security
+from routers.deps import check_node_access
+from services.job_events import JobEvent, job_events
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Commento SSE periodico: tiene aperti proxy e connessioni inattive
+KEEPALIVE_SECONDS = 15
+# Pausa minima tra due invii allo stesso client; gli aggiornamenti intermedi
+# dello stesso job vengono fusi dal bus
+MIN_PUSH_INTERVAL_SECONDS = 0.5
+
+
+class _NodeFilter:
+    """Visibilità degli eventi per un utente (nodi ricalcolati se un evento
+    cita un nodo creato dopo l'apertura dello stream)."""
+
+    def __init__(self, user: User):
+        self.user = user
+        self._known: Set[int] = set()
+        self._allowed: Set[int] = set()
+        self.reload()
+
+    def reload(self) -> None:
+        db = SessionLocal()
+        try:
+            nodes = db.query(Node).all()
+            self._known = {n.id for n in nodes}
+            self._allowed = {n.id for n in nodes if check_node_access(self.user, n)}
+        finally:
+            db.close()
+
+    def visible(self, event: JobEvent) -> bool:
+        if not event.node_ids:
+            return True
+        if any(n not in self._known for n in event.node_ids):
+            self.reload()
+        return all(n in self._allowed for n in event.node_ids)
+
+
+async def _stream_user(
+    request: Request,
+    token: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+) -> User:
+    """Utente da header Bearer o ``?token=``, con una sessione DB breve
+    (quella di ``get_db`` resterebbe aperta per tutta la durata dello stream)."""
+    if credentials is None and token:
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    db = SessionLocal()
+    try:
+        user = await get_current_user(credentials, db)
+        db.expunge(user)
+        return user
+    finally:
+        db.close()
+
+
+def _format_sse(event: JobEvent) -> str:
+    return f"id: {event.seq}\nevent: job\ndata: {json.dumps(event.as_dict(), default=str)}\n\n"
+
+
+async def event_stream(
+    visible: Callable[[JobEvent], bool],
+    is_disconnected: Callable[[], Awaitable[bool]],
+    keepalive: float = KEEPALIVE_SECONDS,
+    min_interval: float = MIN_PUSH_INTERVAL_SECONDS,
+):
+    """Generatore SSE: stato dei job in corso all'apertura, poi gli
+    aggiornamenti visibili all'utente."""
+    async with job_events.subscribe() as sub:
+        yield "retry: 5000\n\n"
+        while not await is_disconnected():
+            batch = await job_events.next_batch(sub, keepalive)
+            if not batch:
+                yield ": keepalive\n\n"
+                continue
+            chunk = "".join(_format_sse(ev) for ev in batch if visible(ev))
+            if chunk:
+                yield chunk
+            await asyncio.sleep(min_interval)
+
+
+@router.get("/jobs")
+async def job_events_stream(request: Request, user: User = Depends(_stream_user)):
+    """Stream SSE (``event: job``) di stato/progresso dei job."""
+    node_filter = _NodeFilter(user)
+    return StreamingResponse(
+        event_stream(node_filter.visible, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/jobs/active", response_model=List[Dict])
+async def active_job_events(user: User = Depends(get_current_user)):
+    """Ultimo evento dei job in corso visibili all'utente (stato iniziale
+    per client senza SSE)."""
+    node_filter = _NodeFilter(user)
+    return [ev.as_dict() for ev in job_events.active() if node_filter.visible(ev)]
+
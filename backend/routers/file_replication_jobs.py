@@ -17,12 +17,14 @@ from services.file_replication.file_replication_execution import (
     get_job_progress,
     is_job_running,
 )
+from services.file_replication import staging_cache
 from services.file_replication.exclude_presets import _merge_presets
 from services.file_replication.path_utils import (
     compact_source_paths,
     normalize_qnap_dest_share,
     sanitize_path,
 )
+from services.job_log_output import full_outputs
 from services.file_replication_schemas import (
     FileReplicationJobCreate,
     FileReplicationJobOut,
@@ -33,6 +35,11 @@ from services.scheduler import scheduler_service
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Campi che cambiano cosa copia lo stream tar: invalidano il checkpoint di ripresa
+_STREAM_CHECKPOINT_FIELDS = {
+    "source_paths", "dest_staging_path", "sync_method", "exclude_presets", "exclude_patterns",
+}
+
 
 def _latest_log_errors(db: Session, job_ids: list[int]) -> dict[int, str]:
     if not job_ids:
@@ -76,6 +83,11 @@ def _job_out(job: FileReplicationJob, last_run_error: Optional[str] = None) -> F
         exclude_presets=job.exclude_presets or [],
         exclude_patterns=job.exclude_patterns or [],
         bandwidth_limit_kb=job.bandwidth_limit_kb,
+        persistent_staging=bool(job.persistent_staging),
+        stream_compression=job.stream_compression,
+        stream_resume_pending=any(
+            (entry or {}).get("done") for entry in (job.stream_checkpoint or {}).values()
+        ),
         immutability_strategy=job.immutability_strategy,
         snapshot_policy_hint=hint,
         schedule=job.schedule,
@@ -163,6 +175,8 @@ def create_job(
         exclude_patterns=body.exclude_patterns,
         bandwidth_limit_kb=body.bandwidth_limit_kb,
         extra_rsync_args=body.extra_rsync_args,
+        persistent_staging=body.persistent_staging,
+        stream_compression=body.stream_compression,
         snapshot_policy_hint=hint,
         schedule=body.schedule,
         schedule_config=body.schedule_config,
@@ -212,11 +226,18 @@ def update_job(
     if "dest_staging_path" in data and data["dest_staging_path"] is not None:
         data["dest_staging_path"] = normalize_qnap_dest_share(data["dest_staging_path"])
 
+    if any(data[k] != getattr(job, k) for k in _STREAM_CHECKPOINT_FIELDS & data.keys()):
+        # Blocchi già copiati non più validi: il prossimo stream tar riparte da capo
+        job.stream_checkpoint = None
     for key, value in data.items():
         setattr(job, key, value)
     job.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(job)
+    if data.get("persistent_staging") is False:
+        staging_cache.remove(job.id)
+    elif data.get("persistent_staging") is True:
+        staging_cache.cancel_removal(job.id)
 
     if job.schedule and job.is_active:
         scheduler_service.update_file_replication_schedule(job.id, job.schedule)
@@ -235,6 +256,7 @@ def delete_job(
     if not job:
         raise HTTPException(status_code=404, detail="Job non trovato")
     scheduler_service.remove_file_replication_schedule(job.id)
+    staging_cache.remove(job.id)
     db.delete(job)
     db.commit()
     return {"ok": True}
@@ -287,12 +309,13 @@ def job_logs(
         .limit(50)
         .all()
     )
+    outputs = full_outputs(db, logs)
     return [
         {
             "id": log.id,
             "status": log.status,
             "message": log.message,
-            "output": log.output,
+            "output": outputs.get(log.id) or None,
             "error": log.error,
             "duration": log.duration,
             "transferred": log.transferred,
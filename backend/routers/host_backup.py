@@ -14,6 +14,7 @@ from database import get_db, Node, JobLog, HostBackupJob
 from routers.auth import get_current_user, require_operator, User
 from routers.deps import assert_node_access, check_node_access
 from services.host_backup_service import host_backup_service
+from services.scheduler import scheduler_service
 
 import logging
 
@@ -167,6 +168,9 @@ async def create_host_backup_job(
     db.add(job)
     db.commit()
     db.refresh(job)
+
+    if job.is_active and job.schedule:
+        scheduler_service.update_host_backup_schedule(job.id, job.schedule, job.last_run)
     
     return {
         "success": True,
@@ -237,6 +241,11 @@ async def update_host_backup_job(
     
     job.updated_at = datetime.utcnow()
     db.commit()
+
+    if job.is_active and job.schedule:
+        scheduler_service.update_host_backup_schedule(job.id, job.schedule, job.last_run)
+    else:
+        scheduler_service.remove_host_backup_schedule(job.id)
     
     return {"success": True, "message": "Job aggiornato"}
 
@@ -253,6 +262,7 @@ async def delete_host_backup_job(
         raise HTTPException(status_code=404, detail="Job non trovato")
     _require_job_node(db, user, job)
     
+    scheduler_service.remove_host_backup_schedule(job_id)
     db.delete(job)
     db.commit()
     
@@ -4,6 +4,7 @@ Espone dati hardware, storage, network raccolti da host_info_service
 """
 
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
@@ -13,6 +14,7 @@ import re
 
 from database import get_db, Node, User
 from services.host_info_service import host_info_service
+from services.dashboard_aggregate import dashboard_aggregate
 from services.proxmox_service import proxmox_service
 from services.ssh_service import ssh_service
 from routers.auth import get_current_user
@@ -83,6 +85,8 @@ class DashboardOverviewResponse(BaseModel):
     nodes_summary: List[Dict[str, Any]] = []
     job_stats: Dict[str, Any] = {}
     recent_logs: List[Dict[str, Any]] = []
+    # Nodi online senza host_info in cache, in aggiornamento in background
+    refreshing_nodes: List[int] = []
 
 
 # ============== Endpoints ==============
@@ -212,120 +216,29 @@ async def get_dashboard_overview(
     total_nodes = len(nodes)
     online_nodes = sum(1 for n in nodes if n.is_online)
     
-    # Aggrega dati da tutti i nodi
-    total_vms = 0
-    running_vms = 0
-    total_storage_gb = 0.0
-    used_storage_gb = 0.0
-    total_memory_gb = 0.0
-    used_memory_gb = 0.0
-    total_cpu_cores = 0
-    nodes_summary = []
-    
-    # Traccia storage condivisi già contati (per evitare duplicati)
-    counted_shared_storage = set()
-    
-    for node in nodes:
-        if not node.is_online:
-            continue
-        
-        # Supportiamo anche PBS (node_type="pbs")
-        
-        try:
-            # Raccolta dati host (solo summary, senza dettagli completi)
-            # Raccolta dati host (da cache)
-            host_details = await host_info_service.get_host_details(node_id=node.id)
-            if not host_details:
-                # Prova update veloce se manca
-                host_details = await host_info_service.update_host_details(node.id)
-            
-            if not host_details:
-                continue
-            
-            # Aggrega storage (deduplicando storage condivisi)
-            node_storage_total = 0.0
-            node_storage_used = 0.0
-            for storage in host_details.get("storage", []):
-                storage_name = storage.get("name", "")
-                is_shared = storage.get("shared", False)
-                
-                # Per il singolo nodo, conta tutto
-                if storage.get("total_gb"):
-                    node_storage_total += storage["total_gb"]
-                if storage.get("used_gb"):
-                    node_storage_used += storage["used_gb"]
-                
-                # Per il totale globale, conta shared solo una volta
-                if is_shared:
-                    if storage_name not in counted_shared_storage:
-                        counted_shared_storage.add(storage_name)
-                        if storage.get("total_gb"):
-                            total_storage_gb += storage["total_gb"]
-                        if storage.get("used_gb"):
-                            used_storage_gb += storage["used_gb"]
-                else:
-                    # Storage locale: conta sempre
-                    if storage.get("total_gb"):
-                        total_storage_gb += storage["total_gb"]
-                    if storage.get("used_gb"):
-                        used_storage_gb += storage["used_gb"]
-            
-            # Aggrega memory
-            if host_details.get("memory", {}).get("total_gb"):
-                total_memory_gb += host_details["memory"]["total_gb"]
-            if host_details.get("memory", {}).get("used_gb"):
-                used_memory_gb += host_details["memory"]["used_gb"]
-            
-            # Aggrega CPU
-            if host_details.get("cpu", {}).get("cores"):
-                total_cpu_cores += host_details["cpu"]["cores"]
-            
-            # Conta VM
-            vms = await proxmox_service.get_all_guests(
-                hostname=node.hostname,
-                port=node.ssh_port,
-                username=node.ssh_user,
-                key_path=node.ssh_key_path
-            )
-            
-            total_vms += len(vms)
-            running_vms += sum(1 for vm in vms if vm.get("status", "").lower() == "running")
-            
-            # Summary nodo (mostra tutto lo storage del nodo, non deduplicato)
-            nodes_summary.append({
-                "node_id": node.id,
-                "node_name": node.name,
-                "hostname": node.hostname,
-                "is_online": node.is_online,
-                "cpu_cores": host_details.get("cpu", {}).get("cores", 0),
-                "memory_total_gb": host_details.get("memory", {}).get("total_gb", 0),
-                "memory_used_gb": host_details.get("memory", {}).get("used_gb", 0),
-                "storage_total_gb": round(node_storage_total, 2),
-                "storage_used_gb": round(node_storage_used, 2),
-                "vm_count": len(vms),
-                "running_vm_count": sum(1 for vm in vms if vm.get("status", "").lower() == "running"),
-                "temperature_highest_c": host_details.get("temperature", {}).get("highest_c"),
-                "proxmox_version": host_details.get("proxmox_version")
-            })
-        except Exception as e:
-            # Skip nodi con errori
-            logger.error(f"Errore raccolta dati nodo {node.name}: {e}")
-            continue
+    # Aggregato precalcolato da host_info + cache VM (niente SSH qui): i nodi
+    # online ancora senza host_info si aggiornano in background
+    aggregate = dashboard_aggregate.overview(db, nodes)
     
     # Ottieni statistiche job
     from database import SyncJob, BackupJob, RecoveryJob, MigrationJob
-    sync_jobs = db.query(SyncJob).filter(SyncJob.is_active == True).all()
-    backup_jobs = db.query(BackupJob).filter(BackupJob.is_active == True).all()
-    recovery_jobs = db.query(RecoveryJob).filter(RecoveryJob.is_active == True).all()
-    migration_jobs = db.query(MigrationJob).filter(MigrationJob.is_active == True).all()
+    sync_by_method = dict(
+        db.query(SyncJob.sync_method, func.count(SyncJob.id))
+        .filter(SyncJob.is_active == True)
+        .group_by(SyncJob.sync_method)
+        .all()
+    )
+    backup_count = db.query(func.count(BackupJob.id)).filter(BackupJob.is_active == True).scalar() or 0
+    recovery_count = db.query(func.count(RecoveryJob.id)).filter(RecoveryJob.is_active == True).scalar() or 0
+    migration_count = db.query(func.count(MigrationJob.id)).filter(MigrationJob.is_active == True).scalar() or 0
     
     job_stats = {
-        "replica_zfs": sum(1 for j in sync_jobs if j.sync_method == "syncoid"),
-        "replica_btrfs": sum(1 for j in sync_jobs if j.sync_method == "btrfs_send"),
-        "backup_pbs": len(backup_jobs),
-        "replica_pbs": len(recovery_jobs),
-        "migration": len(migration_jobs),
-        "total": len(sync_jobs) + len(backup_jobs) + len(recovery_jobs) + len(migration_jobs)
+        "replica_zfs": sync_by_method.get("syncoid", 0),
+        "replica_btrfs": sync_by_method.get("btrfs_send", 0),
+        "backup_pbs": backup_count,
+        "replica_pbs": recovery_count,
+        "migration": migration_count,
+        "total": sum(sync_by_method.values()) + backup_count + recovery_count + migration_count
     }
     
     # Ottieni log recenti
@@ -347,16 +260,17 @@ async def get_dashboard_overview(
     return DashboardOverviewResponse(
         total_nodes=total_nodes,
         online_nodes=online_nodes,
-        total_vms=total_vms,
-        running_vms=running_vms,
-        total_storage_gb=round(total_storage_gb, 2),
-        used_storage_gb=round(used_storage_gb, 2),
-        total_memory_gb=round(total_memory_gb, 2),
-        used_memory_gb=round(used_memory_gb, 2),
-        total_cpu_cores=total_cpu_cores,
-        nodes_summary=nodes_summary,
+        total_vms=aggregate["total_vms"],
+        running_vms=aggregate["running_vms"],
+        total_storage_gb=aggregate["total_storage_gb"],
+        used_storage_gb=aggregate["used_storage_gb"],
+        total_memory_gb=aggregate["total_memory_gb"],
+        used_memory_gb=aggregate["used_memory_gb"],
+        total_cpu_cores=aggregate["total_cpu_cores"],
+        nodes_summary=aggregate["nodes_summary"],
         job_stats=job_stats,
-        recent_logs=recent_logs
+        recent_logs=recent_logs,
+        refreshing_nodes=aggregate["refreshing_nodes"]
     )
 
 
@@ -373,6 +287,8 @@ async def get_dashboard_nodes(
     nodes_query = db.query(Node).filter(Node.is_active == True)
     nodes = filter_nodes_for_user(db, user, nodes_query).all()
     
+    summaries = dashboard_aggregate.node_summaries(db, [n.id for n in nodes if n.is_online])
+    missing: List[int] = []
     nodes_list = []
     for node in nodes:
         node_summary = {
@@ -401,57 +317,37 @@ async def get_dashboard_nodes(
             "pbs_fingerprint": node.pbs_fingerprint
         }
         
-        # Se online, aggiungi summary dati (supporta PVE e PBS)
-        if node.is_online:
-            try:
-                host_details = await host_info_service.get_host_details(node_id=node.id)
-                
-                if not host_details:
-                    host_details = {}
-                # Conta VM
-                vms = await proxmox_service.get_all_guests(
-                    hostname=node.hostname,
-                    port=node.ssh_port,
-                    username=node.ssh_user,
-                    key_path=node.ssh_key_path
-                )
-                
-                # Calcola storage totale e usato
-                storage_list = host_details.get("storage", [])
-                storage_total_gb = sum((s.get("total_gb") or 0) for s in storage_list)
-                storage_used_gb = sum((s.get("used_gb") or 0) for s in storage_list)
-                
-                # Aggiorna summary con dati raccolti
-                cpu_data = host_details.get("cpu", {})
-                memory_data = host_details.get("memory", {})
-                temperature_data = host_details.get("temperature", {})
-                
-                node_summary.update({
-                    "proxmox_version": host_details.get("proxmox_version"),
-                    "cpu": cpu_data,
-                    "memory": memory_data,
-                    "storage": host_details.get("storage", []),
-                    "temperature": temperature_data,
-                    # Network topology data
-                    "network": host_details.get("network", []),
-                    "guests": host_details.get("guests", []),
-                    # Full host_info for detailed modal
-                    "host_info": host_details,
-                    # Campi aggiuntivi per compatibilità frontend
-                    "storage_total_gb": round(storage_total_gb, 2) if storage_total_gb > 0 else 0,
-                    "storage_used_gb": round(storage_used_gb, 2) if storage_used_gb > 0 else 0,
-                    "vm_count": len(vms) if vms else 0,
-                    "running_vm_count": sum(1 for vm in vms if vm.get("status", "").lower() == "running") if vms else 0,
-                    "temperature_highest_c": temperature_data.get("highest_c") if temperature_data else None
-                })
-                
-                logger.debug(f"Nodo {node.name}: {len(vms) if vms else 0} VM totali, {node_summary['running_vm_count']} running, storage: {storage_total_gb}GB")
-            except Exception as e:
-                # In caso di errore, mantieni i valori di default (None)
-                logger.error(f"Errore raccolta dati per nodo {node.id} ({node.name}): {e}", exc_info=True)
+        # Se online, aggiungi summary dati (supporta PVE e PBS): host_info e
+        # conteggi VM dalle cache, senza SSH nella richiesta
+        summary = summaries.get(node.id)
+        if node.is_online and summary:
+            host_details = node.host_info or {}
+            temperature_data = host_details.get("temperature", {})
+            node_summary.update({
+                "proxmox_version": host_details.get("proxmox_version"),
+                "cpu": host_details.get("cpu", {}),
+                "memory": host_details.get("memory", {}),
+                "storage": host_details.get("storage", []),
+                "temperature": temperature_data,
+                # Network topology data
+                "network": host_details.get("network", []),
+                "guests": host_details.get("guests", []),
+                # Full host_info for detailed modal
+                "host_info": host_details,
+                # Campi aggiuntivi per compatibilità frontend
+                "storage_total_gb": summary["storage_total_gb"],
+                "storage_used_gb": summary["storage_used_gb"],
+                "vm_count": summary["vm_count"],
+                "running_vm_count": summary["running_vm_count"],
+                "temperature_highest_c": temperature_data.get("highest_c") if temperature_data else None
+            })
+            if not summary["has_host_info"]:
+                missing.append(node.id)
         
         nodes_list.append(node_summary)
     
+    if missing:
+        dashboard_aggregate.schedule_refresh(missing)
     return nodes_list
 
 
@@ -5,7 +5,8 @@ Con autenticazione
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, case, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, case, or_, select
 from typing import List, Optional
 from datetime import datetime, timedelta
 from pydantic import BaseModel
@@ -14,9 +15,11 @@ import asyncio
 import subprocess
 import logging
 
-from database import get_db, JobLog, User, AuditLog
+from database import get_db, get_async_db, JobLog, Node, User, AuditLog
 from routers.auth import get_current_user, require_admin
-from services.size_utils import sum_transferred_values
+from services.job_log_output import full_outputs, read_output
+from services.job_log_rollup import open_counts, window_totals
+from services.size_utils import format_bytes_human
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -41,16 +44,30 @@ class JobLogResponse(BaseModel):
     error: Optional[str] = None
     duration: Optional[float] = None  # Can be float from database
     transferred: Optional[str] = None
+    transferred_bytes: Optional[int] = None
     attempt_number: Optional[int] = 1
     started_at: datetime
     completed_at: Optional[datetime] = None
     triggered_by: Optional[int] = None
+    trigger_source: Optional[str] = None
     backup_id: Optional[str] = None
+    # Posizione di `output` nell'output completo (header + job_log_chunks):
+    # valorizzati quando si chiede solo la coda o un intervallo.
+    output_offset: Optional[int] = None
+    output_size: Optional[int] = None
     
     class Config:
         from_attributes = True
 
 
+class JobLogOutputResponse(BaseModel):
+    log_id: int
+    text: str
+    offset: int
+    size: int
+    last_seq: int
+
+
 class LogStatsResponse(BaseModel):
     total: int
     success: int
@@ -63,6 +80,24 @@ class LogStatsResponse(BaseModel):
 
 # ============== Endpoints ==============
 
+async def _with_full_outputs(
+    db: AsyncSession, logs, output_tail: Optional[int] = None
+) -> List[JobLogResponse]:
+    """Risposte con l'output ricomposto (header + job_log_chunks), una sola
+    query sui chunk per tutti i log."""
+    outputs = await db.run_sync(full_outputs, logs)
+    result = []
+    for log in logs:
+        text = outputs.get(log.id) or ""
+        item = JobLogResponse.model_validate(log)
+        update = {"output": text or None, "output_offset": 0, "output_size": len(text)}
+        if output_tail is not None and len(text) > output_tail:
+            update["output"] = text[len(text) - output_tail:]
+            update["output_offset"] = len(text) - output_tail
+        result.append(item.model_copy(update=update))
+    return result
+
+
 @router.get("/", response_model=List[JobLogResponse])
 async def list_logs(
     limit: int = Query(default=100, ge=1, le=1000),   # S-13: tetto massimo
@@ -71,32 +106,38 @@ async def list_logs(
     status: Optional[str] = None,
     job_id: Optional[int] = None,
     since: Optional[datetime] = None,
+    output_tail: Optional[int] = Query(default=None, ge=0),
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Lista i log delle operazioni"""
-    query = db.query(JobLog)
+    """Lista i log delle operazioni.
+
+    ``output_tail=N`` restituisce solo gli ultimi N caratteri dell'output di
+    ogni log (con ``output_offset``/``output_size``).
+    """
+    query = select(JobLog)
 
     # S-14: un utente non-admin con allowed_nodes vede solo i log dei propri nodi
     # (più i log non legati a un nodo specifico, node_name null).
     if user.role != "admin" and user.allowed_nodes is not None:
-        from database import Node
-        allowed_names = {
-            n.name for n in db.query(Node).filter(Node.id.in_(user.allowed_nodes)).all()
-        }
-        query = query.filter(or_(JobLog.node_name.in_(allowed_names), JobLog.node_name.is_(None)))
+        allowed_names = set(
+            (await db.scalars(select(Node.name).where(Node.id.in_(user.allowed_nodes)))).all()
+        )
+        query = query.where(or_(JobLog.node_name.in_(allowed_names), JobLog.node_name.is_(None)))
 
     if job_type:
-        query = query.filter(JobLog.job_type == job_type)
+        query = query.where(JobLog.job_type == job_type)
     if status:
-        query = query.filter(JobLog.status == status)
+        query = query.where(JobLog.status == status)
     if job_id:
-        query = query.filter(JobLog.job_id == job_id)
+        query = query.where(JobLog.job_id == job_id)
     if since:
-        query = query.filter(JobLog.started_at >= since)
+        query = query.where(JobLog.started_at >= since)
     
-    logs = query.order_by(JobLog.started_at.desc()).offset(offset).limit(limit).all()
-    return logs
+    logs = (await db.scalars(
+        query.order_by(JobLog.started_at.desc()).offset(offset).limit(limit)
+    )).all()
+    return await _with_full_outputs(db, logs, output_tail)
 
 
 @router.get("/stats", response_model=LogStatsResponse)
@@ -104,39 +145,26 @@ async def get_log_stats(
     days: int = Query(default=7, ge=1, le=365),   # S-13: finestra massima
     job_type: Optional[str] = None,
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Ottiene statistiche sui log"""
-    since = datetime.utcnow() - timedelta(days=days)
-    
-    # P-06/P11: conteggi e media via SQL (COUNT/SUM/AVG), non caricando l'intera
-    # finestra di log in Python. Solo la colonna `transferred` (stringhe human,
-    # non aggregabili in SQL) viene letta, e solo dove valorizzata.
-    base = db.query(JobLog).filter(JobLog.started_at >= since)
-    if job_type:
-        base = base.filter(JobLog.job_type == job_type)
-
-    agg = base.with_entities(
-        func.count().label("total"),
-        func.sum(case((JobLog.status == "success", 1), else_=0)).label("success"),
-        func.sum(case((JobLog.status == "failed", 1), else_=0)).label("failed"),
-        func.sum(case((JobLog.status.in_(["started", "running"]), 1), else_=0)).label("running"),
-        func.avg(JobLog.duration).label("avg_duration"),
-    ).one()
-
-    total = int(agg.total or 0)
-    success = int(agg.success or 0)
-    failed = int(agg.failed or 0)
-    running = int(agg.running or 0)
-    avg_duration = float(agg.avg_duration) if agg.avg_duration is not None else None
+    now = datetime.utcnow()
+    since = now - timedelta(days=days)
 
-    success_rate = (success / total * 100) if total > 0 else 0
+    # Log conclusi dai rollup orari/giornalieri (services/job_log_rollup.py):
+    # costo indipendente da `days`, finestra allineata all'ora. I log ancora
+    # aperti non sono nei rollup e si contano a parte.
+    done = (await db.execute(window_totals(since, now, job_type))).one()
+    pending = (await db.execute(open_counts(since, job_type))).one()
 
-    transferred_values = [
-        t for (t,) in base.with_entities(JobLog.transferred)
-        .filter(JobLog.transferred.isnot(None), JobLog.transferred != "").all()
-    ]
-    total_transferred = sum_transferred_values(transferred_values) if transferred_values else None
+    success = int(done.success)
+    failed = int(done.failed)
+    total = int(done.runs) + int(pending.open or 0)
+    running = int(pending.running or 0)
+    avg_duration = done.duration_sum / done.duration_count if done.duration_count else None
+
+    success_rate = (success / total * 100) if total > 0 else 0
+    total_transferred = format_bytes_human(int(done.transferred_bytes)) if done.transferred_bytes else None
     
     return LogStatsResponse(
         total=total,
@@ -165,33 +193,35 @@ async def cleanup_old_logs(
     return {"message": f"Eliminati {count} log più vecchi di {days} giorni", "deleted": count, "days": days}
 
 
-@router.get("/recent/failed")
+@router.get("/recent/failed", response_model=List[JobLogResponse])
 async def get_recent_failures(
     limit: int = 10,
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Ottiene i fallimenti recenti"""
-    logs = db.query(JobLog).filter(
-        JobLog.status == "failed"
-    ).order_by(JobLog.started_at.desc()).limit(limit).all()
+    logs = (await db.scalars(
+        select(JobLog).where(JobLog.status == "failed")
+        .order_by(JobLog.started_at.desc()).limit(limit)
+    )).all()
 
-    return logs
+    return await _with_full_outputs(db, logs)
 
 
-@router.get("/job/{job_id}/history")
+@router.get("/job/{job_id}/history", response_model=List[JobLogResponse])
 async def get_job_history(
     job_id: int,
     limit: int = 50,
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Ottiene lo storico di un job specifico"""
-    logs = db.query(JobLog).filter(
-        JobLog.job_id == job_id
-    ).order_by(JobLog.started_at.desc()).limit(limit).all()
+    logs = (await db.scalars(
+        select(JobLog).where(JobLog.job_id == job_id)
+        .order_by(JobLog.started_at.desc()).limit(limit)
+    )).all()
 
-    return logs
+    return await _with_full_outputs(db, logs)
 
 
 # ============== Audit Log Endpoints ==============
@@ -547,17 +577,51 @@ async def get_live_logs(
     }
 
 
+@router.get("/{log_id}/output", response_model=JobLogOutputResponse)
+async def get_log_output(
+    log_id: int,
+    tail: Optional[int] = Query(default=None, ge=0),
+    offset: int = Query(default=0, ge=0),
+    limit: Optional[int] = Query(default=None, ge=0),
+    after_seq: Optional[int] = Query(default=None, ge=0),
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Output di un log a pezzi: coda (``tail``), intervallo
+    (``offset``/``limit``, in caratteri) o solo i chunk nuovi (``after_seq``,
+    da ripassare con il ``last_seq`` della risposta precedente)."""
+    log = await db.get(JobLog, log_id)
+    if not log:
+        raise HTTPException(status_code=404, detail="Log non trovato")
+    chunk = await db.run_sync(
+        read_output, log, tail=tail, offset=offset, limit=limit, after_seq=after_seq
+    )
+    return JobLogOutputResponse(log_id=log.id, **chunk)
+
+
 @router.get("/{log_id}", response_model=JobLogResponse)
 async def get_log(
     log_id: int,
+    tail: Optional[int] = Query(default=None, ge=0),
+    offset: Optional[int] = Query(default=None, ge=0),
+    limit: Optional[int] = Query(default=None, ge=0),
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Ottiene un log specifico (deve restare dopo le route statiche)."""
-    log = db.query(JobLog).filter(JobLog.id == log_id).first()
+    """Ottiene un log specifico (deve restare dopo le route statiche).
+
+    ``tail`` o ``offset``/``limit`` limitano ``output`` a una porzione
+    dell'output completo; senza parametri viene restituito per intero.
+    """
+    log = await db.get(JobLog, log_id)
     if not log:
         raise HTTPException(status_code=404, detail="Log non trovato")
-    return log
+    chunk = await db.run_sync(read_output, log, tail=tail, offset=offset or 0, limit=limit)
+    return JobLogResponse.model_validate(log).model_copy(update={
+        "output": chunk["text"] or None,
+        "output_offset": chunk["offset"],
+        "output_size": chunk["size"],
+    })
 
 
 def format_size(size_bytes: int) -> str:
@@ -19,11 +19,17 @@ from database import (
 from services.migration_service import migration_service
 from services.proxmox_service import proxmox_service
 from services.notification_service import notification_service
+from services.scheduler import scheduler_service
+from services.job_events import job_events
 from routers.auth import get_current_user, require_operator, require_admin, log_audit
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Avanzamento dei run in corso (byte della copia in streaming), pubblicato
+# anche sullo stream SSE /api/events/jobs
+_progress = job_events.registry("migration", node_scoped=True)
+
 
 # ============== Schemas ==============
 
@@ -41,6 +47,11 @@ class MigrationJobCreate(BaseModel):
     keep_snapshots: int = 1
     start_after_migration: bool = False
     
+    # Solo per copy: staged (archivio su disco) o stream (vzdump --stdout -> restore)
+    transfer_mode: str = Field("staged", pattern="^(staged|stream)$")
+    stream_compress_level: Optional[int] = Field(None, ge=1, le=19)
+    stream_mbuffer: Optional[str] = Field(None, pattern=r"^\d+[KMGkmg]?$")
+    
     # Riconfigurazione hardware (JSON)
     hw_config: Optional[dict] = None  # {"memory": 4096, "cores": 2, "network": {...}, "storage": {...}}
     
@@ -63,6 +74,10 @@ class MigrationJobUpdate(BaseModel):
     keep_snapshots: Optional[int] = None
     start_after_migration: Optional[bool] = None
     
+    transfer_mode: Optional[str] = Field(None, pattern="^(staged|stream)$")
+    stream_compress_level: Optional[int] = Field(None, ge=1, le=19)
+    stream_mbuffer: Optional[str] = Field(None, pattern=r"^\d+[KMGkmg]?$")
+    
     hw_config: Optional[dict] = None
     
     schedule: Optional[str] = None
@@ -87,6 +102,10 @@ class MigrationJobResponse(BaseModel):
     keep_snapshots: int
     start_after_migration: bool
     
+    transfer_mode: Optional[str] = "staged"
+    stream_compress_level: Optional[int] = None
+    stream_mbuffer: Optional[str] = None
+    
     hw_config: Optional[dict]
     
     schedule: Optional[str]
@@ -174,6 +193,12 @@ async def execute_migration_job_task(job_id: int, triggered_by: Optional[int] =
         if job.hw_config:
             logger.info(f"[MIGRATION JOB] HW Config: {json.dumps(job.hw_config)}")
         
+        _progress.set_nodes(job_id, (source_node.id, dest_node.id))
+        _progress[job_id] = {"status": "running", "phase": "start"}
+        
+        def _on_progress(progress: dict):
+            _progress[job_id] = progress
+        
         # Crea log entry con dettagli
         log_entry = JobLog(
             job_type="migration",
@@ -209,7 +234,11 @@ async def execute_migration_job_task(job_id: int, triggered_by: Optional[int] =
                 dest_port=dest_node.ssh_port,
                 dest_user=dest_node.ssh_user,
                 dest_key=dest_node.ssh_key_path,
-                force_overwrite=force_overwrite
+                force_overwrite=force_overwrite,
+                transfer_mode=job.transfer_mode or "staged",
+                stream_compress_level=job.stream_compress_level,
+                stream_mbuffer=job.stream_mbuffer,
+                progress_callback=_on_progress
             )
             
             # Se richiede conferma, ritorna senza aggiornare il job
@@ -363,6 +392,7 @@ async def execute_migration_job_task(job_id: int, triggered_by: Optional[int] =
             db.commit()
             
     finally:
+        _progress.pop(job_id, None)
         db.close()
 
 
@@ -447,6 +477,9 @@ async def create_migration_job(
         create_snapshot=job.create_snapshot,
         keep_snapshots=job.keep_snapshots,
         start_after_migration=job.start_after_migration,
+        transfer_mode=job.transfer_mode,
+        stream_compress_level=job.stream_compress_level,
+        stream_mbuffer=job.stream_mbuffer,
         hw_config=job.hw_config,
         schedule=job.schedule,
         notify_mode=job.notify_mode,
@@ -465,6 +498,9 @@ async def create_migration_job(
     
     db.commit()
     db.refresh(db_job)
+
+    if db_job.is_active and db_job.schedule:
+        scheduler_service.update_migration_schedule(db_job.id, db_job.schedule, db_job.last_run)
     
     return db_job
 
@@ -500,6 +536,11 @@ async def update_migration_job(
     
     db.commit()
     db.refresh(job)
+
+    if job.is_active and job.schedule:
+        scheduler_service.update_migration_schedule(job.id, job.schedule, job.last_run)
+    else:
+        scheduler_service.remove_migration_schedule(job.id)
     
     return job
 
@@ -527,6 +568,7 @@ async def delete_migration_job(
         ip_address=request.client.host if request.client else None
     )
     
+    scheduler_service.remove_migration_schedule(job_id)
     db.delete(job)
     db.commit()
     
@@ -604,6 +646,24 @@ async def run_migration_job(
     return {"success": True, "message": "Migrazione avviata"}
 
 
+@router.get("/{job_id}/progress")
+async def get_migration_job_progress(
+    job_id: int,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Avanzamento del run in corso (byte trasferiti in modalità stream)"""
+    job = db.query(MigrationJob).filter(MigrationJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job non trovato")
+    
+    if not check_job_access(user, job, db):
+        raise HTTPException(status_code=403, detail="Accesso negato")
+    
+    progress = _progress.get(job_id)
+    return {"running": progress is not None, "progress": progress}
+
+
 @router.post("/{job_id}/toggle")
 async def toggle_migration_job(
     job_id: int,
@@ -622,6 +682,11 @@ async def toggle_migration_job(
     
     job.is_active = not job.is_active
     db.commit()
+
+    if job.is_active and job.schedule:
+        scheduler_service.update_migration_schedule(job.id, job.schedule, job.last_run)
+    else:
+        scheduler_service.remove_migration_schedule(job.id)
     
     return {"success": True, "is_active": job.is_active}
 
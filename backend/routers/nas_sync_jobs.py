@@ -13,6 +13,7 @@ from sqlalchemy.orm import Session
 from database import FileEndpoint, JobLog, get_db
 from routers.auth import User, get_current_user, require_operator
 from services.file_replication.path_utils import compact_source_paths
+from services.job_log_output import full_outputs
 from services.nas_sync.capabilities import resolve_capabilities, resolve_engine
 from services.nas_sync.du_catalog import (
     get_catalog_progress,
@@ -84,6 +85,7 @@ def _job_out(db: Session, job: NasSyncJob, last_run_error: Optional[str] = None)
         exclude_presets=job.exclude_presets or [],
         exclude_patterns=job.exclude_patterns or [],
         bandwidth_limit_kb=job.bandwidth_limit_kb,
+        parallel_workers=job.parallel_workers or 1,
         snapshot_policy_hint=job.snapshot_policy_hint,
         schedule=job.schedule,
         schedule_config=job.schedule_config,
@@ -209,6 +211,7 @@ async def create_job(
         exclude_presets=body.exclude_presets,
         exclude_patterns=body.exclude_patterns,
         bandwidth_limit_kb=body.bandwidth_limit_kb,
+        parallel_workers=body.parallel_workers,
         snapshot_policy_hint=body.snapshot_policy_hint or {},
         schedule=body.schedule,
         schedule_config=body.schedule_config,
@@ -322,7 +325,13 @@ def toggle_job(job_id: int, db: Session = Depends(get_db), _user: User = Depends
 
 
 @router.post("/{job_id}/refresh-catalog")
-async def refresh_catalog(job_id: int, db: Session = Depends(get_db), _user: User = Depends(require_operator)):
+async def refresh_catalog(
+    job_id: int,
+    full: bool = False,
+    db: Session = Depends(get_db),
+    _user: User = Depends(require_operator),
+):
+    """Aggiorna il catalogo du: solo le cartelle cambiate, tutte con ``full``."""
     job = db.query(NasSyncJob).filter(NasSyncJob.id == job_id).first()
     if not job:
         raise HTTPException(status_code=404, detail="Job non trovato")
@@ -337,7 +346,7 @@ async def refresh_catalog(job_id: int, db: Session = Depends(get_db), _user: Use
             status_code=400,
             detail="Il catalogo du richiede SSH sulla sorgente (non disponibile per questo endpoint)",
         )
-    asyncio.create_task(refresh_job_du_catalog(job_id))
+    asyncio.create_task(refresh_job_du_catalog(job_id, full=full))
     return {"ok": True, "message": "Aggiornamento catalogo du avviato"}
 
 
@@ -362,12 +371,13 @@ def job_logs(job_id: int, db: Session = Depends(get_db), _user: User = Depends(g
         .limit(50)
         .all()
     )
+    outputs = full_outputs(db, logs)
     return [
         {
             "id": log.id,
             "status": log.status,
             "message": log.message,
-            "output": log.output,
+            "output": outputs.get(log.id) or None,
             "error": log.error,
             "duration": log.duration,
             "transferred": log.transferred,
@@ -763,11 +763,13 @@ async def get_node_datasets(
     
     if refresh or not db.query(Dataset).filter(Dataset.node_id == node_id).first():
         # Refresh dalla macchina
+        # Un solo zfs list: i conteggi snapshot sotto leggono lo stesso inventario
         zfs_datasets = await ssh_service.get_zfs_datasets(
             hostname=node.hostname,
             port=node.ssh_port,
             username=node.ssh_user,
-            key_path=node.ssh_key_path
+            key_path=node.ssh_key_path,
+            refresh=refresh
         )
         
         # Aggiorna database
@@ -861,10 +863,11 @@ async def get_node_vms(
 
 
 async def refresh_cache_task():
-    """Background task wrapper for cache refresh"""
+    """Background task wrapper for cache refresh (cache VM + host info)"""
     db = SessionLocal()
     try:
         await cache_service.refresh_all_nodes(db)
+        await cache_service.refresh_host_info(db=db)
     finally:
         db.close()
 
@@ -1,8 +1,9 @@
 """
 Schedule API
 ------------
-Endpoint di supporto per la UI: round-trip ScheduleConfig <-> cron e
-preview delle prossime esecuzioni. Stateless — non tocca il DB.
+Endpoint di supporto per la UI: round-trip ScheduleConfig <-> cron,
+preview delle prossime esecuzioni e vista della coda job (admission
+controller, stato in memoria). Non tocca il DB.
 """
 
 from datetime import datetime
@@ -116,3 +117,13 @@ async def translate(
         error=err,
         next_runs=next_runs,
     )
+
+
+@router.get("/queue")
+async def job_queue(user: User = Depends(get_current_user)) -> Dict[str, Any]:
+    """Job schedulati in esecuzione e in coda (budget di concorrenza).
+
+    Risposta: ``{budgets, running: [...], queued: [...], usage: {risorsa: n}}``.
+    """
+    from services.scheduler import scheduler_service
+    return scheduler_service.get_queue_snapshot()
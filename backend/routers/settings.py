@@ -542,6 +542,82 @@ async def get_config_categories(
     }
 
 
+# ============== Diagnostica runtime ==============
+
+@router.get("/diagnostics/ssh-pool")
+async def get_ssh_pool_stats(user: User = Depends(require_admin)):
+    """Metriche del pool SSH: transport per host, canali attivi, coda, latenze."""
+    from services.ssh_service import ssh_service
+    return ssh_service.get_pool_stats()
+
+
+@router.get("/diagnostics/http-pool")
+async def get_http_pool_stats(user: User = Depends(require_admin)):
+    """Client HTTP keep-alive per endpoint (NAS, PBS): richieste, età, inattività."""
+    from services.http_pool import http_pool
+    return http_pool.stats()
+
+
+@router.get("/diagnostics/caches")
+async def get_cache_stats(user: User = Depends(require_admin)):
+    """Metriche delle cache in memoria: voci, hit/miss, letture, evizioni."""
+    # Import dei servizi per registrare le loro cache anche se non ancora usati
+    import services.cluster_service  # noqa: F401
+    import services.ha_service  # noqa: F401
+    import services.pbs_service  # noqa: F401
+    from services.ttl_cache import cache_stats
+    return {"caches": cache_stats()}
+
+
+@router.delete("/diagnostics/caches/{name}")
+async def invalidate_cache(name: str, user: User = Depends(require_admin)):
+    """Svuota una cache (la prossima lettura torna sui nodi)."""
+    from services.ttl_cache import get_cache
+    cache = get_cache(name)
+    if cache is None:
+        raise HTTPException(status_code=404, detail=f"Cache '{name}' non trovata")
+    return {"name": name, "invalidated": cache.invalidate()}
+
+
+class AdmissionBudgetsUpdate(BaseModel):
+    budgets: Dict[str, int]
+
+    @field_validator("budgets")
+    @classmethod
+    def _check_budgets(cls, v: Dict[str, int]) -> Dict[str, int]:
+        from services.job_admission import DEFAULT_BUDGETS
+        unknown = set(v) - set(DEFAULT_BUDGETS)
+        if unknown:
+            raise ValueError(f"Budget sconosciuti: {', '.join(sorted(unknown))}")
+        if any(val < 0 for val in v.values()):
+            raise ValueError("I budget devono essere >= 0 (0 = illimitato)")
+        return v
+
+
+@router.get("/admission")
+async def get_admission_budgets(user: User = Depends(require_admin)):
+    """Budget di concorrenza dei job schedulati (0 = illimitato)."""
+    from services.job_admission import admission_controller, DEFAULT_BUDGETS
+    return {"budgets": admission_controller.budgets, "defaults": DEFAULT_BUDGETS}
+
+
+@router.put("/admission")
+async def update_admission_budgets(
+    body: AdmissionBudgetsUpdate,
+    user: User = Depends(require_admin),
+    db: Session = Depends(get_db),
+):
+    """Aggiorna i budget di admission: applicati subito alla coda e salvati."""
+    from services.job_admission import admission_controller
+
+    admission_controller.set_budgets(body.budgets)
+    set_config_value(db, "admission_budgets", admission_controller.budgets, "json")
+    db.commit()
+    log_audit(db, user.id, "admission_budgets_updated", "settings",
+              details=str(admission_controller.budgets))
+    return {"budgets": admission_controller.budgets}
+
+
 # ============== SSL/HTTPS Configuration ==============
 
 import os
@@ -4,7 +4,7 @@ Con autenticazione e autorizzazione
 Supporta sia ZFS (syncoid) che BTRFS (btrfs send/receive)
 """
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, Request
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from datetime import datetime
@@ -14,6 +14,7 @@ import logging
 
 from database import get_db, Node, SyncJob, JobLog, User, SyncMethod
 from services.syncoid_service import syncoid_service
+from services.job_log_output import full_output, read_output
 from services.btrfs_service import btrfs_service
 from services.scheduler import scheduler_service
 from services.schedule_helpers import resolve_schedule_pair
@@ -23,10 +24,7 @@ from services.vm_group_sync_service import (
     continue_vm_group_chain as _continue_vm_group_chain,
     run_vm_group_background as _run_vm_group_background,
 )
-from services.sync_job_live_state import (
-    get_sync_job_live_state as _get_sync_job_live_state,
-    compute_vm_group_progress as _compute_vm_group_progress,
-)
+from services.sync_job_live_state import sync_job_live_aggregator
 from services.sync_job_schemas import (
     SnapshotInfo,
     SyncJobCreate,
@@ -202,20 +200,27 @@ async def check_vm_compatibility(
 
 @router.get("", response_model=List[SyncJobResponseWithNodes])
 async def list_sync_jobs(
+    live: Optional[str] = Query(None, pattern="^fresh$"),
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Lista tutti i job di sincronizzazione"""
+    """Lista tutti i job di sincronizzazione.
+
+    Lo stato live (replica in corso, progresso, gruppi VM) viene dalla
+    fotografia aggiornata in background; ``?live=fresh`` la aggiorna prima
+    di rispondere interrogando i nodi in parallelo.
+    """
     jobs = db.query(SyncJob).all()
     accessible = [j for j in jobs if check_job_access(user, j, db)]
     nodes_by_id = {n.id: n for n in db.query(Node).all()}
 
-    live_by_id: Dict[int, Dict[str, Any]] = {}
-    for job in accessible:
-        source_node = nodes_by_id.get(job.source_node_id)
-        dest_node = nodes_by_id.get(job.dest_node_id)
-        if source_node and dest_node:
-            live_by_id[job.id] = await _get_sync_job_live_state(job, source_node, dest_node)
+    if live == "fresh":
+        await sync_job_live_aggregator.refresh(accessible, nodes_by_id)
+
+    live_by_id: Dict[int, Dict[str, Any]] = {
+        job.id: sync_job_live_aggregator.live_state(job, nodes_by_id.get(job.dest_node_id))
+        for job in accessible
+    }
 
     groups: Dict[str, List[SyncJob]] = {}
     for job in accessible:
@@ -223,8 +228,8 @@ async def list_sync_jobs(
             groups.setdefault(job.vm_group_id, []).append(job)
 
     group_progress: Dict[str, Dict[str, Any]] = {}
-    for gid, group_jobs in groups.items():
-        gp = await _compute_vm_group_progress(group_jobs, live_by_id, nodes_by_id)
+    for gid in groups:
+        gp = sync_job_live_aggregator.group_progress(gid)
         if gp:
             group_progress[gid] = gp
 
@@ -996,7 +1001,16 @@ async def get_job_progress(
 
     log_payload = None
     if last_log:
-        output_full = (last_log.output or "")
+        # Con tail>0 legge solo la coda dei chunk (~512 caratteri per riga
+        # richiesta), non l'intero output di una replica lunga.
+        if tail > 0:
+            chunk = read_output(db, last_log, tail=tail * 512)
+            output_full = chunk["text"]
+            if chunk["offset"] > 0:
+                # scarta la prima riga, probabilmente troncata
+                output_full = output_full.split("\n", 1)[-1]
+        else:
+            output_full = full_output(db, last_log)
         # tail logico: ultime N righe, niente HTML/ANSI ripuliamo solo
         # \r in eccesso (progress bar di syncoid).
         cleaned = output_full.replace("\r", "\n")
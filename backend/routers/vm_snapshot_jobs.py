@@ -339,6 +339,31 @@ async def job_snapshots(
         .filter(Node.id.in_(list({t["node_id"] for t in targets})))
         .all()
     }
+    # Un solo listing SSH per nodo (tutti i guest del job in un colpo).
+    listings: dict[int, dict] = {}
+    listing_errors: dict[int, str] = {}
+
+    async def _list_node(node_id: int) -> None:
+        node = nodes[node_id]
+        guests = [
+            (t["vmid"], t.get("vm_type") or "qemu")
+            for t in targets
+            if t["node_id"] == node_id and t.get("warning") != "not_found"
+        ]
+        try:
+            listings[node_id] = await proxmox_service.get_snapshots_batch(
+                hostname=node.hostname,
+                guests=guests,
+                port=node.ssh_port,
+                username=node.ssh_user,
+                key_path=node.ssh_key_path,
+                raise_on_error=True,
+            )
+        except Exception as exc:  # noqa: BLE001 — un nodo irraggiungibile non svuota la vista
+            listing_errors[node_id] = str(exc)
+
+    await asyncio.gather(*[_list_node(nid) for nid in nodes])
+
     out = []
     for target in targets:
         node = nodes.get(target["node_id"])
@@ -357,17 +382,13 @@ async def job_snapshots(
             entry["error"] = "VM non trovata"
             out.append(entry)
             continue
-        try:
-            snapshots = await proxmox_service.get_snapshots(
-                hostname=node.hostname,
-                vmid=target["vmid"],
-                vm_type=entry["vm_type"],
-                port=node.ssh_port,
-                username=node.ssh_user,
-                key_path=node.ssh_key_path,
-            )
-        except Exception as exc:  # noqa: BLE001 — un nodo irraggiungibile non svuota la vista
-            entry["error"] = str(exc)
+        if node.id in listing_errors:
+            entry["error"] = listing_errors[node.id]
+            out.append(entry)
+            continue
+        snapshots = listings.get(node.id, {}).get(target["vmid"])
+        if snapshots is None:
+            entry["error"] = "Listing snapshot non disponibile per questa VM"
             out.append(entry)
             continue
         for snap in snapshots:
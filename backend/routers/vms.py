@@ -4,13 +4,15 @@ Con autenticazione
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel
 import json # Missing import
 import logging
 
-from database import get_db, Node, VMRegistry, User, NodeType
+from database import get_db, get_async_db, Node, VMRegistry, User, NodeType
 from services.proxmox_service import proxmox_service
 from services.ssh_service import ssh_service
 from services.pbs_service import pbs_service
@@ -81,10 +83,10 @@ def check_node_access(user: User, node: Node) -> bool:
 async def get_node_vms(
     node_id: int,
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Ottiene tutte le VM e container di un nodo"""
-    node = db.query(Node).filter(Node.id == node_id).first()
+    node = await db.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Nodo non trovato")
     
@@ -107,10 +109,10 @@ async def get_vm_details(
     vmid: int,
     vm_type: str = "qemu",
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Ottiene i dettagli di una VM specifica"""
-    node = db.query(Node).filter(Node.id == node_id).first()
+    node = await db.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Nodo non trovato")
     
@@ -153,10 +155,10 @@ async def get_vm_datasets(
     vmid: int,
     vm_type: str = "qemu",
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Trova i dataset ZFS associati a una VM"""
-    node = db.query(Node).filter(Node.id == node_id).first()
+    node = await db.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Nodo non trovato")
     
@@ -181,13 +183,13 @@ async def get_vm_disks(
     vmid: int,
     vm_type: str = "qemu",
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Ottiene tutti i dischi di una VM con dimensioni e dataset ZFS.
     Usato per la creazione di job di replica VM-centrici.
     """
-    node = db.query(Node).filter(Node.id == node_id).first()
+    node = await db.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Nodo non trovato")
     
@@ -294,10 +296,10 @@ async def unregister_vm(
 async def get_next_vmid(
     node_id: int,
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Ottiene il prossimo VMID disponibile"""
-    node = db.query(Node).filter(Node.id == node_id).first()
+    node = await db.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Nodo non trovato")
     
@@ -319,10 +321,10 @@ async def get_next_vmid(
 @router.get("/registry")
 async def list_vm_registry(
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Lista le VM registrate nel sistema"""
-    vms = db.query(VMRegistry).all()
+    vms = (await db.scalars(select(VMRegistry))).all()
     return vms
 
 
@@ -330,10 +332,10 @@ async def list_vm_registry(
 async def get_vm_registry(
     vm_id: int,
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Ottiene info di una VM dal registro"""
-    vm = db.query(VMRegistry).filter(VMRegistry.vm_id == vm_id).first()
+    vm = await db.scalar(select(VMRegistry).where(VMRegistry.vm_id == vm_id))
     if not vm:
         raise HTTPException(status_code=404, detail="VM non trovata nel registro")
     return vm
@@ -472,10 +474,10 @@ async def get_vm_full_details_endpoint(
     vmid: int,
     vm_type: str = "qemu",
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Ottiene dettagli completi VM (inclusi snapshot, IP, config)"""
-    node = db.query(Node).filter(Node.id == node_id).first()
+    node = await db.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Nodo non trovato")
     
@@ -615,10 +617,10 @@ async def get_vm_sanoid_config(
     vmid: int,
     vm_type: str = "qemu",
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Ottiene configurazione Sanoid per la VM (assume configurazione uniforme sui dischi)"""
-    node = db.query(Node).filter(Node.id == node_id).first()
+    node = await db.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Nodo non trovato")
     
@@ -765,10 +767,10 @@ async def get_vm_zfs_snapshots(
     vmid: int,
     vm_type: str = "qemu",
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Ottiene snapshot ZFS per tutti i dischi della VM"""
-    node = db.query(Node).filter(Node.id == node_id).first()
+    node = await db.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Nodo non trovato")
     
@@ -1000,7 +1002,7 @@ async def get_vm_backups(
     node_id: int,
     vmid: int,
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Elenco backup PBS per una VM/CT.
@@ -1008,7 +1010,7 @@ async def get_vm_backups(
     Usa la stessa logica dell'inventario PBS (API + pvesh) così da includere
     backup nativi Proxmox, manuali e creati da dapx.
     """
-    node = db.query(Node).filter(Node.id == node_id).first()
+    node = await db.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Nodo non trovato")
 
@@ -1019,10 +1021,10 @@ async def get_vm_backups(
     all_backups: list[dict] = []
     seen: set[str] = set()
 
-    pbs_nodes = db.query(Node).filter(
+    pbs_nodes = (await db.scalars(select(Node).where(
         Node.node_type == NodeType.PBS.value,
         Node.is_active == True,
-    ).all()
+    ))).all()
 
     storage_candidates = pbs_storages or [None]
 
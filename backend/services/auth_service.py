@@ -3,6 +3,7 @@ Auth Service - Gestione autenticazione JWT e utenti
 Compatibile con Python 3.9-3.13
 """
 
+import hashlib
 import os
 import secrets
 import bcrypt
@@ -58,7 +59,9 @@ class AuthService:
         to_encode.update({
             "exp": expire,
             "iat": datetime.utcnow(),
-            "type": "access"
+            "type": "access",
+            # Identificativo del token: chiave della cache dei principal
+            "jti": to_encode.get("jti") or secrets.token_urlsafe(16),
         })
         return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     
@@ -82,6 +85,14 @@ class AuthService:
             logger.warning(f"Token verification failed: {e}")
             return False, None
     
+    def token_fingerprint(self, token: str) -> str:
+        """Impronta SHA-256 di un token (salvata in UserSession.token_hash).
+
+        Il token è già un segreto ad alta entropia: un hash veloce basta e
+        non serve bcrypt, che costa centinaia di ms di CPU.
+        """
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
     def extract_user_id(self, token: str) -> Optional[int]:
         """Estrae l'ID utente dal token"""
         success, payload = self.verify_token(token)
@@ -1,90 +1,169 @@
+from sqlalchemy import delete, insert, or_, update
 from sqlalchemy.orm import Session
 from datetime import datetime
+from typing import Dict, List, Optional
 import logging
 import asyncio
 
 from database import Node, VirtualMachine, NodeType
 from services.proxmox_service import proxmox_service
 from services.pbs_service import pbs_service
+from services.dashboard_aggregate import dashboard_aggregate
 
 logger = logging.getLogger(__name__)
 
+# Nodi processati in parallelo durante un refresh (fetch remoti).
+REFRESH_CONCURRENCY = 6
+# Cadenza del refresh host_info, separata da quella della cache VM (5 min).
+HOST_INFO_REFRESH_INTERVAL = 900
+
+
+def _guest_from_resource(r: Dict) -> Dict:
+    return {
+        "vmid": int(r.get('vmid')),
+        "name": r.get('name'),
+        "type": r.get('type'),  # qemu o lxc
+        "status": r.get('status'),
+        "maxmem": int(r.get('maxmem', 0) or 0),  # Bytes
+        "cpus": int(r.get('maxcpu', 0) or 0),
+        "uptime": int(r.get('uptime', 0) or 0),
+    }
+
+
+def _is_pve_node():
+    # node_type NULL = nodi legacy, trattati come PVE
+    return or_(Node.node_type.is_(None), Node.node_type != NodeType.PBS.value)
+
+
 class CacheService:
-    async def refresh_all_nodes(self, db: Session):
-        """Aggiorna la cache per tutti i nodi attivi"""
-        nodes = db.query(Node).filter(Node.is_active == True).all()
-        logger.info(f"Starting cache refresh for {len(nodes)} nodes")
-        
-        results = {}
-        for node in nodes:
-            try:
-                # Esegui ogni nodo in un task separato o sequenziale?
-                # Sequenziale è più sicuro per il DB session sqlite (se usato)
-                await self.refresh_node_vms(db, node)
-                
-                # Cache inventario PBS: gestita in pbs_service (TTL 5 min)
-                
-                results[node.name] = "OK"
-            except Exception as e:
-                logger.error(f"Error refreshing node {node.name}: {e}")
-                results[node.name] = str(e)
-        
-        logger.info("Cache refresh completed")
-        return results
+    def __init__(self, concurrency: int = REFRESH_CONCURRENCY):
+        self._concurrency = max(1, concurrency)
+        # Un solo refresh VM / host_info alla volta: un ciclo lento non deve
+        # sovrapporsi al successivo (scheduler + bottone "Aggiorna cache").
+        self._vm_refresh_lock = asyncio.Lock()
+        self._host_info_lock = asyncio.Lock()
 
-    async def refresh_node_vms(self, db: Session, node: Node):
-        """Aggiorna cache VM e dettagli Host per un singolo nodo"""
-        if not node.is_online and not node.is_auth_node:
-             # Se non è online, si potrebbe skippare, ma proviamo comunque
-             pass
+    def is_refreshing(self) -> bool:
+        return self._vm_refresh_lock.locked()
+
+    async def refresh_all_nodes(self, db: Session) -> Dict[str, str]:
+        """Aggiorna la cache VM per tutti i nodi attivi.
+
+        ``/cluster/resources`` viene letto UNA volta per cluster PVE: la risposta
+        contiene tutti i membri, quindi i nodi registrati che vi compaiono sono
+        già coperti. Il lavoro per-nodo (fallback qm/pct list) gira in parallelo
+        con concorrenza limitata; le scritture DB restano sequenziali (una
+        upsert bulk per nodo). Se un refresh è già in corso ritorna subito.
+        """
+        if self._vm_refresh_lock.locked():
+            logger.info("Cache refresh già in corso: richiesta ignorata")
+            return {}
+        async with self._vm_refresh_lock:
+            nodes = (
+                db.query(Node)
+                .filter(Node.is_active == True, _is_pve_node())
+                .all()
+            )
+            logger.info(f"Starting cache refresh for {len(nodes)} nodes")
+            started = datetime.utcnow()
 
+            guests_by_node = await self._collect_guests(nodes)
+
+            results: Dict[str, str] = {}
+            for node in nodes:
+                guests = guests_by_node.get(node.id)
+                if isinstance(guests, Exception):
+                    logger.error(f"Error refreshing node {node.name}: {guests}")
+                    results[node.name] = str(guests)
+                    continue
+                try:
+                    self._upsert_node_vms(db, node, guests or [])
+                    results[node.name] = "OK"
+                except Exception as e:
+                    logger.error(f"Failed to refresh VMs for node {node.name}: {e}")
+                    db.rollback()
+                    results[node.name] = str(e)
+
+            elapsed = (datetime.utcnow() - started).total_seconds()
+            logger.info(f"Cache refresh completed in {elapsed:.1f}s")
+            return results
+
+    async def refresh_node_vms(self, db: Session, node: Node):
+        """Aggiorna la cache VM di un singolo nodo."""
         try:
-            # 1. Aggiorna Host Info (Advanced Data)
-            # Utilizza host_info_service per raccogliere metriche avanzate (CPU, RAM specifica, Storage, Network)
-            from services.host_info_service import HostInfoService
-            host_service = HostInfoService()
-            # Nota: update_host_details crea la sua sessione, quindi è autonomo
-            await host_service.update_host_details(node.id)
-
-            logger.debug(f"Fetching Cluster Resources for node {node.name}")
-            
-            # 2. Ottieni lista VM/CT con metriche avanzate (via pvesh cluster resource)
-            # Questo ritorna CPU usage, MaxMem, Uptime, etc.
-            resources = await proxmox_service.get_cluster_resources(
-                hostname=node.hostname,
-                port=node.ssh_port,
-                username=node.ssh_user,
-                key_path=node.ssh_key_path
+            guests = (await self._collect_guests([node])).get(node.id)
+            if isinstance(guests, Exception):
+                raise guests
+            self._upsert_node_vms(db, node, guests or [])
+        except Exception as e:
+            logger.error(f"Failed to refresh VMs for node {node.name}: {e}")
+            db.rollback()
+            # Non facciamo raise, permettiamo agli altri nodi di aggiornarsi
+
+    async def refresh_host_info(self, nodes: Optional[List[Node]] = None, db: Optional[Session] = None) -> int:
+        """Aggiorna host_info (HostInfoService) dei nodi attivi, in parallelo
+        limitato. Disaccoppiato dal refresh VM: gira con cadenza propria
+        (HOST_INFO_REFRESH_INTERVAL). Ritorna il numero di nodi aggiornati."""
+        from services.host_info_service import host_info_service
+
+        if self._host_info_lock.locked():
+            return 0
+        async with self._host_info_lock:
+            if nodes is None:
+                if db is None:
+                    return 0
+                nodes = db.query(Node).filter(Node.is_active == True).all()
+            node_ids = [n.id for n in nodes]
+            semaphore = asyncio.Semaphore(self._concurrency)
+
+            async def _one(node_id: int) -> bool:
+                async with semaphore:
+                    try:
+                        # update_host_details crea la sua sessione, quindi è autonomo
+                        return bool(await host_info_service.update_host_details(node_id))
+                    except Exception as e:
+                        logger.error(f"Host info refresh fallito per nodo {node_id}: {e}")
+                        return False
+
+            done = await asyncio.gather(*[_one(nid) for nid in node_ids])
+            return sum(1 for ok in done if ok)
+
+    async def _collect_guests(self, nodes: List[Node]) -> Dict[int, object]:
+        """Raccoglie i guest per nodo: {node_id: [guest, ...] | Exception}."""
+        out: Dict[int, object] = {}
+        pending = list(nodes)
+        covered_by_cluster: Dict[int, List[Dict]] = {}
+
+        # 1. /cluster/resources una volta per cluster: un nodo "entry" risponde
+        #    per tutti i membri registrati presenti nella risposta. Il primo
+        #    giro interroga un solo nodo (caso tipico: un unico cluster); i giri
+        #    successivi interrogano in parallelo i nodi ancora scoperti
+        #    (standalone o altri cluster).
+        wave_size = 1
+        while pending:
+            wave, pending = pending[:wave_size], pending[wave_size:]
+            wave_size = self._concurrency
+            fetched = await asyncio.gather(
+                *[self._fetch_cluster_resources(entry) for entry in wave]
             )
-            
-            # Filtra risorse per questo nodo
-            # La risorsa ha campo 'node' che deve combaciare con node.name
-            node_resources = [
-                r for r in resources 
-                if r.get('node') == node.name and r.get('type') in ['qemu', 'lxc']
-            ]
-            
-            # Se la lista è vuota ma get_cluster_resources ha avuto successo, potrebbe essere 
-            # che il nodo non è parte di un cluster (standalone) o il nome nodo non combacia.
-            # In caso di standalone, pvesh get /cluster/resources ritorna comunque le risorse locali?
-            # Sì, su standalone ritorna le risorse del nodo locale.
-            # Se node.name nel DB è diverso da quello Proxmox, potremmo avere problemi.
-            # Fallback: se node_resources vuoto, prova get_all_guests (metodo classico via qm list)
-            
-            guests = []
-            if node_resources:
-                for r in node_resources:
-                    guests.append({
-                        "vmid": int(r.get('vmid')),
-                        "name": r.get('name'),
-                        "type": r.get('type'), # qemu o lxc
-                        "status": r.get('status'),
-                        "maxmem": int(r.get('maxmem', 0)), # Bytes
-                        "cpus": int(r.get('maxcpu', 0)),
-                        "uptime": int(r.get('uptime', 0))
-                    })
-            else:
-                # Fallback legacy
+            for entry, resources in zip(wave, fetched):
+                # Nomi nodo PVE presenti nella risposta (voci 'node' + guest)
+                member_names = {r.get('node') for r in resources if r.get('node')}
+                by_node_name: Dict[str, List[Dict]] = {}
+                for r in resources:
+                    if r.get('type') in ('qemu', 'lxc') and r.get('vmid') is not None:
+                        by_node_name.setdefault(r.get('node'), []).append(_guest_from_resource(r))
+                for node in [entry] + pending:
+                    if node.name in member_names and node.id not in covered_by_cluster:
+                        covered_by_cluster[node.id] = by_node_name.get(node.name, [])
+            pending = [n for n in pending if n.id not in covered_by_cluster]
+
+        # 2. Fallback per-nodo (in parallelo, limitato) dove il nome nodo non
+        #    combacia con quello Proxmox o la risposta non contiene guest.
+        semaphore = asyncio.Semaphore(self._concurrency)
+
+        async def _legacy(node: Node):
+            async with semaphore:
                 logger.warning(f"No cluster resources found for node {node.name}, falling back to qm/pct list")
                 guests_legacy = await proxmox_service.get_all_guests(
                     hostname=node.hostname,
@@ -92,64 +171,97 @@ class CacheService:
                     username=node.ssh_user,
                     key_path=node.ssh_key_path
                 )
-                # Adatta formato
-                for g in guests_legacy:
-                    guests.append({
+                return [
+                    {
                         "vmid": int(g.get('vmid')),
                         "name": g.get('name'),
                         "type": g.get('type'),
                         "status": g.get('status'),
-                        "maxmem": 0, # Legacy fetch non ha questi dati
+                        "maxmem": 0,  # Legacy fetch non ha questi dati
                         "cpus": 0,
                         "uptime": 0
-                    })
-
-            # Sync DB
-            current_vms = {vm.vmid: vm for vm in db.query(VirtualMachine).filter(VirtualMachine.node_id == node.id).all()}
-            found_vmids = set()
-            
-            for guest in guests:
-                vmid = guest["vmid"]
-                found_vmids.add(vmid)
-                
-                # Dati da salvare
-                vm_data = {
-                    "name": guest.get('name'),
-                    "type": guest.get('type'),
-                    "status": guest.get('status'),
-                    "memory": guest.get('maxmem'),
-                    "cpus": guest.get('cpus'),
-                    "uptime": guest.get('uptime'),
-                    "last_updated": datetime.utcnow()
-                }
-                
-                if vmid in current_vms:
-                    # Update
-                    vm_obj = current_vms[vmid]
-                    for k, v in vm_data.items():
-                        if v is not None:
-                            setattr(vm_obj, k, v)
-                else:
-                    # Create
-                    new_vm = VirtualMachine(
-                        node_id=node.id,
-                        vmid=vmid,
-                        **vm_data
-                    )
-                    db.add(new_vm)
-            
-            # Remove deleted VMs
-            for vmid, vm_obj in current_vms.items():
-                if vmid not in found_vmids:
-                    db.delete(vm_obj)
-            
-            db.commit()
-            logger.info(f"Updated {len(guests)} VMs for node {node.name}")
-            
+                    }
+                    for g in guests_legacy
+                ]
+
+        # Nota: un nodo "coperto" ma senza guest ripiega comunque su qm/pct list
+        # (nome nodo nel DB diverso da quello Proxmox → lista vuota ingannevole).
+        fallback = [n for n in nodes if not covered_by_cluster.get(n.id)]
+        fetched = await asyncio.gather(
+            *[_legacy(n) for n in fallback], return_exceptions=True
+        )
+        for node in nodes:
+            out[node.id] = covered_by_cluster.get(node.id) or []
+        for node, guests in zip(fallback, fetched):
+            out[node.id] = guests
+        return out
+
+    async def _fetch_cluster_resources(self, entry: Node) -> List[Dict]:
+        logger.debug(f"Fetching Cluster Resources via node {entry.name}")
+        try:
+            return await proxmox_service.get_cluster_resources(
+                hostname=entry.hostname,
+                port=entry.ssh_port,
+                username=entry.ssh_user,
+                key_path=entry.ssh_key_path
+            )
         except Exception as e:
-            logger.error(f"Failed to refresh VMs for node {node.name}: {e}")
-            db.rollback()
-            # Non facciamo raise, permettiamo agli altri nodi di aggiornarsi
-            # raise e
+            logger.warning(f"Cluster resources non disponibili da {entry.name}: {e}")
+            return []
+
+    def _upsert_node_vms(self, db: Session, node: Node, guests: List[Dict]) -> None:
+        """Sincronizza ``VirtualMachine`` del nodo con una upsert bulk:
+        un UPDATE executemany, un INSERT executemany e un DELETE, un commit."""
+        now = datetime.utcnow()
+        existing = dict(
+            db.query(VirtualMachine.vmid, VirtualMachine.id)
+            .filter(VirtualMachine.node_id == node.id)
+            .all()
+        )
+        to_update: List[Dict] = []
+        to_insert: List[Dict] = []
+        seen = set()
+        for guest in guests:
+            vmid = guest["vmid"]
+            if vmid in seen:
+                continue
+            seen.add(vmid)
+            vm_data = {
+                "name": guest.get('name'),
+                "type": guest.get('type'),
+                "status": guest.get('status'),
+                "memory": guest.get('maxmem'),
+                "cpus": guest.get('cpus'),
+                "uptime": guest.get('uptime'),
+                "last_updated": now,
+            }
+            if vmid in existing:
+                # I campi None non sovrascrivono il valore in cache
+                row = {k: v for k, v in vm_data.items() if v is not None}
+                row["id"] = existing[vmid]
+                to_update.append(row)
+            else:
+                to_insert.append({"node_id": node.id, "vmid": vmid, **vm_data})
+
+        # executemany richiede chiavi omogenee: raggruppa per set di colonne.
+        by_keys: Dict[tuple, List[Dict]] = {}
+        for row in to_update:
+            by_keys.setdefault(tuple(sorted(row)), []).append(row)
+        for rows in by_keys.values():
+            db.execute(update(VirtualMachine), rows)
+        if to_insert:
+            db.execute(insert(VirtualMachine), to_insert)
+        removed = [vmid for vmid in existing if vmid not in seen]
+        if removed:
+            db.execute(
+                delete(VirtualMachine).where(
+                    VirtualMachine.node_id == node.id,
+                    VirtualMachine.vmid.in_(removed),
+                )
+            )
+        db.commit()
+        dashboard_aggregate.invalidate(node.id)
+        logger.info(f"Updated {len(seen)} VMs for node {node.name}")
+
 
 cache_service = CacheService()
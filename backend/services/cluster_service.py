@@ -11,37 +11,13 @@ import time
 import asyncio
 
 from services.ssh_service import ssh_service
+from services.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
-# Simple in-memory cache with TTL
-class ClusterCache:
-    """Cache in-memory con TTL per dati Cluster"""
-    def __init__(self, default_ttl: int = 60):
-        self._cache: Dict[str, Tuple[Any, float]] = {}
-        self._default_ttl = default_ttl
-    
-    def get(self, key: str) -> Optional[Any]:
-        if key in self._cache:
-            value, expires = self._cache[key]
-            if time.time() < expires:
-                return value
-            else:
-                del self._cache[key]
-        return None
-    
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
-        expires = time.time() + (ttl or self._default_ttl)
-        self._cache[key] = (value, expires)
-    
-    def invalidate(self, key: str = None) -> None:
-        if key:
-            self._cache.pop(key, None)
-        else:
-            self._cache.clear()
-
-# Global cache instance
-_cluster_cache = ClusterCache(default_ttl=60)
+# Stato e nodi del cluster (pvecm): servito scaduto fino a 60s oltre il TTL
+# mentre si rilegge in background
+_cluster_cache = TTLCache("cluster", ttl=60, max_entries=256, stale_ttl=60)
 
 
 class ClusterService:
@@ -58,38 +34,31 @@ class ClusterService:
         """
         Ottiene lo stato completo del cluster.
         """
-        cache_key = f"cluster_status:{hostname}"
-        
-        if use_cache:
-            cached = _cluster_cache.get(cache_key)
-            if cached is not None:
-                logger.debug(f"Cluster status cache HIT for {hostname}")
-                return cached
-        
-        result = await ssh_service.execute(
-            hostname=hostname,
-            command="pvecm status 2>/dev/null",
-            port=port,
-            username=username,
-            key_path=key_path
-        )
-        
-        status = {
-            "cluster_name": "",
-            "quorum": False,
-            "version": "",
-            "nodes": 0,
-            "expected_votes": 0,
-            "total_votes": 0,
-            "quorum_votes": 0,
-            "raw_output": result.stdout if result.success else result.stderr
-        }
-        
-        if result.success:
-            status.update(self._parse_pvecm_status(result.stdout))
+        async def _load() -> Dict[str, Any]:
+            result = await ssh_service.execute(
+                hostname=hostname,
+                command="pvecm status 2>/dev/null",
+                port=port,
+                username=username,
+                key_path=key_path
+            )
+            
+            status = {
+                "cluster_name": "",
+                "quorum": False,
+                "version": "",
+                "nodes": 0,
+                "expected_votes": 0,
+                "total_votes": 0,
+                "quorum_votes": 0,
+                "raw_output": result.stdout if result.success else result.stderr
+            }
+            
+            if result.success:
+                status.update(self._parse_pvecm_status(result.stdout))
+            return status
         
-        _cluster_cache.set(cache_key, status)
-        return status
+        return await _cluster_cache.get_or_load(f"cluster_status:{hostname}", _load, force=not use_cache)
     
     def _parse_pvecm_status(self, text: str) -> Dict[str, Any]:
         """Parse pvecm status output (formato PVE 7/8+: Name:, Quorate:, Nodes:)."""
@@ -166,28 +135,21 @@ class ClusterService:
         """
         Ottiene lista nodi del cluster con stato.
         """
-        cache_key = f"cluster_nodes:{hostname}"
-        
-        if use_cache:
-            cached = _cluster_cache.get(cache_key)
-            if cached is not None:
-                logger.debug(f"Cluster nodes cache HIT for {hostname}")
-                return cached
-        
-        result = await ssh_service.execute(
-            hostname=hostname,
-            command="pvecm nodes 2>/dev/null",
-            port=port,
-            username=username,
-            key_path=key_path
-        )
-        
-        nodes = []
-        if result.success:
-            nodes = self._parse_pvecm_nodes(result.stdout)
+        async def _load() -> List[Dict[str, Any]]:
+            result = await ssh_service.execute(
+                hostname=hostname,
+                command="pvecm nodes 2>/dev/null",
+                port=port,
+                username=username,
+                key_path=key_path
+            )
+            
+            nodes = []
+            if result.success:
+                nodes = self._parse_pvecm_nodes(result.stdout)
+            return nodes
         
-        _cluster_cache.set(cache_key, nodes)
-        return nodes
+        return await _cluster_cache.get_or_load(f"cluster_nodes:{hostname}", _load, force=not use_cache)
     
     def _parse_pvecm_nodes(self, text: str) -> List[Dict[str, Any]]:
         """Parse pvecm nodes output"""
@@ -300,6 +262,7 @@ class ClusterService:
         )
         
         if result.success:
+            _cluster_cache.invalidate()
             return True, f"Nodo {new_node_ip} aggiunto al cluster"
         else:
             return False, f"Errore: {result.stderr}"
@@ -349,6 +312,7 @@ class ClusterService:
         )
         
         if result.success:
+            _cluster_cache.invalidate()
             return True, f"Nodo {node_name} rimosso dal cluster"
         else:
             return False, f"Errore rimozione: {result.stderr}"
@@ -0,0 +1,213 @@
+"""Aggregato della dashboard (nodi, VM, storage/memoria/CPU).
+
+``GET /api/dashboard/overview`` leggeva host_info nodo per nodo (con un
+``update_host_details`` sincrono, 10+ probe SSH, se la cache era vuota) e
+contava le VM con ``qm/pct list`` via SSH: dopo un riavvio la dashboard
+impiegava oltre un minuto. Qui:
+
+- il riepilogo di ogni nodo (CPU, memoria, storage, conteggi VM) viene
+  ricalcolato da ``Node.host_info`` e dalla cache ``VirtualMachine`` quando
+  una delle due cambia (``invalidate`` da ``HostInfoService`` e
+  ``CacheService``), con una query per tutti i nodi da ricalcolare;
+- i totali per un insieme di nodi (storage condivisi contati una volta)
+  restano in memoria finché nessun nodo cambia;
+- i nodi online senza host_info vengono aggiornati in background: la
+  risposta arriva subito e li elenca in ``refreshing_nodes``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from database import Node, VirtualMachine
+
+logger = logging.getLogger(__name__)
+
+# Refresh host_info in background contemporanei lanciati dalla dashboard
+BACKGROUND_REFRESH_CONCURRENCY = 4
+# Combinazioni di nodi (utenti con nodi diversi) di cui tenere i totali
+MAX_CACHED_OVERVIEWS = 32
+# Dopo un refresh fallito (nodo irraggiungibile) la dashboard non lo
+# rilancia prima di questo intervallo
+RETRY_AFTER_FAILURE_SECONDS = 120
+
+
+def summarize_node(node_id: int, host_info: Optional[Dict[str, Any]], vm_counts: Optional[Tuple[int, int]]) -> Dict[str, Any]:
+    """Riepilogo dashboard di un nodo da host_info e conteggi VM in cache.
+
+    Senza righe in cache VM si usa la lista guest di host_info (se c'è)."""
+    info = host_info or {}
+    storage = [
+        {
+            "name": s.get("name", ""),
+            "shared": bool(s.get("shared", False)),
+            "total_gb": s.get("total_gb") or 0,
+            "used_gb": s.get("used_gb") or 0,
+        }
+        for s in info.get("storage", []) or []
+    ]
+    if vm_counts:
+        vm_count, running = vm_counts
+    else:
+        guests = info.get("guests") or []
+        vm_count = len(guests)
+        running = sum(1 for g in guests if (g.get("status") or "").lower() == "running")
+    return {
+        "node_id": node_id,
+        "has_host_info": bool(host_info),
+        "cpu_cores": (info.get("cpu") or {}).get("cores", 0),
+        "memory_total_gb": (info.get("memory") or {}).get("total_gb", 0),
+        "memory_used_gb": (info.get("memory") or {}).get("used_gb", 0),
+        "storage": storage,
+        "storage_total_gb": round(sum(s["total_gb"] for s in storage), 2),
+        "storage_used_gb": round(sum(s["used_gb"] for s in storage), 2),
+        "vm_count": vm_count,
+        "running_vm_count": running,
+        "temperature_highest_c": (info.get("temperature") or {}).get("highest_c"),
+        "proxmox_version": info.get("proxmox_version"),
+    }
+
+
+def compose_totals(summaries: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totali su più nodi: uno storage condiviso (stesso nome) conta una volta."""
+    totals = {
+        "total_vms": 0,
+        "running_vms": 0,
+        "total_storage_gb": 0.0,
+        "used_storage_gb": 0.0,
+        "total_memory_gb": 0.0,
+        "used_memory_gb": 0.0,
+        "total_cpu_cores": 0,
+    }
+    counted_shared: Set[str] = set()
+    for s in summaries:
+        totals["total_vms"] += s["vm_count"]
+        totals["running_vms"] += s["running_vm_count"]
+        totals["total_memory_gb"] += s["memory_total_gb"] or 0
+        totals["used_memory_gb"] += s["memory_used_gb"] or 0
+        totals["total_cpu_cores"] += s["cpu_cores"] or 0
+        for st in s["storage"]:
+            if st["shared"]:
+                if st["name"] in counted_shared:
+                    continue
+                counted_shared.add(st["name"])
+            totals["total_storage_gb"] += st["total_gb"]
+            totals["used_storage_gb"] += st["used_gb"]
+    for key in ("total_storage_gb", "used_storage_gb", "total_memory_gb", "used_memory_gb"):
+        totals[key] = round(totals[key], 2)
+    return totals
+
+
+class DashboardAggregate:
+    def __init__(self):
+        self._summaries: Dict[int, Dict[str, Any]] = {}
+        self._dirty: Set[int] = set()
+        self._overviews: Dict[Tuple[int, ...], Dict[str, Any]] = {}
+        self._refreshing: Set[int] = set()
+        self._failed_at: Dict[int, float] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def invalidate(self, node_id: Optional[int] = None) -> None:
+        """Segna da ricalcolare il riepilogo di un nodo (tutti se ``None``)."""
+        if node_id is None:
+            self._summaries.clear()
+            self._dirty.clear()
+        else:
+            self._dirty.add(node_id)
+        self._overviews.clear()
+
+    def node_summaries(self, db: Session, node_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """Riepiloghi dei nodi richiesti, ricalcolando in blocco quelli
+        mancanti o invalidati."""
+        node_ids = list(node_ids)
+        stale = [nid for nid in node_ids if nid not in self._summaries or nid in self._dirty]
+        if stale:
+            host_infos = dict(db.query(Node.id, Node.host_info).filter(Node.id.in_(stale)).all())
+            vm_counts = {
+                nid: (int(total), int(running or 0))
+                for nid, total, running in db.query(
+                    VirtualMachine.node_id,
+                    func.count(VirtualMachine.id),
+                    func.sum(case((func.lower(VirtualMachine.status) == "running", 1), else_=0)),
+                ).filter(VirtualMachine.node_id.in_(stale)).group_by(VirtualMachine.node_id).all()
+            }
+            for nid in stale:
+                self._summaries[nid] = summarize_node(nid, host_infos.get(nid), vm_counts.get(nid))
+                self._dirty.discard(nid)
+        return {nid: self._summaries[nid] for nid in node_ids if nid in self._summaries}
+
+    def overview(self, db: Session, nodes: List[Node]) -> Dict[str, Any]:
+        """Totali e riepilogo per nodo dei nodi online in ``nodes``; avvia in
+        background l'aggiornamento di quelli ancora senza host_info."""
+        online = sorted((n for n in nodes if n.is_online), key=lambda n: n.id)
+        key = tuple(n.id for n in online)
+        cached = self._overviews.get(key)
+        if cached is None:
+            summaries = self.node_summaries(db, key)
+            ready = [s for s in summaries.values() if s["has_host_info"]]
+            cached = {
+                **compose_totals(ready),
+                "nodes_summary": [
+                    {k: v for k, v in s.items() if k not in ("storage", "has_host_info")} for s in ready
+                ],
+                "missing": [nid for nid in key if not summaries.get(nid, {}).get("has_host_info")],
+            }
+            if len(self._overviews) >= MAX_CACHED_OVERVIEWS:
+                self._overviews.clear()
+            self._overviews[key] = cached
+        if cached["missing"]:
+            self.schedule_refresh(cached["missing"])
+        # Nome/hostname dal nodo corrente (non fanno parte dell'aggregato)
+        by_id = {n.id: n for n in online}
+        nodes_summary = [
+            {
+                **item,
+                "node_name": by_id[item["node_id"]].name,
+                "hostname": by_id[item["node_id"]].hostname,
+                "is_online": True,
+            }
+            for item in cached["nodes_summary"]
+        ]
+        result = {k: v for k, v in cached.items() if k not in ("nodes_summary", "missing")}
+        result["nodes_summary"] = nodes_summary
+        result["refreshing_nodes"] = [nid for nid in key if nid in self._refreshing]
+        return result
+
+    def schedule_refresh(self, node_ids: Iterable[int]) -> None:
+        """Aggiorna host_info in background (una volta per nodo alla volta)."""
+        now = time.monotonic()
+        for node_id in node_ids:
+            if node_id in self._refreshing:
+                continue
+            if now - self._failed_at.get(node_id, -RETRY_AFTER_FAILURE_SECONDS) < RETRY_AFTER_FAILURE_SECONDS:
+                continue
+            self._refreshing.add(node_id)
+            asyncio.create_task(self._refresh(node_id))
+
+    async def _refresh(self, node_id: int) -> None:
+        from services.host_info_service import host_info_service
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(BACKGROUND_REFRESH_CONCURRENCY)
+        ok = False
+        try:
+            async with self._semaphore:
+                ok = bool(await host_info_service.update_host_details(node_id))
+        except Exception as e:
+            logger.warning(f"Refresh host_info nodo {node_id} per dashboard fallito: {e}")
+        finally:
+            self._refreshing.discard(node_id)
+            if ok:
+                self._failed_at.pop(node_id, None)
+            else:
+                self._failed_at[node_id] = time.monotonic()
+            self._overviews.clear()
+
+
+dashboard_aggregate = DashboardAggregate()
@@ -1,19 +1,62 @@
-"""Sync diretto Synology → QNAP via pipe tar (no staging locale su dapx)."""
+"""Sync diretto sorgente → QNAP via pipe tar (no staging locale su dapx).
+
+Engine dei job con ``sync_method="tar_stream"``: per ogni path sorgente
+``tar cf -`` via SSH sulla sorgente, ritrasmesso dal server dapx a
+``tar xf -`` via SSH sul QNAP, senza copia intermedia su disco.
+
+- Il path è diviso in blocchi: uno per cartella di 1° livello più uno per
+  i file sciolti nella radice. Un blocco è concluso quando tar esce bene
+  sui due lati e lo SHA-256 del flusso calcolato dal relay coincide con
+  quello letto dal QNAP (``tee`` verso ``sha256sum``); i blocchi conclusi
+  finiscono nel checkpoint del job e un run fallito riprende dal primo
+  blocco non concluso.
+- Compressione opzionale sul filo (``zstd``/``lz4``), usata solo se il
+  comando è presente su entrambi i NAS.
+- Il relay conta i byte: velocità, percentuale ed ETA (dalla dimensione
+  dei blocchi al run precedente) arrivano nel progresso del job; il limite
+  banda del job è applicato qui.
+- stderr dei due lati letto riga per riga in code limitate, mai
+  bufferizzato per intero.
+
+Come ogni copia tar, non elimina su QNAP i file rimossi dalla sorgente
+(``delete_on_dest`` non si applica).
+"""
 
 from __future__ import annotations
 
 import asyncio
+import fnmatch
+import hashlib
 import logging
 import os
 import shlex
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
 
-from database import FileEndpoint
+from database import FileEndpoint, FileEndpointType
 from services.file_replication.endpoint_crypto import decrypt_password
 from services.file_replication.file_sync_service import _ssh_port
-from services.file_replication.path_utils import parse_synology_share_path, synology_ssh_path
+from services.file_replication.path_utils import sanitize_path, synology_ssh_path
+from services.nas_sync.events import eta_human
+from services.size_utils import format_bytes_human
 
 logger = logging.getLogger(__name__)
 
+STREAM_READ_BYTES = 1024 * 1024
+# Blocco dei file (non cartelle) nella radice del path sorgente
+LOOSE_CHUNK = ""
+# Compressore sorgente, decompressore QNAP
+_COMPRESSORS = {
+    "zstd": ("zstd -q -c -T0 -3", "zstd -q -d -c"),
+    "lz4": ("lz4 -q -c", "lz4 -q -d -c"),
+}
+_RC_MARK = "dapx-tar-rc="
+
+# Orologio di velocità e limite banda (sostituibile nei test)
+_now = time.monotonic
+
 
 def _ssh_cmd(endpoint: FileEndpoint) -> tuple[list[str], dict[str, str]]:
     """Argv SSH + env (SSHPASS). Mai password in argv."""
@@ -50,68 +93,413 @@ def _ssh_cmd(endpoint: FileEndpoint) -> tuple[list[str], dict[str, str]]:
     return (["ssh", "-p", str(port), "-o", "StrictHostKeyChecking=no"], {})
 
 
-async def stream_synology_to_qnap(
-    source: FileEndpoint,
-    dest: FileEndpoint,
-    src_path: str,
-    dest_dir: str,
-    exclude_file: str | None = None,
-) -> tuple[list[str], list[str]]:
-    """Stream tar Synology → QNAP senza copia intermedia su dapx."""
-    src_base = synology_ssh_path(src_path)
-    dest_dir = dest_dir.rstrip("/")
-    share, subpath = parse_synology_share_path(src_path)
-    desc = f"{src_base} → {dest_dir}"
-    logger.info("Stream tar Synology→QNAP %s", desc)
+@dataclass
+class StreamResult:
+    bytes_sent: int = 0
+    chunks_total: int = 0
+    chunks_resumed: int = 0
+    warnings: list[str] = field(default_factory=list)
+    stderr_tail: list[str] = field(default_factory=list)
 
-    src_ssh, src_env = _ssh_cmd(source)
-    dest_ssh, dest_env = _ssh_cmd(dest)
-    src_host = f"{source.username}@{source.host}"
-    dest_host = f"{dest.username}@{dest.host}"
 
-    if exclude_file and os.path.isfile(exclude_file):
-        with open(exclude_file, encoding="utf-8") as fh:
-            excl_body = fh.read().replace("'", "'\"'\"'")
-        remote_tar = (
-            f"printf '%s' '{excl_body}' > /tmp/dapx-fr-exclude.txt && "
-            f"tar cf - --exclude-from=/tmp/dapx-fr-exclude.txt -C {shlex.quote(src_base)} . "
-            f"&& rm -f /tmp/dapx-fr-exclude.txt"
+def source_base_path(source: FileEndpoint, src_path: str) -> str:
+    """Path assoluto SSH del path sorgente (volume Synology come per rsync)."""
+    if source.endpoint_type == FileEndpointType.SYNOLOGY:
+        extra = source.extra_config or {}
+        vol = extra.get("synology_volume") or extra.get("ssh_volume") or "volume1"
+        return synology_ssh_path(src_path, vol)
+    return sanitize_path(src_path)
+
+
+def _remote_argv(endpoint: FileEndpoint, script: str) -> tuple[list[str], Optional[dict]]:
+    ssh, env = _ssh_cmd(endpoint)
+    return [*ssh, f"{endpoint.username}@{endpoint.host}", script], (
+        {**os.environ, **env} if env else None
+    )
+
+
+async def _terminate(proc: asyncio.subprocess.Process) -> None:
+    if proc.returncode is not None:
+        return
+    try:
+        proc.terminate()
+        await asyncio.wait_for(proc.wait(), timeout=10)
+    except ProcessLookupError:
+        pass
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+
+
+async def _ssh_run(endpoint: FileEndpoint, script: str, timeout: float = 120) -> tuple[int, str, str]:
+    """Comando breve via SSH (elenco cartelle, verifica strumenti)."""
+    argv, env = _remote_argv(endpoint, script)
+    proc = await asyncio.create_subprocess_exec(
+        *argv,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        env=env,
+    )
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+    except BaseException:
+        await _terminate(proc)
+        raise
+    return proc.returncode or 0, out.decode(errors="replace"), err.decode(errors="replace")
+
+
+async def resolve_compression(
+    source: FileEndpoint, dest: FileEndpoint, requested: Optional[str]
+) -> Optional[str]:
+    """Compressione richiesta, se il comando c'è su sorgente e QNAP."""
+    if requested not in _COMPRESSORS:
+        return None
+    check = f"command -v {requested} >/dev/null 2>&1"
+    src_rc, dest_rc = await asyncio.gather(
+        *(_ssh_run(ep, check, timeout=30) for ep in (source, dest)),
+        return_exceptions=True,
+    )
+    missing = [
+        ep.name for ep, rc in ((source, src_rc), (dest, dest_rc))
+        if isinstance(rc, BaseException) or rc[0] != 0
+    ]
+    if missing:
+        logger.warning(
+            "Stream tar: %s non disponibile su %s, flusso non compresso",
+            requested, ", ".join(missing),
+        )
+        return None
+    return requested
+
+
+def _top_level_excluded(name: str, patterns: Iterable[str]) -> bool:
+    for raw in patterns:
+        pat = raw.strip()
+        if pat.startswith("**/"):
+            pat = pat[3:]
+        pat = pat.removesuffix("/**").strip("/")
+        if pat and "/" not in pat and fnmatch.fnmatchcase(name, pat):
+            return True
+    return False
+
+
+async def list_chunks(
+    source: FileEndpoint, src_base: str, exclude_lines: Iterable[str] = ()
+) -> list[str]:
+    """Blocchi del path: file sciolti nella radice (se presenti) + cartelle di 1° livello."""
+    script = (
+        f"cd {shlex.quote(src_base)} || exit 2; "
+        "for e in * .[!.]* ..?*; do "
+        'if [ -d "$e" ] && [ ! -L "$e" ]; then printf "d/%s\\n" "$e"; '
+        'elif [ -e "$e" ] || [ -L "$e" ]; then echo f; fi; done'
+    )
+    rc, out, err = await _ssh_run(source, script)
+    if rc != 0:
+        raise RuntimeError(f"elenco cartelle di {src_base} fallito (exit {rc}): {err[-500:]}")
+    patterns = list(exclude_lines)
+    dirs = sorted(
+        line[2:] for line in out.splitlines()
+        if line.startswith("d/") and not _top_level_excluded(line[2:], patterns)
+    )
+    has_loose = any(line == "f" for line in out.splitlines())
+    return ([LOOSE_CHUNK] if has_loose else []) + dirs
+
+
+def _source_script(src_base: str, chunk: str, exclude_body: str, compression: Optional[str]) -> str:
+    if chunk == LOOSE_CHUNK:
+        tar = (
+            "find . -mindepth 1 -maxdepth 1 ! -type d -print0 | "
+            'tar cf - --exclude-from="$X" --null --no-recursion -T -'
         )
     else:
-        remote_tar = f"tar cf - -C {shlex.quote(src_base)} ."
+        tar = f'tar cf - --exclude-from="$X" -- {shlex.quote("./" + chunk)}'
+    # L'exit di tar viaggia su stderr: con il compressore in pipe lo
+    # stato della pipeline sarebbe quello del compressore
+    body = f'{{ cd {shlex.quote(src_base)} && {tar}; echo "{_RC_MARK}$?" >&2; }}'
+    if compression:
+        body += f" | {_COMPRESSORS[compression][0]}"
+    return (
+        'X=$(mktemp) || exit 1; '
+        f'printf "%s" {shlex.quote(exclude_body)} > "$X"; '
+        f'{body}; rm -f "$X"'
+    )
+
+
+def _dest_script(dest_dir: str, compression: Optional[str]) -> str:
+    extract = f"tar xf - -C {shlex.quote(dest_dir)}"
+    if compression:
+        extract = f"{_COMPRESSORS[compression][1]} | {extract}"
+    # tee su fd 3 verso sha256sum: l'hash di ciò che il QNAP ha ricevuto
+    # torna su stdout, l'exit di tar su stderr
+    return (
+        f"mkdir -p {shlex.quote(dest_dir)} && "
+        f'{{ tee /dev/fd/3 | {extract} >&2; echo "{_RC_MARK}$?" >&2; }} 3>&1 | sha256sum'
+    )
+
+
+class StreamProgress:
+    """Byte, velocità e ETA del flusso di un path."""
+
+    def __init__(
+        self,
+        label: str,
+        chunks: list[str],
+        done: set[str],
+        sizes: dict[str, int],
+        on_progress: Optional[Callable[[dict], None]] = None,
+        bytes_offset: int = 0,
+    ):
+        self.label = label
+        self.total_chunks = len(chunks)
+        self.done_chunks = sum(1 for c in chunks if c in done)
+        self.sizes = sizes
+        todo = [c for c in chunks if c not in done]
+        # Stima dal run precedente: nota solo se tutti i blocchi da fare hanno una misura
+        self.known = bool(todo) and all(c in sizes for c in todo)
+        self.remaining_est = sum(sizes.get(c, 0) for c in todo)
+        self.total_est = self.remaining_est
+        self.on_progress = on_progress
+        self.bytes_offset = bytes_offset
+        self.bytes = 0
+        self.chunk = None
+        self.chunk_bytes = 0
+        self.rate = 0.0
+        self._window_start = _now()
+        self._window_bytes = 0
+        self._published = 0.0
+
+    def start_chunk(self, chunk: str) -> None:
+        self.chunk = chunk
+        self.chunk_bytes = 0
+        self.publish(force=True)
+
+    def add(self, n: int) -> None:
+        self.bytes += n
+        self.chunk_bytes += n
+        self._window_bytes += n
+        now = _now()
+        elapsed = now - self._window_start
+        if elapsed >= 2:
+            self.rate = self._window_bytes / elapsed
+            self._window_start = now
+            self._window_bytes = 0
+        if now - self._published >= 1:
+            self.publish()
+
+    def finish_chunk(self) -> None:
+        self.remaining_est -= self.sizes.get(self.chunk, 0)
+        self.done_chunks += 1
+        self.chunk = None
+        self.chunk_bytes = 0
+        self.publish(force=True)
+
+    def view(self) -> dict:
+        current_est = self.sizes.get(self.chunk, 0) if self.chunk is not None else 0
+        in_chunk = min(self.chunk_bytes, current_est)
+        if self.known and self.total_est:
+            percent = (self.total_est - self.remaining_est + in_chunk) / self.total_est * 100
+        else:
+            percent = self.done_chunks / max(1, self.total_chunks) * 100
+        eta = None
+        if self.known and self.rate > 0:
+            eta = eta_human(int(max(0, self.remaining_est - in_chunk) / self.rate))
+        folder = "file nella radice" if self.chunk == LOOSE_CHUNK else self.chunk
+        total = self.bytes_offset + self.bytes
+        return {
+            "status": "running",
+            "percent": f"{min(100.0, percent):.0f}%",
+            "bytes_transferred": total,
+            "transferred_human": format_bytes_human(total),
+            "speed": f"{format_bytes_human(int(self.rate))}/s" if self.rate else None,
+            "eta": eta,
+            "current_folder_name": folder,
+            "folders_done": self.done_chunks,
+            "current_folder_total": self.total_chunks,
+            "message": f"tar {self.label}: {self.done_chunks}/{self.total_chunks} cartelle"
+            + (f", {folder}" if folder is not None else ""),
+        }
+
+    def publish(self, force: bool = False) -> None:
+        if self.on_progress is None:
+            return
+        now = _now()
+        if force or now - self._published >= 1:
+            self._published = now
+            self.on_progress(self.view())
 
-    prep_and_extract = f"mkdir -p {shlex.quote(dest_dir)} && tar xf - -C {shlex.quote(dest_dir)}"
 
-    # Due processi separati con env propri: niente password in argv della shell.
+async def _relay(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    progress: StreamProgress,
+    bandwidth_limit_kb: Optional[int],
+) -> str:
+    """Copia sorgente → QNAP contando i byte; ritorna lo SHA-256 del flusso."""
+    digest = hashlib.sha256()
+    started = _now()
+    sent = 0
+    limit = (bandwidth_limit_kb or 0) * 1024
+    while True:
+        data = await reader.read(STREAM_READ_BYTES)
+        if not data:
+            break
+        digest.update(data)
+        writer.write(data)
+        await writer.drain()
+        sent += len(data)
+        progress.add(len(data))
+        if limit:
+            ahead = sent / limit - (_now() - started)
+            if ahead > 0:
+                await asyncio.sleep(ahead)
+    writer.close()
+    return digest.hexdigest()
+
+
+async def _read_lines(stream: asyncio.StreamReader, tail: deque, marks: list[int]) -> None:
+    while True:
+        line_b = await stream.readline()
+        if not line_b:
+            return
+        line = line_b.decode(errors="replace")
+        if line.startswith(_RC_MARK):
+            try:
+                marks.append(int(line[len(_RC_MARK):].strip()))
+            except ValueError:
+                pass
+            continue
+        tail.append(line)
+
+
+async def _stream_chunk(
+    source: FileEndpoint,
+    dest: FileEndpoint,
+    src_base: str,
+    dest_dir: str,
+    chunk: str,
+    exclude_body: str,
+    compression: Optional[str],
+    progress: StreamProgress,
+    stderr_tail: deque,
+    warnings: list[str],
+    bandwidth_limit_kb: Optional[int],
+) -> int:
+    src_argv, src_env = _remote_argv(source, _source_script(src_base, chunk, exclude_body, compression))
+    dest_argv, dest_env = _remote_argv(dest, _dest_script(dest_dir, compression))
     src_proc = await asyncio.create_subprocess_exec(
-        *src_ssh,
-        src_host,
-        remote_tar,
+        *src_argv,
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.PIPE,
-        env={**os.environ, **src_env} if src_env else None,
+        env=src_env,
     )
-    dest_proc = await asyncio.create_subprocess_exec(
-        *dest_ssh,
-        dest_host,
-        prep_and_extract,
-        stdin=src_proc.stdout,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-        env={**os.environ, **dest_env} if dest_env else None,
+    try:
+        dest_proc = await asyncio.create_subprocess_exec(
+            *dest_argv,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=dest_env,
+        )
+    except BaseException:
+        await _terminate(src_proc)
+        raise
+    src_marks: list[int] = []
+    dest_marks: list[int] = []
+    tasks = [
+        asyncio.ensure_future(_relay(src_proc.stdout, dest_proc.stdin, progress, bandwidth_limit_kb)),
+        asyncio.ensure_future(dest_proc.stdout.read()),
+        asyncio.ensure_future(_read_lines(src_proc.stderr, stderr_tail, src_marks)),
+        asyncio.ensure_future(_read_lines(dest_proc.stderr, stderr_tail, dest_marks)),
+    ]
+    try:
+        sent_hash, received, _, _ = await asyncio.gather(*tasks)
+        await asyncio.gather(src_proc.wait(), dest_proc.wait())
+    except (BrokenPipeError, ConnectionResetError) as exc:
+        raise RuntimeError(
+            f"stream tar {chunk or '.'}: QNAP ha chiuso il flusso ({exc}): "
+            + "".join(stderr_tail)[-2000:]
+        ) from exc
+    finally:
+        for task in tasks:
+            task.cancel()
+        await _terminate(src_proc)
+        await _terminate(dest_proc)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    name = chunk or "."
+    src_rc = src_marks[-1] if src_marks else src_proc.returncode or 255
+    dest_rc = dest_marks[-1] if dest_marks else dest_proc.returncode or 255
+    # GNU tar: exit 1 = file modificati durante la lettura (copia comunque completa)
+    if src_rc == 1:
+        warnings.append(f"{name}: file modificati durante la lettura")
+    elif src_rc != 0:
+        raise RuntimeError(f"stream tar {name}: tar sorgente exit {src_rc}: " + "".join(stderr_tail)[-2000:])
+    if dest_rc != 0 or dest_proc.returncode:
+        raise RuntimeError(
+            f"stream tar {name}: estrazione QNAP exit {dest_rc or dest_proc.returncode}: "
+            + "".join(stderr_tail)[-2000:]
+        )
+    received_hash = received.decode(errors="replace").split(" ")[0].strip()
+    if received_hash != sent_hash:
+        raise RuntimeError(
+            f"stream tar {name}: checksum non corrispondente (inviato {sent_hash[:12]}, "
+            f"ricevuto {received_hash[:12] or '-'})"
+        )
+    return progress.chunk_bytes
+
+
+async def stream_synology_to_qnap(
+    source: FileEndpoint,
+    dest: FileEndpoint,
+    src_path: str,
+    dest_dir: str,
+    exclude_file: str | None = None,
+    *,
+    compression: Optional[str] = None,
+    completed: Iterable[str] = (),
+    sizes: Optional[dict[str, int]] = None,
+    on_chunk_done: Optional[Callable[[str, int], None]] = None,
+    on_progress: Optional[Callable[[dict], None]] = None,
+    bandwidth_limit_kb: Optional[int] = None,
+    bytes_offset: int = 0,
+) -> StreamResult:
+    """Stream tar di un path sorgente verso QNAP, a blocchi, senza copia su dapx.
+
+    ``completed`` sono i blocchi già conclusi da un run interrotto (saltati),
+    ``sizes`` i byte per blocco del run precedente (per l'ETA);
+    ``on_chunk_done(blocco, byte)`` viene chiamato dopo ogni blocco
+    verificato. ``compression`` va già risolta con ``resolve_compression``.
+    """
+    src_base = source_base_path(source, src_path)
+    dest_dir = dest_dir.rstrip("/")
+    exclude_body = ""
+    if exclude_file and os.path.isfile(exclude_file):
+        with open(exclude_file, encoding="utf-8") as fh:
+            exclude_body = fh.read()
+    logger.info(
+        "Stream tar %s → %s (compressione: %s)", src_base, dest_dir, compression or "nessuna"
+    )
+
+    chunks = await list_chunks(source, src_base, exclude_body.splitlines())
+    done = set(completed) & set(chunks)
+    progress = StreamProgress(
+        src_path, chunks, done, dict(sizes or {}), on_progress, bytes_offset=bytes_offset
     )
-    # Consenti a src di ricevere SIGPIPE se dest esce prima.
-    if src_proc.stdout is not None:
-        src_proc.stdout.close()
-
-    dest_out_b, dest_err_b = await dest_proc.communicate()
-    src_out_b, src_err_b = await src_proc.communicate()
-
-    out = dest_out_b.decode(errors="replace") + src_out_b.decode(errors="replace")
-    err = dest_err_b.decode(errors="replace") + src_err_b.decode(errors="replace")
-    code = dest_proc.returncode or 0
-    if src_proc.returncode not in (0, None) and code == 0:
-        code = src_proc.returncode or 0
-    if code != 0:
-        raise RuntimeError(f"stream tar exit {code}: {(out + err)[-2000:]}")
-    return [out], [err]
+    result = StreamResult(chunks_total=len(chunks), chunks_resumed=len(done))
+    if done:
+        logger.info("Stream tar %s: ripresa, %d/%d blocchi già copiati", src_base, len(done), len(chunks))
+    stderr_tail: deque = deque(maxlen=200)
+    for chunk in chunks:
+        if chunk in done:
+            continue
+        progress.start_chunk(chunk)
+        size = await _stream_chunk(
+            source, dest, src_base, dest_dir, chunk, exclude_body, compression,
+            progress, stderr_tail, result.warnings, bandwidth_limit_kb,
+        )
+        progress.finish_chunk()
+        result.bytes_sent += size
+        if on_chunk_done:
+            on_chunk_done(chunk, size)
+    result.stderr_tail = list(stderr_tail)
+    return result
@@ -17,12 +17,27 @@ from services.file_replication.exclude_presets import (
     build_rclone_filter_lines,
     build_rsync_exclude_lines,
 )
-from services.file_replication.file_sync_service import build_sync_plan, parse_rsync_progress
+from services.file_replication import staging_cache
+from services.file_replication.direct_stream import (
+    resolve_compression,
+    stream_synology_to_qnap,
+)
+from services.file_replication.file_sync_service import (
+    build_sync_plan,
+    parse_rsync_progress,
+    staging_subdir,
+)
 from services.file_replication.file_replication_notifications import notify_file_replication_result
 from services.file_replication.file_replication_report import (
     build_file_replication_report,
     report_transferred_human,
 )
+from services.file_replication.leg_pipeline import (
+    LegProgress,
+    endpoint_gates,
+    group_rsync_plan,
+    run_pipeline,
+)
 from services.file_replication.rclone_sync import (
     format_rclone_progress_summary,
     merge_rclone_progress,
@@ -31,25 +46,24 @@ from services.file_replication.rclone_sync import (
     rclone_sync_synology_to_qnap,
     summarize_rclone_output,
 )
+from services.job_events import job_events
+from services.job_log_output import append_output
 from services.size_utils import parse_transfer_size_to_bytes
 
 logger = logging.getLogger(__name__)
 
 _running: set[int] = set()
-_progress: dict[int, dict] = {}
+# Progresso per job, pubblicato sul bus eventi (/api/events/jobs)
+_progress = job_events.registry("file_replication")
 
 
-def _preflight_rsync_tools(source: FileEndpoint, dest: FileEndpoint) -> None:
-    if not shutil.which("rsync"):
-        raise RuntimeError(
-            "rsync non installato sul server dapx. Installare con: apt install rsync openssh-client"
-        )
+def _needs_sshpass(ep: FileEndpoint) -> bool:
+    if ep.ssh_key_path:
+        return False
+    return bool(decrypt_password(ep.password_enc or ""))
 
-    def _needs_sshpass(ep: FileEndpoint) -> bool:
-        if ep.ssh_key_path:
-            return False
-        return bool(decrypt_password(ep.password_enc or ""))
 
+def _preflight_sshpass(source: FileEndpoint, dest: FileEndpoint) -> None:
     if _needs_sshpass(source) or _needs_sshpass(dest):
         if not shutil.which("sshpass"):
             raise RuntimeError(
@@ -58,6 +72,37 @@ def _preflight_rsync_tools(source: FileEndpoint, dest: FileEndpoint) -> None:
             )
 
 
+def _preflight_rsync_tools(source: FileEndpoint, dest: FileEndpoint) -> None:
+    if not shutil.which("rsync"):
+        raise RuntimeError(
+            "rsync non installato sul server dapx. Installare con: apt install rsync openssh-client"
+        )
+    _preflight_sshpass(source, dest)
+
+
+def _preflight_stream_tools(source: FileEndpoint, dest: FileEndpoint) -> None:
+    """Stream tar: sul server dapx servono solo ssh (e sshpass con password)."""
+    if not shutil.which("ssh"):
+        raise RuntimeError(
+            "ssh non installato sul server dapx. Installare con: apt install openssh-client"
+        )
+    _preflight_sshpass(source, dest)
+
+
+async def _terminate_process(proc) -> None:
+    """Termina un rsync ancora attivo (SIGTERM, poi SIGKILL dopo 10s)."""
+    if proc.returncode is not None:
+        return
+    try:
+        proc.terminate()
+        await asyncio.wait_for(proc.wait(), timeout=10)
+    except ProcessLookupError:
+        pass
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+
+
 def _write_failure_log(
     db,
     *,
@@ -139,6 +184,7 @@ async def execute_file_replication_job(job_id: int, *, triggered_by: str = "manu
     exclude_path: Optional[str] = None
     filter_path: Optional[str] = None
     staging_dir: Optional[str] = None
+    persistent_staging = False
     source: Optional[FileEndpoint] = None
     dest: Optional[FileEndpoint] = None
 
@@ -155,12 +201,16 @@ async def execute_file_replication_job(job_id: int, *, triggered_by: str = "manu
         if dest.endpoint_type != FileEndpointType.QNAP:
             raise RuntimeError("La destinazione deve essere un endpoint QNAP")
 
-        _preflight_rsync_tools(source, dest)
-        if (
-            source.endpoint_type == FileEndpointType.SYNOLOGY
-            and dest.endpoint_type == FileEndpointType.QNAP
-        ):
-            preflight_rclone()
+        tar_stream = job.sync_method == "tar_stream"
+        if tar_stream:
+            _preflight_stream_tools(source, dest)
+        else:
+            _preflight_rsync_tools(source, dest)
+            if (
+                source.endpoint_type == FileEndpointType.SYNOLOGY
+                and dest.endpoint_type == FileEndpointType.QNAP
+            ):
+                preflight_rclone()
 
         job.current_status = "running"
         db.commit()
@@ -191,13 +241,23 @@ async def execute_file_replication_job(job_id: int, *, triggered_by: str = "manu
         with os.fdopen(fd2, "w") as fh:
             fh.write("\n".join(filter_lines) + "\n")
 
-        staging_dir = tempfile.mkdtemp(prefix=f"dapx-fr-{job_id}-")
+        if tar_stream:
+            # Stream diretto sorgente → QNAP: nessuno staging su dapx
+            pass
+        elif job.persistent_staging:
+            # Staging conservato tra i run: il pull rsync diventa incrementale
+            persistent_staging = True
+            staging_dir = await asyncio.to_thread(
+                staging_cache.acquire, job_id, [staging_subdir(p) for p in job.source_paths or []]
+            )
+        else:
+            staging_dir = tempfile.mkdtemp(prefix=f"dapx-fr-{job_id}-")
         sync_plan = build_sync_plan(
             job,
             source,
             dest,
             exclude_path,
-            staging_dir,
+            staging_dir or "",
             filter_file=filter_path,
         )
         # P-12: memoria limitata su job lunghi/verbosi (il log finale prende
@@ -206,8 +266,7 @@ async def execute_file_replication_job(job_id: int, *, triggered_by: str = "manu
         combined_stderr: "deque[str]" = deque(maxlen=20000)
         total_bytes = 0
 
-        async def _run_rsync(cmd: list[str], env_extra: dict | None = None) -> None:
-            nonlocal total_bytes
+        async def _run_rsync(cmd: list[str], env_extra: dict | None, on_progress) -> None:
             # Log solo argv senza password: SSHPASS resta in env, non in cmd.
             logger.info("FileReplicationJob %s rsync: %s", job_id, " ".join(cmd[:8]))
             run_env = None
@@ -227,35 +286,119 @@ async def execute_file_replication_job(job_id: int, *, triggered_by: str = "manu
                     "Installare con: apt install rsync openssh-client sshpass cifs-utils"
                 ) from exc
             assert proc.stderr is not None
-            while True:
-                line_b = await proc.stderr.readline()
-                if not line_b:
-                    break
-                line = line_b.decode(errors="replace")
-                combined_stderr.append(line)
-                prog = parse_rsync_progress(line)
-                if prog:
-                    if prog.get("bytes_transferred"):
-                        total_bytes = max(total_bytes, prog["bytes_transferred"])
-                    _progress[job_id] = {
-                        "status": "running",
-                        "percent": prog.get("percent", _progress[job_id].get("percent")),
-                        "bytes_transferred": total_bytes,
-                        "speed": prog.get("speed"),
-                    }
-
-            stdout_b, stderr_rest = await proc.communicate()
+            # Coda stderr di questo processo: con le tratte in parallelo il
+            # buffer comune mescola le righe dei due rsync
+            stderr_tail: "deque[str]" = deque(maxlen=200)
+            try:
+                while True:
+                    line_b = await proc.stderr.readline()
+                    if not line_b:
+                        break
+                    line = line_b.decode(errors="replace")
+                    combined_stderr.append(line)
+                    stderr_tail.append(line)
+                    prog = parse_rsync_progress(line)
+                    if prog:
+                        on_progress(prog)
+
+                stdout_b, stderr_rest = await proc.communicate()
+            except asyncio.CancelledError:
+                # Tratta cancellata (errore sull'altra tratta, job interrotto)
+                await _terminate_process(proc)
+                raise
             if stdout_b:
                 combined_stdout.append(stdout_b.decode(errors="replace"))
             if stderr_rest:
                 combined_stderr.append(stderr_rest.decode(errors="replace"))
+                stderr_tail.append(stderr_rest.decode(errors="replace"))
 
             if proc.returncode != 0:
                 raise RuntimeError(
                     f"rsync exit {proc.returncode}: "
-                    + "".join(combined_stderr)[-2000:]
+                    + "".join(stderr_tail)[-2000:]
                 )
 
+        rsync_steps = [step for step in sync_plan if step["type"] == "rsync"]
+        if rsync_steps:
+            # Pull e push in pipeline: il push del path N si sovrappone al
+            # pull del path N+1, tratte limitate per endpoint
+            legs = LegProgress(len(rsync_steps))
+
+            async def _run_leg(step: dict) -> None:
+                leg, path = step["leg"], step["src_path"]
+
+                def _on_progress(prog: dict) -> None:
+                    legs.update(leg, path, prog)
+                    _progress[job_id] = legs.view()
+
+                legs.update(leg, path, {})
+                _progress[job_id] = legs.view()
+                try:
+                    await _run_rsync(step["cmd"], step.get("env") or None, _on_progress)
+                except BaseException:
+                    legs.discard(leg, path)
+                    raise
+                legs.finish(leg, path)
+                _progress[job_id] = legs.view()
+
+            def _leg_gate(step: dict) -> asyncio.Semaphore:
+                endpoint = source if step["leg"] == "pull" else dest
+                return endpoint_gates.gate(endpoint.id)
+
+            await run_pipeline(group_rsync_plan(rsync_steps), _run_leg, _leg_gate)
+            total_bytes = legs.leg_bytes("push")
+
+        tar_steps = [step for step in sync_plan if step["type"] == "tar_stream"]
+        if tar_steps:
+            compression = await resolve_compression(source, dest, job.stream_compression)
+            checkpoint: dict = {
+                path: dict(entry) for path, entry in (job.stream_checkpoint or {}).items()
+                if path in (job.source_paths or [])
+            }
+
+            def _save_chunk(src_path: str, chunk: str, size: int) -> None:
+                # Blocco verificato: un run interrotto riprende dal successivo
+                entry = checkpoint.setdefault(src_path, {})
+                entry["done"] = [*entry.get("done", []), chunk]
+                entry["sizes"] = {**entry.get("sizes", {}), chunk: size}
+                job.stream_checkpoint = {p: dict(e) for p, e in checkpoint.items()}
+                db.commit()
+
+            def _on_stream_progress(view: dict) -> None:
+                _progress[job_id] = view
+
+            for step in tar_steps:
+                state = checkpoint.get(step["src_path"]) or {}
+                result = await stream_synology_to_qnap(
+                    source,
+                    dest,
+                    step["src_path"],
+                    step["dest_dir"],
+                    exclude_path,
+                    compression=compression,
+                    completed=state.get("done") or [],
+                    sizes=state.get("sizes") or {},
+                    on_chunk_done=lambda chunk, size, _p=step["src_path"]: _save_chunk(_p, chunk, size),
+                    on_progress=_on_stream_progress,
+                    bandwidth_limit_kb=job.bandwidth_limit_kb,
+                    bytes_offset=total_bytes,
+                )
+                total_bytes += result.bytes_sent
+                combined_stderr.extend(result.stderr_tail)
+                summary = f"stream tar {step['src_path']}: {result.chunks_total} blocchi"
+                if result.chunks_resumed:
+                    summary += f", {result.chunks_resumed} ripresi dal run precedente"
+                if compression:
+                    summary += f", compressione {compression}"
+                combined_stdout.append(summary + "\n")
+                combined_stdout.extend(f"  attenzione: {w}\n" for w in result.warnings)
+            # Run completo: si riparte da capo, restano le dimensioni per l'ETA
+            job.stream_checkpoint = {
+                path: {"done": [], "sizes": entry.get("sizes", {})}
+                for path, entry in checkpoint.items()
+            }
+            _progress[job_id] = {**(_progress.get(job_id) or {}), "percent": "100%"}
+
         for step in sync_plan:
             if step["type"] == "rclone_sync":
                 step_msg = f"rclone {step['src_path']}"
@@ -293,8 +436,6 @@ async def execute_file_replication_job(job_id: int, *, triggered_by: str = "manu
                         "status": "running",
                         "message": step_msg,
                     }
-            elif step["type"] == "rsync":
-                await _run_rsync(step["cmd"], step.get("env") or None)
 
         duration = int((datetime.utcnow() - started).total_seconds())
         final_progress = dict(_progress.get(job_id) or {})
@@ -325,7 +466,11 @@ async def execute_file_replication_job(job_id: int, *, triggered_by: str = "manu
             log_row.message = report_text.split("\n")[0] if report_text else f"Replica completata in {duration}s"
             if progress_summary:
                 log_row.message = f"Replica completata in {duration}s — {progress_summary}"
-            log_row.output = report_text + "\n\n--- rclone/rsync ---\n" + "".join(combined_stdout)[-45000:]
+            append_output(
+                db, log_row.id,
+                report_text + "\n\n--- rclone/rsync ---\n" + "".join(combined_stdout)[-45000:],
+                commit=False,
+            )
             log_row.duration = duration
             log_row.transferred = transferred_label
             log_row.completed_at = datetime.utcnow()
@@ -400,7 +545,12 @@ async def execute_file_replication_job(job_id: int, *, triggered_by: str = "manu
                 os.unlink(filter_path)
             except OSError:
                 pass
-        if staging_dir and os.path.isdir(staging_dir):
+        if persistent_staging:
+            try:
+                await staging_cache.release(job_id)
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("Staging job %s: release fallita: %s", job_id, exc)
+        elif staging_dir and os.path.isdir(staging_dir):
             shutil.rmtree(staging_dir, ignore_errors=True)
         _running.discard(job_id)
         db.close()
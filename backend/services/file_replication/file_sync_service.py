@@ -74,6 +74,11 @@ def _remote_spec(endpoint: FileEndpoint, remote_path: str) -> str:
     return f"{endpoint.username}@{endpoint.host}:{path}"
 
 
+def staging_subdir(src_path: str) -> str:
+    """Sottocartella dello staging locale per un path sorgente."""
+    return src_path.strip("/").replace("/", "_") or "data"
+
+
 def build_sync_plan(
     job: FileReplicationJob,
     source: FileEndpoint,
@@ -83,7 +88,11 @@ def build_sync_plan(
     *,
     filter_file: str | None = None,
 ) -> list[dict]:
-    """Piano sync per path: pull (SMB su Synology, rsync altrove) + push QNAP."""
+    """Piano sync per path: pull (SMB su Synology, rsync altrove) + push QNAP.
+
+    Con ``sync_method="tar_stream"`` un solo step per path: stream tar
+    diretto sorgente → QNAP (``direct_stream``), senza staging.
+    """
     steps: list[dict] = []
     dest_base = job.dest_staging_path.rstrip("/")
     mirror_synology = (
@@ -98,7 +107,11 @@ def build_sync_plan(
         else:
             leaf = src_path.strip("/").split("/")[-1] or "data"
             dest_remote = f"{dest_base}/{leaf}/"
-        local_dir = f"{staging_dir}/{src_path.strip('/').replace('/', '_') or 'data'}/"
+        local_dir = f"{staging_dir}/{staging_subdir(src_path)}/"
+
+        if job.sync_method == "tar_stream":
+            steps.append({"type": "tar_stream", "src_path": src_path, "dest_dir": dest_remote})
+            continue
 
         if use_rclone:
             steps.append(
@@ -114,6 +127,10 @@ def build_sync_plan(
             continue
 
         pull = ["rsync", "-a", "--info=progress2", "--exclude-from", exclude_file]
+        if job.persistent_staging:
+            # Lo staging resta tra i run: deve rispecchiare sorgente ed esclusioni
+            # correnti, altrimenti il push riporterebbe file cancellati o esclusi.
+            pull.extend(["--delete", "--delete-excluded"])
         push = ["rsync", "-a", "--info=progress2"]
         if job.delete_on_dest:
             push.append("--delete")
@@ -140,12 +157,16 @@ def build_sync_plan(
             pull.append(_remote_spec(source, src_remote))
             pull_env = _ssh_env(source)
         pull.append(local_dir)
-        steps.append({"type": "rsync", "cmd": pull, "env": pull_env})
+        steps.append(
+            {"type": "rsync", "leg": "pull", "src_path": src_path, "cmd": pull, "env": pull_env}
+        )
 
         push.extend(["-e", _ssh_transport(dest)])
         push.append(local_dir)
         push.append(_remote_spec(dest, dest_remote))
-        steps.append({"type": "rsync", "cmd": push, "env": _ssh_env(dest)})
+        steps.append(
+            {"type": "rsync", "leg": "push", "src_path": src_path, "cmd": push, "env": _ssh_env(dest)}
+        )
 
     return steps
 
@@ -0,0 +1,188 @@
+"""Pipeline pull/push della replica file a due salti (rsync via staging dapx).
+
+Il piano rsync alterna per ogni path sorgente un pull (sorgente → staging
+dapx) e un push (staging → QNAP). Eseguiti in fila, i due link restavano
+inattivi metà del tempo: qui ogni path è una catena pull → push e le
+catene partono insieme, limitate da semafori per endpoint:
+
+- le tratte sullo stesso endpoint sono al più ``DAPX_FILE_REPL_LEG_CONCURRENCY``
+  (default 1, condiviso tra i job): il push del path N gira mentre il
+  pull del path N+1 occupa la sorgente;
+- i path già scaricati e non ancora inviati sono limitati (due per slot),
+  così lo staging non cresce oltre la coda del push;
+- al primo errore le altre catene vengono cancellate e i loro rsync
+  terminati; lo stesso vale se è il job a essere cancellato.
+
+``LegProgress`` combina il progresso delle tratte attive in un'unica vista
+(percentuale complessiva, byte scaricati/inviati, messaggio per tratta).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+from typing import Awaitable, Callable, Optional
+
+from services.size_utils import format_bytes_human
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+LEG_CONCURRENCY = max(1, _env_int("DAPX_FILE_REPL_LEG_CONCURRENCY", 1))
+
+_PERCENT_RE = re.compile(r"(\d+(?:\.\d+)?)")
+
+
+class EndpointGates:
+    """Semafori per endpoint, legati al loop corrente (ricreati se cambia)."""
+
+    def __init__(self, limit: int = LEG_CONCURRENCY):
+        self.limit = limit
+        self._gates: dict[int, asyncio.Semaphore] = {}
+        self._loop = None
+
+    def gate(self, endpoint_id: int) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._gates = {}
+            self._loop = loop
+        gate = self._gates.get(endpoint_id)
+        if gate is None:
+            gate = self._gates[endpoint_id] = asyncio.Semaphore(self.limit)
+        return gate
+
+
+def group_rsync_plan(plan: list[dict]) -> list[list[dict]]:
+    """Raggruppa gli step rsync del piano in catene per path (pull, push)."""
+    chains: list[list[dict]] = []
+    by_path: dict[str, list[dict]] = {}
+    for step in plan:
+        key = step.get("src_path")
+        if key is None:
+            chains.append([step])
+            continue
+        if key not in by_path:
+            by_path[key] = []
+            chains.append(by_path[key])
+        by_path[key].append(step)
+    return chains
+
+
+def _percent_value(raw) -> float:
+    match = _PERCENT_RE.search(str(raw or ""))
+    return min(100.0, float(match.group(1))) if match else 0.0
+
+
+class LegProgress:
+    """Vista combinata del progresso di pull e push."""
+
+    def __init__(self, total_legs: int):
+        self.total_legs = max(1, total_legs)
+        self.done_legs = 0
+        self.done_bytes = {"pull": 0, "push": 0}
+        self.active: dict[tuple[str, str], dict] = {}
+
+    def update(self, leg: str, path: str, prog: dict) -> None:
+        entry = self.active.setdefault((leg, path), {"bytes": 0})
+        if prog.get("bytes_transferred"):
+            entry["bytes"] = max(entry["bytes"], prog["bytes_transferred"])
+        if prog.get("percent"):
+            entry["percent"] = prog["percent"]
+        entry["speed"] = prog.get("speed") or entry.get("speed")
+
+    def finish(self, leg: str, path: str) -> None:
+        entry = self.active.pop((leg, path), None)
+        if entry is not None:
+            self.done_bytes[leg] = self.done_bytes.get(leg, 0) + entry["bytes"]
+        self.done_legs += 1
+
+    def discard(self, leg: str, path: str) -> None:
+        self.active.pop((leg, path), None)
+
+    def leg_bytes(self, leg: str) -> int:
+        active = sum(e["bytes"] for (lg, _), e in self.active.items() if lg == leg)
+        return self.done_bytes.get(leg, 0) + active
+
+    def view(self) -> dict:
+        running = sum(_percent_value(e.get("percent")) for e in self.active.values()) / 100
+        percent = min(100.0, (self.done_legs + running) / self.total_legs * 100)
+        pushed = self.leg_bytes("push")
+        legs = [
+            {
+                "leg": leg,
+                "path": path,
+                "percent": entry.get("percent"),
+                "bytes_transferred": entry["bytes"],
+                "speed": entry.get("speed"),
+            }
+            for (leg, path), entry in self.active.items()
+        ]
+        message = " · ".join(
+            f"{item['leg']} {item['path']} {item['percent'] or ''}".rstrip() for item in legs
+        )
+        done_paths = self.done_legs // 2
+        return {
+            "status": "running",
+            "percent": f"{percent:.0f}%",
+            "bytes_transferred": pushed,
+            "bytes_pulled": self.leg_bytes("pull"),
+            "bytes_pushed": pushed,
+            "transferred_human": format_bytes_human(pushed),
+            # Velocità del push (verso il QNAP) se attivo, altrimenti del pull
+            "speed": next((i["speed"] for i in legs if i["leg"] == "push" and i["speed"]), None)
+            or next((i["speed"] for i in legs if i["speed"]), None),
+            "legs": legs,
+            "message": f"{message} ({done_paths}/{self.total_legs // 2} path)" if message else None,
+        }
+
+
+async def run_pipeline(
+    chains: list[list[dict]],
+    run_step: Callable[[dict], Awaitable[None]],
+    gate_for: Callable[[dict], asyncio.Semaphore],
+    *,
+    max_in_flight: Optional[int] = None,
+) -> None:
+    """Esegue le catene pull → push in pipeline.
+
+    Gli step di una catena sono sequenziali e ognuno tiene il semaforo del
+    proprio endpoint (``gate_for``) mentre gira. Al primo errore le catene
+    ancora attive vengono cancellate (``run_step`` deve terminare il suo
+    processo su ``CancelledError``) e l'errore rilanciato.
+    """
+    if not chains:
+        return
+    slots = asyncio.Semaphore(max_in_flight or 2 * LEG_CONCURRENCY)
+
+    async def _chain(steps: list[dict]) -> None:
+        async with slots:
+            for step in steps:
+                async with gate_for(step):
+                    await run_step(step)
+
+    # Le catene partono in ordine: i semafori di asyncio sono FIFO, quindi
+    # i pull restano nell'ordine dei path sorgente
+    tasks = [asyncio.create_task(_chain(steps)) for steps in chains]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    for task in tasks:
+        if task in done and not task.cancelled() and task.exception() is not None:
+            raise task.exception()
+
+
+# Singleton: semafori per endpoint condivisi tra i job
+endpoint_gates = EndpointGates()
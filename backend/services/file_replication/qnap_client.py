@@ -2,8 +2,10 @@
 
 from __future__ import annotations
 
+import asyncio
 import base64
 import logging
+import time
 import xml.etree.ElementTree as ET
 from typing import Any, Optional
 
@@ -12,10 +14,39 @@ import httpx
 from services.file_replication.connection_errors import format_connection_error
 from services.file_replication.path_utils import is_excluded_name, sanitize_path
 from services.file_replication_schemas import BrowseEntryOut, ConnectionTestResult
+from services.http_pool import http_pool
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_EXCLUDE_PRESETS = ["nas_snapshots", "system_files"]
+_SESSION_TTL_SEC = 900
+# File Station: status 3 = autenticazione fallita (SID scaduto o revocato)
+_SESSION_EXPIRED_STATUS = 3
+
+# Come Synology: SID riusato tra istanze del client (una per richiesta browse)
+_session_cache: dict[str, tuple[str, float]] = {}
+_session_locks: dict[str, asyncio.Lock] = {}
+# URL base effettivo dopo il fallback HTTPS, per host:porta configurati
+_base_cache: dict[str, str] = {}
+
+
+def _session_key(host: str, port: int, username: str) -> str:
+    return f"{host}:{port}:{username}"
+
+
+def _session_lock(key: str) -> asyncio.Lock:
+    if key not in _session_locks:
+        _session_locks[key] = asyncio.Lock()
+    return _session_locks[key]
+
+
+def _is_session_expired(data: Any) -> bool:
+    if not isinstance(data, dict):
+        return False
+    try:
+        return int(data.get("status")) == _SESSION_EXPIRED_STATUS
+    except (TypeError, ValueError):
+        return False
 
 
 def _encode_qnap_password(password: str) -> str:
@@ -116,10 +147,12 @@ class QnapClient:
         self.verify_ssl = verify_ssl
         self.use_https = use_https or self.port == 443
         self._sid: Optional[str] = None
-        self._base = _qnap_base_url(host, self.port, self.use_https)
+        self._configured_base = _qnap_base_url(host, self.port, self.use_https)
+        self._base = _base_cache.get(self._configured_base, self._configured_base)
+        self._session_key = _session_key(host, self.port, username)
 
-    async def _http_client(self) -> httpx.AsyncClient:
-        return httpx.AsyncClient(verify=self.verify_ssl, timeout=30.0)
+    def _http_client(self, base: str) -> httpx.AsyncClient:
+        return http_pool.client(base, self.verify_ssl)
 
     async def _post(self, path: str, data: dict[str, str]) -> httpx.Response:
         urls = [f"{self._base}{path}"]
@@ -129,14 +162,15 @@ class QnapClient:
 
         last_exc: Exception | None = None
         for url in urls:
+            base = url.rsplit(path, 1)[0]
             try:
-                async with await self._http_client() as client:
-                    resp = await client.post(url, data=data)
-                    resp.raise_for_status()
-                    if url != urls[0]:
-                        self._base = url.rsplit(path, 1)[0]
-                        logger.info("QNAP fallback attivo: %s", self._base)
-                    return resp
+                resp = await self._http_client(base).post(url, data=data)
+                resp.raise_for_status()
+                if url != urls[0]:
+                    self._base = base
+                    _base_cache[self._configured_base] = base
+                    logger.info("QNAP fallback attivo: %s", self._base)
+                return resp
             except httpx.HTTPError as exc:
                 last_exc = exc
                 logger.debug("QNAP POST %s failed: %s", url, exc)
@@ -144,14 +178,33 @@ class QnapClient:
 
     async def _get(self, path: str, params: dict[str, Any]) -> httpx.Response:
         try:
-            async with await self._http_client() as client:
-                resp = await client.get(f"{self._base}{path}", params=params)
-                resp.raise_for_status()
-                return resp
+            resp = await self._http_client(self._base).get(f"{self._base}{path}", params=params)
+            resp.raise_for_status()
+            return resp
         except httpx.HTTPError as exc:
             raise RuntimeError(format_connection_error(self.host, self.port, exc)) from exc
 
-    async def login(self) -> str:
+    async def _ensure_session(self) -> None:
+        if self._sid:
+            return
+        cached = _session_cache.get(self._session_key)
+        if cached and cached[1] > time.time():
+            self._sid = cached[0]
+            return
+        await self.login()
+
+    async def login(self, *, force: bool = False) -> str:
+        async with _session_lock(self._session_key):
+            if not force:
+                cached = _session_cache.get(self._session_key)
+                if cached and cached[1] > time.time():
+                    self._sid = cached[0]
+                    return self._sid
+            sid = await self._authenticate()
+            _session_cache[self._session_key] = (sid, time.time() + _SESSION_TTL_SEC)
+            return sid
+
+    async def _authenticate(self) -> str:
         attempts = (
             ("base64", _encode_qnap_password(self.password)),
             ("plain", self.password),
@@ -184,6 +237,9 @@ class QnapClient:
         except Exception as exc:
             logger.debug("QNAP logout: %s", exc)
         finally:
+            cached = _session_cache.get(self._session_key)
+            if cached and cached[0] == self._sid:
+                _session_cache.pop(self._session_key, None)
             self._sid = None
 
     async def get_firmware_version(self) -> str:
@@ -197,7 +253,8 @@ class QnapClient:
 
     async def test_connection(self) -> ConnectionTestResult:
         try:
-            await self.login()
+            # Verifica le credenziali attuali, non un SID in cache
+            await self.login(force=True)
             version = await self.get_firmware_version()
             shares = await self.list_children("/")
             await self.logout()
@@ -210,15 +267,19 @@ class QnapClient:
             logger.warning("QNAP test_connection failed: %s", exc)
             return ConnectionTestResult(success=False, message=str(exc))
 
-    async def _file_station(self, params: dict[str, Any]) -> list[dict[str, Any]]:
-        if not self._sid:
-            await self.login()
-        params = {**params, "sid": self._sid}
-        resp = await self._get("/cgi-bin/filemanager/utilRequest.cgi", params)
+    async def _file_station(self, params: dict[str, Any], *, retry_auth: bool = True) -> list[dict[str, Any]]:
+        await self._ensure_session()
+        resp = await self._get("/cgi-bin/filemanager/utilRequest.cgi", {**params, "sid": self._sid})
         try:
             data = resp.json()
         except ValueError as exc:
             raise RuntimeError("Risposta File Station QNAP non JSON") from exc
+        if retry_auth and _is_session_expired(data):
+            logger.info("QNAP session expired on %s — re-login", self.host)
+            self._sid = None
+            _session_cache.pop(self._session_key, None)
+            await self.login(force=True)
+            return await self._file_station(params, retry_auth=False)
         return _parse_file_station_items(data)
 
     async def list_children(
@@ -228,8 +289,7 @@ class QnapClient:
     ) -> list[BrowseEntryOut]:
         presets = exclude_presets or DEFAULT_EXCLUDE_PRESETS
         path = sanitize_path(path)
-        if not self._sid:
-            await self.login()
+        await self._ensure_session()
 
         if path in ("/", ""):
             nodes = await self._file_station(
@@ -0,0 +1,218 @@
+"""Staging persistente per job (replica a due salti: pull sul server dapx, push su QNAP).
+
+Con lo staging temporaneo ogni run riscaricava l'intero dataset sul server
+dapx e lo cancellava a fine job, così il pull non era mai incrementale.
+Con ``persistent_staging`` attivo il job usa ``<root>/job-<id>/``, che
+resta tra un run e l'altro: il pull (``rsync --delete``) trasferisce solo
+le differenze come il push.
+
+Lo spazio è condiviso tra i job: oltre ``DAPX_FILE_REPL_STAGING_QUOTA_GB``
+in totale, o con meno di ``DAPX_FILE_REPL_STAGING_MIN_FREE_GB`` liberi sul
+filesystem, vengono eliminati gli staging usati meno di recente (mai
+quelli di un job in esecuzione). Il job il cui staging è stato eliminato
+riparte con un pull completo al run successivo.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Callable, Iterable, Optional
+
+from database import DATABASE_PATH
+
+logger = logging.getLogger(__name__)
+
+_GB = 1024 ** 3
+_META_FILE = ".dapx-staging.json"
+
+
+def _env_gb(name: str, default: float) -> int:
+    try:
+        return int(float(os.environ.get(name, default)) * _GB)
+    except (TypeError, ValueError):
+        return int(default * _GB)
+
+
+STAGING_ROOT = os.environ.get("DAPX_FILE_REPL_STAGING_DIR") or os.path.join(
+    os.path.dirname(DATABASE_PATH), "staging", "file_replication"
+)
+# 0 = nessun tetto sul totale (resta il minimo di spazio libero)
+STAGING_QUOTA_BYTES = max(0, _env_gb("DAPX_FILE_REPL_STAGING_QUOTA_GB", 0))
+STAGING_MIN_FREE_BYTES = max(0, _env_gb("DAPX_FILE_REPL_STAGING_MIN_FREE_GB", 20))
+
+# Job con lo staging in uso (esclusi dall'evizione)
+_in_use: set[int] = set()
+# Staging da eliminare a fine run (job cancellato o staging disattivato
+# mentre era in esecuzione)
+_pending_removal: set[int] = set()
+
+
+def job_staging_dir(job_id: int) -> str:
+    return os.path.join(STAGING_ROOT, f"job-{job_id}")
+
+
+def _read_meta(path: str) -> dict:
+    try:
+        with open(os.path.join(path, _META_FILE)) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(path: str, **fields) -> None:
+    meta = {**_read_meta(path), **fields}
+    tmp = os.path.join(path, _META_FILE + ".tmp")
+    with open(tmp, "w") as fh:
+        json.dump(meta, fh)
+    os.replace(tmp, os.path.join(path, _META_FILE))
+
+
+def list_entries() -> list[dict]:
+    """Staging presenti: job, percorso, ultimo uso, dimensione all'ultimo run."""
+    if not os.path.isdir(STAGING_ROOT):
+        return []
+    entries = []
+    for name in os.listdir(STAGING_ROOT):
+        path = os.path.join(STAGING_ROOT, name)
+        if not name.startswith("job-") or not os.path.isdir(path):
+            continue
+        try:
+            job_id = int(name[4:])
+        except ValueError:
+            continue
+        meta = _read_meta(path)
+        entries.append({
+            "job_id": job_id,
+            "path": path,
+            "last_used": float(meta.get("last_used") or os.path.getmtime(path)),
+            "size_bytes": int(meta.get("size_bytes") or 0),
+            "in_use": job_id in _in_use,
+        })
+    return sorted(entries, key=lambda e: e["last_used"])
+
+
+def remove(job_id: int) -> bool:
+    """Elimina lo staging di un job (job cancellato, staging disattivato).
+
+    Se il job è in esecuzione l'eliminazione viene rimandata a ``release``.
+    """
+    path = job_staging_dir(job_id)
+    if job_id in _in_use:
+        _pending_removal.add(job_id)
+        return False
+    if not os.path.isdir(path):
+        return False
+    shutil.rmtree(path, ignore_errors=True)
+    return True
+
+
+def cancel_removal(job_id: int) -> None:
+    """Annulla l'eliminazione rimandata (staging riattivato durante il run)."""
+    _pending_removal.discard(job_id)
+
+
+def enforce_quota(
+    quota_bytes: Optional[int] = None,
+    min_free_bytes: Optional[int] = None,
+    *,
+    disk_free: Callable[[str], int] = lambda p: shutil.disk_usage(p).free,
+) -> list[int]:
+    """Evizione LRU degli staging non in uso; ritorna i job eliminati."""
+    quota = STAGING_QUOTA_BYTES if quota_bytes is None else quota_bytes
+    min_free = STAGING_MIN_FREE_BYTES if min_free_bytes is None else min_free_bytes
+    entries = list_entries()
+    total = sum(e["size_bytes"] for e in entries)
+    free = disk_free(STAGING_ROOT) if entries else 0
+    evicted: list[int] = []
+    for entry in entries:
+        over_quota = quota and total > quota
+        low_space = min_free and free < min_free
+        if not (over_quota or low_space):
+            break
+        if entry["in_use"]:
+            continue
+        shutil.rmtree(entry["path"], ignore_errors=True)
+        total -= entry["size_bytes"]
+        free += entry["size_bytes"]
+        evicted.append(entry["job_id"])
+        logger.info(
+            "Staging job %s eliminato (LRU, %d MB): quota %s, spazio libero %d MB",
+            entry["job_id"], entry["size_bytes"] // 1024 ** 2,
+            f"{quota // _GB} GB" if quota else "illimitata", free // 1024 ** 2,
+        )
+    return evicted
+
+
+def acquire(job_id: int, keep: Iterable[str]) -> str:
+    """Prepara lo staging del job e lo marca in uso.
+
+    ``keep`` sono le sottocartelle del piano corrente: quelle di path
+    sorgente rimossi dal job vengono eliminate.
+    """
+    path = job_staging_dir(job_id)
+    os.makedirs(path, exist_ok=True)
+    _in_use.add(job_id)
+    keep_names = set(keep) | {_META_FILE}
+    for name in os.listdir(path):
+        if name not in keep_names:
+            stale = os.path.join(path, name)
+            if os.path.isdir(stale):
+                shutil.rmtree(stale, ignore_errors=True)
+            else:
+                os.unlink(stale)
+    _write_meta(path, job_id=job_id, last_used=time.time())
+    # Libera spazio per il pull prima di iniziare (mai lo staging corrente)
+    enforce_quota()
+    return path
+
+
+def _walk_size(path: str) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+async def _measure(path: str) -> int:
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            "du", "-sb", path,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        out, _ = await proc.communicate()
+        if proc.returncode == 0 and out:
+            return int(out.split()[0])
+    except (OSError, ValueError):
+        pass
+    return await asyncio.to_thread(_walk_size, path)
+
+
+async def release(job_id: int) -> None:
+    """Fine run: registra dimensione e ultimo uso, poi applica la quota.
+
+    Esegue l'eliminazione chiesta da ``remove`` durante il run.
+    """
+    path = job_staging_dir(job_id)
+    if job_id in _pending_removal:
+        _in_use.discard(job_id)
+        _pending_removal.discard(job_id)
+        await asyncio.to_thread(shutil.rmtree, path, True)
+        logger.info("Staging job %s eliminato a fine run (rimozione richiesta durante il run)", job_id)
+        return
+    try:
+        if os.path.isdir(path):
+            _write_meta(path, last_used=time.time(), size_bytes=await _measure(path))
+    finally:
+        _in_use.discard(job_id)
+    # rmtree di staging grandi: fuori dall'event loop
+    await asyncio.to_thread(enforce_quota)
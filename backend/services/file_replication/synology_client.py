@@ -12,6 +12,7 @@ import httpx
 from services.file_replication.connection_errors import format_connection_error
 from services.file_replication.path_utils import is_excluded_name, sanitize_path
 from services.file_replication_schemas import BrowseEntryOut, ConnectionTestResult
+from services.http_pool import http_pool
 
 logger = logging.getLogger(__name__)
 
@@ -95,14 +96,14 @@ class SynologyClient:
             req_params["_sid"] = self._sid
 
         try:
-            async with httpx.AsyncClient(verify=self.verify_ssl, timeout=30.0) as client:
-                resp = await client.get(
-                    f"{self._base}{path}",
-                    params=req_params,
-                    headers=self._auth_headers(),
-                )
-                resp.raise_for_status()
-                data = resp.json()
+            client = http_pool.client(self._base, self.verify_ssl)
+            resp = await client.get(
+                f"{self._base}{path}",
+                params=req_params,
+                headers=self._auth_headers(),
+            )
+            resp.raise_for_status()
+            data = resp.json()
         except httpx.HTTPError as exc:
             raise RuntimeError(format_connection_error(self.host, self.port, exc)) from exc
 
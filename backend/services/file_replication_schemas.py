@@ -89,13 +89,16 @@ class FileReplicationJobCreate(BaseModel):
     dest_endpoint_id: int
     source_paths: list[str] = Field(min_length=1)
     dest_staging_path: str
-    sync_method: str = "rsync_ssh"
+    # rsync_ssh: pull/push via staging dapx; tar_stream: pipe tar diretto
+    sync_method: str = Field("rsync_ssh", pattern="^(rsync_ssh|tar_stream)$")
     delete_on_dest: bool = True
     on_source_delete: str = "keep"
     exclude_presets: list[str] = Field(default_factory=lambda: ["nas_snapshots", "system_files"])
     exclude_patterns: list[str] = Field(default_factory=list)
     bandwidth_limit_kb: Optional[int] = None
     extra_rsync_args: Optional[str] = None
+    persistent_staging: bool = False
+    stream_compression: Optional[str] = Field(None, pattern="^(zstd|lz4)$")
     snapshot_policy_hint: Optional[SnapshotPolicyHint] = None
     schedule: Optional[str] = None
     schedule_config: Optional[dict[str, Any]] = None
@@ -109,13 +112,15 @@ class FileReplicationJobUpdate(BaseModel):
     description: Optional[str] = None
     source_paths: Optional[list[str]] = None
     dest_staging_path: Optional[str] = None
-    sync_method: Optional[str] = None
+    sync_method: Optional[str] = Field(None, pattern="^(rsync_ssh|tar_stream)$")
     delete_on_dest: Optional[bool] = None
     on_source_delete: Optional[str] = None
     exclude_presets: Optional[list[str]] = None
     exclude_patterns: Optional[list[str]] = None
     bandwidth_limit_kb: Optional[int] = None
     extra_rsync_args: Optional[str] = None
+    persistent_staging: Optional[bool] = None
+    stream_compression: Optional[str] = Field(None, pattern="^(zstd|lz4)$")
     snapshot_policy_hint: Optional[SnapshotPolicyHint] = None
     schedule: Optional[str] = None
     schedule_config: Optional[dict[str, Any]] = None
@@ -138,6 +143,9 @@ class FileReplicationJobOut(BaseModel):
     exclude_presets: list[str]
     exclude_patterns: list[str]
     bandwidth_limit_kb: Optional[int] = None
+    persistent_staging: bool = False
+    stream_compression: Optional[str] = None
+    stream_resume_pending: bool = False
     immutability_strategy: str
     snapshot_policy_hint: Optional[dict[str, Any]] = None
     schedule: Optional[str] = None
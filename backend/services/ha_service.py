@@ -11,41 +11,19 @@ import time
 import asyncio
 
 from services.ssh_service import ssh_service
+from services.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
-# Simple in-memory cache with TTL
-class HACache:
-    """Cache in-memory con TTL per dati HA"""
-    def __init__(self, default_ttl: int = 60):
-        self._cache: Dict[str, Tuple[Any, float]] = {}
-        self._default_ttl = default_ttl
-        self._lock = asyncio.Lock()
-    
-    def get(self, key: str) -> Optional[Any]:
-        """Ottieni valore dalla cache se non scaduto"""
-        if key in self._cache:
-            value, expires = self._cache[key]
-            if time.time() < expires:
-                return value
-            else:
-                del self._cache[key]
-        return None
-    
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
-        """Imposta valore in cache con TTL"""
-        expires = time.time() + (ttl or self._default_ttl)
-        self._cache[key] = (value, expires)
-    
-    def invalidate(self, key: str = None) -> None:
-        """Invalida una chiave specifica o tutta la cache"""
-        if key:
-            self._cache.pop(key, None)
-        else:
-            self._cache.clear()
+# Risorse e gruppi HA (pvesh): servito scaduto fino a 60s oltre il TTL mentre
+# si rilegge in background; invalidato da ogni modifica fatta da qui
+_ha_cache = TTLCache("ha", ttl=60, max_entries=256, stale_ttl=60)
 
-# Global cache instance (60 secondi TTL default)
-_ha_cache = HACache(default_ttl=60)
+
+def _invalidate_cluster_wide(prefix: str) -> None:
+    """La configurazione HA è di cluster: la cache è per hostname, quindi
+    una modifica invalida le voci di tutti i nodi."""
+    _ha_cache.invalidate(prefix=prefix)
 
 
 class HAService:
@@ -118,31 +96,24 @@ class HAService:
         """
         Lista risorse HA configurate.
         """
-        cache_key = f"ha_resources:{hostname}"
-        
-        if use_cache:
-            cached = _ha_cache.get(cache_key)
-            if cached is not None:
-                logger.debug(f"HA resources cache HIT for {hostname}")
-                return cached
-        
-        result = await ssh_service.execute(
-            hostname=hostname,
-            command="pvesh get /cluster/ha/resources --output-format json 2>/dev/null",
-            port=port,
-            username=username,
-            key_path=key_path
-        )
+        async def _load() -> List[Dict[str, Any]]:
+            result = await ssh_service.execute(
+                hostname=hostname,
+                command="pvesh get /cluster/ha/resources --output-format json 2>/dev/null",
+                port=port,
+                username=username,
+                key_path=key_path
+            )
         
-        resources = []
-        if result.success and result.stdout.strip():
-            try:
-                resources = json.loads(result.stdout)
-            except json.JSONDecodeError:
-                logger.warning(f"Failed to parse HA resources JSON from {hostname}")
+            resources = []
+            if result.success and result.stdout.strip():
+                try:
+                    resources = json.loads(result.stdout)
+                except json.JSONDecodeError:
+                    logger.warning(f"Failed to parse HA resources JSON from {hostname}")
+            return resources
         
-        _ha_cache.set(cache_key, resources)
-        return resources
+        return await _ha_cache.get_or_load(f"ha_resources:{hostname}", _load, force=not use_cache)
     
     async def get_ha_groups(
         self,
@@ -155,31 +126,24 @@ class HAService:
         """
         Lista gruppi HA configurati.
         """
-        cache_key = f"ha_groups:{hostname}"
-        
-        if use_cache:
-            cached = _ha_cache.get(cache_key)
-            if cached is not None:
-                logger.debug(f"HA groups cache HIT for {hostname}")
-                return cached
-        
-        result = await ssh_service.execute(
-            hostname=hostname,
-            command="pvesh get /cluster/ha/groups --output-format json 2>/dev/null",
-            port=port,
-            username=username,
-            key_path=key_path
-        )
+        async def _load() -> List[Dict[str, Any]]:
+            result = await ssh_service.execute(
+                hostname=hostname,
+                command="pvesh get /cluster/ha/groups --output-format json 2>/dev/null",
+                port=port,
+                username=username,
+                key_path=key_path
+            )
         
-        groups = []
-        if result.success and result.stdout.strip():
-            try:
-                groups = json.loads(result.stdout)
-            except json.JSONDecodeError:
-                logger.warning(f"Failed to parse HA groups JSON from {hostname}")
+            groups = []
+            if result.success and result.stdout.strip():
+                try:
+                    groups = json.loads(result.stdout)
+                except json.JSONDecodeError:
+                    logger.warning(f"Failed to parse HA groups JSON from {hostname}")
+            return groups
         
-        _ha_cache.set(cache_key, groups)
-        return groups
+        return await _ha_cache.get_or_load(f"ha_groups:{hostname}", _load, force=not use_cache)
     
     async def add_resource_to_ha(
         self,
@@ -213,6 +177,7 @@ class HAService:
         )
         
         if result.success:
+            _invalidate_cluster_wide("ha_resources:")
             return True, f"Risorsa {sid} aggiunta all'HA"
         else:
             return False, f"Errore: {result.stderr}"
@@ -240,6 +205,7 @@ class HAService:
         )
         
         if result.success:
+            _invalidate_cluster_wide("ha_resources:")
             return True, f"Risorsa {sid} rimossa dall'HA"
         else:
             return False, f"Errore: {result.stderr}"
@@ -268,6 +234,7 @@ class HAService:
         )
         
         if result.success:
+            _invalidate_cluster_wide("ha_resources:")
             return True, f"Stato di {sid} impostato a {state}"
         else:
             return False, f"Errore: {result.stderr}"
@@ -305,6 +272,7 @@ class HAService:
         )
         
         if result.success:
+            _invalidate_cluster_wide("ha_groups:")
             return True, f"Gruppo HA '{group_name}' creato"
         else:
             return False, f"Errore: {result.stderr}"
@@ -329,6 +297,7 @@ class HAService:
         )
         
         if result.success:
+            _invalidate_cluster_wide("ha_groups:")
             return True, f"Gruppo HA '{group_name}' eliminato"
         else:
             return False, f"Errore: {result.stderr}"
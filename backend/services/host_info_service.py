@@ -3,19 +3,25 @@ Host Info Service - Raccolta informazioni dettagliate host Proxmox
 Ispirato a Proxreporter per raccogliere dati hardware, storage, network, etc.
 """
 
+import asyncio
 import json
 import re
 import os
+import time
 import aiofiles
 import logging
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
 
 from services.ssh_service import ssh_service
+from services.dashboard_aggregate import dashboard_aggregate
 from database import SessionLocal, Node
 
 logger = logging.getLogger(__name__)
 
+# Sezioni (probe SSH) raccolte in parallelo per un singolo host.
+HOST_PROBE_CONCURRENCY = 4
+
 
 class HostInfoService:
     """Servizio per raccogliere informazioni dettagliate sugli host Proxmox"""
@@ -46,63 +52,65 @@ class HostInfoService:
             "temperature": {},
             "license": {}
         }
-        
-        # Info base
+        args = (hostname, port, username, key_path)
+
+        # Le sezioni sono indipendenti: girano in parallelo, limitate per host
+        # (HOST_PROBE_CONCURRENCY) così un refresh non occupa tutti i canali
+        # SSH del nodo. Ogni sezione registra la propria durata.
+        probes: Dict[str, Any] = {}
         if node_type == "pve":
-            node_info = await self._get_node_info_via_pvesh(hostname, port, username, key_path)
-            if node_info:
-                result.update(node_info)
+            probes["node"] = self._get_node_info_via_pvesh(*args)
+            probes["guests"] = self._get_guests_list(*args)
         else:
             # Fallback per PBS/Linux
-            node_info = await self._get_node_info_linux(hostname, port, username, key_path)
-            if node_info:
-                result.update(node_info)
-        
-        # CPU info
+            probes["node"] = self._get_node_info_linux(*args)
         if include_hardware:
-            cpu_info = await self._get_cpu_info(hostname, port, username, key_path)
-            if cpu_info:
-                result["cpu"] = cpu_info
-            
-            # Memory info
-            memory_info = await self._get_memory_info(hostname, port, username, key_path)
-            if memory_info:
-                result["memory"] = memory_info
-            
-            # Temperature
-            temp_info = await self._get_temperature_readings(hostname, port, username, key_path)
-            if temp_info:
-                result["temperature"] = temp_info
-        
-        # Storage info
+            probes["cpu"] = self._get_cpu_info(*args)
+            probes["memory"] = self._get_memory_info(*args)
+            probes["temperature"] = self._get_temperature_readings(*args)
+            probes["hardware"] = self._get_hardware_info(*args)
         if include_storage:
-            storage_list = await self._get_storage_details(hostname, port, username, key_path, node_type=node_type)
-            if storage_list:
-                result["storage"] = storage_list
-        
-        # Network info
+            probes["storage"] = self._get_storage_details(*args, node_type=node_type)
         if include_network:
-            network_list = await self._get_network_details(hostname, port, username, key_path)
-            if network_list:
-                result["network"] = network_list
-        
+            probes["network"] = self._get_network_details(*args)
+        probes["license"] = self._get_license_info(*args)
+
+        semaphore = asyncio.Semaphore(HOST_PROBE_CONCURRENCY)
+        timings: Dict[str, float] = {}
+
+        async def _timed(section: str, coro):
+            async with semaphore:
+                t0 = time.monotonic()
+                try:
+                    return await coro
+                except Exception as e:
+                    logger.error(f"Errore sezione {section} su {hostname}: {e}")
+                    return None
+                finally:
+                    timings[section] = round((time.monotonic() - t0) * 1000, 1)
+
+        started = time.monotonic()
+        values = await asyncio.gather(
+            *[_timed(section, coro) for section, coro in probes.items()]
+        )
+        collected = dict(zip(probes.keys(), values))
+
+        # Info base
+        if collected.get("node"):
+            result.update(collected["node"])
+        for section in ("cpu", "memory", "temperature", "storage", "network", "license"):
+            if collected.get(section):
+                result[section] = collected[section]
         # Guests (VMs/CTs) - only for PVE nodes
-        if node_type == "pve":
-            guests_list = await self._get_guests_list(hostname, port, username, key_path)
-            if guests_list:
-                result["guests"] = guests_list
-        
-        # Hardware info
-        if include_hardware:
-            hardware_info = await self._get_hardware_info(hostname, port, username, key_path)
-            if hardware_info:
-                result["hardware"] = hardware_info
-        
-        # License info
-        license_info = await self._get_license_info(hostname, port, username, key_path)
-        if license_info:
-            result["license"] = license_info
-        
+        if collected.get("guests"):
+            result["guests"] = collected["guests"]
+        if collected.get("hardware"):
+            result["hardware"] = collected["hardware"]
+
+        result["collection"] = {
+            "total_ms": round((time.monotonic() - started) * 1000, 1),
+            "sections_ms": timings,
+        }
         return result
 
     async def get_host_details(
@@ -156,6 +164,7 @@ class HostInfoService:
                 node.host_info = details
                 node.host_info_updated_at = datetime.utcnow()
                 db.commit()
+                dashboard_aggregate.invalidate(node.id)
                 logger.info(f"Dati host aggiornati per {node.name}")
                 return details
             else:
@@ -177,25 +186,21 @@ class HostInfoService:
     ) -> Optional[Dict[str, Any]]:
         """Ottiene info base del nodo via pvesh"""
         try:
-            # Ottieni hostname del nodo
-            cmd = "hostname"
-            result = await ssh_service.execute(hostname, cmd, port, username, key_path)
-            node_name = result.stdout.strip() if result.success else hostname
-            
-            # Info versione Proxmox (solo numero versione)
-            cmd = "pveversion 2>/dev/null | grep -oE '[0-9]+\\.[0-9]+\\.[0-9]+' | head -1"
-            result = await ssh_service.execute(hostname, cmd, port, username, key_path)
-            proxmox_version = result.stdout.strip() if result.success and result.stdout.strip() else None
-            
-            # Kernel version (solo numero)
-            cmd = "uname -r"
-            result = await ssh_service.execute(hostname, cmd, port, username, key_path)
-            kernel_version = result.stdout.strip() if result.success else None
-            
-            # Uptime
-            cmd = "cat /proc/uptime | awk '{print int($1)}'"
+            # Un solo round-trip: hostname, versione PVE, kernel, uptime (una riga ciascuno)
+            # (echo "$(...)" garantisce una riga anche se il comando non stampa nulla)
+            cmd = (
+                'echo "$(hostname)"; '
+                "echo \"$(pveversion 2>/dev/null | grep -oE '[0-9]+\\.[0-9]+\\.[0-9]+' | head -1)\"; "
+                'echo "$(uname -r)"; '
+                "echo \"$(cat /proc/uptime | awk '{print int($1)}')\""
+            )
             result = await ssh_service.execute(hostname, cmd, port, username, key_path)
-            uptime_seconds = int(result.stdout.strip()) if result.success and result.stdout.strip().isdigit() else None
+            lines = result.stdout.split("\n") if result.success else []
+            lines += [""] * (4 - len(lines))
+            node_name = lines[0].strip() or hostname
+            proxmox_version = lines[1].strip() or None
+            kernel_version = lines[2].strip() or None
+            uptime_seconds = int(lines[3].strip()) if lines[3].strip().isdigit() else None
             
             return {
                 "node_name": node_name,
@@ -651,9 +656,17 @@ class HostInfoService:
         try:
             network_details = []
             
-            # Prima ottieni configurazione base da pvesh
+            # pvesh (config), ip addr (stato) e route di default sono indipendenti:
+            # un round-trip concorrente ciascuno invece di uno per interfaccia.
             cmd = "pvesh get /nodes/$(hostname)/network --output-format json 2>/dev/null"
-            result = await ssh_service.execute(hostname, cmd, port, username, key_path)
+            result, addr_result, gateways = await asyncio.gather(
+                ssh_service.execute(hostname, cmd, port, username, key_path),
+                ssh_service.execute(
+                    hostname, "ip -j addr show 2>/dev/null || ip addr show 2>/dev/null",
+                    port, username, key_path,
+                ),
+                self._get_default_gateways(hostname, port, username, key_path),
+            )
             
             pvesh_interfaces = {}
             if result.success and result.stdout.strip():
@@ -666,9 +679,8 @@ class HostInfoService:
                 except json.JSONDecodeError:
                     pass
             
-            # Ottieni informazioni dettagliate da ip addr
-            cmd = "ip -j addr show 2>/dev/null || ip addr show 2>/dev/null"
-            result = await ssh_service.execute(hostname, cmd, port, username, key_path)
+            # Informazioni dettagliate da ip addr
+            result = addr_result
             
             if not result.success:
                 # Fallback a ifconfig
@@ -717,8 +729,8 @@ class HostInfoService:
                     if iface_info.get("status", "").upper() == "DOWN":
                         continue
                     
-                    # Ottieni gateway per questa interfaccia
-                    gateway = await self._get_interface_gateway(hostname, port, username, key_path, iface_name)
+                    # Gateway per questa interfaccia (route di default già lette)
+                    gateway = self._gateway_for(gateways, iface_name)
                     if gateway:
                         iface_info["gateway"] = gateway
                     
@@ -737,7 +749,7 @@ class HostInfoService:
                     if status == "DOWN" or state == "down":
                         continue
                     
-                    gateway = await self._get_interface_gateway(hostname, port, username, key_path, iface_info["name"])
+                    gateway = self._gateway_for(gateways, iface_info["name"])
                     if gateway:
                         iface_info["gateway"] = gateway
                     filtered_details.append(iface_info)
@@ -753,84 +765,56 @@ class HostInfoService:
         username: str,
         key_path: str = None
     ) -> List[Dict[str, Any]]:
-        """Ottiene lista VMs e CTs con configurazione di rete"""
-        guests = []
-        
+        """Ottiene lista VMs e CTs con configurazione di rete.
+
+        Le due liste e poi le config dei singoli guest sono lette in parallelo
+        (limitato a HOST_PROBE_CONCURRENCY) invece che una dopo l'altra."""
         try:
-            # Fetch VMs (qemu)
-            cmd = "pvesh get /nodes/$(hostname)/qemu --output-format json 2>/dev/null"
-            result = await ssh_service.execute(hostname, cmd, port, username, key_path)
-            
-            if result.success and result.stdout.strip():
-                try:
-                    vms = json.loads(result.stdout)
-                    for vm in vms:
-                        vmid = vm.get("vmid")
-                        guest_info = {
-                            "id": vmid,
-                            "name": vm.get("name", f"VM {vmid}"),
-                            "type": "vm",
-                            "status": vm.get("status", "unknown"),
-                            "networks": []
-                        }
-                        
-                        # Fetch VM config for network details
-                        config_cmd = f"pvesh get /nodes/$(hostname)/qemu/{vmid}/config --output-format json 2>/dev/null"
-                        cfg_result = await ssh_service.execute(hostname, config_cmd, port, username, key_path)
-                        
-                        if cfg_result.success and cfg_result.stdout.strip():
-                            try:
-                                cfg = json.loads(cfg_result.stdout)
-                                # Parse network interfaces (net0, net1, etc)
-                                for key, val in cfg.items():
-                                    if key.startswith("net") and isinstance(val, str):
-                                        net_info = self._parse_guest_network_config(key, val)
-                                        if net_info:
-                                            guest_info["networks"].append(net_info)
-                            except json.JSONDecodeError:
-                                pass
-                        
-                        guests.append(guest_info)
-                except json.JSONDecodeError:
-                    pass
-            
-            # Fetch CTs (lxc)
-            cmd = "pvesh get /nodes/$(hostname)/lxc --output-format json 2>/dev/null"
-            result = await ssh_service.execute(hostname, cmd, port, username, key_path)
-            
-            if result.success and result.stdout.strip():
-                try:
-                    cts = json.loads(result.stdout)
-                    for ct in cts:
-                        ctid = ct.get("vmid")
-                        guest_info = {
-                            "id": ctid,
-                            "name": ct.get("name", f"CT {ctid}"),
-                            "type": "ct",
-                            "status": ct.get("status", "unknown"),
-                            "networks": []
-                        }
-                        
-                        # Fetch CT config for network details
-                        config_cmd = f"pvesh get /nodes/$(hostname)/lxc/{ctid}/config --output-format json 2>/dev/null"
-                        cfg_result = await ssh_service.execute(hostname, config_cmd, port, username, key_path)
-                        
-                        if cfg_result.success and cfg_result.stdout.strip():
-                            try:
-                                cfg = json.loads(cfg_result.stdout)
-                                for key, val in cfg.items():
-                                    if key.startswith("net") and isinstance(val, str):
-                                        net_info = self._parse_guest_network_config(key, val)
-                                        if net_info:
-                                            guest_info["networks"].append(net_info)
-                            except json.JSONDecodeError:
-                                pass
-                        
-                        guests.append(guest_info)
-                except json.JSONDecodeError:
-                    pass
-            
-            return guests
+            list_results = await asyncio.gather(*[
+                ssh_service.execute(
+                    hostname,
+                    f"pvesh get /nodes/$(hostname)/{kind} --output-format json 2>/dev/null",
+                    port, username, key_path,
+                )
+                for kind in ("qemu", "lxc")
+            ])
+            entries: List[Tuple[str, Dict[str, Any]]] = []
+            for kind, result in zip(("qemu", "lxc"), list_results):
+                if result.success and result.stdout.strip():
+                    try:
+                        entries.extend((kind, item) for item in json.loads(result.stdout))
+                    except json.JSONDecodeError:
+                        pass
+
+            semaphore = asyncio.Semaphore(HOST_PROBE_CONCURRENCY)
+
+            async def _guest(kind: str, item: Dict[str, Any]) -> Dict[str, Any]:
+                vmid = item.get("vmid")
+                label = "VM" if kind == "qemu" else "CT"
+                guest_info = {
+                    "id": vmid,
+                    "name": item.get("name", f"{label} {vmid}"),
+                    "type": "vm" if kind == "qemu" else "ct",
+                    "status": item.get("status", "unknown"),
+                    "networks": []
+                }
+                # Config del guest per i dettagli di rete (net0, net1, ...)
+                config_cmd = f"pvesh get /nodes/$(hostname)/{kind}/{vmid}/config --output-format json 2>/dev/null"
+                async with semaphore:
+                    cfg_result = await ssh_service.execute(hostname, config_cmd, port, username, key_path)
+                if cfg_result.success and cfg_result.stdout.strip():
+                    try:
+                        cfg = json.loads(cfg_result.stdout)
+                        for key, val in cfg.items():
+                            if key.startswith("net") and isinstance(val, str):
+                                net_info = self._parse_guest_network_config(key, val)
+                                if net_info:
+                                    guest_info["networks"].append(net_info)
+                    except json.JSONDecodeError:
+                        pass
+                return guest_info
+
+            return list(await asyncio.gather(*[_guest(kind, item) for kind, item in entries]))
         except Exception as e:
             logger.error(f"Errore raccolta guests: {e}")
             return []
@@ -871,23 +855,35 @@ class HostInfoService:
         except:
             return f"/{prefixlen}"
     
-    async def _get_interface_gateway(self, hostname: str, port: int, username: str, key_path: str, iface: str) -> Optional[str]:
-        """Ottiene il gateway per un'interfaccia"""
+    async def _get_default_gateways(
+        self, hostname: str, port: int, username: str, key_path: str
+    ) -> Tuple[Dict[str, str], Optional[str]]:
+        """Route di default del nodo in un solo comando: ({dev: gateway}, gateway principale)."""
+        by_dev: Dict[str, str] = {}
+        main_gw: Optional[str] = None
         try:
-            # Prova a ottenere il gateway dalla route table
-            cmd = f"ip route show dev {iface} | grep default | head -1 | awk '{{print $3}}'"
-            result = await ssh_service.execute(hostname, cmd, port, username, key_path)
-            if result.success and result.stdout.strip():
-                return result.stdout.strip()
-            
-            # Fallback: gateway principale
-            cmd = "ip route | grep default | head -1 | awk '{print $3}'"
-            result = await ssh_service.execute(hostname, cmd, port, username, key_path)
-            if result.success and result.stdout.strip():
-                return result.stdout.strip()
-        except:
+            result = await ssh_service.execute(
+                hostname, "ip route show default 2>/dev/null", port, username, key_path
+            )
+            if result.success:
+                for line in result.stdout.splitlines():
+                    via = re.search(r'\bvia\s+(\S+)', line)
+                    dev = re.search(r'\bdev\s+(\S+)', line)
+                    if not via:
+                        continue
+                    if main_gw is None:
+                        main_gw = via.group(1)
+                    if dev and dev.group(1) not in by_dev:
+                        by_dev[dev.group(1)] = via.group(1)
+        except Exception:
             pass
-        return None
+        return by_dev, main_gw
+
+    @staticmethod
+    def _gateway_for(gateways: Tuple[Dict[str, str], Optional[str]], iface: str) -> Optional[str]:
+        """Gateway per un'interfaccia: route di default sulla dev, altrimenti quella principale."""
+        by_dev, main_gw = gateways
+        return by_dev.get(iface) or main_gw
     
     def _parse_network_text(self, text: str, pvesh_interfaces: Dict) -> List[Dict[str, Any]]:
         """Parsa output testo di ifconfig o ip addr"""
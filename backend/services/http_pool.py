@@ -0,0 +1,191 @@
+"""
+Client HTTP persistenti per endpoint (keep-alive) condivisi dai client REST.
+
+I client Synology/QNAP aprivano un ``httpx.AsyncClient`` nuovo a ogni
+chiamata e ``PBSService`` una ``aiohttp.ClientSession`` per chiamata: ogni
+click nel browser cartelle pagava TCP + handshake TLS verso il NAS (1-2 s
+per livello via VPN). Qui:
+
+- un ``httpx.AsyncClient`` per ``scheme://host:port`` + verifica TLS,
+  riusato tra le richieste (HTTP/1.1 keep-alive) con pool limitato
+  (``DAPX_HTTP_POOL_MAX_CONNECTIONS``);
+- un ``SSLContext`` per modalità di verifica, condiviso tra i client
+  (il CA bundle non viene ricaricato a ogni client);
+- i client inutilizzati da più di ``DAPX_HTTP_POOL_IDLE_TIMEOUT`` secondi
+  vengono chiusi; i client creati su un event loop diverso (test,
+  executor) vengono sostituiti;
+- i cookie di risposta non vengono conservati: il client è condiviso tra
+  utenti diversi dello stesso endpoint, le credenziali (SID, ticket)
+  restano esplicite nella richiesta;
+- metriche per endpoint da ``http_pool.stats()``
+  (``GET /api/settings/diagnostics/http-pool``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import ssl
+import time
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+HTTP_POOL_MAX_CONNECTIONS = max(1, _env_int("DAPX_HTTP_POOL_MAX_CONNECTIONS", 8))
+HTTP_POOL_IDLE_TIMEOUT_SECONDS = max(10, _env_int("DAPX_HTTP_POOL_IDLE_TIMEOUT", 300))
+HTTP_POOL_TIMEOUT_SECONDS = 30.0
+
+# Orologio dell'inattività (sostituibile nei test)
+_now = time.monotonic
+
+
+def _no_cookies() -> CookieJar:
+    """Jar che rifiuta ogni Set-Cookie (client condiviso tra utenti)."""
+    return CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+
+
+class _PooledClient:
+    def __init__(self, client: httpx.AsyncClient, loop: asyncio.AbstractEventLoop):
+        self.client = client
+        self.loop = loop
+        self.created = _now()
+        self.last_used = self.created
+        self.requests = 0
+
+
+class HttpClientPool:
+    """Registro dei client HTTP keep-alive per endpoint."""
+
+    def __init__(
+        self,
+        max_connections: int = HTTP_POOL_MAX_CONNECTIONS,
+        idle_timeout: int = HTTP_POOL_IDLE_TIMEOUT_SECONDS,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self._max_connections = max_connections
+        self._idle_timeout = idle_timeout
+        # Transport alternativo (MockTransport nei test)
+        self._transport = transport
+        self._clients: Dict[Tuple[str, bool], _PooledClient] = {}
+        self._ssl_contexts: Dict[bool, ssl.SSLContext] = {}
+        self._created = 0
+        self._evicted = 0
+        self._last_eviction = _now()
+
+    def _ssl_context(self, verify: bool) -> ssl.SSLContext:
+        ctx = self._ssl_contexts.get(verify)
+        if ctx is None:
+            ctx = ssl.create_default_context()
+            if not verify:
+                ctx.check_hostname = False
+                ctx.verify_mode = ssl.CERT_NONE
+            self._ssl_contexts[verify] = ctx
+        return ctx
+
+    def client(self, base_url: str, verify: bool = False) -> httpx.AsyncClient:
+        """Client condiviso per ``base_url`` (``scheme://host:port``)."""
+        loop = asyncio.get_running_loop()
+        now = _now()
+        if now - self._last_eviction > 60:
+            self.evict_idle(now)
+        key = (base_url.rstrip("/"), bool(verify))
+        entry = self._clients.get(key)
+        if entry is None or entry.loop is not loop or entry.client.is_closed:
+            if entry is not None:
+                self._discard(entry)
+            limits = httpx.Limits(
+                max_connections=self._max_connections,
+                max_keepalive_connections=self._max_connections,
+                keepalive_expiry=self._idle_timeout,
+            )
+            entry = _PooledClient(
+                httpx.AsyncClient(
+                    verify=self._ssl_context(bool(verify)),
+                    timeout=HTTP_POOL_TIMEOUT_SECONDS,
+                    limits=limits,
+                    cookies=_no_cookies(),
+                    transport=self._transport,
+                ),
+                loop,
+            )
+            self._clients[key] = entry
+            self._created += 1
+        entry.last_used = now
+        entry.requests += 1
+        return entry.client
+
+    def _discard(self, entry: _PooledClient) -> None:
+        """Chiude un client (in background se il suo loop è ancora vivo)."""
+        if entry.client.is_closed or entry.loop.is_closed():
+            return
+        try:
+            if entry.loop is asyncio.get_running_loop():
+                task = entry.loop.create_task(entry.client.aclose())
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            else:
+                asyncio.run_coroutine_threadsafe(entry.client.aclose(), entry.loop)
+        except Exception as exc:
+            logger.debug(f"HTTP pool: chiusura client fallita: {exc}")
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Chiude i client inutilizzati da più di ``idle_timeout`` secondi."""
+        now = _now() if now is None else now
+        stale = [k for k, e in self._clients.items() if now - e.last_used > self._idle_timeout]
+        for key in stale:
+            self._discard(self._clients.pop(key))
+        self._evicted += len(stale)
+        self._last_eviction = now
+        if stale:
+            logger.debug(f"HTTP pool: chiusi {len(stale)} client inattivi")
+        return len(stale)
+
+    async def close_all(self) -> None:
+        """Chiude tutti i client (shutdown dell'app)."""
+        entries = list(self._clients.values())
+        self._clients.clear()
+        loop = asyncio.get_running_loop()
+        for entry in entries:
+            if entry.loop is loop and not entry.client.is_closed:
+                try:
+                    await entry.client.aclose()
+                except Exception:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        now = _now()
+        endpoints: List[Dict[str, Any]] = [
+            {
+                "base_url": base_url,
+                "verify_ssl": verify,
+                "requests": entry.requests,
+                "age_sec": round(now - entry.created, 1),
+                "idle_sec": round(now - entry.last_used, 1),
+            }
+            for (base_url, verify), entry in sorted(self._clients.items())
+        ]
+        return {
+            "config": {
+                "max_connections_per_endpoint": self._max_connections,
+                "idle_timeout_seconds": self._idle_timeout,
+            },
+            "clients": len(endpoints),
+            "created_total": self._created,
+            "evicted_idle": self._evicted,
+            "endpoints": endpoints,
+        }
+
+
+# Singleton instance
+http_pool = HttpClientPool()
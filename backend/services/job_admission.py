@@ -0,0 +1,262 @@
+"""
+Admission controller dei job schedulati.
+
+Lo scheduler impedisce solo il doppio fire dello stesso job; senza un
+controllo globale, allo scoccare dei cron più comuni (es. 01:00) partono
+insieme decine di syncoid, backup PBS e rsync NAS sugli stessi nodi e pool.
+Qui ogni run dichiara le risorse che impegna e attende un posto entro i
+budget di concorrenza:
+
+- ``global``: job contemporanei in totale;
+- ``node``:   job per nodo (sorgente o destinazione);
+- ``pool``:   job per pool ZFS di un nodo;
+- ``pbs``:    job per datastore PBS;
+- ``nas``:    job per endpoint NAS (Synology/QNAP).
+
+Un budget ``0`` disabilita il limite. La coda è ordinata per priorità e poi
+per ordine di arrivo; un job che non entra "prenota" le sue risorse, così
+quelli arrivati dopo non lo scavalcano all'infinito sulle stesse risorse
+(niente starvation) ma possono partire se usano risorse libere.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# Budget di default (override via env, vedi config.env.example, o da
+# Impostazioni → SystemConfig "admission_budgets"). Tutti 0: senza
+# configurazione esplicita le installazioni esistenti non vengono limitate.
+DEFAULT_BUDGETS: Dict[str, int] = {
+    "global": max(0, _env_int("DAPX_ADMISSION_GLOBAL", 0)),
+    "node": max(0, _env_int("DAPX_ADMISSION_PER_NODE", 0)),
+    "pool": max(0, _env_int("DAPX_ADMISSION_PER_POOL", 0)),
+    "pbs": max(0, _env_int("DAPX_ADMISSION_PER_DATASTORE", 0)),
+    "nas": max(0, _env_int("DAPX_ADMISSION_PER_NAS", 0)),
+}
+
+# Priorità per tipo di job (più basso = prima). Le operazioni brevi
+# (snapshot VM) passano davanti ai trasferimenti lunghi.
+DEFAULT_PRIORITY = 50
+KIND_PRIORITIES: Dict[str, int] = {
+    "vm_snapshot": 10,
+    "recovery_pbs": 20,
+    "sync": 30,
+    "vmgroup": 30,
+    "backup_pbs": 40,
+    "host_backup": 50,
+    "file_replication": 60,
+    "nas_sync": 60,
+    "migration": 70,
+}
+
+
+def node_resource(node_id) -> str:
+    return f"node:{node_id}"
+
+
+def pool_resource(node_id, dataset: Optional[str]) -> Optional[str]:
+    """Pool ZFS = primo componente del dataset ('rpool/data/x' -> 'rpool')."""
+    pool = (dataset or "").strip("/").split("/")[0]
+    return f"pool:{node_id}:{pool}" if pool else None
+
+
+def pbs_resource(pbs_node_id, datastore: Optional[str]) -> str:
+    return f"pbs:{pbs_node_id}:{datastore or 'default'}"
+
+
+def nas_resource(endpoint_id) -> str:
+    return f"nas:{endpoint_id}"
+
+
+def _resource_kind(resource: str) -> str:
+    return resource.split(":", 1)[0]
+
+
+class _Ticket:
+    __slots__ = (
+        "key", "label", "kind", "resources", "priority", "seq",
+        "enqueued_at", "started_at", "future", "detached",
+    )
+
+    def __init__(self, key, label, kind, resources, priority, seq, future):
+        self.key = key
+        self.label = label
+        self.kind = kind
+        self.resources = resources
+        self.priority = priority
+        self.seq = seq
+        self.enqueued_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.future = future
+        self.detached = False
+
+    def as_dict(self) -> Dict:
+        return {
+            "key": self.key,
+            "label": self.label,
+            "kind": self.kind,
+            "priority": self.priority,
+            "resources": sorted(self.resources),
+            "enqueued_at": self.enqueued_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+        }
+
+
+class AdmissionController:
+    """Coda con budget di concorrenza per risorsa. Da usare solo dal loop
+    asyncio dello scheduler (nessun lock: tutte le operazioni sono sincrone
+    tra due await)."""
+
+    def __init__(self, budgets: Optional[Dict[str, int]] = None):
+        self._budgets: Dict[str, int] = dict(DEFAULT_BUDGETS)
+        self._seq = itertools.count()
+        self._queue: List[_Ticket] = []
+        self._running: Dict[int, _Ticket] = {}
+        self._usage: Dict[str, int] = {}
+        if budgets:
+            self.set_budgets(budgets)
+
+    @property
+    def budgets(self) -> Dict[str, int]:
+        return dict(self._budgets)
+
+    def set_budgets(self, budgets: Dict[str, int]) -> None:
+        """Aggiorna i budget (chiavi sconosciute ignorate) e riesamina la coda."""
+        for name, value in (budgets or {}).items():
+            if name in DEFAULT_BUDGETS and value is not None:
+                self._budgets[name] = max(0, int(value))
+        self._pump()
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        key: str,
+        resources: Iterable[str] = (),
+        priority: Optional[int] = None,
+        label: Optional[str] = None,
+        kind: Optional[str] = None,
+    ):
+        """Attende un posto per il job e lo rilascia all'uscita."""
+        loop = asyncio.get_running_loop()
+        ticket = _Ticket(
+            key=key,
+            label=label or key,
+            kind=kind,
+            resources={r for r in resources if r},
+            priority=KIND_PRIORITIES.get(kind, DEFAULT_PRIORITY) if priority is None else priority,
+            seq=next(self._seq),
+            future=loop.create_future(),
+        )
+        self._queue.append(ticket)
+        self._queue.sort(key=lambda t: (t.priority, t.seq))
+        self._pump()
+        if not ticket.future.done():
+            logger.info(
+                f"Job {ticket.label} in coda (posizione {self._queue.index(ticket) + 1}, "
+                f"risorse: {', '.join(sorted(ticket.resources)) or '-'})"
+            )
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+            else:
+                self._release(ticket)
+            self._pump()
+            raise
+        try:
+            yield ticket
+        finally:
+            if not ticket.detached:
+                self._release(ticket)
+                self._pump()
+
+    def detach(self, ticket: _Ticket) -> Callable[[], None]:
+        """Sgancia il posto dall'uscita da ``slot`` (es. replica che prosegue
+        in un monitor in background): lo libera la funzione restituita,
+        idempotente."""
+        ticket.detached = True
+
+        def _done() -> None:
+            self._release(ticket)
+            self._pump()
+
+        return _done
+
+    def _fits(self, ticket: _Ticket) -> bool:
+        limit = self._budgets.get("global", 0)
+        if limit and len(self._running) >= limit:
+            return False
+        for res in ticket.resources:
+            limit = self._budgets.get(_resource_kind(res), 0)
+            if limit and self._usage.get(res, 0) >= limit:
+                return False
+        return True
+
+    def _pump(self) -> None:
+        """Ammette in ordine i job in coda che rientrano nei budget."""
+        reserved: set = set()
+        for ticket in list(self._queue):
+            global_limit = self._budgets.get("global", 0)
+            if global_limit and len(self._running) >= global_limit:
+                break
+            if ticket.resources & reserved or not self._fits(ticket):
+                reserved |= ticket.resources
+                continue
+            self._queue.remove(ticket)
+            self._admit(ticket)
+
+    def _admit(self, ticket: _Ticket) -> None:
+        ticket.started_at = datetime.utcnow()
+        self._running[id(ticket)] = ticket
+        for res in ticket.resources:
+            self._usage[res] = self._usage.get(res, 0) + 1
+        waited = (ticket.started_at - ticket.enqueued_at).total_seconds()
+        if waited >= 1:
+            logger.info(f"Job {ticket.label} ammesso dopo {waited:.0f}s in coda")
+        if not ticket.future.done():
+            ticket.future.set_result(True)
+
+    def _release(self, ticket: _Ticket) -> None:
+        if self._running.pop(id(ticket), None) is None:
+            return
+        for res in ticket.resources:
+            left = self._usage.get(res, 0) - 1
+            if left > 0:
+                self._usage[res] = left
+            else:
+                self._usage.pop(res, None)
+
+    def snapshot(self) -> Dict:
+        """Vista per API/UI: job in esecuzione, in coda, uso per risorsa."""
+        now = datetime.utcnow()
+        running = sorted(self._running.values(), key=lambda t: t.started_at)
+        return {
+            "budgets": self.budgets,
+            "running": [t.as_dict() for t in running],
+            "queued": [
+                {**t.as_dict(), "position": i + 1,
+                 "waiting_sec": int((now - t.enqueued_at).total_seconds())}
+                for i, t in enumerate(self._queue)
+            ],
+            "usage": dict(sorted(self._usage.items())),
+        }
+
+
+admission_controller = AdmissionController()
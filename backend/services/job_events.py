@@ -0,0 +1,224 @@
+"""
+Bus in-process dell'avanzamento job, per lo stream SSE ``/api/events/jobs``.
+
+Ogni executor (repliche syncoid, snapshot VM, Repliche dati NAS, file
+replication) pubblica qui stato e progresso dei propri run invece di
+lasciarli solo nei dict in memoria interrogati dal frontend con un polling
+per job. Gli abbonati (una connessione SSE ciascuno) ricevono solo l'ultimo
+evento per job dall'ultima consegna: un rsync che aggiorna il progresso
+dieci volte al secondo non riempie code né rallenta client lenti.
+
+``node_ids`` limita la visibilità: l'evento arriva solo agli utenti che
+accedono a tutti quei nodi (vedi ``routers/deps.py::check_node_access``);
+senza ``node_ids`` è visibile a ogni utente autenticato, come le liste job
+corrispondenti.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from collections.abc import MutableMapping
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Stati che chiudono un run: l'evento viene consegnato e il job esce dagli
+# "attivi" inviati ai nuovi abbonati.
+FINAL_STATUSES = frozenset({
+    "success", "failed", "partial", "warning", "cancelled", "paused", "idle", "done",
+})
+
+
+@dataclass
+class JobEvent:
+    kind: str
+    job_id: Any
+    status: Optional[str] = None
+    progress: Optional[Dict[str, Any]] = None
+    node_ids: Optional[Tuple[int, ...]] = None
+    seq: int = 0
+    ts: float = field(default_factory=time.time)
+
+    @property
+    def key(self) -> str:
+        return f"{self.kind}:{self.job_id}"
+
+    @property
+    def final(self) -> bool:
+        return (self.status or "").lower() in FINAL_STATUSES
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "job_id": self.job_id,
+            "status": self.status,
+            "progress": self.progress,
+            "final": self.final,
+            "seq": self.seq,
+            "ts": self.ts,
+        }
+
+
+class _Subscriber:
+    __slots__ = ("loop", "wake", "pending")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.wake = asyncio.Event()
+        self.pending: Dict[str, JobEvent] = {}
+
+
+class JobProgressBus:
+    """Publish/subscribe dell'avanzamento job con coalescenza per job.
+
+    ``publish`` si può chiamare da qualunque thread; gli abbonati vengono
+    svegliati sul proprio loop."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+        self._active: Dict[str, JobEvent] = {}
+        self._subscribers: List[_Subscriber] = []
+
+    def publish(
+        self,
+        kind: str,
+        job_id: Any,
+        progress: Optional[Dict[str, Any]] = None,
+        status: Optional[str] = None,
+        node_ids: Optional[Iterable[int]] = None,
+    ) -> JobEvent:
+        """Pubblica stato/progresso di un job. ``node_ids`` omesso eredita
+        quello dell'ultimo evento dello stesso job."""
+        event = JobEvent(
+            kind=kind,
+            job_id=job_id,
+            status=status if status is not None else (progress or {}).get("status"),
+            progress=progress,
+            node_ids=tuple(n for n in node_ids if n is not None) if node_ids is not None else None,
+        )
+        with self._lock:
+            previous = self._active.get(event.key)
+            if event.node_ids is None and previous is not None:
+                event.node_ids = previous.node_ids
+            event.seq = next(self._seq)
+            if event.final:
+                self._active.pop(event.key, None)
+            else:
+                self._active[event.key] = event
+            subscribers = list(self._subscribers)
+            for sub in subscribers:
+                sub.pending[event.key] = event
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub.wake.set)
+            except RuntimeError:
+                # Loop dell'abbonato già chiuso: verrà rimosso all'uscita
+                pass
+        return event
+
+    def active(self) -> List[JobEvent]:
+        """Ultimo evento dei job ancora in corso."""
+        with self._lock:
+            return sorted(self._active.values(), key=lambda e: e.seq)
+
+    @asynccontextmanager
+    async def subscribe(self) -> AsyncIterator[_Subscriber]:
+        """Abbonamento: riceve subito lo stato dei job in corso, poi gli
+        aggiornamenti (vedi ``next_batch``)."""
+        sub = _Subscriber(asyncio.get_running_loop())
+        with self._lock:
+            sub.pending.update(self._active)
+            self._subscribers.append(sub)
+        if sub.pending:
+            sub.wake.set()
+        try:
+            yield sub
+        finally:
+            with self._lock:
+                if sub in self._subscribers:
+                    self._subscribers.remove(sub)
+
+    async def next_batch(self, sub: _Subscriber, timeout: float) -> List[JobEvent]:
+        """Eventi accumulati dall'ultima chiamata (al più uno per job), in
+        ordine di pubblicazione; lista vuota allo scadere di ``timeout``."""
+        try:
+            await asyncio.wait_for(sub.wake.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return []
+        with self._lock:
+            sub.wake.clear()
+            batch, sub.pending = sub.pending, {}
+        return sorted(batch.values(), key=lambda e: e.seq)
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def registry(self, kind: str, node_scoped: bool = False) -> "ProgressRegistry":
+        return ProgressRegistry(self, kind, node_scoped=node_scoped)
+
+
+class ProgressRegistry(MutableMapping):
+    """Dict ``job_id -> progress`` degli executor che pubblica ogni
+    assegnazione sul bus. Le modifiche in-place (``reg[id]["x"] = 1``) non
+    vengono pubblicate finché non si chiama ``touch``.
+
+    Con ``node_scoped`` gli eventi di un job restano trattenuti finché
+    ``set_nodes`` non ne dichiara i nodi: senza nodi un evento è visibile
+    a tutti gli utenti."""
+
+    def __init__(self, bus: JobProgressBus, kind: str, node_scoped: bool = False):
+        self._bus = bus
+        self._kind = kind
+        self._node_scoped = node_scoped
+        self._data: Dict[Any, Dict[str, Any]] = {}
+        self._node_ids: Dict[Any, Tuple[int, ...]] = {}
+
+    def __getitem__(self, job_id):
+        return self._data[job_id]
+
+    def __setitem__(self, job_id, progress) -> None:
+        self._data[job_id] = progress
+        self.touch(job_id)
+
+    def __delitem__(self, job_id) -> None:
+        progress = self._data.pop(job_id)
+        node_ids = self._node_ids.pop(job_id, None)
+        if self._node_scoped and node_ids is None:
+            return  # mai pubblicato
+        if ((progress or {}).get("status") or "").lower() not in FINAL_STATUSES:
+            self._bus.publish(self._kind, job_id, status="done", node_ids=node_ids)
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def set_nodes(self, job_id, node_ids: Iterable[int]) -> None:
+        """Nodi coinvolti dal run, per il filtro per utente degli eventi."""
+        self._node_ids[job_id] = tuple(node_ids)
+        if job_id in self._data:
+            self.touch(job_id)
+
+    def touch(self, job_id) -> None:
+        """Ripubblica il progresso corrente (dopo modifiche in-place)."""
+        progress = self._data.get(job_id)
+        if self._node_scoped and job_id not in self._node_ids:
+            return
+        if progress is not None:
+            self._bus.publish(
+                self._kind, job_id, progress=dict(progress),
+                node_ids=self._node_ids.get(job_id),
+            )
+
+
+job_events = JobProgressBus()
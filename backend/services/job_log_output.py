@@ -0,0 +1,170 @@
+"""Output dei JobLog in append-only (tabella ``job_log_chunks``).
+
+Durante un job lungo l'output cresce a piccoli passi (progress ogni 30s,
+messaggi live di vzdump/qmrestore). Riscrivere ogni volta ``JobLog.output``
+(``prev + "\\n" + line``) produce righe da diversi MB riscritte centinaia di
+volte e un WAL SQLite che esplode. Qui ogni aggiunta è un INSERT di un chunk;
+``JobLog.output`` resta l'header iniziale (o l'output dei job legacy) e il
+testo completo si ricompone leggendo i chunk in ordine di ``seq``.
+
+Offset e dimensioni sono in caratteri del testo ricomposto (come
+``length()`` di SQLite), così la paginazione si calcola in SQL senza
+caricare i chunk che non servono.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from database import JobLog, JobLogChunk
+
+
+def _normalize(text: str) -> str:
+    """Ogni blocco termina con newline: la concatenazione resta riga-per-riga."""
+    if text and not text.endswith("\n"):
+        return text + "\n"
+    return text
+
+
+def _head(log: JobLog) -> str:
+    return _normalize(log.output or "")
+
+
+def append_output(db: Session, log_id: int, text: str, commit: bool = True) -> None:
+    """Appende un blocco all'output del log (un INSERT, nessuna riscrittura).
+
+    ``seq`` è calcolato nello stesso statement (INSERT ... SELECT MAX+1): due
+    sessioni che appendono allo stesso log non leggono un MAX stantio.
+    """
+    if not text:
+        return
+    next_seq = (
+        select(
+            literal(log_id),
+            func.coalesce(func.max(JobLogChunk.seq), 0) + 1,
+            literal(datetime.utcnow()),
+            literal(_normalize(text)),
+        )
+        .where(JobLogChunk.log_id == log_id)
+    )
+    db.execute(
+        insert(JobLogChunk).from_select(
+            ["log_id", "seq", "ts", "text"], next_seq
+        )
+    )
+    if commit:
+        db.commit()
+
+
+def last_chunk_text(db: Session, log_id: int) -> Optional[str]:
+    row = (
+        db.query(JobLogChunk.text)
+        .filter(JobLogChunk.log_id == log_id)
+        .order_by(JobLogChunk.seq.desc())
+        .first()
+    )
+    return row[0] if row else None
+
+
+def full_output(db: Session, log: JobLog) -> str:
+    """Testo completo: header ``JobLog.output`` + tutti i chunk."""
+    return full_outputs(db, [log]).get(log.id, "")
+
+
+def full_outputs(db: Session, logs: Iterable[JobLog]) -> Dict[int, str]:
+    """Come ``full_output`` per più log, con una sola query sui chunk."""
+    logs = list(logs)
+    parts: Dict[int, List[str]] = {log.id: [_head(log)] for log in logs}
+    if parts:
+        rows = (
+            db.query(JobLogChunk.log_id, JobLogChunk.text)
+            .filter(JobLogChunk.log_id.in_(list(parts)))
+            .order_by(JobLogChunk.log_id, JobLogChunk.seq)
+            .all()
+        )
+        for log_id, text in rows:
+            parts[log_id].append(text)
+    return {log_id: "".join(chunks) for log_id, chunks in parts.items()}
+
+
+def read_output(
+    db: Session,
+    log: JobLog,
+    tail: Optional[int] = None,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    after_seq: Optional[int] = None,
+) -> Dict:
+    """Legge una porzione dell'output ricomposto.
+
+    - ``after_seq``: solo i chunk successivi (follow incrementale del viewer);
+    - ``tail``: ultimi N caratteri;
+    - altrimenti l'intervallo ``[offset, offset+limit)``.
+
+    Ritorna ``{text, offset, size, last_seq}``; ``offset`` è la posizione del
+    testo restituito nell'output completo, ``last_seq`` va ripassato come
+    ``after_seq`` alla richiesta successiva.
+    """
+    head = _head(log)
+    meta = (
+        db.query(JobLogChunk.seq, func.length(JobLogChunk.text))
+        .filter(JobLogChunk.log_id == log.id)
+        .order_by(JobLogChunk.seq)
+        .all()
+    )
+    size = len(head) + sum(int(n or 0) for _, n in meta)
+    last_seq = meta[-1][0] if meta else 0
+
+    if after_seq is not None:
+        rows = (
+            db.query(JobLogChunk.text)
+            .filter(JobLogChunk.log_id == log.id, JobLogChunk.seq > after_seq)
+            .order_by(JobLogChunk.seq)
+            .all()
+        )
+        text = "".join(t for (t,) in rows)
+        if after_seq <= 0:
+            text = head + text
+        return {"text": text, "offset": size - len(text), "size": size, "last_seq": last_seq}
+
+    if tail is not None:
+        start, end = max(0, size - tail), size
+    else:
+        start = min(max(0, offset), size)
+        end = size if limit is None else min(size, start + max(0, limit))
+
+    # Individua i chunk che intersecano [start, end) e carica solo quelli.
+    pieces: List[str] = []
+    piece_start = None
+    if start < len(head):
+        pieces.append(head)
+        piece_start = 0
+    wanted: List[int] = []
+    pos = len(head)
+    for seq, n in meta:
+        n = int(n or 0)
+        if pos + n > start and pos < end:
+            wanted.append(seq)
+            if piece_start is None:
+                piece_start = pos
+        pos += n
+    if wanted:
+        rows = (
+            db.query(JobLogChunk.text)
+            .filter(
+                JobLogChunk.log_id == log.id,
+                JobLogChunk.seq >= wanted[0],
+                JobLogChunk.seq <= wanted[-1],
+            )
+            .order_by(JobLogChunk.seq)
+            .all()
+        )
+        pieces.extend(t for (t,) in rows)
+    text = "".join(pieces)
+    if piece_start is not None:
+        text = text[start - piece_start:end - piece_start]
+    return {"text": text, "offset": start, "size": size, "last_seq": last_seq}
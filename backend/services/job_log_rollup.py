@@ -0,0 +1,263 @@
+"""
+Rollup orari/giornalieri dei JobLog per le statistiche (``/api/logs/stats``).
+
+Le statistiche su finestre fino a 365 giorni scorrevano ``job_logs`` a ogni
+richiesta e ri-parsavano in Python ogni stringa ``transferred`` ("1.5G",
+"128 MiB"...). Qui:
+
+- ``JobLog.transferred_bytes`` viene valorizzato al flush quando cambia
+  ``transferred`` (stesso parsing di ``services/size_utils.py``);
+- quando un log entra o esce da uno stato conclusivo (o cambia durata/byte
+  da concluso) il bucket orario ``(job_type, ora di started_at)`` viene
+  ricalcolato da ``job_logs`` e il bucket giornaliero dalle sue ore, nella
+  stessa transazione del flush. Ricalcolare il bucket invece di sommare
+  delta rende idempotenti le correzioni di stato successive (es.
+  ``repair_terminal_job_log``);
+- ``window_totals`` compone una finestra da giorni interi più le ore ai
+  bordi: al più ~48 righe orarie + una per giorno e tipo job.
+
+I log ancora in corso non sono nei rollup: le statistiche li contano a parte
+(pochi, su indice ``(status, started_at)``).
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, Set, Tuple
+
+from sqlalchemy import and_, case, event, func, inspect, or_, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database import JobLog, JobLogRollup
+from services.size_utils import parse_transfer_size_to_bytes
+
+logger = logging.getLogger(__name__)
+
+# Stati non conclusivi: il log non entra (ancora) nei rollup
+OPEN_STATUSES = ("started", "running", "pending", "pending_confirmation", "queued")
+
+# Attributi che cambiano il contributo di un log concluso
+_TRACKED = ("status", "duration", "transferred", "transferred_bytes", "started_at", "job_type")
+
+# Formato con cui SQLAlchemy salva i DateTime su SQLite: i bucket ricostruiti
+# in SQL devono coincidere con quelli scritti dall'ORM (vincolo unique)
+_SQLITE_HOUR = "%Y-%m-%d %H:00:00.000000"
+_SQLITE_DAY = "%Y-%m-%d 00:00:00.000000"
+
+_SESSION_KEY = "_job_log_rollup_buckets"
+
+
+def hour_floor(dt: datetime) -> datetime:
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def day_floor(dt: datetime) -> datetime:
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _is_open(status: Optional[str]) -> bool:
+    return (status or "") in OPEN_STATUSES
+
+
+def _terminal_filter():
+    return JobLog.status.notin_(OPEN_STATUSES)
+
+
+# ----------------------------------------------------------------- listener
+
+def _collect(session: Session, flush_context, instances) -> None:
+    buckets: Set[Tuple[str, datetime]] = session.info.setdefault(_SESSION_KEY, set())
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, JobLog):
+            continue
+        state = inspect(obj)
+        is_new = obj in session.new
+        if is_new or state.attrs.transferred.history.has_changes():
+            obj.transferred_bytes = parse_transfer_size_to_bytes(obj.transferred) or None
+        if obj.started_at is None:
+            obj.started_at = datetime.utcnow()
+        if not is_new and not any(state.attrs[a].history.has_changes() for a in _TRACKED):
+            continue
+        status_hist = state.attrs.status.history
+        was_terminal = any(not _is_open(v) for v in (status_hist.deleted or ()))
+        if not is_new and not status_hist.has_changes():
+            was_terminal = not _is_open(obj.status)
+        if _is_open(obj.status) and not was_terminal:
+            continue
+        buckets.add((obj.job_type, hour_floor(obj.started_at)))
+        # Log spostato di ora o di tipo: anche il bucket precedente va rifatto
+        for old_start in state.attrs.started_at.history.deleted or ():
+            if old_start:
+                buckets.add((obj.job_type, hour_floor(old_start)))
+        for old_type in state.attrs.job_type.history.deleted or ():
+            if old_type:
+                buckets.add((old_type, hour_floor(obj.started_at)))
+    for obj in session.deleted:
+        if isinstance(obj, JobLog) and obj.started_at and not _is_open(obj.status):
+            buckets.add((obj.job_type, hour_floor(obj.started_at)))
+
+
+def _apply(session: Session, flush_context) -> None:
+    buckets = session.info.pop(_SESSION_KEY, None)
+    if not buckets:
+        return
+    try:
+        refresh_buckets(session.connection(), buckets)
+    except Exception as e:
+        # I rollup non devono mai far fallire la scrittura del log
+        logger.warning(f"Aggiornamento rollup job_logs fallito: {e}")
+
+
+def install_listeners() -> None:
+    """Registra i listener su tutte le Session (idempotente)."""
+    if not event.contains(Session, "before_flush", _collect):
+        event.listen(Session, "before_flush", _collect)
+        event.listen(Session, "after_flush", _apply)
+
+
+# ------------------------------------------------------------- aggiornamento
+
+def _upsert(conn, period: str, bucket_start: datetime, job_type: str, row) -> None:
+    values = {
+        "runs": int(row.runs or 0),
+        "success": int(row.success or 0),
+        "failed": int(row.failed or 0),
+        "duration_sum": int(row.duration_sum or 0),
+        "duration_count": int(row.duration_count or 0),
+        "transferred_bytes": int(row.transferred_bytes or 0),
+        "updated_at": datetime.utcnow(),
+    }
+    stmt = sqlite_insert(JobLogRollup.__table__).values(
+        period=period, bucket_start=bucket_start, job_type=job_type, **values
+    )
+    conn.execute(stmt.on_conflict_do_update(index_elements=["period", "bucket_start", "job_type"], set_=values))
+
+
+def refresh_buckets(conn, buckets: Iterable[Tuple[str, datetime]]) -> None:
+    """Ricalcola i bucket orari indicati da ``job_logs`` e i giorni che li
+    contengono dalle rispettive ore."""
+    days = set()
+    for job_type, start in buckets:
+        row = conn.execute(
+            select(
+                func.count(JobLog.id).label("runs"),
+                func.sum(case((JobLog.status == "success", 1), else_=0)).label("success"),
+                func.sum(case((JobLog.status == "failed", 1), else_=0)).label("failed"),
+                func.sum(JobLog.duration).label("duration_sum"),
+                func.count(JobLog.duration).label("duration_count"),
+                func.sum(JobLog.transferred_bytes).label("transferred_bytes"),
+            ).where(
+                JobLog.job_type == job_type,
+                JobLog.started_at >= start,
+                JobLog.started_at < start + timedelta(hours=1),
+                _terminal_filter(),
+            )
+        ).one()
+        _upsert(conn, "hour", start, job_type, row)
+        days.add((job_type, day_floor(start)))
+    for job_type, day in days:
+        row = conn.execute(_sum_rollups(
+            JobLogRollup.period == "hour",
+            JobLogRollup.job_type == job_type,
+            JobLogRollup.bucket_start >= day,
+            JobLogRollup.bucket_start < day + timedelta(days=1),
+        )).one()
+        _upsert(conn, "day", day, job_type, row)
+
+
+def rebuild_rollups(conn) -> int:
+    """Ricostruisce da zero ``transferred_bytes`` mancanti e tutti i rollup
+    (prima installazione / riallineamento). Ritorna i bucket orari creati."""
+    pending = conn.execute(text(
+        "SELECT id, transferred FROM job_logs "
+        "WHERE transferred_bytes IS NULL AND transferred IS NOT NULL AND transferred != ''"
+    )).fetchall()
+    updates = [
+        {"i": row_id, "b": parse_transfer_size_to_bytes(value) or None} for row_id, value in pending
+    ]
+    if updates:
+        conn.execute(text("UPDATE job_logs SET transferred_bytes = :b WHERE id = :i"), updates)
+
+    placeholders = ", ".join(f"'{s}'" for s in OPEN_STATUSES)
+    now = datetime.utcnow().isoformat(sep=" ")
+    conn.execute(text("DELETE FROM job_log_rollups"))
+    created = conn.execute(text(
+        "INSERT INTO job_log_rollups (period, bucket_start, job_type, runs, success, failed, "
+        "duration_sum, duration_count, transferred_bytes, updated_at) "
+        f"SELECT 'hour', strftime('{_SQLITE_HOUR}', started_at), job_type, COUNT(*), "
+        "SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END), "
+        "SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END), "
+        "COALESCE(SUM(duration), 0), COUNT(duration), COALESCE(SUM(transferred_bytes), 0), :now "
+        f"FROM job_logs WHERE started_at IS NOT NULL AND status NOT IN ({placeholders}) "
+        f"GROUP BY job_type, strftime('{_SQLITE_HOUR}', started_at)"
+    ), {"now": now}).rowcount or 0
+    conn.execute(text(
+        "INSERT INTO job_log_rollups (period, bucket_start, job_type, runs, success, failed, "
+        "duration_sum, duration_count, transferred_bytes, updated_at) "
+        f"SELECT 'day', strftime('{_SQLITE_DAY}', bucket_start), job_type, SUM(runs), SUM(success), "
+        "SUM(failed), SUM(duration_sum), SUM(duration_count), SUM(transferred_bytes), :now "
+        "FROM job_log_rollups WHERE period = 'hour' "
+        f"GROUP BY job_type, strftime('{_SQLITE_DAY}', bucket_start)"
+    ), {"now": now})
+    return created
+
+
+# -------------------------------------------------------------------- lettura
+
+def _sum_rollups(*conditions):
+    return select(
+        func.coalesce(func.sum(JobLogRollup.runs), 0).label("runs"),
+        func.coalesce(func.sum(JobLogRollup.success), 0).label("success"),
+        func.coalesce(func.sum(JobLogRollup.failed), 0).label("failed"),
+        func.coalesce(func.sum(JobLogRollup.duration_sum), 0).label("duration_sum"),
+        func.coalesce(func.sum(JobLogRollup.duration_count), 0).label("duration_count"),
+        func.coalesce(func.sum(JobLogRollup.transferred_bytes), 0).label("transferred_bytes"),
+    ).where(*conditions)
+
+
+def window_totals(since: datetime, now: Optional[datetime] = None, job_type: Optional[str] = None):
+    """Select dei totali dei log conclusi da ``since`` (arrotondato all'ora):
+    giorni interi dai rollup giornalieri, ore ai bordi da quelli orari."""
+    now = now or datetime.utcnow()
+    start = hour_floor(since)
+    first_day = day_floor(start) if start == day_floor(start) else day_floor(start) + timedelta(days=1)
+    today = day_floor(now)
+    head_end = min(first_day, today)
+    tail_start = max(today, start)
+
+    hours = and_(
+        JobLogRollup.period == "hour",
+        or_(
+            and_(JobLogRollup.bucket_start >= start, JobLogRollup.bucket_start < head_end),
+            JobLogRollup.bucket_start >= tail_start,
+        ),
+    )
+    conditions = [or_(hours, and_(
+        JobLogRollup.period == "day",
+        JobLogRollup.bucket_start >= first_day,
+        JobLogRollup.bucket_start < today,
+    ))]
+    if job_type:
+        conditions.append(JobLogRollup.job_type == job_type)
+    return _sum_rollups(*conditions)
+
+
+def open_counts(since: datetime, job_type: Optional[str] = None):
+    """Select dei log non conclusivi (totale e in corso) da ``since``."""
+    filters = [JobLog.status.in_(OPEN_STATUSES), JobLog.started_at >= since]
+    if job_type:
+        filters.append(JobLog.job_type == job_type)
+    return select(
+        func.count(JobLog.id).label("open"),
+        func.sum(case((JobLog.status.in_(["started", "running"]), 1), else_=0)).label("running"),
+    ).where(*filters)
+
+
+def prune_rollups(conn, keep_days: int = 400) -> int:
+    """Elimina i rollup più vecchi di ``keep_days`` (finestra stats max 365)."""
+    cutoff = day_floor(datetime.utcnow() - timedelta(days=keep_days))
+    return conn.execute(
+        JobLogRollup.__table__.delete().where(JobLogRollup.bucket_start < cutoff)
+    ).rowcount or 0
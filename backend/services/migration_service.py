@@ -4,10 +4,12 @@ Usa funzionalità native di Proxmox (qm copy / pct copy)
 """
 
 import asyncio
-from typing import Optional, Dict, Tuple, List
+from typing import Callable, Optional, Dict, Tuple, List
 import logging
+import os
 import re
 import json
+import shlex
 import time
 from datetime import datetime
 
@@ -16,6 +18,102 @@ from services.logging_config import get_logger, get_operation_logger, OperationL
 
 logger = get_logger(__name__)
 
+# Errori non critici di vzdump che permettono di provare con un altro mode
+# Questi errori sono tipicamente legati all'avvio della VM (mode snapshot/suspend)
+# ma non impediscono il backup con mode stop
+_RECOVERABLE_BACKUP_ERRORS = [
+    "bridge",
+    "does not exist",
+    "not running",
+    "snapshot feature is not available",
+    "unable to activate",
+    "network",
+    "vmbr",
+    "failed to start",
+    "cannot start"
+]
+
+# Inattività massima (secondi senza output) del pipe vzdump -> restore;
+# con pv l'avanzamento arriva ogni STREAM_PV_INTERVAL secondi
+STREAM_IDLE_TIMEOUT = int(os.environ.get("DAPX_MIGRATION_STREAM_IDLE_TIMEOUT", "3600"))
+STREAM_PV_INTERVAL = 2
+
+_MBUFFER_RE = re.compile(r"^\d+[KMG]?$", re.IGNORECASE)
+_DISK_LINE_RE = re.compile(r"^(scsi|virtio|ide|sata|efidisk|tpmstate|rootfs|mp)\d*:\s*(.*)$")
+_SIZE_RE = re.compile(r"size=(\d+(?:\.\d+)?)([KMGT])?", re.IGNORECASE)
+_UNIT = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def _format_bytes(num: int) -> str:
+    """Stesso formato di backup_size_human della copia con archivio."""
+    if num >= 1024 ** 3:
+        return f"{num / (1024 ** 3):.2f} GB"
+    if num >= 1024 ** 2:
+        return f"{num / (1024 ** 2):.2f} MB"
+    if num >= 1024:
+        return f"{num / 1024:.2f} KB"
+    return f"{num} B"
+
+
+def parse_config_disk_bytes(config_text: str) -> int:
+    """Somma dei ``size=`` dei dischi in ``qm config``/``pct config``
+    (cdrom esclusi): stima del volume di un vzdump non compresso."""
+    total = 0
+    for line in config_text.splitlines():
+        m = _DISK_LINE_RE.match(line.strip())
+        if not m or "media=cdrom" in m.group(2):
+            continue
+        size = _SIZE_RE.search(m.group(2))
+        if size:
+            total += int(float(size.group(1)) * _UNIT[(size.group(2) or "").upper()])
+    return total
+
+
+def build_stream_command(
+    vm_id: int,
+    vm_type: str,
+    mode: str,
+    target_vmid: int,
+    dest_storage: str,
+    dest_hostname: str,
+    dest_port: int,
+    dest_user: str,
+    ssh_key: str,
+    compress_level: Optional[int] = None,
+    mbuffer_size: Optional[str] = None,
+    with_pv: bool = False,
+) -> str:
+    """Pipe eseguito sul nodo sorgente:
+    ``vzdump --stdout [| pv] [| zstd] [| mbuffer] | ssh dest '[mbuffer |] [zstd -d |] restore -'``.
+
+    pv (``-n -b``) scrive su stderr i byte letti da vzdump, uno per riga."""
+    if mbuffer_size and not _MBUFFER_RE.match(mbuffer_size):
+        raise ValueError(f"mbuffer non valido: {mbuffer_size!r}")
+    if vm_type == "lxc":
+        restore = f"pct restore {target_vmid} - --storage {shlex.quote(dest_storage)}"
+    else:
+        restore = f"qmrestore - {target_vmid} --storage {shlex.quote(dest_storage)}"
+    remote = []
+    if mbuffer_size:
+        remote.append(f"mbuffer -q -m {mbuffer_size}")
+    if compress_level:
+        remote.append("zstd -q -d")
+    remote.append(restore)
+    remote_cmd = "set -o pipefail; " + " | ".join(remote)
+
+    local = [f"vzdump {vm_id} --stdout --mode {mode}"]
+    if with_pv:
+        local.append(f"pv -f -n -b -i {STREAM_PV_INTERVAL}")
+    if compress_level:
+        local.append(f"zstd -q -T0 -{int(compress_level)}")
+    if mbuffer_size:
+        local.append(f"mbuffer -q -m {mbuffer_size}")
+    local.append(
+        f"ssh -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null -o BatchMode=yes "
+        f"-i {shlex.quote(ssh_key)} -p {dest_port} {dest_user}@{dest_hostname} {shlex.quote(remote_cmd)}"
+    )
+    return f"bash -o pipefail -c {shlex.quote(' | '.join(local))}"
+
 
 class MigrationService:
     """Servizio per migrazione/copia VM tra nodi Proxmox"""
@@ -39,7 +137,11 @@ class MigrationService:
         dest_port: int = 22,
         dest_user: str = "root",
         dest_key: str = "/root/.ssh/id_rsa",
-        force_overwrite: bool = False  # Se True, elimina VM esistente senza conferma
+        force_overwrite: bool = False,  # Se True, elimina VM esistente senza conferma
+        transfer_mode: str = "staged",
+        stream_compress_level: Optional[int] = None,
+        stream_mbuffer: Optional[str] = None,
+        progress_callback: Optional[Callable[[Dict], None]] = None
     ) -> Dict:
         """
         Migra/copia una VM tra nodi Proxmox usando funzionalità native.
@@ -56,6 +158,12 @@ class MigrationService:
             keep_snapshots: Numero snapshot da mantenere
             start_after: Avvia VM dopo migrazione
             hw_config: Dict con riconfigurazione hardware (es: {"memory": 4096, "cores": 2, "network": {...}, "storage": {...}})
+            transfer_mode: solo per "copy": "staged" (archivio vzdump su disco,
+                trasferimento, restore) o "stream" (vzdump --stdout in pipe SSH
+                nel restore della destinazione, senza file intermedi)
+            stream_compress_level: livello zstd sul tratto SSH in modalità stream (None = non compresso)
+            stream_mbuffer: dimensione mbuffer ai due capi del pipe (es. "256M", None = senza)
+            progress_callback: riceve {"phase", "bytes", "total_bytes", "percent", "rate_bps"} durante lo stream
         
         Returns:
             Dict con success, message, vm_id, duration, transferred
@@ -163,7 +271,11 @@ class MigrationService:
                 dest_port=dest_port,
                 dest_user=dest_user,
                 dest_key=dest_key,
-                force_overwrite=force_overwrite
+                force_overwrite=force_overwrite,
+                transfer_mode=transfer_mode,
+                stream_compress_level=stream_compress_level,
+                stream_mbuffer=stream_mbuffer,
+                progress_callback=progress_callback
             )
         
         # Per move, usa migrate diretto
@@ -296,10 +408,16 @@ class MigrationService:
         dest_port: int = 22,
         dest_user: str = "root",
         dest_key: str = "/root/.ssh/id_rsa",
-        force_overwrite: bool = False  # Se True, elimina VM esistente senza conferma
+        force_overwrite: bool = False,  # Se True, elimina VM esistente senza conferma
+        transfer_mode: str = "staged",
+        stream_compress_level: Optional[int] = None,
+        stream_mbuffer: Optional[str] = None,
+        progress_callback: Optional[Callable[[Dict], None]] = None
     ) -> Dict:
         """
-        Copia VM usando vzdump + restore (per copia tra nodi senza cluster)
+        Copia VM usando vzdump + restore (per copia tra nodi senza cluster).
+        Con transfer_mode="stream" l'archivio non passa dal disco (vedi
+        ``_stream_vzdump_restore``).
         """
         import time
         start_time = time.time()
@@ -400,6 +518,57 @@ class MigrationService:
                 logger.warning(f"[MIGRATION] Comando: {snap_cmd}")
                 logger.warning(f"[MIGRATION] Stderr: {snap_result.stderr}")
         
+        if transfer_mode == "stream":
+            dest_storage = await self._resolve_dest_storage(
+                dest_hostname, hw_config, dest_port, dest_user, dest_key
+            )
+            if not dest_storage:
+                return {
+                    "success": False,
+                    "message": "Nessuno storage trovato che supporta 'images' sul nodo destinazione",
+                    "error": "Storage not found"
+                }
+            stream_result = await self._stream_vzdump_restore(
+                source_hostname=source_hostname,
+                dest_hostname=dest_hostname,
+                vm_id=vm_id,
+                vm_type=vm_type,
+                target_vmid=target_vmid,
+                dest_storage=dest_storage,
+                compress_level=stream_compress_level,
+                mbuffer_size=stream_mbuffer,
+                progress_callback=progress_callback,
+                source_port=source_port,
+                source_user=source_user,
+                source_key=source_key,
+                dest_port=dest_port,
+                dest_user=dest_user,
+                dest_key=dest_key
+            )
+            if not stream_result["success"]:
+                return stream_result
+            await self._finish_copy(
+                source_hostname, dest_hostname, vm_id, target_vmid, vm_type,
+                hw_config, dest_vm_name_suffix, keep_snapshots, start_after,
+                source_port, source_user, source_key, dest_port, dest_user, dest_key
+            )
+            duration = int(time.time() - start_time)
+            transferred = _format_bytes(stream_result["bytes"]) if stream_result["bytes"] else "N/A"
+            logger.info(f"[MIGRATION] ========== COPIA (STREAM) COMPLETATA ==========")
+            logger.info(f"[MIGRATION] VM: {vm_id} -> {target_vmid} su {dest_hostname}")
+            logger.info(f"[MIGRATION] Durata: {duration}s | Trasferiti: {transferred}")
+            logger.info(f"[MIGRATION] Backup mode usato: {stream_result['mode']}")
+            return {
+                "success": True,
+                "message": f"VM {vm_id} copiata con successo su {dest_hostname} (VMID: {target_vmid}) - Trasferiti: {transferred}",
+                "vm_id": target_vmid,
+                "duration": duration,
+                "transferred": transferred,
+                "backup_size": transferred,
+                "transfer_mode": "stream",
+                "snapshot_created": snapshot_name if create_snapshot else None
+            }
+        
         # Determina directory di backup con spazio sufficiente
         # Priorità: /var/lib/vz/dump (standard Proxmox) > /var/tmp > /tmp
         backup_dir = "/var/lib/vz/dump"
@@ -463,21 +632,6 @@ class MigrationService:
         backup_result = None
         used_mode = None
         
-        # Errori non critici che permettono di provare con un altro mode
-        # Questi errori sono tipicamente legati all'avvio della VM (mode snapshot/suspend)
-        # ma non impediscono il backup con mode stop
-        recoverable_errors = [
-            "bridge",
-            "does not exist", 
-            "not running",
-            "snapshot feature is not available",
-            "unable to activate",
-            "network",
-            "vmbr",
-            "failed to start",
-            "cannot start"
-        ]
-        
         last_error = None
         last_full_output = None
         for backup_mode in backup_modes:
@@ -503,7 +657,7 @@ class MigrationService:
             
             # Controlla se l'errore è recuperabile (prova prossimo mode)
             full_output_lower = (backup_result.stdout + "\n" + backup_result.stderr).lower()
-            is_recoverable = any(err in full_output_lower for err in recoverable_errors)
+            is_recoverable = any(err in full_output_lower for err in _RECOVERABLE_BACKUP_ERRORS)
             
             full_output = f"STDOUT:\n{backup_result.stdout}\n\nSTDERR:\n{backup_result.stderr}"
             last_full_output = full_output
@@ -686,52 +840,15 @@ class MigrationService:
         remote_backup = f"/var/tmp/{backup_file.split('/')[-1]}"
         
         # Restore sul nodo destinazione
-        # Determina storage destinazione (deve supportare 'images')
-        dest_storage = None
-        if hw_config and "storage" in hw_config:
-            for disk, new_storage in hw_config["storage"].items():
-                if ":" in new_storage:
-                    dest_storage = new_storage.split(":")[0]
-                    break
-                elif new_storage:
-                    dest_storage = new_storage
-                    break
-        
-        # Se non specificato, trova uno storage che supporta 'images'
+        dest_storage = await self._resolve_dest_storage(
+            dest_hostname, hw_config, dest_port, dest_user, dest_key
+        )
         if not dest_storage:
-            find_storage_cmd = "pvesm status --content images 2>/dev/null | awk 'NR>1 {print $1}' | head -1"
-            storage_result = await ssh_service.execute(
-                hostname=dest_hostname,
-                command=find_storage_cmd,
-                port=dest_port,
-                username=dest_user,
-                key_path=dest_key,
-                timeout=30
-            )
-            if storage_result.success and storage_result.stdout.strip():
-                dest_storage = storage_result.stdout.strip()
-            else:
-                # Fallback comuni
-                for fallback in ["local-lvm", "local-zfs", "zfs", "lvm"]:
-                    check_cmd = f"pvesm status | grep -q '^{fallback}' && echo 'found'"
-                    check_result = await ssh_service.execute(
-                        hostname=dest_hostname,
-                        command=check_cmd,
-                        port=dest_port,
-                        username=dest_user,
-                        key_path=dest_key,
-                        timeout=10
-                    )
-                    if check_result.success and "found" in check_result.stdout:
-                        dest_storage = fallback
-                        break
-                
-                if not dest_storage:
-                    return {
-                        "success": False,
-                        "message": "Nessuno storage trovato che supporta 'images' sul nodo destinazione",
-                        "error": "Storage not found"
-                    }
+            return {
+                "success": False,
+                "message": "Nessuno storage trovato che supporta 'images' sul nodo destinazione",
+                "error": "Storage not found"
+            }
         
         logger.info(f"[MIGRATION] FASE: RESTORE")
         logger.info(f"[MIGRATION] VM: {target_vmid} ({vm_type}) | Host: {dest_hostname}")
@@ -804,6 +921,101 @@ class MigrationService:
             if match:
                 transferred = f"{match.group(1)} {match.group(2)}"
         
+        await self._finish_copy(
+            source_hostname, dest_hostname, vm_id, target_vmid, vm_type,
+            hw_config, dest_vm_name_suffix, keep_snapshots, start_after,
+            source_port, source_user, source_key, dest_port, dest_user, dest_key
+        )
+        
+        duration = int(time.time() - start_time)
+        
+        # Usa backup_size_human se transferred non è stato calcolato
+        final_transferred = backup_size_human if backup_size_human != "N/A" else transferred
+        
+        logger.info(f"[MIGRATION] ========== COPIA COMPLETATA ==========")
+        logger.info(f"[MIGRATION] VM: {vm_id} -> {target_vmid} su {dest_hostname}")
+        logger.info(f"[MIGRATION] Durata: {duration}s | Trasferiti: {final_transferred}")
+        logger.info(f"[MIGRATION] Backup mode usato: {used_mode}")
+        
+        return {
+            "success": True,
+            "message": f"VM {vm_id} copiata con successo su {dest_hostname} (VMID: {target_vmid}) - Trasferiti: {final_transferred}",
+            "vm_id": target_vmid,
+            "duration": duration,
+            "transferred": final_transferred,
+            "backup_size": backup_size_human,
+            "snapshot_created": snapshot_name if create_snapshot else None
+        }
+    
+    async def _resolve_dest_storage(
+        self,
+        dest_hostname: str,
+        hw_config: Optional[Dict],
+        dest_port: int,
+        dest_user: str,
+        dest_key: str
+    ) -> Optional[str]:
+        """Storage di restore: da hw_config, altrimenti il primo che supporta 'images'"""
+        dest_storage = None
+        if hw_config and "storage" in hw_config:
+            for disk, new_storage in hw_config["storage"].items():
+                if ":" in new_storage:
+                    dest_storage = new_storage.split(":")[0]
+                    break
+                elif new_storage:
+                    dest_storage = new_storage
+                    break
+        
+        # Se non specificato, trova uno storage che supporta 'images'
+        if not dest_storage:
+            find_storage_cmd = "pvesm status --content images 2>/dev/null | awk 'NR>1 {print $1}' | head -1"
+            storage_result = await ssh_service.execute(
+                hostname=dest_hostname,
+                command=find_storage_cmd,
+                port=dest_port,
+                username=dest_user,
+                key_path=dest_key,
+                timeout=30
+            )
+            if storage_result.success and storage_result.stdout.strip():
+                dest_storage = storage_result.stdout.strip()
+            else:
+                # Fallback comuni
+                for fallback in ["local-lvm", "local-zfs", "zfs", "lvm"]:
+                    check_cmd = f"pvesm status | grep -q '^{fallback}' && echo 'found'"
+                    check_result = await ssh_service.execute(
+                        hostname=dest_hostname,
+                        command=check_cmd,
+                        port=dest_port,
+                        username=dest_user,
+                        key_path=dest_key,
+                        timeout=10
+                    )
+                    if check_result.success and "found" in check_result.stdout:
+                        dest_storage = fallback
+                        break
+        
+        return dest_storage
+    
+    async def _finish_copy(
+        self,
+        source_hostname: str,
+        dest_hostname: str,
+        vm_id: int,
+        target_vmid: int,
+        vm_type: str,
+        hw_config: Optional[Dict],
+        dest_vm_name_suffix: Optional[str],
+        keep_snapshots: int,
+        start_after: bool,
+        source_port: int,
+        source_user: str,
+        source_key: str,
+        dest_port: int,
+        dest_user: str,
+        dest_key: str
+    ):
+        """Passi dopo il restore: config hardware, pruning snapshot, avvio"""
         # Applica riconfigurazione hardware
         if hw_config:
             hw_result = await self._apply_hw_config(
@@ -847,25 +1059,159 @@ class MigrationService:
             )
             if not start_result.success:
                 logger.warning(f"Errore avvio VM: {start_result.stderr}")
+    
+    async def _tools_available(self, hostname: str, tools: List[str], port: int, username: str, key_path: str) -> set:
+        """Sottoinsieme di ``tools`` presenti nel PATH del nodo"""
+        probe = "; ".join(f"command -v {t} >/dev/null 2>&1 && echo {t}" for t in tools)
+        result = await ssh_service.execute(
+            hostname=hostname,
+            command=f"{probe}; true",
+            port=port,
+            username=username,
+            key_path=key_path,
+            timeout=30
+        )
+        return set(result.stdout.split()) & set(tools) if result.success else set()
+    
+    async def _stream_vzdump_restore(
+        self,
+        source_hostname: str,
+        dest_hostname: str,
+        vm_id: int,
+        vm_type: str,
+        target_vmid: int,
+        dest_storage: str,
+        compress_level: Optional[int] = None,
+        mbuffer_size: Optional[str] = None,
+        progress_callback: Optional[Callable[[Dict], None]] = None,
+        source_port: int = 22,
+        source_user: str = "root",
+        source_key: str = "/root/.ssh/id_rsa",
+        dest_port: int = 22,
+        dest_user: str = "root",
+        dest_key: str = "/root/.ssh/id_rsa"
+    ) -> Dict:
+        """
+        Copia in streaming: ``vzdump --stdout`` sul sorgente in pipe SSH verso
+        ``qmrestore -``/``pct restore`` sulla destinazione. Nessun archivio
+        su disco (niente precheck di spazio) e backup/restore sovrapposti.
+
+        zstd e mbuffer si usano solo se presenti su entrambi i nodi; senza pv
+        sul sorgente non c'è avanzamento a byte. Come nella copia con archivio,
+        gli errori recuperabili fanno ritentare con il mode successivo, ma
+        solo se nessun byte è ancora passato nel pipe.
+        """
+        source_tools = await self._tools_available(
+            source_hostname, ["pv", "zstd", "mbuffer"], source_port, source_user, source_key
+        )
+        dest_tools = await self._tools_available(
+            dest_hostname, ["zstd", "mbuffer"], dest_port, dest_user, dest_key
+        )
+        if compress_level and not ("zstd" in source_tools and "zstd" in dest_tools):
+            logger.warning(f"[MIGRATION] zstd non disponibile su entrambi i nodi: stream non compresso")
+            compress_level = None
+        if mbuffer_size and not ("mbuffer" in source_tools and "mbuffer" in dest_tools):
+            logger.warning(f"[MIGRATION] mbuffer non disponibile su entrambi i nodi: stream senza buffer")
+            mbuffer_size = None
+        with_pv = "pv" in source_tools
+        
+        config_result = await ssh_service.execute(
+            hostname=source_hostname,
+            command=f"{'qm' if vm_type == 'qemu' else 'pct'} config {vm_id}",
+            port=source_port,
+            username=source_user,
+            key_path=source_key,
+            timeout=30
+        )
+        total_bytes = parse_config_disk_bytes(config_result.stdout) if config_result.success else 0
         
-        duration = int(time.time() - start_time)
-        
-        # Usa backup_size_human se transferred non è stato calcolato
-        final_transferred = backup_size_human if backup_size_human != "N/A" else transferred
-        
-        logger.info(f"[MIGRATION] ========== COPIA COMPLETATA ==========")
-        logger.info(f"[MIGRATION] VM: {vm_id} -> {target_vmid} su {dest_hostname}")
-        logger.info(f"[MIGRATION] Durata: {duration}s | Trasferiti: {final_transferred}")
-        logger.info(f"[MIGRATION] Backup mode usato: {used_mode}")
+        last_error = None
+        last_full_output = None
+        for backup_mode in ["snapshot", "suspend", "stop"]:
+            stream_cmd = build_stream_command(
+                vm_id, vm_type, backup_mode, target_vmid, dest_storage,
+                dest_hostname, dest_port, dest_user, source_key,
+                compress_level=compress_level, mbuffer_size=mbuffer_size, with_pv=with_pv
+            )
+            logger.info(f"[MIGRATION] FASE: STREAM vzdump -> restore - mode={backup_mode}")
+            logger.info(f"[MIGRATION] VM: {vm_id} ({vm_type}) | {source_hostname} -> {dest_hostname}:{target_vmid} ({dest_storage})")
+            logger.debug(f"[MIGRATION] Comando: {stream_cmd}")
+            
+            state = {"bytes": 0, "at": time.monotonic(), "prev": 0, "rate": 0.0}
+            
+            def on_line(stream: str, line: str, state=state, mode=backup_mode):
+                text = line.strip()
+                if stream != "stderr" or not text.isdigit():
+                    return
+                now = time.monotonic()
+                done = int(text)
+                elapsed = now - state["at"]
+                if elapsed > 0:
+                    state["rate"] = (done - state["prev"]) / elapsed
+                state.update(bytes=done, at=now, prev=done)
+                if progress_callback:
+                    progress_callback({
+                        "status": "running",
+                        "phase": "stream",
+                        "mode": mode,
+                        "bytes": done,
+                        "total_bytes": total_bytes or None,
+                        "percent": round(min(99.0, done * 100.0 / total_bytes), 1) if total_bytes else None,
+                        "rate_bps": int(state["rate"]),
+                    })
+            
+            stream_result = await ssh_service.execute_streaming(
+                hostname=source_hostname,
+                command=stream_cmd,
+                on_line=on_line,
+                port=source_port,
+                username=source_user,
+                key_path=source_key,
+                timeout=STREAM_IDLE_TIMEOUT
+            )
+            if stream_result.success:
+                logger.info(f"[MIGRATION] Stream VM {vm_id} completato con mode={backup_mode} ({_format_bytes(state['bytes'])})")
+                return {"success": True, "mode": backup_mode, "bytes": state["bytes"]}
+            
+            full_output = f"STDOUT:\n{stream_result.stdout[-4000:]}\n\nSTDERR:\n{stream_result.stderr[-4000:]}"
+            last_full_output = full_output
+            last_error = stream_result.stderr
+            full_output_lower = full_output.lower()
+            is_recoverable = any(err in full_output_lower for err in _RECOVERABLE_BACKUP_ERRORS)
+            if is_recoverable and state["bytes"] == 0:
+                logger.warning(f"[MIGRATION] Stream mode {backup_mode} fallito prima del trasferimento, provo alternativa")
+                logger.warning(f"[MIGRATION] Errore: {stream_result.stderr[-300:]}")
+                continue
+            
+            logger.error(f"[MIGRATION] FASE: STREAM FALLITO")
+            logger.error(f"[MIGRATION] VM: {vm_id} ({vm_type}) | {source_hostname} -> {dest_hostname}")
+            logger.error(f"[MIGRATION] Mode: {backup_mode} | Byte trasferiti: {state['bytes']}")
+            logger.error(f"[MIGRATION] Exit code: {stream_result.exit_code}")
+            logger.error(f"[MIGRATION] Output completo:\n{full_output}")
+            error_lines = [line for line in full_output.split('\n') if 'ERROR' in line or 'error' in line.lower()]
+            specific_error = '\n'.join(error_lines) if error_lines else stream_result.stderr
+            return {
+                "success": False,
+                "message": f"Copia in streaming VM {vm_id} fallita (mode={backup_mode}): {specific_error[:500] if specific_error else 'Nessun dettaglio'}",
+                "error": specific_error,
+                "phase": "stream",
+                "backup_mode": backup_mode,
+                "exit_code": stream_result.exit_code,
+                "command": stream_cmd,
+                "source_host": source_hostname,
+                "dest_host": dest_hostname,
+                "dest_storage": dest_storage,
+                "full_output": full_output
+            }
         
         return {
-            "success": True,
-            "message": f"VM {vm_id} copiata con successo su {dest_hostname} (VMID: {target_vmid}) - Trasferiti: {final_transferred}",
-            "vm_id": target_vmid,
-            "duration": duration,
-            "transferred": final_transferred,
-            "backup_size": backup_size_human,
-            "snapshot_created": snapshot_name if create_snapshot else None
+            "success": False,
+            "message": f"Copia in streaming VM {vm_id} fallita con tutti i mode (snapshot, suspend, stop). Ultimo errore: {last_error[:300] if last_error else 'Nessun dettaglio'}",
+            "error": last_error or "Tutti i mode di backup falliti (snapshot, suspend, stop)",
+            "phase": "stream",
+            "source_host": source_hostname,
+            "dest_host": dest_hostname,
+            "full_output": last_full_output
         }
     
     async def _apply_hw_config(
@@ -1,11 +1,26 @@
-"""Catalogo dimensioni per-cartella (du -sb via SSH sulla sorgente) — job separato dalla replica."""
+"""Catalogo dimensioni per-cartella (du -sb via SSH sulla sorgente) — job separato dalla replica.
+
+Ogni aggiornamento fa prima una sonda leggera (``find`` fino al 2° livello:
+tipo, mtime e dimensione delle voci) e poi ``du -sb`` solo sulle cartelle di
+1° livello la cui firma (mtime più recente tra cartella e figli, numero di
+figli) è cambiata dall'ultimo catalogo. Il totale della root è la somma delle
+cartelle più i file sciolti, senza un secondo ``du`` sull'intero albero.
+Ogni ``DAPX_NAS_SYNC_DU_FULL_HOURS`` ore (o su richiesta) si rilegge tutto:
+le modifiche sotto il 3° livello che non toccano i figli diretti non
+cambiano la firma.
+
+La sonda usa ``find -printf`` (GNU): se fallisce senza restituire voci
+(es. busybox find) si ripiega sul ``du`` completo per cartella; se anche
+quello non trova nulla il catalogo precedente resta invariato.
+"""
 
 from __future__ import annotations
 
 import asyncio
 import logging
 import os
-from datetime import datetime
+import shlex
+from datetime import datetime, timedelta
 
 from database import FileEndpoint, SessionLocal
 from services.file_replication.path_utils import sanitize_path
@@ -16,9 +31,15 @@ from services.nas_sync.state import assign_run_state, folder_progress_fields, ge
 
 logger = logging.getLogger(__name__)
 
+# Dopo quante ore l'aggiornamento incrementale diventa una rilettura completa
+DU_FULL_REFRESH_HOURS = float(os.environ.get("DAPX_NAS_SYNC_DU_FULL_HOURS", "168"))
+
 _catalog_running: set[int] = set()
 _catalog_progress: dict[int, dict] = {}
 
+# Cartelle di sistema Synology/QNAP e nascoste: fuori dal catalogo
+_PRUNE = "\\( -name '@*' -o -name '#*' -o -name '.*' \\) -prune"
+
 
 def is_catalog_refresh_running(job_id: int) -> bool:
     return job_id in _catalog_running
@@ -28,21 +49,71 @@ def get_catalog_progress(job_id: int) -> dict | None:
     return _catalog_progress.get(job_id)
 
 
-def build_du_script(fs_root: str) -> str:
-    root = fs_root.rstrip("/")
+def build_probe_script(fs_root: str) -> str:
+    """Voci fino al 2° livello: ``tipo\\tmtime\\tbyte\\tpath relativo``, separate da NUL."""
+    root = shlex.quote(fs_root.rstrip("/"))
+    return (
+        f"find {root} -mindepth 1 -maxdepth 2 {_PRUNE} "
+        "-o -printf '%y\\t%T@\\t%s\\t%P\\0' 2>/dev/null"
+    )
+
+
+def parse_probe_output(text: str, src_root: str) -> tuple[dict[str, dict], int]:
+    """(cartelle di 1° livello → {name, mtime, entries}, byte dei file sciolti)."""
+    logical_root = sanitize_path(src_root).rstrip("/")
+    folders: dict[str, dict] = {}
+    children: list[tuple[str, float]] = []
+    loose_bytes = 0
+    for record in text.split("\0"):
+        parts = record.strip("\n").split("\t", 3)
+        if len(parts) != 4 or not parts[3]:
+            continue
+        kind, mtime_s, size_s, rel = parts
+        try:
+            mtime = float(mtime_s)
+            size = int(size_s)
+        except ValueError:
+            continue
+        if "/" not in rel:
+            if kind == "d":
+                folders[rel] = {"name": rel, "mtime": int(mtime), "entries": 0}
+            elif kind == "f":
+                loose_bytes += size
+            continue
+        children.append((rel.split("/", 1)[0], mtime))
+    for top, mtime in children:
+        folder = folders.get(top)
+        if folder is not None:
+            folder["entries"] += 1
+            folder["mtime"] = max(folder["mtime"], int(mtime))
     return (
-        f"du -sb '{root}' 2>/dev/null; "
-        f"find '{root}' -mindepth 1 -maxdepth 1 -type d "
-        "! -name '@*' ! -name '#*' ! -name '.*' -print0 2>/dev/null "
-        "| xargs -0 -r -n1 du -sb 2>/dev/null"
+        {f"{logical_root}/{name}": info for name, info in sorted(folders.items())},
+        loose_bytes,
     )
 
 
+def build_du_script(fs_root: str, folders: list[str] | None = None) -> str:
+    """``du -sb`` per cartella (un processo per cartella: gli hard link tra
+    cartelle diverse restano contati in entrambe). Senza ``folders`` tutte
+    le cartelle di 1° livello."""
+    root = fs_root.rstrip("/")
+    if folders is None:
+        return (
+            f"find '{root}' -mindepth 1 -maxdepth 1 -type d "
+            "! -name '@*' ! -name '#*' ! -name '.*' -print0 2>/dev/null "
+            "| xargs -0 -r -n1 du -sb 2>/dev/null"
+        )
+    paths = " ".join(shlex.quote(f"{root}/{name}") for name in folders)
+    return f"printf '%s\\0' {paths} | xargs -0 -r -n1 du -sb 2>/dev/null"
+
+
 def parse_du_output(text: str, fs_root: str, src_root: str) -> tuple[list[dict], int]:
+    """(cartelle di 1° livello con byte, totale). Il totale è la riga della
+    root se presente, altrimenti la somma delle cartelle."""
     root = fs_root.rstrip("/")
     logical_root = sanitize_path(src_root).rstrip("/")
     folders: list[dict] = []
-    total = 0
+    total = None
     for line in text.splitlines():
         parts = line.split("\t")
         if len(parts) != 2:
@@ -61,10 +132,125 @@ def parse_du_output(text: str, fs_root: str, src_root: str) -> tuple[list[dict],
         if "/" in rel:
             continue  # solo primo livello
         folders.append({"path": f"{logical_root}/{rel}", "name": rel, "bytes": size})
+    if total is None:
+        total = sum(f["bytes"] for f in folders)
     return folders, total
 
 
-async def refresh_job_du_catalog(job_id: int) -> None:
+async def _run_remote(argv: list[str], env: dict, script: str, timeout: int = 3600) -> tuple[int, str]:
+    """(exit status, stdout) dello script remoto."""
+    proc = await asyncio.create_subprocess_exec(
+        *argv,
+        script,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+        env={**os.environ, **env},
+        start_new_session=True,  # process group proprio → kill pulito al timeout
+    )
+    try:
+        out_b, _ = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        # P-18: al timeout applicativo termina il process group (ssh+du),
+        # altrimenti resta orfano a consumare CPU/IO/connessioni.
+        import signal
+        if proc.returncode is None and proc.pid:
+            try:
+                os.killpg(proc.pid, signal.SIGTERM)
+            except (ProcessLookupError, PermissionError):
+                proc.terminate()
+            try:
+                await asyncio.wait_for(proc.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except (ProcessLookupError, PermissionError):
+                    proc.kill()
+        raise
+    return proc.returncode, out_b.decode(errors="replace")
+
+
+def _needs_full(previous: dict | None, now: datetime) -> bool:
+    if not previous or not previous.get("full_at"):
+        return True
+    if DU_FULL_REFRESH_HOURS <= 0:
+        return True
+    try:
+        full_at = datetime.fromisoformat(previous["full_at"])
+    except ValueError:
+        return True
+    return now - full_at >= timedelta(hours=DU_FULL_REFRESH_HOURS)
+
+
+async def _collect_root_full(
+    argv: list[str], env: dict, fs_root: str, src_path: str, previous: dict | None, now: datetime,
+) -> tuple[list[dict], int, int, bool]:
+    """Ripiego senza sonda: ``du`` su tutte le cartelle di 1° livello. Senza
+    firme (mtime/figli) il prossimo aggiornamento le rilegge tutte; i byte
+    dei file sciolti restano quelli dell'ultimo catalogo."""
+    rc, out = await _run_remote(argv, env, build_du_script(fs_root))
+    scanned, _ = parse_du_output(out, fs_root, src_path)
+    if not scanned and (previous or {}).get("folders"):
+        raise RuntimeError(
+            f"Catalogo du di {src_path} non leggibile (find/du exit {rc}): catalogo precedente mantenuto"
+        )
+    stamp = now.isoformat(timespec="seconds")
+    folders = [
+        {**f, "mtime": None, "entries": None, "scanned_at": stamp} for f in scanned
+    ]
+    return folders, int((previous or {}).get("loose_bytes") or 0), len(folders), True
+
+
+async def _collect_root(
+    argv: list[str], env: dict, fs_root: str, src_path: str, previous: dict | None, full: bool,
+) -> tuple[list[dict], int, int, bool]:
+    """Catalogo di una root: (cartelle, byte file sciolti, cartelle rilette, completo)."""
+    now = datetime.utcnow()
+    full = full or _needs_full(previous, now)
+    rc, out = await _run_remote(argv, env, build_probe_script(fs_root), timeout=600)
+    if rc != 0 and not out.strip("\0\n"):
+        # Sonda non supportata (es. find senza -printf): errori di permesso
+        # su alcune voci danno exit != 0 ma con output, qui non c'è nulla
+        logger.warning(
+            "du catalog %s: sonda find fallita (exit %s), du completo per cartella", fs_root, rc
+        )
+        return await _collect_root_full(argv, env, fs_root, src_path, previous, now)
+    probe, loose_bytes = parse_probe_output(out, src_path)
+    known = {f.get("path"): f for f in (previous or {}).get("folders") or []}
+    changed = [
+        path for path, info in probe.items()
+        if full
+        or path not in known
+        or known[path].get("mtime") != info["mtime"]
+        or known[path].get("entries") != info["entries"]
+    ]
+    sizes: dict[str, int] = {}
+    if changed:
+        names = None if full else [probe[path]["name"] for path in changed]
+        _, out = await _run_remote(argv, env, build_du_script(fs_root, names))
+        scanned, _ = parse_du_output(out, fs_root, src_path)
+        sizes = {f["path"]: f["bytes"] for f in scanned}
+    stamp = now.isoformat(timespec="seconds")
+    folders: list[dict] = []
+    for path, info in probe.items():
+        if path in sizes:
+            bytes_, scanned_at = sizes[path], stamp
+        elif path in known and path not in changed:
+            bytes_, scanned_at = int(known[path].get("bytes") or 0), known[path].get("scanned_at")
+        else:
+            continue  # sparita tra sonda e du
+        folders.append({
+            "path": path,
+            "name": info["name"],
+            "bytes": bytes_,
+            "mtime": info["mtime"],
+            "entries": info["entries"],
+            "scanned_at": scanned_at,
+        })
+    return folders, loose_bytes, len(sizes), full
+
+
+async def refresh_job_du_catalog(job_id: int, full: bool = False) -> None:
+    """Aggiorna il catalogo du del job; ``full`` rilegge tutte le cartelle."""
     if job_id in _catalog_running:
         return
     _catalog_running.add(job_id)
@@ -86,8 +272,9 @@ async def refresh_job_du_catalog(job_id: int) -> None:
         state = get_run_state(job)
         argv, env = build_ssh_argv(source)
         for src_path in job.source_paths or []:
+            root = sanitize_path(src_path)
             fs_root = build_source_fs_path(source, src_path)
-            script = build_du_script(fs_root)
+            previous = (state.get("catalog") or {}).get(root)
             _catalog_progress[job_id] = {
                 "status": "catalog_refresh",
                 "phase": "starting",
@@ -95,45 +282,23 @@ async def refresh_job_du_catalog(job_id: int) -> None:
                 "message": f"du {src_path}…",
                 **folder_progress_fields(state, activity="catalog"),
             }
-            proc = await asyncio.create_subprocess_exec(
-                *argv,
-                script,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.DEVNULL,
-                env={**os.environ, **env},
-                start_new_session=True,  # process group proprio → kill pulito al timeout
-            )
-            try:
-                out_b, _ = await asyncio.wait_for(proc.communicate(), timeout=3600)
-            except asyncio.TimeoutError:
-                # P-18: al timeout applicativo termina il process group (ssh+du),
-                # altrimenti resta orfano a consumare CPU/IO/connessioni.
-                import signal
-                if proc.returncode is None and proc.pid:
-                    try:
-                        os.killpg(proc.pid, signal.SIGTERM)
-                    except (ProcessLookupError, PermissionError):
-                        proc.terminate()
-                    try:
-                        await asyncio.wait_for(proc.wait(), timeout=5)
-                    except asyncio.TimeoutError:
-                        try:
-                            os.killpg(proc.pid, signal.SIGKILL)
-                        except (ProcessLookupError, PermissionError):
-                            proc.kill()
-                raise
-            folders, total = parse_du_output(
-                out_b.decode(errors="replace"), fs_root, src_path
+            folders, loose_bytes, rescanned, was_full = await _collect_root(
+                argv, env, fs_root, src_path, previous, full,
             )
+            at_iso = datetime.utcnow().isoformat(timespec="seconds")
             state = set_du_catalog(
-                state, sanitize_path(src_path), folders, total, None,
-                datetime.utcnow().isoformat(timespec="seconds"),
+                state, root, folders, sum(f["bytes"] for f in folders) + loose_bytes, None, at_iso,
+                loose_bytes=loose_bytes,
+                full_at=at_iso if was_full else (previous or {}).get("full_at"),
             )
             _catalog_progress[job_id] = {
                 "status": "catalog_refresh",
                 "phase": "starting",
                 "phase_label": "Catalogo du sorgente",
-                "message": f"Catalogo aggiornato: {src_path} ({len(folders)} cartelle)",
+                "message": (
+                    f"Catalogo aggiornato: {src_path} ({len(folders)} cartelle, "
+                    f"{rescanned} rilette)"
+                ),
                 **folder_progress_fields(state, activity="catalog"),
             }
         assign_run_state(job, state)
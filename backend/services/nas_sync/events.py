@@ -4,6 +4,8 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 
+from services.size_utils import parse_transfer_size_to_bytes
+
 
 @dataclass
 class SyncEvent:
@@ -75,6 +77,56 @@ def apply_event(progress: dict, ev: SyncEvent) -> dict:
     return p
 
 
+
+_COUNTERS = ("files_new", "files_replaced", "files_skipped", "files_deleted", "bytes_done")
+
+
+def fold_finished(totals: dict, step_progress: dict) -> dict:
+    """Aggiunge ai totali degli step conclusi il progresso finale di uno step
+    (solo contatori e byte: percentuale, velocità ed ETA non servono più)."""
+    t = dict(totals)
+    for attr in _COUNTERS:
+        t[attr] = int(t.get(attr) or 0) + int(step_progress.get(attr) or 0)
+    done = step_progress.get("bytes_total") or step_progress.get("bytes_done") or 0
+    t["bytes_total"] = int(t.get("bytes_total") or 0) + int(done)
+    for attr in ("phase", "last_file"):
+        if step_progress.get(attr):
+            t[attr] = step_progress[attr]
+    return t
+
+
+def merge_progress(finished: dict, active: list[dict]) -> dict:
+    """Progresso complessivo: step conclusi + step in corso (anche in parallelo).
+
+    Contatori, byte e velocità si sommano; l'ETA è quella dello step più
+    lento; la percentuale del singolo step vale solo se ne è attivo uno
+    (con più step la % complessiva arriva dal catalogo du)."""
+    parts = [finished, *active]
+    p: dict = {}
+    for attr in _COUNTERS:
+        if any(attr in part for part in parts):
+            p[attr] = sum(int(part.get(attr) or 0) for part in parts)
+    p["files_copied"] = int(p.get("files_new") or 0) + int(p.get("files_replaced") or 0)
+    p["files_done"] = p["files_copied"]
+    if active and all(part.get("bytes_total") for part in active):
+        p["bytes_total"] = int(finished.get("bytes_total") or 0) + sum(int(a["bytes_total"]) for a in active)
+    for attr in ("phase", "last_file"):
+        for part in parts:
+            if part.get(attr):
+                p[attr] = part[attr]
+    if len(active) == 1:
+        for attr in ("percent", "speed", "eta_seconds"):
+            if active[0].get(attr) is not None:
+                p[attr] = active[0][attr]
+    elif active:
+        speeds = [parse_transfer_size_to_bytes((a.get("speed") or "").replace("/s", "")) for a in active]
+        if any(speeds):
+            p["speed"] = f"{human_bytes(sum(speeds))}/s"
+        etas = [int(a["eta_seconds"]) for a in active if a.get("eta_seconds")]
+        if etas:
+            p["eta_seconds"] = max(etas)
+    return p
+
 _PHASE_LABELS = {
     "starting": "Avvio replica…",
     "scanning": "Scansione sorgente",
@@ -2,7 +2,10 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
+import os
+from collections import deque
 from datetime import datetime
 from typing import Optional
 
@@ -12,6 +15,8 @@ from services.file_replication.exclude_presets import (
     build_rsync_exclude_lines,
 )
 from services.file_replication.path_utils import sanitize_path
+from services.job_events import job_events
+from services.job_log_output import append_output
 from services.nas_sync.capabilities import ENGINE_DIRECT, resolve_engine
 from services.nas_sync.du_catalog import is_catalog_refresh_running
 from services.nas_sync.engine_direct_rsync import (
@@ -22,7 +27,14 @@ from services.nas_sync.engine_direct_rsync import (
     run_direct_rsync,
 )
 from services.nas_sync.engine_rclone import run_rclone_step
-from services.nas_sync.events import SyncEvent, apply_event, build_view, eta_human
+from services.nas_sync.events import (
+    SyncEvent,
+    apply_event,
+    build_view,
+    eta_human,
+    fold_finished,
+    merge_progress,
+)
 from services.nas_sync.models import NasSyncJob
 from services.nas_sync.notifications import notify_nas_sync_result
 from services.nas_sync.state import (
@@ -40,11 +52,15 @@ from services.nas_sync.state import (
 
 logger = logging.getLogger(__name__)
 
+# Tetto agli step per-cartella in parallelo di un job (parallel_workers)
+NAS_SYNC_MAX_PARALLEL = max(1, int(os.environ.get("DAPX_NAS_SYNC_MAX_PARALLEL", "8")))
+
 _running: set[int] = set()
 _cancel_requested: set[int] = set()
 _processes: dict[int, list] = {}
 _remote_pids: dict[int, tuple[int, int]] = {}  # job_id -> (source_endpoint_id, pid)
-_progress: dict[int, dict] = {}
+# Progresso per job, pubblicato sul bus eventi (/api/events/jobs)
+_progress = job_events.registry("nas_sync")
 
 
 def is_job_running(job_id: int) -> bool:
@@ -108,8 +124,18 @@ def _catalog_dir_names(run_state: dict, root: str) -> list[str]:
     return names
 
 
+def _job_parallelism(job: NasSyncJob) -> int:
+    return max(1, min(int(job.parallel_workers or 1), NAS_SYNC_MAX_PARALLEL))
+
+
 def _build_steps(job: NasSyncJob, run_state: dict) -> list[dict]:
-    """Step: ensure root dest, poi per-cartella se c'è catalogo, poi root (file sciolti)."""
+    """Step: ensure root dest, poi per-cartella se c'è catalogo, poi root (file sciolti).
+
+    Con più worker gli step di copia di ogni root sono ordinati per byte
+    decrescenti dal catalogo du (i file sciolti stimati come totale meno
+    cartelle): le cartelle grandi partono subito e non restano in coda
+    alla fine mentre gli altri worker sono fermi."""
+    parallel = _job_parallelism(job) > 1
     steps: list[dict] = []
     for src_path in job.source_paths or []:
         root = sanitize_path(src_path)
@@ -123,20 +149,28 @@ def _build_steps(job: NasSyncJob, run_state: dict) -> list[dict]:
                 "folder_path": None,
                 "ensure_dest_only": True,
             })
-            for folder in pending_folders(run_state, root):
-                steps.append({
+            copy_steps = [
+                {
                     "src_path": folder["path"],
                     "root": root,
                     "folder_path": folder["path"],
-                })
+                    "bytes": int(folder.get("bytes") or 0),
+                }
+                for folder in pending_folders(run_state, root)
+            ]
             # Sempre uno step root che esclude le cartelle già catalogate:
             # copre file sciolti e directory apparse dopo il du.
-            steps.append({
+            folders_bytes = sum(int(f.get("bytes") or 0) for f in catalog_entry.get("folders") or [])
+            copy_steps.append({
                 "src_path": root,
                 "root": root,
                 "folder_path": None,
                 "exclude_dirs": _catalog_dir_names(run_state, root),
+                "bytes": max(0, int(catalog_entry.get("total_bytes") or 0) - folders_bytes),
             })
+            if parallel:
+                copy_steps.sort(key=lambda st: st["bytes"], reverse=True)
+            steps.extend(copy_steps)
         else:
             steps.append({"src_path": root, "root": root, "folder_path": None})
     return steps
@@ -161,7 +195,12 @@ async def _run_engine_step(
     filter_file: str | None,
     on_event,
     job_id: int,
+    *,
+    cancel_check=None,
+    bandwidth_limit_kb: int | None = None,
 ) -> StepResult:
+    if cancel_check is None:
+        cancel_check = lambda: job_id in _cancel_requested  # noqa: E731
     step_excludes = _step_exclude_lines(exclude_lines, step)
     ensure_dest_only = bool(step.get("ensure_dest_only"))
     if engine == ENGINE_DIRECT:
@@ -172,9 +211,9 @@ async def _run_engine_step(
             (job.dest_base_path or "").strip(),
             exclude_lines=step_excludes,
             delete_on_dest=bool(job.delete_on_dest) and not ensure_dest_only,
-            bandwidth_limit_kb=None if ensure_dest_only else job.bandwidth_limit_kb,
+            bandwidth_limit_kb=None if ensure_dest_only else bandwidth_limit_kb,
             on_event=on_event,
-            cancel_check=lambda: job_id in _cancel_requested,
+            cancel_check=cancel_check,
             process_registry=_processes[job_id],
             ensure_dest_only=ensure_dest_only,
         )
@@ -190,11 +229,11 @@ async def _run_engine_step(
         job.dest_base_path or "",
         delete_on_dest=bool(job.delete_on_dest),
         size_only=bool(job.rclone_size_only),
-        bandwidth_limit_kb=job.bandwidth_limit_kb,
+        bandwidth_limit_kb=bandwidth_limit_kb,
         filter_file=filter_file,
         extra_excludes=list(step.get("exclude_dirs") or []),
         on_event=on_event,
-        cancel_check=lambda: job_id in _cancel_requested,
+        cancel_check=cancel_check,
         process_registry=_processes[job_id],
     )
 
@@ -266,30 +305,46 @@ async def execute_nas_sync_job(job_id: int, *, fresh: bool = False, _engine_runn
             db.commit()
         run_state = clear_pause(run_state)
 
-        def on_event(ev: SyncEvent) -> None:
+        workers = _job_parallelism(job)
+        # Limite banda del job diviso tra i processi in parallelo
+        step_bwlimit = (
+            max(1, job.bandwidth_limit_kb // workers) if job.bandwidth_limit_kb else None
+        )
+        # worker -> {"step", "progress"} degli step in corso; i contatori
+        # degli step conclusi sono sommati in finished
+        active: dict[int, dict] = {}
+        finished: dict = {}
+        failures: list[Exception] = []
+
+        def _step_activity(step: dict) -> Optional[str]:
+            if step.get("ensure_dest_only"):
+                return "ensure"
+            if step.get("folder_path") is None and step.get("exclude_dirs") is not None:
+                return "root_loose"
+            return None
+
+        def _publish() -> None:
             nonlocal progress_state
-            progress_state = apply_event(progress_state, ev)
+            entries = [active[w] for w in sorted(active)]
+            progress_state = merge_progress(finished, [e["progress"] for e in entries])
+            primary = entries[0]["step"] if entries else {}
             view = build_view(progress_state)
             view["status"] = "running"
             view.update(catalog_summary(run_state))
             folder_fields = folder_progress_fields(
                 run_state,
-                current_step.get("folder_path"),
-                step_percent=progress_state.get("percent"),
-                step_eta_seconds=progress_state.get("eta_seconds"),
-                activity=(
-                    "ensure"
-                    if current_step.get("ensure_dest_only")
-                    else (
-                        "root_loose"
-                        if current_step.get("folder_path") is None
-                        and current_step.get("exclude_dirs") is not None
-                        else None
+                activity=_step_activity(primary) if len(entries) <= 1 else None,
+                active_folders={
+                    e["step"]["folder_path"]: (
+                        e["progress"].get("percent"),
+                        e["progress"].get("eta_seconds"),
                     )
-                ),
+                    for e in entries
+                    if e["step"].get("folder_path")
+                },
             )
             view.update(folder_fields)
-            if current_step.get("ensure_dest_only"):
+            if primary.get("ensure_dest_only"):
                 view["folder_activity_label"] = "Preparazione path destinazione…"
                 view["phase_label"] = "Preparazione destinazione"
             # Alias UI (formatFileReplProgress legge eta / percent stringa)
@@ -305,11 +360,62 @@ async def execute_nas_sync_job(job_id: int, *, fresh: bool = False, _engine_runn
                     view["eta"] = human
             elif view.get("eta_human"):
                 view["eta"] = view["eta_human"]
-            if current_step.get("folder_path") and not view.get("current_folder_path"):
-                view["current_folder_path"] = current_step["folder_path"]
-                view["current_folder_name"] = current_step["folder_path"].rsplit("/", 1)[-1]
+            if primary.get("folder_path") and not view.get("current_folder_path"):
+                view["current_folder_path"] = primary["folder_path"]
+                view["current_folder_name"] = primary["folder_path"].rsplit("/", 1)[-1]
+            view["parallel_workers"] = workers
             _progress[job_id] = view
 
+        def _stopping() -> bool:
+            # Un errore in un worker ferma anche gli altri (come il run sequenziale)
+            return job_id in _cancel_requested or bool(failures)
+
+        async def _run_step(slot: int, step: dict) -> None:
+            nonlocal run_state, finished
+            entry = {"step": step, "progress": {}}
+
+            def on_step_event(ev: SyncEvent) -> None:
+                entry["progress"] = apply_event(entry["progress"], ev)
+                _publish()
+
+            current_step.clear()
+            current_step.update(step)
+            active[slot] = entry
+            _publish()
+            try:
+                if _engine_runner is not None:
+                    result = await _engine_runner(
+                        {"engine": engine, "src_path": step["src_path"],
+                         "folder_path": step["folder_path"],
+                         "dest_subpath": job.dest_base_path or "",
+                         "exclude_dirs": step.get("exclude_dirs") or [],
+                         "on_event": on_step_event}
+                    )
+                else:
+                    result = await _run_engine_step(
+                        engine, job, source, dest, step, exclude_lines, filter_path,
+                        on_step_event, job_id,
+                        cancel_check=_stopping, bandwidth_limit_kb=step_bwlimit,
+                    )
+            finally:
+                active.pop(slot, None)
+                finished = fold_finished(finished, entry["progress"])
+            warnings.extend(result.warnings)
+            output_tail.extend(result.output_lines[-200:])
+            if step["folder_path"]:
+                run_state = mark_folder_done(run_state, step["root"], step["folder_path"])
+                assign_run_state(job, run_state)
+                db.commit()
+            _publish()
+
+        async def _worker(slot: int, queue: deque) -> None:
+            while queue and not _stopping():
+                try:
+                    await _run_step(slot, queue.popleft())
+                except Exception as exc:  # noqa: BLE001 — rilanciata dopo il join
+                    failures.append(exc)
+                    return
+
         steps = _build_steps(job, run_state)
         # Vista iniziale con catalogo (ETA/% più accurati dopo il du)
         _progress[job_id] = {
@@ -319,52 +425,25 @@ async def execute_nas_sync_job(job_id: int, *, fresh: bool = False, _engine_runn
             **folder_progress_fields(run_state, activity="ensure"),
             "folder_activity_label": "Avvio replica…",
         }
-        for step in steps:
-            current_step.clear()
-            current_step.update(step)
-            step_activity = (
-                "ensure"
-                if step.get("ensure_dest_only")
-                else (
-                    "root_loose"
-                    if step.get("folder_path") is None and step.get("exclude_dirs") is not None
-                    else None
+        # In parallelo le cartelle destinazione delle root vanno create prima
+        # di far partire le copie per-cartella
+        phases = [steps] if workers == 1 else [
+            [st for st in steps if st.get("ensure_dest_only")],
+            [st for st in steps if not st.get("ensure_dest_only")],
+        ]
+        for phase_steps in phases:
+            queue = deque(phase_steps)
+            await asyncio.gather(*(
+                _worker(slot, queue) for slot in range(min(workers, len(phase_steps)) or 1)
+            ))
+            if failures:
+                # Priorità all'errore vero: gli altri worker fermati
+                # escono con EngineCancelled
+                raise next(
+                    (f for f in failures if not isinstance(f, EngineCancelled)), failures[0]
                 )
-            )
-            _progress[job_id] = {
-                **(_progress.get(job_id) or {}),
-                **folder_progress_fields(
-                    run_state, step.get("folder_path"), activity=step_activity,
-                ),
-                "status": "running",
-            }
-            if step.get("ensure_dest_only"):
-                _progress[job_id]["folder_activity_label"] = "Preparazione path destinazione…"
             if job_id in _cancel_requested:
                 raise EngineCancelled("Interrotto dall'utente")
-            if _engine_runner is not None:
-                result = await _engine_runner(
-                    {"engine": engine, "src_path": step["src_path"],
-                     "folder_path": step["folder_path"],
-                     "dest_subpath": job.dest_base_path or "",
-                     "exclude_dirs": step.get("exclude_dirs") or []}
-                )
-            else:
-                result = await _run_engine_step(
-                    engine, job, source, dest, step, exclude_lines, filter_path,
-                    on_event, job_id,
-                )
-            warnings.extend(result.warnings)
-            output_tail.extend(result.output_lines[-200:])
-            if step["folder_path"]:
-                run_state = mark_folder_done(run_state, step["root"], step["folder_path"])
-                assign_run_state(job, run_state)
-                db.commit()
-                _progress[job_id] = {
-                    **(_progress.get(job_id) or {}),
-                    **folder_progress_fields(run_state),
-                    "status": "running",
-                }
 
         duration = int((datetime.utcnow() - started).total_seconds())
         final_view = build_view(progress_state)
@@ -384,7 +463,11 @@ async def execute_nas_sync_job(job_id: int, *, fresh: bool = False, _engine_runn
                 summary += " — con avvisi"
             log_row.status = "success"
             log_row.message = summary
-            log_row.output = ("\n".join(warnings) + "\n\n" if warnings else "") + "".join(output_tail)[-45000:]
+            append_output(
+                db, log_row.id,
+                ("\n".join(warnings) + "\n\n" if warnings else "") + "".join(output_tail)[-45000:],
+                commit=False,
+            )
             log_row.duration = duration
             log_row.completed_at = datetime.utcnow()
             db.commit()
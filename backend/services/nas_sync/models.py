@@ -37,6 +37,8 @@ class NasSyncJob(Base):
     exclude_presets = Column(JSON, nullable=False, default=list)
     exclude_patterns = Column(JSON, nullable=False, default=list)
     bandwidth_limit_kb = Column(Integer, nullable=True)
+    # Step per-cartella eseguiti in parallelo (1 = sequenziale)
+    parallel_workers = Column(Integer, nullable=False, default=1)
     snapshot_policy_hint = Column(JSON, nullable=True, default=dict)
     schedule = Column(String(100), nullable=True)
     schedule_config = Column(JSON, nullable=True)
@@ -19,6 +19,7 @@ class NasSyncJobCreate(BaseModel):
     exclude_presets: list[str] = Field(default_factory=lambda: ["nas_snapshots", "system_files"])
     exclude_patterns: list[str] = Field(default_factory=list)
     bandwidth_limit_kb: Optional[int] = None
+    parallel_workers: int = Field(default=1, ge=1, le=16)
     snapshot_policy_hint: Optional[dict[str, Any]] = None
     schedule: Optional[str] = None
     schedule_config: Optional[dict[str, Any]] = None
@@ -38,6 +39,7 @@ class NasSyncJobUpdate(BaseModel):
     exclude_presets: Optional[list[str]] = None
     exclude_patterns: Optional[list[str]] = None
     bandwidth_limit_kb: Optional[int] = None
+    parallel_workers: Optional[int] = Field(default=None, ge=1, le=16)
     snapshot_policy_hint: Optional[dict[str, Any]] = None
     schedule: Optional[str] = None
     schedule_config: Optional[dict[str, Any]] = None
@@ -62,6 +64,7 @@ class NasSyncJobOut(BaseModel):
     exclude_presets: list[str]
     exclude_patterns: list[str]
     bandwidth_limit_kb: Optional[int] = None
+    parallel_workers: int = 1
     snapshot_policy_hint: Optional[dict[str, Any]] = None
     schedule: Optional[str] = None
     schedule_config: Optional[dict[str, Any]] = None
@@ -2,9 +2,11 @@
 
 Struttura:
 {
-  "catalog": {"<root>": {"folders": [{"path","name","bytes"}...],
+  "catalog": {"<root>": {"folders": [{"path","name","bytes",
+                                      "mtime","entries","scanned_at"}...],
                           "total_bytes": int, "total_files": int|None,
-                          "updated_at": iso}},
+                          "loose_bytes": int, "updated_at": iso,
+                          "full_at": iso}},
   "done": {"<root>": ["<folder_path>", ...]},
   "pause": {"source_path", "folder_path", "last_file"} | assente
 }
@@ -33,14 +35,22 @@ def set_du_catalog(
     total_bytes: int,
     total_files: int | None,
     at_iso: str,
+    *,
+    loose_bytes: int | None = None,
+    full_at: str | None = None,
 ) -> dict:
     s = copy.deepcopy(state)
-    s.setdefault("catalog", {})[root] = {
+    entry = {
         "folders": folders,
         "total_bytes": total_bytes,
         "total_files": total_files,
         "updated_at": at_iso,
     }
+    if loose_bytes is not None:
+        entry["loose_bytes"] = loose_bytes
+    if full_at is not None:
+        entry["full_at"] = full_at
+    s.setdefault("catalog", {})[root] = entry
     return s
 
 
@@ -87,19 +97,25 @@ def folder_progress_fields(
     step_percent: int | None = None,
     step_eta_seconds: int | None = None,
     activity: str | None = None,
+    active_folders: dict[str, tuple[int | None, int | None]] | None = None,
 ) -> dict:
     """Campi UI: lista cartelle, indici, % complessivo ed ETA da catalogo du.
 
     ``activity``: ``ensure`` | ``root_loose`` | ``catalog`` | None (cartella o idle).
+    ``active_folders``: cartelle in copia in parallelo → (percent, eta_seconds)
+    del rispettivo step; senza, vale ``current_folder_path`` con ``step_*``.
     """
     catalog = state.get("catalog") or {}
     if not catalog:
         return {}
 
+    active: dict[str, tuple[int | None, int | None]] = dict(active_folders or {})
+    if not active and current_folder_path:
+        active[current_folder_path] = (step_percent, step_eta_seconds)
     items: list[dict] = []
     done_bytes = 0
-    current_folder_bytes = 0
-    current_idx = None
+    active_bytes: dict[str, int] = {}
+    active_idx: dict[str, int] = {}
     for root, cat in catalog.items():
         done = set((state.get("done") or {}).get(root) or [])
         for folder in cat.get("folders") or []:
@@ -107,10 +123,10 @@ def folder_progress_fields(
             nbytes = int(folder.get("bytes") or 0)
             if activity == "catalog":
                 status = "catalogued"
-            elif path == current_folder_path:
+            elif path in active:
                 status = "in_progress"
-                current_folder_bytes = nbytes
-                current_idx = len(items) + 1
+                active_bytes[path] = nbytes
+                active_idx[path] = len(items) + 1
             elif path in done:
                 status = "done"
                 done_bytes += nbytes
@@ -143,7 +159,7 @@ def folder_progress_fields(
     }
     if activity == "ensure":
         out["folder_activity_label"] = "Preparazione path destinazione…"
-    elif activity == "root_loose":
+    elif activity == "root_loose" and not active:
         out["folder_activity_label"] = "File sciolti a root (+ cartelle nuove)"
     elif activity == "catalog":
         parent = roots[0] if len(roots) == 1 else "sorgente"
@@ -152,7 +168,12 @@ def folder_progress_fields(
         )
         out["folders_done"] = 0
         out["folders_pending"] = 0
-    elif current_folder_path:
+    elif active:
+        # La prima cartella attiva (la più grande in parallelo) resta il
+        # riferimento dei campi current_folder_* letti dalla UI
+        current_folder_path = next(iter(active))
+        current_folder_bytes = active_bytes.get(current_folder_path, 0)
+        current_idx = active_idx.get(current_folder_path)
         name = current_folder_path.rsplit("/", 1)[-1]
         parent = current_folder_path.rsplit("/", 1)[0] if "/" in current_folder_path else ""
         out["current_folder_path"] = current_folder_path
@@ -162,22 +183,36 @@ def folder_progress_fields(
             out["current_folder_index"] = current_idx
         if current_folder_bytes:
             out["current_folder_size_human"] = _format_bytes_human(current_folder_bytes)
-        size_bit = (
-            f" (~{_format_bytes_human(current_folder_bytes)})"
-            if current_folder_bytes
-            else ""
-        )
-        idx_bit = f" ({current_idx}/{len(items)})" if current_idx is not None else ""
-        # Path completo reale (non solo il leaf): es. /FTP_BACKUP/DITTE
-        out["folder_activity_label"] = (
-            f"In lavorazione: {current_folder_path}{idx_bit}{size_bit}"
-        )
+        if len(active) > 1:
+            out["active_folders"] = list(active)
+            names = ", ".join(p.rsplit("/", 1)[-1] for p in active)
+            out["folder_activity_label"] = (
+                f"In lavorazione in parallelo: {len(active)} cartelle ({names})"
+            )
+        else:
+            size_bit = (
+                f" (~{_format_bytes_human(current_folder_bytes)})"
+                if current_folder_bytes
+                else ""
+            )
+            idx_bit = f" ({current_idx}/{len(items)})" if current_idx is not None else ""
+            # Path completo reale (non solo il leaf): es. /FTP_BACKUP/DITTE
+            out["folder_activity_label"] = (
+                f"In lavorazione: {current_folder_path}{idx_bit}{size_bit}"
+            )
 
     if activity != "catalog" and total_bytes > 0:
-        current_contrib = 0.0
-        if current_folder_bytes and step_percent is not None:
-            current_contrib = current_folder_bytes * max(0, min(100, int(step_percent))) / 100.0
-        overall_done = done_bytes + current_contrib
+        overall_done = float(done_bytes)
+        rate = 0.0
+        for path, (pct, eta) in active.items():
+            nbytes = active_bytes.get(path, 0)
+            if not nbytes or pct is None:
+                continue
+            pct = max(0, min(100, int(pct)))
+            overall_done += nbytes * pct / 100.0
+            step_remaining = nbytes * (100 - pct) / 100.0
+            if eta and eta > 0 and step_remaining > 0:
+                rate += step_remaining / float(eta)
         overall_pct = min(99, int(100 * overall_done / total_bytes)) if overall_done < total_bytes else 100
         out["percent"] = f"{overall_pct}%"
         out["progress_percent"] = out["percent"]
@@ -185,12 +220,8 @@ def folder_progress_fields(
         out["catalog_bytes_est"] = total_bytes
 
         remaining = max(0.0, total_bytes - overall_done)
-        if step_eta_seconds and current_folder_bytes and step_percent is not None:
-            step_remaining = current_folder_bytes * (100 - max(0, min(100, int(step_percent)))) / 100.0
-            if step_remaining > 0 and step_eta_seconds > 0:
-                rate = step_remaining / float(step_eta_seconds)
-                if rate > 0:
-                    out["eta_seconds_overall"] = int(remaining / rate)
+        if rate > 0:
+            out["eta_seconds_overall"] = int(remaining / rate)
     elif activity == "catalog" and total_bytes > 0:
         out["catalog_bytes_est"] = total_bytes
         out["transferred_total_human"] = _format_bytes_human(total_bytes)
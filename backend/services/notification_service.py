@@ -9,6 +9,8 @@ from datetime import datetime, timedelta
 from typing import List, Optional, Tuple, Dict, Any
 import logging
 
+from sqlalchemy import case, func
+
 from services.email_service import email_service
 from database import (
     SessionLocal,
@@ -24,6 +26,75 @@ from database import (
 logger = logging.getLogger(__name__)
 
 
+def _latest_per_job(db, since: datetime, column, *conditions) -> Dict[Tuple[str, int], Tuple[Any, datetime]]:
+    """Valore di ``column`` del log più recente per (job_type, job_id) tra
+    quelli che soddisfano ``conditions`` (ROW_NUMBER, una sola query)."""
+    ranked = (
+        db.query(
+            JobLog.job_type.label("job_type"),
+            JobLog.job_id.label("job_id"),
+            column.label("value"),
+            JobLog.started_at.label("started_at"),
+            func.row_number().over(
+                partition_by=(JobLog.job_type, JobLog.job_id),
+                order_by=(JobLog.started_at.desc(), JobLog.id.desc()),
+            ).label("rn"),
+        )
+        .filter(JobLog.started_at >= since, *conditions)
+        .subquery()
+    )
+    rows = db.query(ranked.c.job_type, ranked.c.job_id, ranked.c.value, ranked.c.started_at).filter(
+        ranked.c.rn == 1
+    )
+    return {(r.job_type, r.job_id): (r.value, r.started_at) for r in rows}
+
+
+def job_log_stats(db, since: datetime) -> Dict[Tuple[str, int], Dict[str, Any]]:
+    """Statistiche dei JobLog da ``since`` per (job_type, job_id): run,
+    successi, fallimenti, durata totale, ultimo errore (troncato a 200
+    caratteri) e ultimo ``transferred``.
+
+    Tre query aggregate (GROUP BY + due ROW_NUMBER) indipendenti dal numero
+    di job, al posto di una query e del caricamento di tutti i log per job.
+    """
+    rows = (
+        db.query(
+            JobLog.job_type,
+            JobLog.job_id,
+            func.count(JobLog.id),
+            func.sum(case((JobLog.status == "success", 1), else_=0)),
+            func.sum(case((JobLog.status == "failed", 1), else_=0)),
+            func.coalesce(func.sum(JobLog.duration), 0),
+        )
+        .filter(JobLog.started_at >= since)
+        .group_by(JobLog.job_type, JobLog.job_id)
+        .all()
+    )
+    errors = _latest_per_job(
+        db, since, func.substr(JobLog.error, 1, 200),
+        JobLog.status == "failed", JobLog.error.isnot(None), JobLog.error != "",
+    )
+    transferred = _latest_per_job(
+        db, since, JobLog.transferred, JobLog.transferred.isnot(None), JobLog.transferred != "",
+    )
+    stats: Dict[Tuple[str, int], Dict[str, Any]] = {}
+    for job_type, job_id, runs, ok, ko, duration in rows:
+        key = (job_type, job_id)
+        err, err_at = errors.get(key, (None, None))
+        tr, tr_at = transferred.get(key, (None, None))
+        stats[key] = {
+            "runs": runs,
+            "success": int(ok or 0),
+            "failed": int(ko or 0),
+            "duration": int(duration or 0),
+            "last_error": err,
+            "last_error_at": err_at,
+            "last_transferred": tr,
+            "last_transferred_at": tr_at,
+        }
+    return stats
+
+
 class NotificationService:
     """Servizio centralizzato per tutte le notifiche"""
     
@@ -415,39 +486,39 @@ class NotificationService:
             # Dettaglio per ogni job
             jobs_summary = []
             
+            # Statistiche 24h di tutti i job in query aggregate (vedi job_log_stats)
+            log_stats = job_log_stats(db, yesterday)
+            node_by_id = {n.id: n for n in db.query(Node).all()}
+            ep_by_id = {e.id: e for e in db.query(FileEndpoint).all()}
+            
+            def _logs_24h(job_id: int, jtypes: list):
+                """Statistiche 24h del job sommate sui tipi di log indicati;
+                ultimo errore/trasferimento = il più recente tra i tipi."""
+                runs = ok = ko = dur = 0
+                l_err = l_err_at = transferred = transferred_at = None
+                for jtype in jtypes:
+                    st = log_stats.get((jtype, job_id))
+                    if not st:
+                        continue
+                    runs += st["runs"]
+                    ok += st["success"]
+                    ko += st["failed"]
+                    dur += st["duration"]
+                    if st["last_error"] and (l_err_at is None or st["last_error_at"] > l_err_at):
+                        l_err, l_err_at = st["last_error"], st["last_error_at"]
+                    if st["last_transferred"] and (transferred_at is None or st["last_transferred_at"] > transferred_at):
+                        transferred, transferred_at = st["last_transferred"], st["last_transferred_at"]
+                l_err_t = l_err_at.strftime("%H:%M") if l_err_at else None
+                return runs, ok, ko, dur, l_err, l_err_t, transferred
+            
             # Processa Sync Jobs
             for job in sync_jobs:
-                # Ottieni logs per questo job nelle ultime 24 ore
-                job_logs = db.query(JobLog).filter(
-                    JobLog.job_id == job.id,
-                    JobLog.job_type == "sync",
-                    JobLog.started_at >= yesterday
-                ).order_by(JobLog.started_at.desc()).all()
-                
-                # Ottieni nodi
-                source_node = db.query(Node).filter(Node.id == job.source_node_id).first()
-                dest_node = db.query(Node).filter(Node.id == job.dest_node_id).first()
-                
-                job_runs = len(job_logs)
-                job_success = len([l for l in job_logs if l.status == "success"])
-                job_failed = len([l for l in job_logs if l.status == "failed"])
-                job_duration = sum(l.duration or 0 for l in job_logs)
-                
-                # Ultimo errore se presente
-                last_error = None
-                last_error_time = None
-                for log in job_logs:
-                    if log.status == "failed" and log.error:
-                        last_error = log.error[:200]
-                        last_error_time = log.started_at.strftime("%H:%M") if log.started_at else None
-                        break
+                source_node = node_by_id.get(job.source_node_id)
+                dest_node = node_by_id.get(job.dest_node_id)
                 
-                # Ultimo trasferimento
-                last_transferred = None
-                for log in job_logs:
-                    if log.transferred:
-                        last_transferred = log.transferred
-                        break
+                job_runs, job_success, job_failed, job_duration, last_error, last_error_time, last_transferred = (
+                    _logs_24h(job.id, ["sync"])
+                )
                 
                 job_info = {
                     "id": job.id,
@@ -480,40 +551,17 @@ class NotificationService:
             
             # Processa Recovery Jobs
             for job in recovery_jobs:
-                # Ottieni logs per questo job nelle ultime 24 ore
-                job_logs = db.query(JobLog).filter(
-                    JobLog.job_id == job.id,
-                    JobLog.job_type.in_(["recovery", "backup", "restore"]),
-                    JobLog.started_at >= yesterday
-                ).order_by(JobLog.started_at.desc()).all()
-                
-                # Ottieni nodi
-                source_node = db.query(Node).filter(Node.id == job.source_node_id).first()
-                pbs_node = db.query(Node).filter(Node.id == job.pbs_node_id).first()
-                dest_node = db.query(Node).filter(Node.id == job.dest_node_id).first()
+                source_node = node_by_id.get(job.source_node_id)
+                pbs_node = node_by_id.get(job.pbs_node_id)
+                dest_node = node_by_id.get(job.dest_node_id)
                 
-                # Separa log per tipo
-                recovery_logs = [l for l in job_logs if l.job_type == "recovery"]
-                backup_logs = [l for l in job_logs if l.job_type == "backup"]
-                restore_logs = [l for l in job_logs if l.job_type == "restore"]
-                
-                job_runs = len(recovery_logs)
-                job_success = len([l for l in recovery_logs if l.status == "success"])
-                job_failed = len([l for l in recovery_logs if l.status == "failed"])
-                job_duration = sum(l.duration or 0 for l in recovery_logs)
+                job_runs, job_success, job_failed, job_duration, last_error, last_error_time, _ = (
+                    _logs_24h(job.id, ["recovery"])
+                )
                 
                 # Durate fasi
-                backup_duration = sum(l.duration or 0 for l in backup_logs)
-                restore_duration = sum(l.duration or 0 for l in restore_logs)
-                
-                # Ultimo errore se presente
-                last_error = None
-                last_error_time = None
-                for log in recovery_logs:
-                    if log.status == "failed" and log.error:
-                        last_error = log.error[:200]
-                        last_error_time = log.started_at.strftime("%H:%M") if log.started_at else None
-                        break
+                backup_duration = _logs_24h(job.id, ["backup"])[3]
+                restore_duration = _logs_24h(job.id, ["restore"])[3]
                 
                 job_info = {
                     "id": job.id,
@@ -545,33 +593,12 @@ class NotificationService:
                 total_duration += job_duration
 
             for job in file_repl_jobs:
-                job_logs = db.query(JobLog).filter(
-                    JobLog.job_id == job.id,
-                    JobLog.job_type == "file_replication",
-                    JobLog.started_at >= yesterday,
-                ).order_by(JobLog.started_at.desc()).all()
-
-                source = db.query(FileEndpoint).filter(FileEndpoint.id == job.source_endpoint_id).first()
-                dest = db.query(FileEndpoint).filter(FileEndpoint.id == job.dest_endpoint_id).first()
-
-                job_runs = len(job_logs)
-                job_success = len([l for l in job_logs if l.status == "success"])
-                job_failed = len([l for l in job_logs if l.status == "failed"])
-                job_duration = sum(l.duration or 0 for l in job_logs)
-
-                last_error = None
-                last_error_time = None
-                for log in job_logs:
-                    if log.status == "failed" and log.error:
-                        last_error = log.error[:200]
-                        last_error_time = log.started_at.strftime("%H:%M") if log.started_at else None
-                        break
+                source = ep_by_id.get(job.source_endpoint_id)
+                dest = ep_by_id.get(job.dest_endpoint_id)
 
-                last_transferred = None
-                for log in job_logs:
-                    if log.transferred:
-                        last_transferred = log.transferred
-                        break
+                job_runs, job_success, job_failed, job_duration, last_error, last_error_time, last_transferred = (
+                    _logs_24h(job.id, ["file_replication"])
+                )
 
                 paths = job.source_paths or []
                 source_paths_label = ", ".join(paths[:2])
@@ -603,28 +630,7 @@ class NotificationService:
                 failed += job_failed
                 total_duration += job_duration
 
-            # === Collector generico per i moduli aggiuntivi ===
-            def _logs_24h(job_id: int, jtypes: list):
-                logs = db.query(JobLog).filter(
-                    JobLog.job_id == job_id,
-                    JobLog.job_type.in_(jtypes),
-                    JobLog.started_at >= yesterday,
-                ).order_by(JobLog.started_at.desc()).all()
-                runs = len(logs)
-                ok = len([l for l in logs if l.status == "success"])
-                ko = len([l for l in logs if l.status == "failed"])
-                dur = sum(l.duration or 0 for l in logs)
-                l_err = l_err_t = None
-                for l in logs:
-                    if l.status == "failed" and l.error:
-                        l_err = l.error[:200]
-                        l_err_t = l.started_at.strftime("%H:%M") if l.started_at else None
-                        break
-                transferred = next(
-                    (l.transferred for l in logs if getattr(l, "transferred", None)), None
-                )
-                return runs, ok, ko, dur, l_err, l_err_t, transferred
-
+            # === Moduli aggiuntivi ===
             def _fmt_last_run(dt) -> str:
                 return dt.strftime("%d/%m %H:%M") if dt else "Mai"
 
@@ -651,9 +657,6 @@ class NotificationService:
                 failed += ko
                 total_duration += dur
 
-            node_by_id = {n.id: n for n in db.query(Node).all()}
-            ep_by_id = {e.id: e for e in db.query(FileEndpoint).all()}
-
             for job in backup_pbs_jobs:
                 src = node_by_id.get(job.source_node_id)
                 pbs = node_by_id.get(getattr(job, "pbs_node_id", None))
@@ -11,17 +11,25 @@ import re
 import shlex
 import time
 from datetime import datetime, timedelta
-import aiohttp
 import ssl
 import urllib.parse
 
+from services.http_pool import http_pool
 from services.ssh_service import ssh_service
+from services.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
 # Cache inventario PBS (evita chiamate ripetute a PBS/pvesh per ogni expand VM)
-_INVENTORY_CACHE: Dict[str, Tuple[float, List[Dict]]] = {}
 INVENTORY_CACHE_TTL_SEC = 300
+_inventory_cache = TTLCache("pbs_inventory", ttl=INVENTORY_CACHE_TTL_SEC, max_entries=64, stale_ttl=INVENTORY_CACHE_TTL_SEC)
+# Ticket API PBS per host/utente (PBS li rilascia validi 2 ore)
+_ticket_cache = TTLCache("pbs_tickets", ttl=3600, max_entries=64)
+
+
+def _pbs_auth_headers(ticket_data: Dict) -> Dict[str, str]:
+    """Cookie di autenticazione PBS esplicito (il client HTTP è condiviso)."""
+    return {"Cookie": f"PBSAuthCookie={urllib.parse.quote_plus(ticket_data['ticket'])}"}
 
 
 def inventory_cache_key(
@@ -33,6 +41,13 @@ def inventory_cache_key(
     return f"{pbs_node_id}:{datastore}:{pve_node_id or ''}:{pbs_storage or ''}"
 
 
+def invalidate_inventory(pbs_node_id: Optional[int] = None) -> int:
+    """Scarta l'inventario in cache di un PBS (tutti se ``None``), es. dopo un backup."""
+    if pbs_node_id is None:
+        return _inventory_cache.invalidate()
+    return _inventory_cache.invalidate(prefix=f"{int(pbs_node_id)}:")
+
+
 def summarize_inventory_entries(entries: List[Dict]) -> List[Dict]:
     """Raggruppa snapshot per VMID → riepilogo (senza catena date)."""
     groups: Dict[int, Dict] = {}
@@ -180,30 +195,88 @@ def normalize_pvesh_backup_entry(entry: Dict, pbs_storage: Optional[str] = None)
     }
 
 
+# Righe del log vzdump per i backup di più guest nella stessa invocazione
+_VZDUMP_START_RE = re.compile(r"Starting Backup of VM (\d+) \((qemu|lxc)\)")
+_VZDUMP_FINISH_RE = re.compile(r"Finished Backup of VM (\d+)")
+_VZDUMP_FAIL_RE = re.compile(r"ERROR: Backup of VM (\d+) failed - (.*)")
+_VZDUMP_ARCHIVE_RE = re.compile(r"creating (?:vzdump|Proxmox Backup Server) archive '(.+?)'")
+_VZDUMP_PERCENT_RE = re.compile(r"INFO:\s+(\d{1,3})% \(")
+_VZDUMP_TRANSFERRED_RE = re.compile(r"transferred (\d+(?:\.\d+)?)\s*([KMGT]i?B)")
+_SIZE_MULTIPLIERS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4}
+
+
+class VzdumpBatchParser:
+    """Esito per guest di un ``vzdump <id1> <id2> ...`` letto riga per riga.
+
+    I guest non ancora iniziati restano ``pending``; quelli iniziati senza
+    riga di fine al termine del processo risultano falliti (``finalize``)."""
+
+    def __init__(self, vm_ids: List[int]):
+        self.current: Optional[int] = None
+        self.results: Dict[int, Dict[str, Any]] = {
+            vm_id: {
+                "status": "pending", "backup_id": None, "percent": 0,
+                "transferred_bytes": None, "error": None, "lines": [],
+                "started": None, "finished": None,
+            }
+            for vm_id in vm_ids
+        }
+
+    def feed(self, line: str) -> Optional[int]:
+        """Elabora una riga; ritorna il VMID il cui stato è cambiato."""
+        line = line.rstrip()
+        m = _VZDUMP_START_RE.search(line)
+        if m and int(m.group(1)) in self.results:
+            self.current = int(m.group(1))
+            entry = self.results[self.current]
+            entry.update(status="running", started=time.monotonic())
+            entry["lines"].append(line)
+            return self.current
+        m = _VZDUMP_FAIL_RE.search(line)
+        if m and int(m.group(1)) in self.results:
+            vm_id = int(m.group(1))
+            entry = self.results[vm_id]
+            entry.update(status="failed", error=m.group(2).strip(), finished=time.monotonic())
+            entry["lines"].append(line)
+            return vm_id
+        if self.current is None:
+            return None
+        entry = self.results[self.current]
+        entry["lines"].append(line)
+        m = _VZDUMP_FINISH_RE.search(line)
+        if m and int(m.group(1)) == self.current:
+            if entry["status"] != "failed":
+                entry.update(status="success", percent=100)
+            entry["finished"] = time.monotonic()
+            return self.current
+        m = _VZDUMP_ARCHIVE_RE.search(line)
+        if m:
+            entry["backup_id"] = m.group(1)
+            return None
+        m = _VZDUMP_PERCENT_RE.search(line)
+        if m:
+            entry["percent"] = min(99, int(m.group(1)))
+            return self.current
+        m = _VZDUMP_TRANSFERRED_RE.search(line)
+        if m:
+            unit = m.group(2).replace("i", "")
+            entry["transferred_bytes"] = int(float(m.group(1)) * _SIZE_MULTIPLIERS.get(unit, 1))
+        return None
+
+    def finalize(self, process_error: Optional[str] = None) -> Dict[int, Dict[str, Any]]:
+        for entry in self.results.values():
+            if entry["status"] == "running":
+                entry.update(status="failed", error=process_error or "Backup interrotto", finished=time.monotonic())
+            elif entry["status"] == "pending":
+                entry.update(status="failed", error=process_error or "Backup non avviato da vzdump")
+        return self.results
+
+
 class PBSService:
     """Servizio per integrazione con Proxmox Backup Server"""
     
     def __init__(self):
-        self._ticket_cache = {}
-
-    def _get_ssl_context(
-        self,
-        verify_ssl: bool = False,
-        fingerprint: Optional[str] = None,
-    ) -> ssl.SSLContext:
-        """Contesto SSL per chiamate PBS.
-
-        - verify_ssl=True senza fingerprint -> CA bundle standard.
-        - fingerprint set -> CERT_NONE ma il chiamante deve verificare
-          manualmente lo SHA-256 del cert con `_verify_peer_fingerprint`.
-        - altrimenti -> CERT_NONE (legacy, sconsigliato).
-        """
-        if verify_ssl and not fingerprint:
-            return ssl.create_default_context()
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        return ctx
+        self._ticket_cache = _ticket_cache
 
     @staticmethod
     def _normalize_fingerprint(fp: str) -> str:
@@ -261,10 +334,9 @@ class PBSService:
         warning di sicurezza.
         """
         cache_key = f"{hostname}:{username}"
-        if cache_key in self._ticket_cache:
-            ticket_data = self._ticket_cache[cache_key]
-            if datetime.now() < ticket_data['expires']:
-                return ticket_data
+        ticket_data = self._ticket_cache.get(cache_key)
+        if ticket_data is not None:
+            return ticket_data
 
         if fingerprint:
             ok = await self._verify_peer_fingerprint(hostname, port, fingerprint)
@@ -280,26 +352,28 @@ class PBSService:
                 "TLS non verificato (configura node.pbs_fingerprint)."
             )
 
-        api_url = f"https://{hostname}:{port}/api2/json/access/ticket"
-        ssl_ctx = self._get_ssl_context(False, fingerprint)
+        base_url = f"https://{hostname}:{port}"
+        api_url = f"{base_url}/api2/json/access/ticket"
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(api_url, data={"username": username, "password": password}, ssl=ssl_ctx) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        result = data.get('data', {})
-                        ticket = result.get('ticket')
-                        csrf = result.get('CSRFPreventionToken')
-                        if ticket:
-                            self._ticket_cache[cache_key] = {
-                                'ticket': ticket,
-                                'csrf': csrf,
-                                'expires': datetime.now() + timedelta(hours=1)
-                            }
-                            return self._ticket_cache[cache_key]
-                    else:
-                        logger.warning(f"PBS Auth failed: {resp.status} - {await resp.text()}")
+            # Client keep-alive condiviso; TLS non verificato come prima
+            # (il fingerprint, se presente, è già stato verificato sopra)
+            client = http_pool.client(base_url, verify=False)
+            resp = await client.post(api_url, data={"username": username, "password": password})
+            if resp.status_code == 200:
+                result = resp.json().get('data', {})
+                ticket = result.get('ticket')
+                csrf = result.get('CSRFPreventionToken')
+                if ticket:
+                    ticket_data = {
+                        'ticket': ticket,
+                        'csrf': csrf,
+                        'expires': datetime.now() + timedelta(hours=1)
+                    }
+                    self._ticket_cache.set(cache_key, ticket_data)
+                    return ticket_data
+            else:
+                logger.warning(f"PBS Auth failed: {resp.status_code} - {resp.text}")
         except Exception as e:
             logger.error(f"Error getting PBS ticket: {e}")
         return None
@@ -325,39 +399,29 @@ class PBSService:
         if not ticket_data:
             raise Exception("Authentication failed")
 
-        api_url = f"https://{pbs_hostname}:{port}/api2/json/admin/datastore/{datastore}/snapshots"
-        ssl_ctx = self._get_ssl_context(False)
-        
-        # PBSAuthCookie must be passed. Ensure no URL encoding issues.
-        # usually requests/aiohttp handles cookies transparently.
-        # But if the ticket contains special chars it might be an issue.
-        # Let's try explicit header instead.
-        # headers = {"Cookie": f"PBSAuthCookie={ticket_data['ticket']}"}
-        
-        
-        cookies = {"PBSAuthCookie": urllib.parse.quote_plus(ticket_data['ticket'])}
+        base_url = f"https://{pbs_hostname}:{port}"
+        api_url = f"{base_url}/api2/json/admin/datastore/{datastore}/snapshots"
         
         try:
-            async with aiohttp.ClientSession(cookies=cookies) as session:
-                async with session.get(api_url, ssl=ssl_ctx) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        snapshots = data.get('data', [])
-                        
-                        results = []
-                        for snap in snapshots:
-                            if vm_id is not None:
-                                snap_vmid = snap.get("backup-id")
-                                if str(snap_vmid) != str(vm_id):
-                                    continue
-                            results.append(normalize_pbs_api_snapshot(snap))
-                        return results
-                    else:
-                        logger.error(f"PBS List snapshots failed: {resp.status} - {await resp.text()}")
-                        # If 401, clear cache and retry once?
-                        if resp.status == 401:
-                             self._ticket_cache.pop(f"{pbs_hostname}:{pbs_user}", None)
-                        return []
+            client = http_pool.client(base_url, verify=False)
+            resp = await client.get(api_url, headers=_pbs_auth_headers(ticket_data))
+            if resp.status_code == 200:
+                snapshots = resp.json().get('data', [])
+                
+                results = []
+                for snap in snapshots:
+                    if vm_id is not None:
+                        snap_vmid = snap.get("backup-id")
+                        if str(snap_vmid) != str(vm_id):
+                            continue
+                    results.append(normalize_pbs_api_snapshot(snap))
+                return results
+            else:
+                logger.error(f"PBS List snapshots failed: {resp.status_code} - {resp.text}")
+                # If 401, clear cache and retry once?
+                if resp.status_code == 401:
+                     self._ticket_cache.invalidate(f"{pbs_hostname}:{pbs_user}")
+                return []
         except Exception as e:
             logger.error(f"Error listing PBS backups via API: {e}")
             return []
@@ -484,25 +548,29 @@ class PBSService:
             getattr(pve_node, "id", None) if pve_node else None,
             pbs_storage,
         )
-        now = time.time()
-        if not force_refresh and key in _INVENTORY_CACHE:
-            ts, cached = _INVENTORY_CACHE[key]
-            if now - ts < INVENTORY_CACHE_TTL_SEC:
-                entries = cached
-                if vm_id is not None:
-                    return filter_inventory_by_vmid(entries, vm_id)
-                return entries
+        if vm_id is not None:
+            # Dettaglio VM: dall'inventario completo se già letto, altrimenti
+            # lettura filtrata (non messa in cache)
+            cached = None if force_refresh else _inventory_cache.get(key)
+            if cached is not None:
+                return filter_inventory_by_vmid(cached, vm_id)
+            return await self.list_inventory_backups(
+                pbs_node=pbs_node,
+                datastore=datastore,
+                vm_id=vm_id,
+                pve_node=pve_node,
+                pbs_storage=pbs_storage,
+            )
 
-        entries = await self.list_inventory_backups(
-            pbs_node=pbs_node,
-            datastore=datastore,
-            vm_id=vm_id,
-            pve_node=pve_node,
-            pbs_storage=pbs_storage,
-        )
-        if vm_id is None:
-            _INVENTORY_CACHE[key] = (now, entries)
-        return entries
+        async def _load() -> List[Dict]:
+            return await self.list_inventory_backups(
+                pbs_node=pbs_node,
+                datastore=datastore,
+                pve_node=pve_node,
+                pbs_storage=pbs_storage,
+            )
+
+        return await _inventory_cache.get_or_load(key, _load, force=force_refresh)
 
     async def list_inventory_vm_summaries(
         self,
@@ -545,9 +613,8 @@ class PBSService:
                 getattr(pve_node, "id", None) if pve_node else None,
                 pbs_storage,
             )
-            now = time.time()
-            if key in _INVENTORY_CACHE:
-                _, cached = _INVENTORY_CACHE[key]
+            cached = _inventory_cache.peek(key)
+            if cached is not None:
                 entries = filter_inventory_by_vmid(cached, vm_id)
             else:
                 entries = await self.list_inventory_backups(
@@ -696,18 +763,17 @@ class PBSService:
                 getattr(node, "pbs_fingerprint", None),
             )
             if ticket_data:
-                api_url = f"https://{node.hostname}:8007/api2/json/admin/datastore"
-                ssl_ctx = self._get_ssl_context(False)
-                cookies = {"PBSAuthCookie": urllib.parse.quote_plus(ticket_data["ticket"])}
+                base_url = f"https://{node.hostname}:8007"
                 try:
-                    async with aiohttp.ClientSession(cookies=cookies) as session:
-                        async with session.get(api_url, ssl=ssl_ctx) as resp:
-                            if resp.status == 200:
-                                payload = await resp.json()
-                                for item in payload.get("data", []):
-                                    val = item.get("store") or item.get("name")
-                                    if val:
-                                        names.append(str(val))
+                    client = http_pool.client(base_url, verify=False)
+                    resp = await client.get(
+                        f"{base_url}/api2/json/admin/datastore", headers=_pbs_auth_headers(ticket_data)
+                    )
+                    if resp.status_code == 200:
+                        for item in resp.json().get("data", []):
+                            val = item.get("store") or item.get("name")
+                            if val:
+                                names.append(str(val))
                 except Exception as e:
                     logger.warning(f"PBS API datastore list fallita: {e}")
 
@@ -942,6 +1008,66 @@ for match in re.finditer(r'pbs:\\s+(\\S+)\\n((?:^\\s+.*\\n)*)', content, re.MULT
             logger.error(f"Failed to create storage {storage_name}: {error_msg}")
             return False, f"Errore creazione storage: {error_msg}"
     
+    async def _prepare_backup_storage(
+        self,
+        source_node_hostname: str,
+        pbs_hostname: str,
+        datastore: str,
+        pbs_user: str,
+        pbs_password: Optional[str],
+        pbs_fingerprint: Optional[str],
+        pbs_storage_id: Optional[str],
+        source_node_port: int,
+        source_node_user: str,
+        source_node_key: str,
+    ) -> Tuple[Optional[str], Optional[Dict]]:
+        """Storage PBS da usare sul nodo sorgente: verifica quello indicato o
+        ne crea/riusa uno per il datastore. Ritorna ``(storage, None)`` oppure
+        ``(None, {"message", "error"})``."""
+        if pbs_storage_id:
+            # Verifica che lo storage esista
+            check_result = await ssh_service.execute(
+                hostname=source_node_hostname,
+                command=f"pvesm status 2>/dev/null | grep -q '^{pbs_storage_id} '",
+                port=source_node_port,
+                username=source_node_user,
+                key_path=source_node_key
+            )
+            if check_result.exit_code != 0:
+                return None, {
+                    "message": f"Storage PBS '{pbs_storage_id}' non trovato sul nodo",
+                    "error": f"Storage {pbs_storage_id} non esiste",
+                }
+            logger.info(f"Using existing PBS storage: {pbs_storage_id}")
+            storage_name = pbs_storage_id
+        else:
+            # Crea storage PBS automaticamente o riusa esistente
+            storage_ok, storage_name = await self._ensure_pbs_storage(
+                node_hostname=source_node_hostname,
+                storage_name=f"pbs-{datastore}",
+                pbs_hostname=pbs_hostname,
+                datastore=datastore,
+                pbs_user=pbs_user,
+                pbs_password=pbs_password,
+                pbs_fingerprint=pbs_fingerprint,
+                node_port=source_node_port,
+                node_user=source_node_user,
+                node_key=source_node_key
+            )
+            if not storage_ok:
+                return None, {
+                    "message": f"Impossibile configurare storage PBS: {storage_name}",
+                    "error": storage_name,
+                }
+
+        # storage_name puo' provenire da _ensure_pbs_storage; rivalido
+        # difensivamente prima di costruire il comando.
+        try:
+            _check(storage_name, _PBS_STORAGE_RE, "storage_name")
+        except Exception as e:
+            return None, {"message": f"Storage name non valido: {e}", "error": str(e)}
+        return storage_name, None
+
     async def run_backup(
         self,
         source_node_hostname: str,
@@ -1006,69 +1132,12 @@ for match in re.finditer(r'pbs:\\s+(\\S+)\\n((?:^\\s+.*\\n)*)', content, re.MULT
                 "output": "", "error": str(e), "duration": 0,
             }
 
-        # Se è specificato uno storage esistente, usalo; altrimenti crea/usa uno standard
-        if pbs_storage_id:
-            # Verifica che lo storage esista
-            check_result = await ssh_service.execute(
-                hostname=source_node_hostname,
-                command=f"pvesm status 2>/dev/null | grep -q '^{pbs_storage_id} '",
-                port=source_node_port,
-                username=source_node_user,
-                key_path=source_node_key
-            )
-            
-            if check_result.exit_code != 0:
-                return {
-                    "success": False,
-                    "backup_id": None,
-                    "message": f"Storage PBS '{pbs_storage_id}' non trovato sul nodo",
-                    "output": "",
-                    "error": f"Storage {pbs_storage_id} non esiste",
-                    "duration": 0
-                }
-            
-            storage_name = pbs_storage_id
-            logger.info(f"Using existing PBS storage: {storage_name}")
-        else:
-            # Crea storage PBS automaticamente o riusa esistente
-            proposed_storage_name = f"pbs-{datastore}"
-            
-            storage_ok, actual_storage_name = await self._ensure_pbs_storage(
-                node_hostname=source_node_hostname,
-                storage_name=proposed_storage_name,
-                pbs_hostname=pbs_hostname,
-                datastore=datastore,
-                pbs_user=pbs_user,
-                pbs_password=pbs_password,
-                pbs_fingerprint=pbs_fingerprint,
-                node_port=source_node_port,
-                node_user=source_node_user,
-                node_key=source_node_key
-            )
-            
-            if not storage_ok:
-                return {
-                    "success": False,
-                    "backup_id": None,
-                    "message": f"Impossibile configurare storage PBS: {actual_storage_name}",
-                    "output": "",
-                    "error": actual_storage_name,
-                    "duration": 0
-                }
-            
-            # Use the actual storage name returned (could be different if existing one was found)
-            storage_name = actual_storage_name
-        
-        # storage_name puo' provenire da _ensure_pbs_storage; rivalido
-        # difensivamente prima di costruire il comando.
-        try:
-            _check(storage_name, _PBS_STORAGE_RE, "storage_name")
-        except Exception as e:
-            return {
-                "success": False, "backup_id": None,
-                "message": f"Storage name non valido: {e}",
-                "output": "", "error": str(e), "duration": 0,
-            }
+        storage_name, error = await self._prepare_backup_storage(
+            source_node_hostname, pbs_hostname, datastore, pbs_user, pbs_password,
+            pbs_fingerprint, pbs_storage_id, source_node_port, source_node_user, source_node_key,
+        )
+        if error:
+            return {"success": False, "backup_id": None, "output": "", "duration": 0, **error}
 
         # Setup comando backup vzdump (tutti i token validati)
         vzdump_parts = [
@@ -1120,6 +1189,137 @@ for match in re.finditer(r'pbs:\\s+(\\S+)\\n((?:^\\s+.*\\n)*)', content, re.MULT
                 "duration": int(duration)
             }
     
+    async def run_backup_batch(
+        self,
+        source_node_hostname: str,
+        vm_ids: List[int],
+        pbs_hostname: str,
+        datastore: str,
+        pbs_user: str = "root@pam",
+        pbs_password: Optional[str] = None,
+        pbs_fingerprint: Optional[str] = None,
+        pbs_storage_id: Optional[str] = None,
+        mode: str = "snapshot",
+        compress: str = "zstd",
+        bwlimit_kb: Optional[int] = None,
+        exclude_tmp: bool = False,
+        source_node_port: int = 22,
+        source_node_user: str = "root",
+        source_node_key: str = "/root/.ssh/id_rsa",
+        progress_callback: Optional[Any] = None,
+    ) -> Dict:
+        """
+        Backup di più guest dello stesso nodo verso PBS con un solo
+        ``vzdump <id1> <id2> ...``: storage verificato/creato una volta e una
+        sola sessione SSH. vzdump tiene un lock globale per nodo, quindi più
+        invocazioni parallele sullo stesso nodo si metterebbero comunque in fila.
+
+        ``progress_callback(vm_id, entry)`` riceve gli aggiornamenti per guest
+        (status, percent, backup_id). Ritorna ``{"success", "storage",
+        "duration", "output", "results": {vm_id: {success, backup_id, message,
+        output, error, duration, transferred_bytes}}}``; ``success`` è vero
+        solo se tutti i guest sono riusciti.
+        """
+        start_time = datetime.utcnow()
+
+        def _all_failed(message: str, error: str) -> Dict:
+            return {
+                "success": False, "storage": None, "duration": 0, "output": "", "error": error,
+                "results": {
+                    vm_id: {
+                        "success": False, "backup_id": None, "message": message,
+                        "output": "", "error": error, "duration": 0, "transferred_bytes": None,
+                    }
+                    for vm_id in vm_ids
+                },
+            }
+
+        try:
+            vm_ids = [_check_int(v, "vm_id") for v in dict.fromkeys(vm_ids)]
+            if not vm_ids:
+                raise ValueError("nessun vm_id")
+            _check(source_node_hostname, _PBS_HOST_RE, "source_node_hostname")
+            if not pbs_storage_id:
+                # Servono solo per creare/cercare lo storage sul nodo
+                _check(pbs_hostname, _PBS_HOST_RE, "pbs_hostname")
+                _check(datastore, _PBS_DATASTORE_RE, "datastore")
+                _check(pbs_user, _PBS_USER_RE, "pbs_user")
+            _check_in(mode, _PBS_MODE_ALLOWED, "mode")
+            _check_in(compress, _PBS_COMPRESS_ALLOWED, "compress")
+            if pbs_storage_id:
+                _check(pbs_storage_id, _PBS_STORAGE_RE, "pbs_storage_id")
+            if bwlimit_kb is not None:
+                bwlimit_kb = _check_int(bwlimit_kb, "bwlimit_kb", lo=1)
+            if pbs_fingerprint:
+                fp = self._normalize_fingerprint(pbs_fingerprint)
+                if not re.fullmatch(r"[0-9A-F]{64}", fp):
+                    raise ValueError("pbs_fingerprint deve essere SHA-256 (64 hex)")
+        except Exception as e:
+            return _all_failed(f"Validazione input PBS fallita: {e}", str(e))
+
+        storage_name, error = await self._prepare_backup_storage(
+            source_node_hostname, pbs_hostname, datastore, pbs_user, pbs_password,
+            pbs_fingerprint, pbs_storage_id, source_node_port, source_node_user, source_node_key,
+        )
+        if error:
+            return _all_failed(error["message"], error["error"])
+
+        vzdump_parts = ["vzdump", *[str(v) for v in vm_ids],
+                        "--mode", mode, "--compress", compress, "--storage", storage_name, "--remove", "0"]
+        if bwlimit_kb:
+            vzdump_parts += ["--bwlimit", str(bwlimit_kb)]
+        if exclude_tmp:
+            vzdump_parts += ["--exclude-path", "/tmp"]
+        vzdump_cmd = " ".join(vzdump_parts)
+        logger.info(f"Running batch backup ({len(vm_ids)} guest): {vzdump_cmd}")
+
+        parser = VzdumpBatchParser(vm_ids)
+
+        def _on_line(stream: str, line: str) -> None:
+            vm_id = parser.feed(line)
+            if vm_id is not None and progress_callback:
+                progress_callback(vm_id, parser.results[vm_id])
+
+        result = await ssh_service.execute_streaming(
+            hostname=source_node_hostname,
+            command=vzdump_cmd,
+            on_line=_on_line,
+            port=source_node_port,
+            username=source_node_user,
+            key_path=source_node_key,
+            timeout=7200  # 2 ore senza output
+        )
+        process_error = None if result.success else (result.stderr or "").strip()[-500:] or None
+        entries = parser.finalize(process_error)
+        duration = int((datetime.utcnow() - start_time).total_seconds())
+
+        results: Dict[int, Dict] = {}
+        for vm_id, entry in entries.items():
+            ok = entry["status"] == "success"
+            vm_duration = (
+                int(entry["finished"] - entry["started"]) if entry["started"] and entry["finished"] else 0
+            )
+            results[vm_id] = {
+                "success": ok,
+                "backup_id": entry["backup_id"],
+                "message": (
+                    f"Backup VM {vm_id} completato in {vm_duration}s" if ok
+                    else f"Backup fallito: {entry['error']}"
+                ),
+                "output": "\n".join(entry["lines"]),
+                "error": None if ok else entry["error"],
+                "duration": vm_duration,
+                "transferred_bytes": entry["transferred_bytes"],
+            }
+        return {
+            "success": all(r["success"] for r in results.values()),
+            "storage": storage_name,
+            "duration": duration,
+            "output": result.stdout,
+            "error": process_error,
+            "results": results,
+        }
+
     async def run_restore(
         self,
         dest_node_hostname: str,
@@ -70,8 +70,16 @@ def disable_optical_media_in_config(config_content: str, vm_type: str = "qemu")
     return updated
 
 
+# pvesh concorrenti lato nodo nel listing snapshot batch
+_SNAPSHOT_LIST_PARALLELISM = 4
+
+
 class ProxmoxService:
     """Servizio per integrazione con Proxmox VE"""
+
+    def __init__(self):
+        # user@host:port -> nome nodo PVE (vedi get_node_name)
+        self._node_names: Dict[str, str] = {}
     
     async def get_vm_list(
         self,
@@ -172,6 +180,136 @@ class ProxmoxService:
         
         return result.success, result.stdout
 
+    async def get_node_name(
+        self,
+        hostname: str,
+        port: int = 22,
+        username: str = "root",
+        key_path: str = "/root/.ssh/id_rsa",
+    ) -> Optional[str]:
+        """Nome del nodo PVE (quello usato da pvesh) per una connessione SSH.
+
+        Cache in memoria per ``user@host:port`` (= una riga Node): il nome nodo
+        cambia solo reinstallando il nodo, quindi non serve rileggerlo a ogni
+        chiamata."""
+        key = f"{username}@{hostname}:{port}"
+        cached = self._node_names.get(key)
+        if cached:
+            return cached
+        res = await ssh_service.execute(hostname, "hostname", port, username, key_path)
+        name = res.stdout.strip() if res.success else ""
+        if name:
+            self._node_names[key] = name
+            return name
+        return None
+
+    async def get_snapshots_batch(
+        self,
+        hostname: str,
+        guests: Optional[List[Tuple[int, str]]] = None,
+        port: int = 22,
+        username: str = "root",
+        key_path: str = "/root/.ssh/id_rsa",
+        raise_on_error: bool = False,
+    ) -> Dict[int, List[Dict]]:
+        """Snapshot di più guest di un nodo in UNA sola invocazione SSH.
+
+        ``guests`` è una lista di ``(vmid, vm_type)``; se ``None`` vengono listati
+        tutti i guest del nodo (``qm list`` + ``pct list`` lato remoto).
+        Ritorna ``{vmid: [snapshot, ...]}`` (senza la voce ``current``). I guest il
+        cui listing fallisce NON compaiono nel dict: il chiamante deve trattare
+        la chiave mancante come "listing non disponibile", mai come "zero
+        snapshot". Con ``raise_on_error=True`` un fallimento dell'intera
+        invocazione solleva RuntimeError."""
+        if guests is None:
+            specs_expr = (
+                "$(qm list 2>/dev/null | awk 'NR>1{print $1\":qemu\"}') "
+                "$(pct list 2>/dev/null | awk 'NR>1{print $1\":lxc\"}')"
+            )
+        else:
+            if not guests:
+                return {}
+            specs_expr = " ".join(
+                f"{int(vmid)}:{'lxc' if vm_type == 'lxc' else 'qemu'}"
+                for vmid, vm_type in guests
+            )
+
+        # I pvesh girano in parallelo (bounded) lato nodo su file temporanei e
+        # vengono poi emessi in ordine con un header per guest:
+        #   @node <nome>
+        #   @vm <vmid> <tipo> <exit_code>
+        #   <json su una riga | messaggio d'errore>
+        script = (
+            "N=$(hostname); D=$(mktemp -d); trap 'rm -rf \"$D\"' EXIT; "
+            f"SPECS=\"{specs_expr}\"; "
+            "echo \"@node $N\"; "
+            "for s in $SPECS; do echo \"$s\"; done | "
+            f"xargs -r -P {_SNAPSHOT_LIST_PARALLELISM} -I{{}} sh -c "
+            "'id=${1%%:*}; t=${1#*:}; "
+            "pvesh get /nodes/$2/$t/$id/snapshot --output-format json >\"$3/$id.out\" 2>&1; "
+            "echo $? >\"$3/$id.rc\"' _ {} \"$N\" \"$D\"; "
+            "for s in $SPECS; do id=${s%%:*}; t=${s#*:}; "
+            "echo \"@vm $id $t $(cat \"$D/$id.rc\" 2>/dev/null || echo 255)\"; "
+            "cat \"$D/$id.out\" 2>/dev/null; echo; done"
+        )
+        res = await ssh_service.execute(
+            hostname, script, port, username, key_path, timeout=600
+        )
+        if not res.success or "@node " not in res.stdout:
+            message = (
+                f"Listing snapshot fallito su {hostname}: "
+                f"{(res.stderr or res.stdout or 'errore sconosciuto').strip()[:300]}"
+            )
+            if raise_on_error:
+                raise RuntimeError(message)
+            logger.warning(message)
+            return {}
+
+        snapshots: Dict[int, List[Dict]] = {}
+        current: Optional[Tuple[int, int]] = None
+        body: List[str] = []
+
+        def _flush() -> None:
+            if current is None:
+                return
+            vmid, rc = current
+            text = "\n".join(body).strip()
+            if rc != 0:
+                logger.warning(
+                    f"Listing snapshot fallito per VM {vmid} su {hostname}: {text[:300]}"
+                )
+                return
+            try:
+                data = json.loads(text) if text else []
+            except ValueError as exc:
+                logger.warning(
+                    f"Output listing snapshot non interpretabile per VM {vmid}: {exc}"
+                )
+                return
+            snapshots[vmid] = [
+                snap for snap in data
+                if isinstance(snap, dict) and snap.get("name") != "current"
+            ]
+
+        for line in res.stdout.splitlines():
+            if line.startswith("@node "):
+                node_name = line[6:].strip()
+                if node_name:
+                    self._node_names[f"{username}@{hostname}:{port}"] = node_name
+                continue
+            if line.startswith("@vm "):
+                _flush()
+                parts = line.split()
+                try:
+                    current = (int(parts[1]), int(parts[3]))
+                except (IndexError, ValueError):
+                    current = None
+                body = []
+                continue
+            body.append(line)
+        _flush()
+        return snapshots
+
     async def get_snapshots(
         self,
         hostname: str,
@@ -182,91 +320,26 @@ class ProxmoxService:
         key_path: str = "/root/.ssh/id_rsa",
         raise_on_error: bool = False,
     ) -> List[Dict]:
-        """Ottiene lista snapshot VM.
+        """Ottiene lista snapshot VM (un solo round-trip SSH).
 
         Con ``raise_on_error=True`` (usato dalla retention) un fallimento del
         comando di listing solleva RuntimeError invece di ritornare ``[]`` — così
         un errore non viene scambiato per "nessuno snapshot" (bug C-07/B4)."""
-        cmd_base = "qm" if vm_type == "qemu" else "pct"
-        # qm listsnapshot <vmid> non ha output json nativo facile, ma proviamo a parsarle
-        # Output tipico:
-        # parent        pre-suspend     2023-01-01 10:00:00   description
-        # current                                             
-        
-        # Purtroppo 'qm listsnapshot' è ostico da parsare.
-        # Meglio usare config file parsing se possibile, ma qm listsnapshot mostra la struttura ad albero.
-        # Per semplicità V2, usiamo lista piatta dai config o qm listsnapshot.
-        
-        # Usiamo pvesh che ha output json
-        # pvesh get /nodes/{node}/qemu/{vmid}/snapshot --output-format json
-        
-        # Bisogna prima trovare il node name dal hostname?
-        # get_snapshot usa SSH, pvesh richiede node name, non hostname (hostname network).
-        # Se siamo su hostname, possiamo usare 'hostname' command per sapere il nome nodo, oppure assumiamo hostname ~= nodename
-        # Oppure usiamo qm listsnapshot e parsiamo le righe.
-        
-        # Tentativo con pvesh assumendo esecuzione locale o che hostname corrisponda
-        # Ma ssh_service esegue su 'hostname'.
-        # Usiamo qm listsnapshot
-        
-        result = await ssh_service.execute(
-            hostname=hostname,
-            command=f"{cmd_base} listsnapshot {vmid}",
+        listing = await self.get_snapshots_batch(
+            hostname,
+            [(vmid, vm_type)],
             port=port,
             username=username,
-            key_path=key_path
+            key_path=key_path,
+            raise_on_error=raise_on_error,
         )
-        
-        snapshots = []
-        if result.success:
-            lines = result.stdout.strip().split('\n')
-            # Skip header? qm listsnapshot header: "`name` `date/time` `parent` `description`?" NO
-            # It prints a tree.
-            # `current` line is the current state.
-            
-            for line in lines:
-                if "`->`" in line or "current" in line:
-                    # Tree view visualization characters handling might be complex
-                    pass
-                
-                parts = line.split()
-                if len(parts) >= 2:
-                    # Very basic parsing
-                    name = parts[0]
-                    if name == "current": continue
-                    
-                    # Try to finding date info?
-                    # This is unreliable. 
-                    pass
-        
-        # Better approach: pvesh via SSH
-        # We need the local nodename. 'uname -n' or 'hostname'.
-        node_name_res = await ssh_service.execute(hostname, "hostname", port, username, key_path)
-        node_name = node_name_res.stdout.strip() if node_name_res.success else "localhost"
-        
-        pvesh_cmd = f"pvesh get /nodes/{node_name}/{'qemu' if vm_type == 'qemu' else 'lxc'}/{vmid}/snapshot --output-format json"
-        res = await ssh_service.execute(hostname, pvesh_cmd, port, username, key_path)
-
-        if not res.success:
+        if vmid not in listing:
             if raise_on_error:
                 raise RuntimeError(
-                    f"Listing snapshot fallito per VM {vmid} su {hostname}: "
-                    f"{(res.stderr or res.stdout or 'errore sconosciuto').strip()[:300]}"
+                    f"Listing snapshot fallito per VM {vmid} su {hostname}"
                 )
-            return snapshots
-
-        if res.stdout.strip():
-            try:
-                snapshots = json.loads(res.stdout)
-                # Filter 'current' entry usually returned
-                snapshots = [s for s in snapshots if s.get('name') != 'current']
-            except Exception as exc:
-                if raise_on_error:
-                    raise RuntimeError(
-                        f"Output listing snapshot non interpretabile per VM {vmid}: {exc}"
-                    )
-
-        return snapshots
+            return []
+        return listing[vmid]
 
     
     async def get_vm_config_file(
@@ -1171,9 +1244,7 @@ echo "Configuration created"
         
         # Ottieni node name se non fornito
         if not node_name:
-            cmd = "hostname"
-            hostname_result = await ssh_service.execute(hostname, cmd, port, username, key_path)
-            node_name = hostname_result.stdout.strip() if hostname_result.success else hostname
+            node_name = await self.get_node_name(hostname, port, username, key_path) or hostname
         
         # Config via pvesh
         cmd = f"pvesh get /nodes/{node_name}/{vm_type}/{vmid}/config --output-format json 2>/dev/null"
@@ -4,19 +4,27 @@ Con supporto notifiche e riepilogo giornaliero
 """
 
 import asyncio
+import heapq
 import os
+import threading
 from datetime import datetime, time, timezone, timedelta
 from zoneinfo import ZoneInfo
-from typing import Dict, Optional, Callable
+from typing import Dict, List, Optional, Callable, Tuple
 import logging
 from croniter import croniter
 from sqlalchemy.orm import Session
 
-from database import SessionLocal, SyncJob, JobLog, Node, NotificationConfig, SystemConfig, HostBackupJob, MigrationJob, FileReplicationJob, BackupJob, RecoveryJob
+from database import SessionLocal, run_with_async_session, SyncJob, JobLog, Node, NotificationConfig, SystemConfig, HostBackupJob, MigrationJob, FileReplicationJob, BackupJob, RecoveryJob
 from services.notification_service import notification_service
 from services.host_backup_service import host_backup_service
-from services.host_info_service import host_info_service
 from services.cache_service import cache_service
+from services.job_admission import (
+    admission_controller,
+    nas_resource,
+    node_resource,
+    pbs_resource,
+    pool_resource,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +32,22 @@ logger = logging.getLogger(__name__)
 # ancora innescare la run di quello slot (evita backlog di settimane).
 _CRON_SLOT_GRACE_SEC = 120
 
+# Uno slot rinviato (job ancora in esecuzione) viene ritentato dopo N secondi.
+_BUSY_RETRY_SEC = 60
+# Sonno massimo del dispatcher senza fire in coda né wake (difesa da salti
+# d'orologio di sistema).
+_MAX_IDLE_SLEEP_SEC = 300
+# Cadenza dei task di housekeeping (riepilogo, cache, cleanup, reconcile).
+_HOUSEKEEPING_INTERVAL_SEC = 60
+# Riallineamento completo coda/DB: rete di sicurezza per modifiche ai job
+# fatte senza passare dagli hook update_*/remove_*.
+_RESYNC_INTERVAL_SEC = int(os.environ.get("DAPX_SCHEDULER_RESYNC_SEC", "600"))
+# Backup PBS: i fire compatibili (stesso nodo sorgente, storage e opzioni)
+# raccolti in questa finestra girano in un solo vzdump (0 = un vzdump per job),
+# al più _PBS_BATCH_MAX_VMS guest per invocazione.
+_PBS_BATCH_WINDOW_SEC = float(os.environ.get("DAPX_PBS_BATCH_WINDOW_SEC", "5"))
+_PBS_BATCH_MAX_VMS = max(1, int(os.environ.get("DAPX_PBS_BATCH_MAX_VMS", "20")))
+
 # Timezone in cui interpretare le espressioni cron dei job schedulati.
 # Default Europe/Rome (ORA LOCALE, come si aspetta l'utente). Storage e
 # confronti interni restano in UTC naive; solo la valutazione del cron è locale.
@@ -75,17 +99,91 @@ def compute_initial_next_run(
     return next_future
 
 
+def _job_kinds() -> Dict[str, dict]:
+    """Tipi di job schedulabili, per prefisso della chiave scheduler.
+
+    - ``last_run``: campo usato per il catch-up dello slot corrente al restart;
+    - ``busy_field``/``busy``: stato DB che rinvia lo slot (job ancora attivo);
+    - ``runner``: metodo di SchedulerService eseguito sotto lock;
+    - ``persist_next``: scrive ``next_run_at`` sul DB per la UI.
+
+    I VM group (chiave ``vmgroup_<id>``) sono gestiti a parte.
+    """
+    from services.nas_sync.models import NasSyncJob
+    from services.vm_snapshot.models import VmSnapshotJob
+
+    return {
+        "sync": {
+            "model": SyncJob, "last_run": "last_run",
+            "busy_field": "last_status", "busy": ("running", "started"),
+            "runner": "_guarded_execute_sync_job",
+        },
+        "host_backup": {
+            "model": HostBackupJob, "last_run": "last_run",
+            "runner": "_execute_host_backup_job",
+        },
+        "file_replication": {
+            "model": FileReplicationJob, "last_run": "last_run_at",
+            "runner": "_execute_file_replication_job", "persist_next": True,
+        },
+        "nas_sync": {
+            "model": NasSyncJob, "last_run": "last_run_at",
+            "runner": "_execute_nas_sync_job", "persist_next": True,
+        },
+        "vm_snapshot": {
+            "model": VmSnapshotJob, "last_run": "last_run_at",
+            "runner": "_execute_vm_snapshot_job",
+        },
+        "backup_pbs": {
+            "model": BackupJob, "last_run": "last_run",
+            "busy_field": "current_status", "busy": ("running",),
+            "runner": "_execute_backup_pbs_job",
+        },
+        "recovery_pbs": {
+            "model": RecoveryJob, "last_run": "last_run",
+            "busy_field": "current_status",
+            "busy": ("backing_up", "restoring", "registering", "running"),
+            "runner": "_execute_recovery_pbs_job",
+        },
+        "migration": {
+            "model": MigrationJob, "last_run": "last_run",
+            "runner": "_execute_migration_job",
+        },
+    }
+
+
+def _split_job_key(key: str, kinds: Dict[str, dict]) -> Tuple[Optional[str], str]:
+    """'nas_sync_12' -> ('nas_sync', '12'); 'vmgroup_ab' -> ('vmgroup', 'ab')."""
+    for prefix in sorted(list(kinds) + ["vmgroup"], key=len, reverse=True):
+        if key.startswith(prefix + "_"):
+            return prefix, key[len(prefix) + 1:]
+    return None, key
+
+
 class SchedulerService:
     """Servizio per scheduling dei job di sincronizzazione"""
     
     def __init__(self):
         self._running = False
         self._task: Optional[asyncio.Task] = None
+        self._housekeeping_task: Optional[asyncio.Task] = None
         self._jobs: Dict[str, datetime] = {}  # job_key -> next_run
+        # Coda dei prossimi fire (next_run, job_key). Le voci superate da un
+        # aggiornamento restano nell'heap e sono scartate in lettura: una voce
+        # è valida solo se coincide con _jobs[job_key].
+        self._heap: List[Tuple[datetime, str]] = []
+        self._schedules: Dict[str, str] = {}  # job_key -> cron in coda
+        # Gli hook update_*/remove_* arrivano anche da endpoint sync (threadpool).
+        self._heap_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._last_resync: Optional[datetime] = None
         # Lock di esecuzione: previene il fire concorrente dello stesso
         # job (race scheduler vs durata > intervallo cron). Le chiavi sono
         # le stesse usate per `_jobs` (es. "sync_42", "backup_pbs_3").
         self._running_jobs: set = set()
+        # Batch backup PBS in raccolta: chiave opzioni -> {keys, job_ids, resources}
+        self._backup_batches: Dict[tuple, dict] = {}
         self._last_daily_summary: Optional[datetime] = None
         self._last_vm_cache_refresh: Optional[datetime] = None
         self._daily_summary_hour: int = 8  # Ora predefinita: 08:00 UTC
@@ -102,6 +200,8 @@ class SchedulerService:
         self._reset_stale_running_jobs()
 
         self._running = True
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
         self._task = asyncio.create_task(self._scheduler_loop())
         self._last_sync_reconcile: Optional[datetime] = None
         asyncio.create_task(self._reconcile_sync_jobs_on_startup())
@@ -109,6 +209,7 @@ class SchedulerService:
 
         # Carica configurazione orario riepilogo
         self._load_daily_summary_config()
+        self._load_admission_config()
 
     def _reset_stale_running_jobs(self) -> None:
         """All'avvio, marca come failed/idle i job lasciati in stato
@@ -184,17 +285,72 @@ class SchedulerService:
     def _unlock(self, key: str) -> None:
         self._running_jobs.discard(key)
 
-    async def _guarded_execute(self, key: str, fn: Callable, *args):
+    async def _guarded_execute(
+        self,
+        key: str,
+        fn: Callable,
+        *args,
+        resources: Optional[List[str]] = None,
+        kind: Optional[str] = None,
+        label: Optional[str] = None,
+    ):
         """Esegue `fn(*args)` rilasciando sempre il lock alla fine,
         anche su eccezione. Le exception vengono solo loggate per non
-        far propagare errori al loop principale."""
+        far propagare errori al loop principale.
+
+        Prima dell'esecuzione il job attende un posto nell'admission
+        controller (budget per nodo/pool/datastore/NAS/globale)."""
         try:
-            await fn(*args)
+            async with admission_controller.slot(key, resources or (), kind=kind, label=label):
+                await fn(*args)
         except Exception as e:
             logger.error(f"Job {key} fallito: {e}", exc_info=True)
         finally:
             self._unlock(key)
 
+    def _queue_backup_pbs(self, key: str, job, resources: List[str]) -> None:
+        """Accoda un fire backup PBS al batch delle stesse opzioni; il batch
+        parte alla chiusura della finestra o al raggiungimento del massimo."""
+        batch_key = (
+            job.source_node_id, job.pbs_node_id, job.pbs_storage_id or "",
+            job.backup_mode, job.backup_compress, job.bandwidth_limit, bool(job.include_all_disks),
+        )
+        batch = self._backup_batches.get(batch_key)
+        if batch is None:
+            batch = {"keys": [], "job_ids": [], "resources": set()}
+            self._backup_batches[batch_key] = batch
+            asyncio.create_task(self._flush_backup_batch_later(batch_key, batch))
+        batch["keys"].append(key)
+        batch["job_ids"].append(job.id)
+        batch["resources"].update(resources)
+        if len(batch["job_ids"]) >= _PBS_BATCH_MAX_VMS:
+            self._backup_batches.pop(batch_key, None)
+            self._start_backup_batch(batch)
+
+    async def _flush_backup_batch_later(self, batch_key: tuple, batch: dict) -> None:
+        await asyncio.sleep(_PBS_BATCH_WINDOW_SEC)
+        if self._backup_batches.get(batch_key) is batch:
+            del self._backup_batches[batch_key]
+            self._start_backup_batch(batch)
+
+    def _start_backup_batch(self, batch: dict) -> None:
+        keys, job_ids = batch["keys"], batch["job_ids"]
+        label = f"BackupJob batch {', '.join(str(j) for j in job_ids)}"
+        logger.info(f"Esecuzione {label} ({len(job_ids)} VM)")
+        asyncio.create_task(self._guarded_backup_batch(keys, job_ids, sorted(batch["resources"]), label))
+
+    async def _guarded_backup_batch(self, keys: List[str], job_ids: List[int], resources: List[str], label: str):
+        """Come ``_guarded_execute`` per un batch: un solo posto di admission
+        (risorse unite, come i VM group) e lock di tutti i job rilasciati alla fine."""
+        try:
+            async with admission_controller.slot(keys[0], resources, kind="backup_pbs", label=label):
+                await self._execute_backup_pbs_batch(job_ids)
+        except Exception as e:
+            logger.error(f"Batch backup {job_ids} fallito: {e}", exc_info=True)
+        finally:
+            for key in keys:
+                self._unlock(key)
+
     def is_running(self, key: str) -> bool:
         """API pubblica: verifica se un job e' attualmente in esecuzione
         secondo lo scheduler in-memory. Usata dagli endpoint /run-now per
@@ -213,12 +369,13 @@ class SchedulerService:
     async def stop(self):
         """Ferma lo scheduler"""
         self._running = False
-        if self._task:
-            self._task.cancel()
-            try:
-                await self._task
-            except asyncio.CancelledError:
-                pass
+        for task in (self._task, self._housekeeping_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
         logger.info("Scheduler fermato")
     
     def _load_daily_summary_config(self):
@@ -250,21 +407,339 @@ class SchedulerService:
         finally:
             db.close()
     
+    def _load_admission_config(self):
+        """Applica i budget di admission salvati (SystemConfig
+        "admission_budgets"); in assenza restano i default/env."""
+        from database import get_config_value
+
+        db = SessionLocal()
+        try:
+            budgets = get_config_value(db, "admission_budgets")
+            if isinstance(budgets, dict):
+                admission_controller.set_budgets(budgets)
+            logger.info(f"Budget admission job: {admission_controller.budgets}")
+        except Exception as e:
+            logger.warning(f"Config admission non caricata: {e}")
+        finally:
+            db.close()
+
+    def get_queue_snapshot(self) -> Dict:
+        """Job in esecuzione/in coda secondo l'admission controller."""
+        return admission_controller.snapshot()
+
     async def _scheduler_loop(self):
-        """Loop principale dello scheduler"""
+        """Loop principale dello scheduler: dispatcher event-driven.
+
+        Dorme fino al prossimo fire in coda (o a un wake degli hook
+        update_*/remove_*) e lancia i job scaduti. L'housekeeping gira in un
+        task separato e non ritarda mai il dispatch.
+        """
+        self._housekeeping_task = asyncio.create_task(self._housekeeping_loop())
+        try:
+            await run_with_async_session(self._resync_schedule)
+        except Exception as e:
+            logger.error(f"Errore caricamento schedule iniziale: {e}")
+        while self._running:
+            try:
+                self._wake.clear()
+                # Sessione async: la rilettura dei job scaduti non blocca il loop
+                await run_with_async_session(self._dispatch_due)
+                delay = self._seconds_until_next(datetime.utcnow())
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Errore nello scheduler: {e}")
+                await asyncio.sleep(5)
+
+    async def _housekeeping_loop(self):
+        """Task periodici non legati ai cron dei job (ogni minuto)."""
         while self._running:
             try:
-                await self._check_and_run_jobs()
                 await self._check_daily_summary()
                 await self._check_replication_overdue()
                 await self._check_host_info_updates()
                 await self._refresh_vm_cache()
                 await self._daily_log_cleanup()
                 await self._reconcile_stuck_sync_jobs()
-                await asyncio.sleep(60)  # Check ogni minuto
+                await self._periodic_resync()
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                logger.error(f"Errore nello scheduler: {e}")
-                await asyncio.sleep(60)
+                logger.error(f"Errore housekeeping scheduler: {e}")
+            await asyncio.sleep(_HOUSEKEEPING_INTERVAL_SEC)
+
+    # ============== Coda next-fire ==============
+
+    def _notify(self) -> None:
+        """Sveglia il dispatcher (thread-safe: gli hook possono arrivare da
+        endpoint sync eseguiti nel threadpool)."""
+        loop, wake = self._loop, self._wake
+        if loop is None or wake is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            wake.set()
+        else:
+            loop.call_soon_threadsafe(wake.set)
+
+    def _set_next(self, key: str, when: datetime, schedule: Optional[str] = None) -> None:
+        with self._heap_lock:
+            if schedule is not None:
+                self._schedules[key] = schedule
+            if self._jobs.get(key) == when:
+                return
+            self._jobs[key] = when
+            heapq.heappush(self._heap, (when, key))
+        self._notify()
+
+    def _drop(self, key: str) -> None:
+        with self._heap_lock:
+            self._jobs.pop(key, None)
+            self._schedules.pop(key, None)
+
+    def _update_schedule(self, key: str, schedule: str, last_run: Optional[datetime]) -> None:
+        if schedule:
+            self._set_next(key, compute_initial_next_run(schedule, last_run, datetime.utcnow()), schedule)
+        else:
+            self._drop(key)
+
+    def _pop_due(self, now: datetime) -> List[str]:
+        """Estrae le chiavi scadute; restano fuori da _jobs finché _fire non
+        fissa il prossimo slot (o un ritentativo)."""
+        due: List[str] = []
+        with self._heap_lock:
+            while self._heap and self._heap[0][0] <= now:
+                when, key = heapq.heappop(self._heap)
+                if self._jobs.get(key) == when:
+                    del self._jobs[key]
+                    due.append(key)
+        return due
+
+    def _seconds_until_next(self, now: datetime) -> float:
+        with self._heap_lock:
+            while self._heap and self._jobs.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return _MAX_IDLE_SLEEP_SEC
+            delta = (self._heap[0][0] - now).total_seconds()
+        return min(max(0.0, delta), _MAX_IDLE_SLEEP_SEC)
+
+    async def _periodic_resync(self) -> None:
+        now = datetime.utcnow()
+        if self._last_resync and (now - self._last_resync).total_seconds() < _RESYNC_INTERVAL_SEC:
+            return
+        await run_with_async_session(self._resync_schedule)
+
+    def _resync_schedule(self, session: Optional[Session] = None) -> None:
+        """Riallinea la coda con il DB (job attivi con cron).
+
+        All'avvio costruisce l'heap; poi, ogni _RESYNC_INTERVAL_SEC, recupera
+        chiavi nuove/rimosse o cron cambiati senza passare dagli hook. Le
+        chiavi con cron invariato mantengono il prossimo slot già in coda.
+        ``session``: sessione fornita dal chiamante (dal loop, quella sync di
+        una AsyncSession via ``run_with_async_session``).
+        """
+        now = datetime.utcnow()
+        kinds = _job_kinds()
+        desired: Dict[str, Tuple[str, Optional[datetime]]] = {}
+        persist_rows: Dict[str, object] = {}
+        db = session or SessionLocal()
+        try:
+            for prefix, kind in kinds.items():
+                model = kind["model"]
+                rows = db.query(model).filter(
+                    model.is_active == True,
+                    model.schedule.isnot(None),
+                    model.schedule != "",
+                ).order_by(model.id).all()
+                if prefix == "sync":
+                    groups: Dict[str, list] = {}
+                    for job in rows:
+                        if job.vm_group_id:
+                            groups.setdefault(job.vm_group_id, []).append(job)
+                        else:
+                            desired[f"sync_{job.id}"] = (job.schedule, job.last_run)
+                    for gid, members in groups.items():
+                        group_last_run = max(
+                            (m.last_run for m in members if m.last_run), default=None
+                        )
+                        desired[f"vmgroup_{gid}"] = (members[0].schedule, group_last_run)
+                    continue
+                for job in rows:
+                    key = f"{prefix}_{job.id}"
+                    desired[key] = (job.schedule, getattr(job, kind["last_run"]))
+                    if kind.get("persist_next"):
+                        persist_rows[key] = job
+
+            for key in [k for k in list(self._jobs) if k not in desired]:
+                self._drop(key)
+            for key, (schedule, last_run) in desired.items():
+                if key in self._jobs and self._schedules.get(key) == schedule:
+                    continue
+                self._set_next(key, compute_initial_next_run(schedule, last_run, now), schedule)
+
+            # Persisti il prossimo run nel DB così l'UI può mostrarlo
+            dirty = False
+            for key, job in persist_rows.items():
+                nxt = self._jobs.get(key)
+                if nxt and job.next_run_at != nxt:
+                    job.next_run_at = nxt
+                    dirty = True
+            if dirty:
+                db.commit()
+        finally:
+            if session is None:
+                db.close()
+        self._last_resync = now
+        logger.debug(f"Schedule riallineato: {len(desired)} job in coda")
+
+    def _dispatch_due(self, session: Optional[Session] = None) -> None:
+        """Lancia i job il cui slot è scaduto (una sessione DB per giro)."""
+        now = datetime.utcnow()
+        due = self._pop_due(now)
+        if not due:
+            return
+        kinds = _job_kinds()
+        db = session or SessionLocal()
+        try:
+            for key in due:
+                try:
+                    self._fire(db, kinds, key, now)
+                except Exception as e:
+                    logger.error(f"Errore scheduling {key}: {e}")
+                    try:
+                        db.rollback()
+                    except Exception:
+                        pass
+                    self._set_next(key, now + timedelta(seconds=_BUSY_RETRY_SEC))
+        finally:
+            if session is None:
+                db.close()
+
+    def _fire(self, db: Session, kinds: Dict[str, dict], key: str, now: datetime) -> None:
+        """Esegue (sotto lock) il job di uno slot scaduto e accoda il prossimo.
+        Il job viene riletto dal DB: se disattivato/eliminato esce dalla coda;
+        se ancora in esecuzione lo slot è ritentato dopo _BUSY_RETRY_SEC."""
+        prefix, ident = _split_job_key(key, kinds)
+        if prefix is None:
+            self._drop(key)
+            return
+        if prefix == "vmgroup":
+            self._fire_vm_group(db, key, ident, now)
+            return
+
+        kind = kinds[prefix]
+        model = kind["model"]
+        label = model.__name__
+        job = db.query(model).filter(model.id == int(ident)).first()
+        if (
+            not job
+            or not job.is_active
+            or not job.schedule
+            or (prefix == "sync" and job.vm_group_id)
+        ):
+            self._drop(key)
+            return
+
+        busy = kind.get("busy_field")
+        if busy and (getattr(job, busy) or "").lower() in kind["busy"]:
+            logger.info(f"{label} {job.id} in esecuzione, slot cron rinviato")
+            self._set_next(key, now + timedelta(seconds=_BUSY_RETRY_SEC))
+            return
+        if not self._try_lock(key):
+            logger.info(f"{label} {job.id} ancora in esecuzione: skip fire schedulato")
+            self._set_next(key, now + timedelta(seconds=_BUSY_RETRY_SEC))
+            return
+
+        logger.info(f"Esecuzione {label} schedulato: {job.name} (ID: {job.id})")
+        runner = getattr(self, kind["runner"])
+        resources = self._job_resources(db, prefix, job)
+        run_label = f"{label} {job.name} (ID: {job.id})"
+        if prefix == "sync":
+            # Il lock resta se la replica continua in background.
+            asyncio.create_task(runner(key, job.id, resources=resources, label=run_label))
+        elif prefix == "backup_pbs" and _PBS_BATCH_WINDOW_SEC > 0:
+            self._queue_backup_pbs(key, job, resources)
+        else:
+            asyncio.create_task(self._guarded_execute(
+                key, runner, job.id, resources=resources, kind=prefix, label=run_label,
+            ))
+
+        next_run = _next_run_after(job.schedule, now)
+        self._set_next(key, next_run, job.schedule)
+        if kind.get("persist_next") and job.next_run_at != next_run:
+            job.next_run_at = next_run
+            db.commit()
+
+    def _job_resources(self, db: Session, prefix: str, job) -> List[str]:
+        """Risorse impegnate da una run (chiavi dei budget di admission)."""
+        res: List[Optional[str]] = []
+        if prefix == "sync":
+            res = [
+                node_resource(job.source_node_id),
+                node_resource(job.dest_node_id),
+                pool_resource(job.source_node_id, job.source_dataset),
+                pool_resource(job.dest_node_id, job.dest_dataset),
+            ]
+        elif prefix == "host_backup":
+            res = [node_resource(job.node_id)]
+        elif prefix in ("file_replication", "nas_sync"):
+            res = [nas_resource(job.source_endpoint_id), nas_resource(job.dest_endpoint_id)]
+        elif prefix == "vm_snapshot":
+            node_ids = {t.get("node_id") for t in (job.targets or []) if isinstance(t, dict)}
+            node_ids |= set((job.selectors or {}).get("node_ids") or [])
+            res = [node_resource(nid) for nid in sorted(n for n in node_ids if n)]
+        elif prefix in ("backup_pbs", "recovery_pbs"):
+            datastore = job.pbs_datastore
+            if not datastore:
+                pbs_node = db.query(Node).filter(Node.id == job.pbs_node_id).first()
+                datastore = pbs_node.pbs_datastore if pbs_node else None
+            res = [node_resource(job.source_node_id), pbs_resource(job.pbs_node_id, datastore)]
+            if prefix == "recovery_pbs":
+                res.append(node_resource(job.dest_node_id))
+        elif prefix == "migration":
+            res = [node_resource(job.source_node_id), node_resource(job.dest_node_id)]
+        return [r for r in res if r]
+
+    def _fire_vm_group(self, db: Session, key: str, vm_group_id: str, now: datetime) -> None:
+        members = db.query(SyncJob).filter(
+            SyncJob.vm_group_id == vm_group_id,
+            SyncJob.is_active == True,
+            SyncJob.schedule.isnot(None),
+            SyncJob.schedule != "",
+        ).order_by(SyncJob.id).all()
+        if not members:
+            self._drop(key)
+            return
+        if any((sj.last_status or "").lower() in ("running", "started") for sj in members):
+            logger.info(f"VM group {vm_group_id}: disco in running, slot cron rinviato")
+            self._set_next(key, now + timedelta(seconds=_BUSY_RETRY_SEC))
+            return
+        if not self._try_lock(key):
+            logger.info(f"VM group {vm_group_id} ancora in esecuzione: skip")
+            self._set_next(key, now + timedelta(seconds=_BUSY_RETRY_SEC))
+            return
+        logger.info(
+            f"Esecuzione VM group schedulato: {vm_group_id} (es. {members[0].name})"
+        )
+        resources = sorted({
+            r for sj in members for r in self._job_resources(db, "sync", sj)
+        })
+        asyncio.create_task(
+            self._guarded_execute(
+                key, self._execute_vm_group_sync, vm_group_id,
+                resources=resources, kind="vmgroup", label=f"VM group {vm_group_id}",
+            )
+        )
+        schedule = members[0].schedule
+        self._set_next(key, _next_run_after(schedule, now), schedule)
 
     async def _daily_log_cleanup(self):
         """Una volta al giorno (UTC 03:30) cancella JobLog/AuditLog scaduti.
@@ -375,45 +850,34 @@ class SchedulerService:
             db.close()
 
     async def _check_host_info_updates(self):
-        """Aggiorna i dati dei nodi una volta al giorno (03:00 UTC)"""
+        """Aggiorna host_info dei nodi con cadenza propria (HOST_INFO_REFRESH_INTERVAL),
+        disaccoppiata dalla cache VM. Gira in background: il loop non attende
+        le decine di probe SSH per nodo."""
+        from services.cache_service import HOST_INFO_REFRESH_INTERVAL
+
         now = datetime.utcnow()
-        # Esegui alle 03:00
-        if now.hour == 3 and now.minute == 0:
-             # Controlla se già eseguito oggi per evitare loop nel minuto 0
-             # Usiamo una variabile di stato in memoria per semplicità o controlliamo l'ultimo update di un nodo
-             # Per robustezza, meglio limitare la frequenza a 1 volta ogni ora se serve
-             pass
-
-        # Approccio più semplice: 
-        # Iteriamo i nodi, se last_update è vecchio di > 24h (o nullo), aggiorna.
-        # Così è resiliente ai riavvii e non serve cron preciso.
-        
-        db = SessionLocal()
-        try:
-            nodes = db.query(Node).filter(Node.is_active == True, Node.is_online == True).all()
-            for node in nodes:
-                should_update = False
-                if not node.host_info_updated_at:
-                    should_update = True
-                else:
-                    delta = now - node.host_info_updated_at
-                    if delta.total_seconds() > 86400: # 24 ore
-                        should_update = True # Scaduto
-                    elif now.hour == 3 and delta.total_seconds() > 3600: 
-                        # Se sono le 3 di notte e non ho aggiornato nell'ultima ora -> forza update "giornaliero"
-                        should_update = True
-
-                if should_update:
-                    logger.info(f"Schedulato aggiornamento dati per nodo {node.name}")
-                    asyncio.create_task(host_info_service.update_host_details(node.id))
-                    
-        except Exception as e:
-            logger.error(f"Errore check updates nodi: {e}")
-        finally:
-            db.close()
+        last = getattr(self, "_last_host_info_refresh", None)
+        if last and (now - last).total_seconds() < HOST_INFO_REFRESH_INTERVAL:
+            return
+        self._last_host_info_refresh = now
+
+        async def _run():
+            db = SessionLocal()
+            try:
+                updated = await cache_service.refresh_host_info(db=db)
+                logger.debug(f"Host info aggiornati per {updated} nodi")
+            except Exception as e:
+                logger.error(f"Errore check updates nodi: {e}")
+            finally:
+                db.close()
+
+        asyncio.create_task(_run())
     
     async def _refresh_vm_cache(self):
-        """Aggiorna la cache VM ogni 5 minuti per velocizzare la pagina VM"""
+        """Aggiorna la cache VM ogni 5 minuti per velocizzare la pagina VM.
+
+        Il refresh gira in background (non ritarda il dispatch dei job) e
+        CacheService impedisce che due cicli si sovrappongano."""
         now = datetime.utcnow()
         
         # Check se è passato abbastanza tempo dall'ultimo refresh (5 minuti)
@@ -421,396 +885,50 @@ class SchedulerService:
             delta = (now - self._last_vm_cache_refresh).total_seconds()
             if delta < 300:  # 5 minuti
                 return
-        
-        logger.debug("Avvio refresh cache VMs...")
-        db = SessionLocal()
-        try:
-            await cache_service.refresh_all_nodes(db)
-            self._last_vm_cache_refresh = now
-            logger.info("Cache VM aggiornata con successo")
-        except Exception as e:
-            logger.error(f"Errore refresh cache VM: {e}")
-        finally:
-            db.close()
+        if cache_service.is_refreshing():
+            return
+        self._last_vm_cache_refresh = now
+
+        async def _run():
+            logger.debug("Avvio refresh cache VMs...")
+            db = SessionLocal()
+            try:
+                await cache_service.refresh_all_nodes(db)
+                logger.info("Cache VM aggiornata con successo")
+            except Exception as e:
+                logger.error(f"Errore refresh cache VM: {e}")
+            finally:
+                db.close()
+
+        asyncio.create_task(_run())
     
-    async def _guarded_execute_sync_job(self, job_key: str, job_id: int) -> None:
+    async def _guarded_execute_sync_job(
+        self,
+        job_key: str,
+        job_id: int,
+        resources: Optional[List[str]] = None,
+        label: Optional[str] = None,
+    ) -> None:
         """Esegue un SyncJob standalone; mantiene il lock se la replica continua in background."""
         from services.sync_job_execution import execute_sync_job_task
 
         keep_lock = False
         try:
-            keep_lock = await execute_sync_job_task(job_id)
+            async with admission_controller.slot(job_key, resources or (), kind="sync", label=label) as ticket:
+                # Se la replica prosegue nel monitor il posto resta occupato
+                # fino alla sua fine, non fino al ritorno di execute_sync_job_task
+                release = admission_controller.detach(ticket)
+                try:
+                    keep_lock = await execute_sync_job_task(job_id, on_monitor_done=release)
+                finally:
+                    if not keep_lock:
+                        release()
         except Exception as e:
             logger.error(f"SyncJob {job_id} fallito: {e}", exc_info=True)
         finally:
             if not keep_lock:
                 self._unlock(job_key)
 
-    async def _check_and_run_jobs(self):
-        """Verifica e esegue i job schedulati"""
-        db = SessionLocal()
-        try:
-            now = datetime.utcnow()
-            
-            # === SYNC JOBS ===
-            sync_jobs = db.query(SyncJob).filter(
-                SyncJob.is_active == True,
-                SyncJob.schedule.isnot(None),
-                SyncJob.schedule != ""
-            ).all()
-            
-            seen_vm_groups: set[str] = set()
-            for job in sync_jobs:
-                try:
-                    if job.vm_group_id:
-                        if job.vm_group_id in seen_vm_groups:
-                            continue
-                        seen_vm_groups.add(job.vm_group_id)
-                        group_key = f"vmgroup_{job.vm_group_id}"
-                        group_members = [
-                            sj for sj in sync_jobs if sj.vm_group_id == job.vm_group_id
-                        ]
-                        group_last_run = max(
-                            (sj.last_run for sj in group_members if sj.last_run),
-                            default=None,
-                        )
-                        if group_key not in self._jobs:
-                            self._jobs[group_key] = compute_initial_next_run(
-                                job.schedule, group_last_run, now
-                            )
-                        next_run = self._jobs[group_key]
-                        if now >= next_run:
-                            disk_busy = any(
-                                (sj.last_status or "").lower() in ("running", "started")
-                                for sj in group_members
-                            )
-                            if disk_busy:
-                                logger.info(
-                                    f"VM group {job.vm_group_id}: disco in running, "
-                                    f"slot cron rinviato"
-                                )
-                            elif self._try_lock(group_key):
-                                logger.info(
-                                    f"Esecuzione VM group schedulato: {job.vm_group_id} "
-                                    f"(es. {job.name})"
-                                )
-                                asyncio.create_task(
-                                    self._guarded_execute(
-                                        group_key,
-                                        self._execute_vm_group_sync,
-                                        job.vm_group_id,
-                                    )
-                                )
-                                self._jobs[group_key] = _next_run_after(job.schedule, now)
-                                for sj in group_members:
-                                    self._jobs[f"sync_{sj.id}"] = self._jobs[group_key]
-                            else:
-                                logger.info(
-                                    f"VM group {job.vm_group_id} ancora in esecuzione: skip"
-                                )
-                        continue
-
-                    job_key = f"sync_{job.id}"
-                    if job_key not in self._jobs:
-                        self._jobs[job_key] = compute_initial_next_run(
-                            job.schedule, job.last_run, now
-                        )
-
-                    next_run = self._jobs[job_key]
-
-                    if now >= next_run:
-                        disk_busy = (job.last_status or "").lower() in (
-                            "running",
-                            "started",
-                        )
-                        if disk_busy:
-                            logger.info(
-                                f"SyncJob {job.id} in running su DB, slot cron rinviato"
-                            )
-                        elif self._try_lock(job_key):
-                            logger.info(
-                                f"Esecuzione SyncJob schedulato: {job.name} (ID: {job.id})"
-                            )
-                            asyncio.create_task(
-                                self._guarded_execute_sync_job(job_key, job.id)
-                            )
-                            self._jobs[job_key] = _next_run_after(job.schedule, now)
-                        else:
-                            logger.info(
-                                f"SyncJob {job.id} ancora in esecuzione: skip fire schedulato"
-                            )
-
-                except Exception as e:
-                    logger.error(f"Errore scheduling SyncJob {job.id}: {e}")
-            
-            # === HOST BACKUP JOBS ===
-            host_backup_jobs = db.query(HostBackupJob).filter(
-                HostBackupJob.is_active == True,
-                HostBackupJob.schedule.isnot(None),
-                HostBackupJob.schedule != ""
-            ).all()
-            
-            for job in host_backup_jobs:
-                try:
-                    job_key = f"host_backup_{job.id}"
-                    if job_key not in self._jobs:
-                        self._jobs[job_key] = compute_initial_next_run(
-                            job.schedule, job.last_run, now
-                        )
-                    
-                    next_run = self._jobs[job_key]
-                    
-                    if now >= next_run:
-                        if self._try_lock(job_key):
-                            logger.info(f"Esecuzione HostBackupJob schedulato: {job.name} (ID: {job.id})")
-                            asyncio.create_task(self._guarded_execute(job_key, self._execute_host_backup_job, job.id))
-                            self._jobs[job_key] = _next_run_after(job.schedule, now)
-                        else:
-                            logger.info(f"HostBackupJob {job.id} ancora in esecuzione: skip fire schedulato")
-                        
-                except Exception as e:
-                    logger.error(f"Errore scheduling HostBackupJob {job.id}: {e}")
-
-            # === FILE REPLICATION JOBS ===
-            file_replication_jobs = db.query(FileReplicationJob).filter(
-                FileReplicationJob.is_active == True,
-                FileReplicationJob.schedule.isnot(None),
-                FileReplicationJob.schedule != "",
-            ).all()
-
-            for job in file_replication_jobs:
-                try:
-                    job_key = f"file_replication_{job.id}"
-                    if job_key not in self._jobs:
-                        self._jobs[job_key] = compute_initial_next_run(
-                            job.schedule, job.last_run_at, now
-                        )
-
-                    next_run = self._jobs[job_key]
-
-                    if now >= next_run:
-                        if self._try_lock(job_key):
-                            logger.info(
-                                f"Esecuzione FileReplicationJob schedulato: {job.name} (ID: {job.id})"
-                            )
-                            asyncio.create_task(
-                                self._guarded_execute(
-                                    job_key,
-                                    self._execute_file_replication_job,
-                                    job.id,
-                                )
-                            )
-                            self._jobs[job_key] = _next_run_after(job.schedule, now)
-                        else:
-                            logger.info(
-                                f"FileReplicationJob {job.id} ancora in esecuzione: skip fire schedulato"
-                            )
-
-                    # Persisti il prossimo run nel DB così l'UI può mostrarlo
-                    if job.next_run_at != self._jobs[job_key]:
-                        job.next_run_at = self._jobs[job_key]
-                        db.commit()
-                except Exception as e:
-                    logger.error(f"Errore scheduling FileReplicationJob {job.id}: {e}")
-
-            # === NAS SYNC JOBS (Repliche dati v2) ===
-            from services.nas_sync.models import NasSyncJob
-
-            nas_sync_jobs_q = db.query(NasSyncJob).filter(
-                NasSyncJob.is_active == True,
-                NasSyncJob.schedule.isnot(None),
-                NasSyncJob.schedule != "",
-            ).all()
-
-            for job in nas_sync_jobs_q:
-                try:
-                    job_key = f"nas_sync_{job.id}"
-                    if job_key not in self._jobs:
-                        self._jobs[job_key] = compute_initial_next_run(
-                            job.schedule, job.last_run_at, now
-                        )
-                    next_run = self._jobs[job_key]
-                    if now >= next_run:
-                        if self._try_lock(job_key):
-                            logger.info(
-                                f"Esecuzione NasSyncJob schedulato: {job.name} (ID: {job.id})"
-                            )
-                            asyncio.create_task(
-                                self._guarded_execute(
-                                    job_key,
-                                    self._execute_nas_sync_job,
-                                    job.id,
-                                )
-                            )
-                            self._jobs[job_key] = _next_run_after(job.schedule, now)
-                        else:
-                            logger.info(
-                                f"NasSyncJob {job.id} ancora in esecuzione: skip fire schedulato"
-                            )
-                    # Persisti il prossimo run nel DB così l'UI può mostrarlo
-                    if job.next_run_at != self._jobs[job_key]:
-                        job.next_run_at = self._jobs[job_key]
-                        db.commit()
-                except Exception as e:
-                    logger.error(f"Errore scheduling NasSyncJob {job.id}: {e}")
-
-            # === VM SNAPSHOT JOBS (Snapshot VM) ===
-            from services.vm_snapshot.models import VmSnapshotJob
-
-            vm_snapshot_jobs_q = db.query(VmSnapshotJob).filter(
-                VmSnapshotJob.is_active == True,
-                VmSnapshotJob.schedule.isnot(None),
-                VmSnapshotJob.schedule != "",
-            ).all()
-
-            for job in vm_snapshot_jobs_q:
-                try:
-                    job_key = f"vm_snapshot_{job.id}"
-                    if job_key not in self._jobs:
-                        self._jobs[job_key] = compute_initial_next_run(
-                            job.schedule, job.last_run_at, now
-                        )
-                    next_run = self._jobs[job_key]
-                    if now >= next_run:
-                        if self._try_lock(job_key):
-                            logger.info(
-                                f"Esecuzione VmSnapshotJob schedulato: {job.name} (ID: {job.id})"
-                            )
-                            asyncio.create_task(
-                                self._guarded_execute(
-                                    job_key,
-                                    self._execute_vm_snapshot_job,
-                                    job.id,
-                                )
-                            )
-                            self._jobs[job_key] = _next_run_after(job.schedule, now)
-                        else:
-                            logger.info(
-                                f"VmSnapshotJob {job.id} ancora in esecuzione: skip fire schedulato"
-                            )
-                except Exception as e:
-                    logger.error(f"Errore scheduling VmSnapshotJob {job.id}: {e}")
-
-            # === BACKUP PBS JOBS ===
-            backup_jobs = db.query(BackupJob).filter(
-                BackupJob.is_active == True,
-                BackupJob.schedule.isnot(None),
-                BackupJob.schedule != "",
-            ).all()
-
-            for job in backup_jobs:
-                try:
-                    job_key = f"backup_pbs_{job.id}"
-                    if job_key not in self._jobs:
-                        self._jobs[job_key] = compute_initial_next_run(
-                            job.schedule, job.last_run, now
-                        )
-
-                    next_run = self._jobs[job_key]
-
-                    if now >= next_run:
-                        busy = (job.current_status or "").lower() in ("running",)
-                        if busy:
-                            logger.info(
-                                f"BackupJob {job.id} in esecuzione, slot cron rinviato"
-                            )
-                        elif self._try_lock(job_key):
-                            logger.info(
-                                f"Esecuzione BackupJob schedulato: {job.name} (ID: {job.id})"
-                            )
-                            asyncio.create_task(
-                                self._guarded_execute(
-                                    job_key,
-                                    self._execute_backup_pbs_job,
-                                    job.id,
-                                )
-                            )
-                            self._jobs[job_key] = _next_run_after(job.schedule, now)
-                        else:
-                            logger.info(
-                                f"BackupJob {job.id} ancora in esecuzione: skip fire schedulato"
-                            )
-                except Exception as e:
-                    logger.error(f"Errore scheduling BackupJob {job.id}: {e}")
-
-            # === RECOVERY PBS JOBS (replica via PBS) ===
-            recovery_jobs = db.query(RecoveryJob).filter(
-                RecoveryJob.is_active == True,
-                RecoveryJob.schedule.isnot(None),
-                RecoveryJob.schedule != "",
-            ).all()
-
-            for job in recovery_jobs:
-                try:
-                    job_key = f"recovery_pbs_{job.id}"
-                    if job_key not in self._jobs:
-                        self._jobs[job_key] = compute_initial_next_run(
-                            job.schedule, job.last_run, now
-                        )
-
-                    next_run = self._jobs[job_key]
-
-                    if now >= next_run:
-                        busy = (job.current_status or "").lower() in (
-                            "backing_up",
-                            "restoring",
-                            "registering",
-                            "running",
-                        )
-                        if busy:
-                            logger.info(
-                                f"RecoveryJob {job.id} in esecuzione, slot cron rinviato"
-                            )
-                        elif self._try_lock(job_key):
-                            logger.info(
-                                f"Esecuzione RecoveryJob schedulato: {job.name} (ID: {job.id})"
-                            )
-                            asyncio.create_task(
-                                self._guarded_execute(
-                                    job_key,
-                                    self._execute_recovery_pbs_job,
-                                    job.id,
-                                )
-                            )
-                            self._jobs[job_key] = _next_run_after(job.schedule, now)
-                        else:
-                            logger.info(
-                                f"RecoveryJob {job.id} ancora in esecuzione: skip fire schedulato"
-                            )
-                except Exception as e:
-                    logger.error(f"Errore scheduling RecoveryJob {job.id}: {e}")
-            
-            # === MIGRATION JOBS ===
-            migration_jobs = db.query(MigrationJob).filter(
-                MigrationJob.is_active == True,
-                MigrationJob.schedule.isnot(None),
-                MigrationJob.schedule != ""
-            ).all()
-            
-            for job in migration_jobs:
-                try:
-                    job_key = f"migration_{job.id}"
-                    if job_key not in self._jobs:
-                        self._jobs[job_key] = compute_initial_next_run(
-                            job.schedule, job.last_run, now
-                        )
-                    
-                    next_run = self._jobs[job_key]
-                    
-                    if now >= next_run:
-                        if self._try_lock(job_key):
-                            logger.info(f"Esecuzione MigrationJob schedulato: {job.name} (ID: {job.id})")
-                            asyncio.create_task(self._guarded_execute(job_key, self._execute_migration_job, job.id))
-                            self._jobs[job_key] = _next_run_after(job.schedule, now)
-                        else:
-                            logger.info(f"MigrationJob {job.id} ancora in esecuzione: skip fire schedulato")
-                        
-                except Exception as e:
-                    logger.error(f"Errore scheduling MigrationJob {job.id}: {e}")
-                    
-        finally:
-            db.close()
-    
     async def _execute_vm_group_sync(self, vm_group_id: str):
         """Esegue in sequenza tutti i dischi di un gruppo VM."""
         from services.vm_group_sync_service import execute_vm_group_sync_task
@@ -1000,6 +1118,12 @@ class SchedulerService:
 
         await execute_backup_task(job_id, "")
 
+    async def _execute_backup_pbs_batch(self, job_ids: List[int]):
+        """Esegue più backup PBS schedulati con un solo vzdump."""
+        from routers.backup_jobs import execute_backup_batch_task
+
+        await execute_backup_batch_task(job_ids)
+
     async def _execute_recovery_pbs_job(self, job_id: int):
         """Esegue una replica via PBS schedulata (backup + restore)."""
         from services.recovery_job_execution import execute_recovery_job_task
@@ -1018,14 +1142,10 @@ class SchedulerService:
         last_run: Optional[datetime] = None,
     ) -> None:
         """Aggiorna lo schedule in-memory di un gruppo VM."""
-        key = f"vmgroup_{vm_group_id}"
-        if schedule:
-            self._jobs[key] = compute_initial_next_run(schedule, last_run, datetime.utcnow())
-        elif key in self._jobs:
-            del self._jobs[key]
+        self._update_schedule(f"vmgroup_{vm_group_id}", schedule, last_run)
 
     def remove_vm_group_schedule(self, vm_group_id: str) -> None:
-        self._jobs.pop(f"vmgroup_{vm_group_id}", None)
+        self._drop(f"vmgroup_{vm_group_id}")
 
     def update_job_schedule(
         self,
@@ -1038,15 +1158,11 @@ class SchedulerService:
         if vm_group_id:
             self.update_vm_group_schedule(vm_group_id, schedule, last_run)
             return
-        key = self._sync_job_scheduler_key(job_id)
-        if schedule:
-            self._jobs[key] = compute_initial_next_run(schedule, last_run, datetime.utcnow())
-        elif key in self._jobs:
-            del self._jobs[key]
+        self._update_schedule(self._sync_job_scheduler_key(job_id), schedule, last_run)
 
     def remove_job(self, job_id: int, vm_group_id: Optional[str] = None) -> None:
         """Rimuove le chiavi scheduler di un singolo job disco."""
-        self._jobs.pop(f"sync_{job_id}", None)
+        self._drop(f"sync_{job_id}")
         if vm_group_id:
             # La chiave vmgroup_ resta finché non si chiama remove_vm_group_schedule.
             pass
@@ -1057,14 +1173,10 @@ class SchedulerService:
         schedule: str,
         last_run: Optional[datetime] = None,
     ) -> None:
-        key = f"file_replication_{job_id}"
-        if schedule:
-            self._jobs[key] = compute_initial_next_run(schedule, last_run, datetime.utcnow())
-        elif key in self._jobs:
-            del self._jobs[key]
+        self._update_schedule(f"file_replication_{job_id}", schedule, last_run)
 
     def remove_file_replication_schedule(self, job_id: int) -> None:
-        self._jobs.pop(f"file_replication_{job_id}", None)
+        self._drop(f"file_replication_{job_id}")
 
     def update_nas_sync_schedule(
         self,
@@ -1072,14 +1184,10 @@ class SchedulerService:
         schedule: str,
         last_run: Optional[datetime] = None,
     ) -> None:
-        key = f"nas_sync_{job_id}"
-        if schedule:
-            self._jobs[key] = compute_initial_next_run(schedule, last_run, datetime.utcnow())
-        elif key in self._jobs:
-            del self._jobs[key]
+        self._update_schedule(f"nas_sync_{job_id}", schedule, last_run)
 
     def remove_nas_sync_schedule(self, job_id: int) -> None:
-        self._jobs.pop(f"nas_sync_{job_id}", None)
+        self._drop(f"nas_sync_{job_id}")
 
     def next_run_for(self, job_key: str) -> Optional[datetime]:
         """Prossima esecuzione pianificata per una chiave job (dal registry live).
@@ -1093,14 +1201,10 @@ class SchedulerService:
         schedule: str,
         last_run: Optional[datetime] = None,
     ) -> None:
-        key = f"vm_snapshot_{job_id}"
-        if schedule:
-            self._jobs[key] = compute_initial_next_run(schedule, last_run, datetime.utcnow())
-        elif key in self._jobs:
-            del self._jobs[key]
+        self._update_schedule(f"vm_snapshot_{job_id}", schedule, last_run)
 
     def remove_vm_snapshot_schedule(self, job_id: int) -> None:
-        self._jobs.pop(f"vm_snapshot_{job_id}", None)
+        self._drop(f"vm_snapshot_{job_id}")
 
     def update_backup_pbs_schedule(
         self,
@@ -1108,14 +1212,10 @@ class SchedulerService:
         schedule: str,
         last_run: Optional[datetime] = None,
     ) -> None:
-        key = f"backup_pbs_{job_id}"
-        if schedule:
-            self._jobs[key] = compute_initial_next_run(schedule, last_run, datetime.utcnow())
-        elif key in self._jobs:
-            del self._jobs[key]
+        self._update_schedule(f"backup_pbs_{job_id}", schedule, last_run)
 
     def remove_backup_pbs_schedule(self, job_id: int) -> None:
-        self._jobs.pop(f"backup_pbs_{job_id}", None)
+        self._drop(f"backup_pbs_{job_id}")
 
     def update_recovery_pbs_schedule(
         self,
@@ -1123,14 +1223,32 @@ class SchedulerService:
         schedule: str,
         last_run: Optional[datetime] = None,
     ) -> None:
-        key = f"recovery_pbs_{job_id}"
-        if schedule:
-            self._jobs[key] = compute_initial_next_run(schedule, last_run, datetime.utcnow())
-        elif key in self._jobs:
-            del self._jobs[key]
+        self._update_schedule(f"recovery_pbs_{job_id}", schedule, last_run)
 
     def remove_recovery_pbs_schedule(self, job_id: int) -> None:
-        self._jobs.pop(f"recovery_pbs_{job_id}", None)
+        self._drop(f"recovery_pbs_{job_id}")
+
+    def update_host_backup_schedule(
+        self,
+        job_id: int,
+        schedule: str,
+        last_run: Optional[datetime] = None,
+    ) -> None:
+        self._update_schedule(f"host_backup_{job_id}", schedule, last_run)
+
+    def remove_host_backup_schedule(self, job_id: int) -> None:
+        self._drop(f"host_backup_{job_id}")
+
+    def update_migration_schedule(
+        self,
+        job_id: int,
+        schedule: str,
+        last_run: Optional[datetime] = None,
+    ) -> None:
+        self._update_schedule(f"migration_{job_id}", schedule, last_run)
+
+    def remove_migration_schedule(self, job_id: int) -> None:
+        self._drop(f"migration_{job_id}")
 
 
 # Singleton
@@ -3,9 +3,12 @@ SSH Service - Gestione connessioni SSH ai nodi Proxmox
 """
 
 import asyncio
+import codecs
 import paramiko
 import threading
-from typing import Optional, Tuple, List, Dict
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple, List, Dict
 import logging
 import os
 from dataclasses import dataclass
@@ -29,6 +32,25 @@ def sanitize_zfs_name(name: str) -> str:
     return name
 
 
+class _LineSplitter:
+    """Spezza un flusso di testo in righe su ``\r`` o ``\n`` (decodifica
+    UTF-8 incrementale: un carattere multibyte può arrivare spezzato)."""
+
+    def __init__(self):
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._buf = ""
+
+    def feed(self, text: str) -> List[str]:
+        self._buf += text
+        parts = re.split(r"[\r\n]", self._buf)
+        self._buf = parts.pop()
+        return [p for p in parts if p]
+
+    def flush(self) -> str:
+        tail, self._buf = self._buf, ""
+        return tail
+
+
 @dataclass
 class SSHResult:
     """Risultato di un comando SSH"""
@@ -40,52 +62,170 @@ class SSHResult:
 
 from pathlib import Path
 
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# Dimensionamento del pool SSH (override via env, vedi config.env.example).
+SSH_POOL_TRANSPORTS_PER_HOST = max(1, _env_int("DAPX_SSH_POOL_TRANSPORTS", 2))
+SSH_POOL_MAX_CHANNELS_PER_HOST = max(1, _env_int("DAPX_SSH_POOL_MAX_CHANNELS", 8))
+SSH_POOL_EXECUTOR_WORKERS = max(4, _env_int("DAPX_SSH_EXECUTOR_WORKERS", 64))
+SSH_POOL_KEEPALIVE_SECONDS = max(0, _env_int("DAPX_SSH_KEEPALIVE", 30))
+SSH_POOL_IDLE_TIMEOUT_SECONDS = max(30, _env_int("DAPX_SSH_IDLE_TIMEOUT", 300))
+
+
+class _HostPool:
+    """Pool di transport SSH verso un singolo ``user@host:port``.
+
+    Mantiene fino a ``max_transports`` client paramiko (ognuno multiplexa più
+    canali) e un gate asyncio che limita i canali aperti contemporaneamente
+    verso l'host: le richieste in eccesso attendono in coda senza occupare
+    thread dell'executor, così un host saturo non affama gli altri.
+    Le metriche (coda, attesa canale, latenza connect) sono esposte da
+    ``SSHService.get_pool_stats``.
+    """
+
+    def __init__(self, key: str, max_transports: int, max_channels: int):
+        self.key = key
+        self.max_transports = max_transports
+        self.max_channels = max_channels
+        # id(client) -> {"inflight": canali aperti, "last_used": monotonic}
+        self.clients: List[paramiko.SSHClient] = []
+        self.usage: Dict[int, Dict[str, float]] = {}
+        self.connecting = 0
+        self._gate: Optional[asyncio.Semaphore] = None
+        self._gate_loop = None
+        # Metriche
+        self.waiting = 0
+        self.active = 0
+        self.total_acquired = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_last = 0.0
+        self.connects = 0
+        self.connect_failures = 0
+        self.connect_total = 0.0
+        self.connect_last = 0.0
+        self.evicted = 0
+
+    def gate(self) -> asyncio.Semaphore:
+        """Semaforo dei canali, legato al loop corrente (ricreato se cambia)."""
+        loop = asyncio.get_running_loop()
+        if self._gate is None or self._gate_loop is not loop:
+            self._gate = asyncio.Semaphore(self.max_channels)
+            self._gate_loop = loop
+        return self._gate
+
+    def record_wait(self, seconds: float) -> None:
+        self.total_acquired += 1
+        self.wait_total += seconds
+        self.wait_last = seconds
+        if seconds > self.wait_max:
+            self.wait_max = seconds
+
+    def record_connect(self, seconds: float, ok: bool) -> None:
+        if ok:
+            self.connects += 1
+            self.connect_total += seconds
+            self.connect_last = seconds
+        else:
+            self.connect_failures += 1
+
+    def close(self) -> None:
+        clients = list(self.clients)
+        self.clients.clear()
+        self.usage.clear()
+        for client in clients:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict:
+        return {
+            "transports": len(self.clients),
+            "max_transports": self.max_transports,
+            "max_channels": self.max_channels,
+            "active_channels": self.active,
+            "queue_depth": self.waiting,
+            "acquired_total": self.total_acquired,
+            "channel_wait_avg_ms": round(self.wait_total / self.total_acquired * 1000, 1) if self.total_acquired else 0.0,
+            "channel_wait_max_ms": round(self.wait_max * 1000, 1),
+            "channel_wait_last_ms": round(self.wait_last * 1000, 1),
+            "connects": self.connects,
+            "connect_failures": self.connect_failures,
+            "connect_avg_ms": round(self.connect_total / self.connects * 1000, 1) if self.connects else 0.0,
+            "connect_last_ms": round(self.connect_last * 1000, 1),
+            "evicted_idle": self.evicted,
+        }
+
+
+def _is_active(client: paramiko.SSHClient) -> bool:
+    try:
+        transport = client.get_transport()
+        return bool(transport and transport.is_active())
+    except Exception:
+        return False
+
+
 class SSHService:
     """Servizio per eseguire comandi via SSH sui nodi Proxmox"""
     
     DEFAULT_KEY_PATH = str(Path.home() / ".ssh" / "id_rsa")
 
-    def __init__(self):
-        self._connections: Dict[str, paramiko.SSHClient] = {}
-        # P-14/B11: il pool è letto/scritto da thread diversi (run_in_executor).
-        # Il lock protegge SOLO le mutazioni del dict; le connect (lente) restano
-        # fuori dal lock così host diversi non si serializzano.
+    def __init__(
+        self,
+        max_transports_per_host: int = SSH_POOL_TRANSPORTS_PER_HOST,
+        max_channels_per_host: int = SSH_POOL_MAX_CHANNELS_PER_HOST,
+        executor_workers: int = SSH_POOL_EXECUTOR_WORKERS,
+        keepalive: int = SSH_POOL_KEEPALIVE_SECONDS,
+        idle_timeout: int = SSH_POOL_IDLE_TIMEOUT_SECONDS,
+    ):
+        # user@host:port -> _HostPool (N transport + gate dei canali)
+        self._connections: Dict[str, _HostPool] = {}
+        # P-14/B11: il pool è letto/scritto da thread diversi (executor).
+        # Il lock protegge SOLO le mutazioni delle strutture; le connect (lente)
+        # restano fuori dal lock così host diversi non si serializzano.
         self._lock = threading.Lock()
+        self._max_transports = max(1, max_transports_per_host)
+        self._max_channels = max(1, max_channels_per_host)
+        self._executor_workers = max(1, executor_workers)
+        self._keepalive = keepalive
+        self._idle_timeout = idle_timeout
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._last_eviction = time.monotonic()
         # Override se siamo root
         if os.geteuid() == 0:
             self.DEFAULT_KEY_PATH = "/root/.ssh/id_rsa"
-    
-    def _get_client(
-        self, 
-        hostname: str, 
-        port: int = 22,
-        username: str = "root",
-        key_path: str = None
-    ) -> paramiko.SSHClient:
-        """Ottiene o crea una connessione SSH"""
-        key_path = key_path or self.DEFAULT_KEY_PATH
-        key = f"{username}@{hostname}:{port}"
 
+    # ------------------------------------------------------------------ pool
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Executor dedicato all'I/O SSH (non quello di default del loop)."""
         with self._lock:
-            client = self._connections.get(key)
-        if client is not None:
-            # Verifica se la connessione è ancora attiva
-            try:
-                transport = client.get_transport()
-                if transport and transport.is_active():
-                    return client
-            except Exception:
-                pass
-            # Connessione non attiva: rimuovila e chiudila
-            with self._lock:
-                stale = self._connections.pop(key, None)
-            if stale is not None:
-                try:
-                    stale.close()
-                except Exception:
-                    pass
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._executor_workers,
+                    thread_name_prefix="dapx-ssh",
+                )
+            return self._executor
+
+    def _host_pool(self, key: str) -> _HostPool:
+        with self._lock:
+            pool = self._connections.get(key)
+            if pool is None:
+                pool = _HostPool(key, self._max_transports, self._max_channels)
+                self._connections[key] = pool
+            return pool
 
-        # Crea nuova connessione (fuori dal lock: la connect è lenta)
+    def _new_client(
+        self, hostname: str, port: int, username: str, key_path: str
+    ) -> paramiko.SSHClient:
+        """Apre un nuovo transport SSH (bloccante)."""
         client = paramiko.SSHClient()
         # Load system known_hosts for host key verification
         known_hosts_paths = [
@@ -101,42 +241,166 @@ class SSHService:
         # Warn and auto-add only if no known_hosts found (first connection)
         # In production, consider switching to RejectPolicy and managing keys manually
         client.set_missing_host_key_policy(paramiko.WarningPolicy())
-        
+        client.connect(
+            hostname=hostname,
+            port=port,
+            username=username,
+            key_filename=key_path,
+            timeout=10,
+            banner_timeout=10
+        )
+        if self._keepalive:
+            transport = client.get_transport()
+            if transport is not None:
+                transport.set_keepalive(self._keepalive)
+        return client
+
+    def _get_client(
+        self, 
+        hostname: str, 
+        port: int = 22,
+        username: str = "root",
+        key_path: str = None
+    ) -> paramiko.SSHClient:
+        """Sceglie (o apre) un transport del pool per l'host e lo marca in uso.
+
+        Va sempre bilanciato da ``_release_client``. Preferisce il transport
+        attivo meno carico; ne apre uno nuovo solo se tutti sono occupati e
+        non si è raggiunto ``max_transports``.
+        """
+        key_path = key_path or self.DEFAULT_KEY_PATH
+        key = f"{username}@{hostname}:{port}"
+        pool = self._host_pool(key)
+
+        stale: List[paramiko.SSHClient] = []
+        with self._lock:
+            for c in list(pool.clients):
+                if not _is_active(c):
+                    pool.clients.remove(c)
+                    pool.usage.pop(id(c), None)
+                    stale.append(c)
+            best = None
+            for c in pool.clients:
+                if best is None or pool.usage[id(c)]["inflight"] < pool.usage[id(best)]["inflight"]:
+                    best = c
+            open_slots = pool.max_transports - len(pool.clients) - pool.connecting
+            if best is not None and (pool.usage[id(best)]["inflight"] == 0 or open_slots <= 0):
+                pool.usage[id(best)]["inflight"] += 1
+                pool.usage[id(best)]["last_used"] = time.monotonic()
+                chosen = best
+            else:
+                chosen = None
+                pool.connecting += 1
+        for c in stale:
+            try:
+                c.close()
+            except Exception:
+                pass
+        if chosen is not None:
+            return chosen
+
+        # Crea nuovo transport (fuori dal lock: la connect è lenta)
+        t0 = time.monotonic()
         try:
-            client.connect(
-                hostname=hostname,
-                port=port,
-                username=username,
-                key_filename=key_path,
-                timeout=10,
-                banner_timeout=10
-            )
-            # Race: se un altro thread ha già creato una connessione valida per
-            # questa chiave nel frattempo, riusa quella e chiudi la duplicata.
-            with self._lock:
-                existing = self._connections.get(key)
-                is_active = False
-                if existing is not None:
-                    try:
-                        t = existing.get_transport()
-                        is_active = bool(t and t.is_active())
-                    except Exception:
-                        is_active = False
-                if is_active:
-                    winner = existing
-                else:
-                    self._connections[key] = client
-                    winner = client
-            if winner is not client:
-                try:
-                    client.close()
-                except Exception:
-                    pass
-            return winner
+            client = self._new_client(hostname, port, username, key_path)
         except Exception as e:
+            with self._lock:
+                pool.connecting -= 1
+                pool.record_connect(time.monotonic() - t0, ok=False)
             logger.error(f"Errore connessione SSH a {hostname}: {e}")
             raise
-    
+        with self._lock:
+            pool.connecting -= 1
+            pool.record_connect(time.monotonic() - t0, ok=True)
+            pool.clients.append(client)
+            pool.usage[id(client)] = {"inflight": 1, "last_used": time.monotonic()}
+        return client
+
+    def _release_client(
+        self, client: paramiko.SSHClient, hostname: str, port: int, username: str
+    ) -> None:
+        key = f"{username}@{hostname}:{port}"
+        with self._lock:
+            pool = self._connections.get(key)
+            usage = pool.usage.get(id(client)) if pool else None
+            if usage is not None:
+                usage["inflight"] = max(0, usage["inflight"] - 1)
+                usage["last_used"] = time.monotonic()
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Chiude i transport inattivi da più di ``idle_timeout`` secondi."""
+        now = time.monotonic() if now is None else now
+        to_close: List[paramiko.SSHClient] = []
+        with self._lock:
+            for pool in self._connections.values():
+                if not isinstance(pool, _HostPool):
+                    continue
+                for c in list(pool.clients):
+                    usage = pool.usage.get(id(c))
+                    if usage and usage["inflight"] == 0 and now - usage["last_used"] > self._idle_timeout:
+                        pool.clients.remove(c)
+                        pool.usage.pop(id(c), None)
+                        pool.evicted += 1
+                        to_close.append(c)
+            self._last_eviction = now
+        for c in to_close:
+            try:
+                c.close()
+            except Exception:
+                pass
+        if to_close:
+            logger.debug(f"SSH pool: chiusi {len(to_close)} transport inattivi")
+        return len(to_close)
+
+    async def _run_pooled(self, hostname: str, port: int, username: str, fn):
+        """Esegue ``fn`` (bloccante) sull'executor SSH rispettando il gate host."""
+        key = f"{username}@{hostname}:{port}"
+        pool = self._host_pool(key)
+        if time.monotonic() - self._last_eviction > 60:
+            self.evict_idle()
+        gate = pool.gate()
+        t0 = time.monotonic()
+        pool.waiting += 1
+        try:
+            await gate.acquire()
+        finally:
+            pool.waiting -= 1
+        pool.record_wait(time.monotonic() - t0)
+        pool.active += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn)
+        finally:
+            pool.active -= 1
+            gate.release()
+
+    def get_pool_stats(self) -> Dict:
+        """Metriche del pool SSH (per host + executor)."""
+        with self._lock:
+            hosts = {
+                key: pool.stats()
+                for key, pool in self._connections.items()
+                if isinstance(pool, _HostPool)
+            }
+        return {
+            "config": {
+                "max_transports_per_host": self._max_transports,
+                "max_channels_per_host": self._max_channels,
+                "executor_workers": self._executor_workers,
+                "keepalive_seconds": self._keepalive,
+                "idle_timeout_seconds": self._idle_timeout,
+            },
+            "totals": {
+                "hosts": len(hosts),
+                "transports": sum(h["transports"] for h in hosts.values()),
+                "active_channels": sum(h["active_channels"] for h in hosts.values()),
+                "queue_depth": sum(h["queue_depth"] for h in hosts.values()),
+            },
+            "hosts": hosts,
+        }
+
+    # --------------------------------------------------------------- comandi
+
     async def execute(
         self,
         hostname: str,
@@ -149,6 +413,7 @@ class SSHService:
         """Esegue un comando su un nodo remoto"""
         key_path = key_path or self.DEFAULT_KEY_PATH
         def _execute():
+            client = None
             try:
                 client = self._get_client(hostname, port, username, key_path)
                 stdin, stdout, stderr = client.exec_command(command, timeout=timeout)
@@ -171,10 +436,93 @@ class SSHService:
                     stderr=str(e),
                     exit_code=-1
                 )
+            finally:
+                if client is not None:
+                    self._release_client(client, hostname, port, username)
         
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, _execute)
+        return await self._run_pooled(hostname, port, username, _execute)
     
+    async def execute_streaming(
+        self,
+        hostname: str,
+        command: str,
+        on_line: Callable[[str, str], None],
+        port: int = 22,
+        username: str = "root",
+        key_path: str = None,
+        timeout: int = 3600
+    ) -> SSHResult:
+        """Come ``execute``, ma consegna l'output riga per riga mentre arriva.
+
+        ``on_line(stream, line)`` (stream = "stdout"/"stderr") viene chiamata
+        sul loop asyncio; ``\r`` e ``\n`` valgono entrambi come fine riga
+        (pv/mbuffer aggiornano la stessa riga con ``\r``). ``timeout``: secondi
+        massimi senza output prima di abbandonare il canale. Il risultato
+        contiene comunque stdout/stderr completi.
+        """
+        key_path = key_path or self.DEFAULT_KEY_PATH
+        loop = asyncio.get_running_loop()
+
+        def _emit(stream: str, line: str) -> None:
+            try:
+                on_line(stream, line)
+            except Exception as e:
+                logger.debug(f"callback output streaming {hostname}: {e}")
+
+        def _execute():
+            client = None
+            try:
+                client = self._get_client(hostname, port, username, key_path)
+                chan = client.get_transport().open_session(timeout=30)
+                chan.exec_command(command)
+                streams = {
+                    "stdout": (chan.recv_ready, chan.recv, [], _LineSplitter()),
+                    "stderr": (chan.recv_stderr_ready, chan.recv_stderr, [], _LineSplitter()),
+                }
+                last_data = time.monotonic()
+                while True:
+                    got = False
+                    for name, (ready, recv, chunks, splitter) in streams.items():
+                        if ready():
+                            text = splitter.decoder.decode(recv(65536))
+                            chunks.append(text)
+                            for line in splitter.feed(text):
+                                loop.call_soon_threadsafe(_emit, name, line)
+                            got = True
+                    if got:
+                        last_data = time.monotonic()
+                        continue
+                    if chan.exit_status_ready() and not chan.recv_ready() and not chan.recv_stderr_ready():
+                        break
+                    if timeout and time.monotonic() - last_data > timeout:
+                        chan.close()
+                        raise TimeoutError(f"nessun output da {timeout}s")
+                    time.sleep(0.1)
+                for name, (_, _, chunks, splitter) in streams.items():
+                    tail = splitter.flush()
+                    if tail:
+                        loop.call_soon_threadsafe(_emit, name, tail)
+                exit_code = chan.recv_exit_status()
+                return SSHResult(
+                    success=(exit_code == 0),
+                    stdout="".join(streams["stdout"][2]),
+                    stderr="".join(streams["stderr"][2]),
+                    exit_code=exit_code
+                )
+            except Exception as e:
+                logger.error(f"Errore esecuzione comando (streaming) su {hostname}: {e}")
+                return SSHResult(
+                    success=False,
+                    stdout="",
+                    stderr=str(e),
+                    exit_code=-1
+                )
+            finally:
+                if client is not None:
+                    self._release_client(client, hostname, port, username)
+
+        return await self._run_pooled(hostname, port, username, _execute)
+
     async def execute_script_from_content(
         self,
         hostname: str,
@@ -233,9 +581,10 @@ class SSHService:
                 )
             finally:
                 if sftp: sftp.close()
+                if client is not None:
+                    self._release_client(client, hostname, port, username)
 
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, _execute_script)
+        return await self._run_pooled(hostname, port, username, _execute_script)
     
     async def test_connection(
         self,
@@ -354,31 +703,25 @@ class SSHService:
         hostname: str,
         port: int = 22,
         username: str = "root",
-        key_path: str = None
+        key_path: str = None,
+        refresh: bool = False
     ) -> List[Dict]:
-        """Ottiene la lista dei dataset ZFS"""
-        key_path = key_path or self.DEFAULT_KEY_PATH
-        result = await self.execute(
-            hostname=hostname,
-            command="zfs list -H -o name,used,avail,mountpoint -t filesystem,volume",
-            port=port,
-            username=username,
-            key_path=key_path
-        )
-        
-        datasets = []
-        if result.success:
-            for line in result.stdout.strip().split('\n'):
-                if line:
-                    parts = line.split('\t')
-                    if len(parts) >= 4:
-                        datasets.append({
-                            "name": parts[0],
-                            "used": parts[1],
-                            "available": parts[2],
-                            "mountpoint": parts[3] if parts[3] != "-" else None
-                        })
-        return datasets
+        """Ottiene la lista dei dataset ZFS (dall'inventario del nodo in cache;
+        ``refresh`` forza la rilettura)"""
+        from services.zfs_inventory import zfs_inventory, zfs_nicenum
+
+        inv = await zfs_inventory.get(hostname, port, username, key_path, refresh=refresh)
+        if inv is None:
+            return []
+        return [
+            {
+                "name": ds.name,
+                "used": zfs_nicenum(ds.used),
+                "available": zfs_nicenum(ds.avail),
+                "mountpoint": ds.mountpoint,
+            }
+            for ds in inv.datasets()
+        ]
     
     async def get_snapshots(
         self,
@@ -388,36 +731,25 @@ class SSHService:
         username: str = "root",
         key_path: str = None
     ) -> List[Dict]:
-        """Ottiene la lista degli snapshot ZFS"""
-        key_path = key_path or self.DEFAULT_KEY_PATH
-        cmd = "zfs list -H -t snapshot -o name,used,creation -s creation"
+        """Ottiene la lista degli snapshot ZFS (di ``dataset`` e discendenti),
+        in ordine di creazione, dall'inventario del nodo in cache"""
+        from services.zfs_inventory import zfs_date, zfs_inventory, zfs_nicenum
+
         if dataset:
             dataset = sanitize_zfs_name(dataset)
-            cmd += f" -r {dataset}"
-        
-        result = await self.execute(
-            hostname=hostname,
-            command=cmd,
-            port=port,
-            username=username,
-            key_path=key_path
-        )
-        
-        snapshots = []
-        if result.success:
-            for line in result.stdout.strip().split('\n'):
-                if line:
-                    parts = line.split('\t')
-                    if len(parts) >= 3:
-                        name_parts = parts[0].split('@')
-                        snapshots.append({
-                            "full_name": parts[0],
-                            "dataset": name_parts[0] if len(name_parts) > 0 else "",
-                            "snapshot": name_parts[1] if len(name_parts) > 1 else "",
-                            "used": parts[1],
-                            "creation": parts[2]
-                        })
-        return snapshots
+        inv = await zfs_inventory.get(hostname, port, username, key_path)
+        if inv is None:
+            return []
+        return [
+            {
+                "full_name": snap.name,
+                "dataset": snap.dataset,
+                "snapshot": snap.snapshot,
+                "used": zfs_nicenum(snap.used),
+                "creation": zfs_date(snap.creation),
+            }
+            for snap in inv.snapshots(dataset)
+        ]
     
     async def create_snapshot(
         self,
@@ -436,13 +768,16 @@ class SSHService:
         r_flag = "-r" if recursive else ""
         cmd = f"zfs snapshot {r_flag} {dataset}@{snapshot_name}"
         
-        return await self.execute(
+        result = await self.execute(
             hostname=hostname,
             command=cmd,
             port=port,
             username=username,
             key_path=key_path
         )
+        from services.zfs_inventory import zfs_inventory
+        zfs_inventory.invalidate(hostname, port, username, dataset, recursive=recursive)
+        return result
     
     async def delete_snapshot(
         self,
@@ -456,13 +791,19 @@ class SSHService:
         full_snapshot_name = sanitize_zfs_name(full_snapshot_name)
         cmd = f"zfs destroy {full_snapshot_name}"
         
-        return await self.execute(
+        result = await self.execute(
             hostname=hostname,
             command=cmd,
             port=port,
             username=username,
             key_path=key_path
         )
+        from services.zfs_inventory import zfs_inventory
+        if result.success:
+            zfs_inventory.discard_snapshot(hostname, full_snapshot_name, port, username)
+        else:
+            zfs_inventory.invalidate(hostname, port, username, full_snapshot_name)
+        return result
     
     async def read_remote_file(
         self,
@@ -489,22 +830,26 @@ class SSHService:
             finally:
                 if sftp:
                     sftp.close()
-                # Non chiudiamo il client perché è gestito dal pool _connections
+                # Non chiudiamo il client: torna al pool _connections
+                if client is not None:
+                    self._release_client(client, hostname, port, username)
         
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, _read)
+        return await self._run_pooled(hostname, port, username, _read)
 
     
     def close_all(self):
-        """Chiude tutte le connessioni (chiamato allo shutdown dell'app)."""
+        """Chiude tutte le connessioni e l'executor SSH (shutdown dell'app)."""
         with self._lock:
-            clients = list(self._connections.values())
+            pools = list(self._connections.values())
             self._connections.clear()
-        for client in clients:
+            executor, self._executor = self._executor, None
+        for pool in pools:
             try:
-                client.close()
+                pool.close()
             except Exception:
                 pass
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
 
 
 # Singleton instance
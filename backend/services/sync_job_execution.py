@@ -4,11 +4,14 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import time
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional
 
 from database import SyncJob
 from services.btrfs_service import btrfs_service
+from services.job_events import job_events
+from services.job_log_output import append_output, last_chunk_text
 from services.scheduler import scheduler_service
 from services.syncoid_service import syncoid_service
 from services.vm_group_sync_service import (
@@ -79,33 +82,78 @@ async def _persist_sync_progress(
     log_entry_id: int,
     progress: Dict[str, Any],
 ) -> None:
-    """Salva avanzamento replica nel log e nel job (best-effort)."""
-    from database import SessionLocal, SyncJob, JobLog
+    """Salva avanzamento replica nel log e nel job (best-effort).
+
+    La riga di progress è appesa come chunk (job_log_chunks): niente
+    riscrittura di JobLog.output ad ogni poll. Gira ogni 30s per ogni
+    replica attiva: usa la sessione async per non bloccare il loop.
+    """
+    from database import SyncJob, run_with_async_session
 
     ts = datetime.utcnow().strftime("%H:%M:%S")
-    line = (
-        f"[{ts}] Avanzamento: {progress['percent']}% "
-        f"({progress['dest_human']} scritti su {progress['source_human']} sorgente)"
-    )
-    db = SessionLocal()
+    if progress.get("streamed"):
+        extra = "".join(
+            f", {v}" for v in (
+                progress.get("rate_human"),
+                f"ETA {progress['eta_human']}" if progress.get("eta_human") else None,
+            ) if v
+        )
+        line = (
+            f"[{ts}] Avanzamento: {progress['percent'] if progress['percent'] is not None else '?'}% "
+            f"({progress['dest_human']} inviati su {progress['source_human']} stimati{extra})"
+        )
+    else:
+        line = (
+            f"[{ts}] Avanzamento: {progress['percent']}% "
+            f"({progress['dest_human']} scritti su {progress['source_human']} sorgente)"
+        )
+
+    def _save(db) -> None:
+        try:
+            job = db.get(SyncJob, job_id)
+            if job:
+                job.last_transferred = progress["label"]
+            if (last_chunk_text(db, log_entry_id) or "").rstrip("\n") != line:
+                append_output(db, log_entry_id, line, commit=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
     try:
-        job = db.query(SyncJob).filter(SyncJob.id == job_id).first()
-        log = db.query(JobLog).filter(JobLog.id == log_entry_id).first()
-        if job:
-            job.last_transferred = progress["label"]
-        if log:
-            prev = log.output or ""
-            if line not in prev:
-                log.output = prev + ("\n" if prev else "") + line
-        db.commit()
+        await run_with_async_session(_save)
     except Exception as e:
         logger.debug(f"persist progress job {job_id}: {e}")
-        try:
-            db.rollback()
-        except Exception:
-            pass
-    finally:
-        db.close()
+
+
+class _StreamedProgressWriter:
+    """Riceve gli eventi in streaming di syncoid (sul loop) e li salva nel
+    log con al massimo una scrittura ogni ``interval`` secondi."""
+
+    def __init__(self, job_id: int, log_entry_id: int, interval: int = 15):
+        self.job_id = job_id
+        self.log_entry_id = log_entry_id
+        self.interval = interval
+        self._last_saved = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def __call__(self, event) -> None:
+        # Ogni evento va sul bus (coalescenza per abbonato), il log no
+        job_events.publish("sync", self.job_id, progress=event.as_progress(), status="running")
+        now = time.monotonic()
+        if now - self._last_saved < self.interval or (self._task and not self._task.done()):
+            return
+        self._last_saved = now
+        self._task = asyncio.create_task(
+            _persist_sync_progress(self.job_id, self.log_entry_id, event.as_progress())
+        )
+
+    async def drain(self) -> None:
+        if self._task and not self._task.done():
+            try:
+                await asyncio.wait_for(self._task, timeout=5)
+            except Exception:
+                self._task.cancel()
 
 
 async def _poll_sync_progress(
@@ -134,6 +182,10 @@ async def _poll_sync_progress(
                 dest_dataset=dest_dataset,
             )
             if progress:
+                job_events.publish(
+                    "sync", job_id, progress=progress, status="running",
+                    node_ids=(source_node.id, dest_node.id),
+                )
                 await _persist_sync_progress(job_id, log_entry_id, progress)
         except Exception as e:
             logger.debug(f"poll progress job {job_id}: {e}")
@@ -415,8 +467,13 @@ async def _monitor_sync_job_completion(
     dest_node,
     source_dataset: str,
     dest_dataset: str,
+    on_done: Optional[Callable[[], None]] = None,
 ):
-    """Attende fine syncoid/receive remoto e aggiorna stato job."""
+    """Attende fine syncoid/receive remoto e aggiorna stato job.
+
+    ``on_done`` viene chiamata alla fine del monitoraggio (es. rilascio del
+    posto nell'admission controller tenuto dallo scheduler).
+    """
     import asyncio as _asyncio
     from database import SessionLocal, SyncJob, Node
 
@@ -440,6 +497,8 @@ async def _monitor_sync_job_completion(
 
     if not source_node or not dest_node:
         scheduler_service.mark_done(job_key)
+        if on_done:
+            on_done()
         return
 
     try:
@@ -470,6 +529,10 @@ async def _monitor_sync_job_completion(
                     dest_dataset=dest_dataset,
                 )
                 if progress:
+                    job_events.publish(
+                        "sync", job_id, progress=progress, status="running",
+                        node_ids=(source_node.id, dest_node.id),
+                    )
                     await _persist_sync_progress(job_id, log_entry_id, progress)
                 await _asyncio.sleep(30)
                 continue
@@ -501,10 +564,20 @@ async def _monitor_sync_job_completion(
         logger.warning(f"Monitor job {job_id} interrotto: {e}")
     finally:
         scheduler_service.mark_done(job_key)
-async def execute_sync_job_task(job_id: int, triggered_by_user_id: int = None) -> bool:
+        job_events.publish("sync", job_id, status="done")
+        if on_done:
+            on_done()
+
+
+async def execute_sync_job_task(
+    job_id: int,
+    triggered_by_user_id: int = None,
+    on_monitor_done: Optional[Callable[[], None]] = None,
+) -> bool:
     """
     Esegue un job di sync. Ritorna True se il lock scheduler va tenuto
-    (replica ancora attiva sui nodi, monitor in background).
+    (replica ancora attiva sui nodi, monitor in background): in quel caso
+    ``on_monitor_done`` viene chiamata quando il monitor termina.
     """
     from database import SessionLocal, SyncJob, Node, JobLog, SyncMethod
     from services.syncoid_service import syncoid_service
@@ -515,6 +588,8 @@ async def execute_sync_job_task(job_id: int, triggered_by_user_id: int = None) -
     db_session = SessionLocal()
     log_entry = None
     job_record = None
+    # True quando la replica passa al monitor, che pubblicherà "done" a fine run
+    handed_off = False
     
     try:
         # Recupera job e nodi dal database
@@ -571,6 +646,7 @@ async def execute_sync_job_task(job_id: int, triggered_by_user_id: int = None) -
             except Exception:
                 pass
         db_session.commit()
+        job_events.publish("sync", job_id, status="running", node_ids=(source_node.id, dest_node.id))
         
         # Esegui sync in base al metodo
         if sync_method == SyncMethod.PVE_NATIVE.value:
@@ -581,8 +657,8 @@ async def execute_sync_job_task(job_id: int, triggered_by_user_id: int = None) -
             # run trasferisce l'archivio completo.
             from services.pve_native_replicate_service import pve_native_replicate_service
 
-            # Callback live: ogni progress message viene appeso a
-            # JobLog.output con un commit, cosi' il viewer di /progress
+            # Callback live: ogni progress message viene appeso come chunk
+            # (job_log_chunks) con un commit, cosi' il viewer di /progress
             # vede l'avanzamento in tempo reale (polling 1.5s).
             # NB: usa una sessione DB dedicata per evitare race con la
             # transazione principale del task in background.
@@ -594,11 +670,7 @@ async def execute_sync_job_task(job_id: int, triggered_by_user_id: int = None) -
                 line = f"[{ts}] {msg}"
                 _s = _SL()
                 try:
-                    le = _s.query(JobLog).filter(JobLog.id == _log_id).first()
-                    if le is not None:
-                        prev = le.output or ""
-                        le.output = (prev + ("\n" if prev else "") + line)
-                        _s.commit()
+                    append_output(_s, _log_id, line)
                 except Exception:
                     try:
                         _s.rollback()
@@ -697,19 +769,27 @@ async def execute_sync_job_task(job_id: int, triggered_by_user_id: int = None) -
                     else:
                         log_entry.message = f"Attenzione: impossibile creare {dest_parent}: {create_result.stderr}"
             
-            # Esegui sync ZFS (con polling avanzamento ogni 30s)
+            # Esegui sync ZFS: avanzamento in streaming dall'output di pv
+            # (byte reali, velocità, ETA); se l'executor non lo supporta,
+            # polling used/refer ogni 30s.
+            progress_writer = _StreamedProgressWriter(job_id, log_entry.id)
             stop_progress = asyncio.Event()
-            progress_task = asyncio.create_task(
-                _poll_sync_progress(
-                    stop_progress,
-                    job_id,
-                    log_entry.id,
-                    source_node,
-                    dest_node,
-                    job.source_dataset,
-                    job.dest_dataset,
+            progress_task = None
+            if not await syncoid_service.supports_progress_stream(
+                source_node.hostname, source_node.ssh_port,
+                source_node.ssh_user, source_node.ssh_key_path,
+            ):
+                progress_task = asyncio.create_task(
+                    _poll_sync_progress(
+                        stop_progress,
+                        job_id,
+                        log_entry.id,
+                        source_node,
+                        dest_node,
+                        job.source_dataset,
+                        job.dest_dataset,
+                    )
                 )
-            )
             try:
                 result = await syncoid_service.run_sync(
                     executor_host=source_node.hostname,
@@ -728,14 +808,17 @@ async def execute_sync_job_task(job_id: int, triggered_by_user_id: int = None) -
                     mbuffer_size=job.mbuffer_size or "128M",
                     no_sync_snap=job.no_sync_snap,
                     force_delete=job.force_delete,
-                    extra_args=job.extra_args or ""
+                    extra_args=job.extra_args or "",
+                    on_progress=progress_writer,
                 )
             finally:
                 stop_progress.set()
-                try:
-                    await asyncio.wait_for(progress_task, timeout=5)
-                except Exception:
-                    progress_task.cancel()
+                await progress_writer.drain()
+                if progress_task:
+                    try:
+                        await asyncio.wait_for(progress_task, timeout=5)
+                    except Exception:
+                        progress_task.cancel()
             
             # Se retention configurata, crea snapshot backup_* sulla destinazione DOPO il sync
             use_retention = job.keep_snapshots and job.keep_snapshots > 0
@@ -814,9 +897,10 @@ async def execute_sync_job_task(job_id: int, triggered_by_user_id: int = None) -
                 note += f"\nNota syncoid: {err_hint[:500]}"
             log_entry.message = (log_entry.message or "") + (" | " if log_entry.message else "") + note
             if result.get("output"):
-                prev = log_entry.output or ""
-                sep = "\n--- output ---\n" if prev else ""
-                log_entry.output = prev + sep + result["output"]
+                append_output(
+                    db_session, log_entry.id,
+                    "--- output ---\n" + result["output"], commit=False,
+                )
             db_session.commit()
             job_key = f"sync_{job_id}"
             asyncio.create_task(
@@ -828,8 +912,10 @@ async def execute_sync_job_task(job_id: int, triggered_by_user_id: int = None) -
                     dest_node=dest_node,
                     source_dataset=job.source_dataset,
                     dest_dataset=job.dest_dataset,
+                    on_done=on_monitor_done,
                 )
             )
+            handed_off = True
             return True
 
         job_record.last_run = datetime.utcnow()
@@ -872,16 +958,14 @@ async def execute_sync_job_task(job_id: int, triggered_by_user_id: int = None) -
             error_msg = f"Comando: {result.get('command', 'N/A')}\n\n{error_msg}" if error_msg else f"Comando: {result.get('command', 'N/A')}\nErrore sconosciuto"
             log_entry.error = error_msg
         
-        # Append dell'output finale al log progressivo (prodotto da
-        # log_cb durante la run). Senza append, perderemmo i progress
-        # message scritti incrementalmente.
+        # Append dell'output finale come ultimo chunk, dopo i progress
+        # message scritti incrementalmente da log_cb / poller.
         _final_out = result.get("output") or ""
         if _final_out:
-            # Refresha per leggere progress eventualmente scritti dal callback
-            db_session.refresh(log_entry)
-            prev = log_entry.output or ""
-            sep = "\n--- output ---\n" if prev and not prev.endswith("\n--- output ---\n") else ""
-            log_entry.output = prev + sep + _final_out
+            append_output(
+                db_session, log_entry.id,
+                "--- output ---\n" + _final_out, commit=False,
+            )
         log_entry.duration = result["duration"]
         log_entry.transferred = result.get("transferred")
         log_entry.completed_at = datetime.utcnow()
@@ -965,8 +1049,10 @@ async def execute_sync_job_task(job_id: int, triggered_by_user_id: int = None) -
                     dest_node=dest_node,
                     source_dataset=job_record.source_dataset,
                     dest_dataset=job_record.dest_dataset,
+                    on_done=on_monitor_done,
                 )
             )
+            handed_off = True
             return True
 
         if log_entry:
@@ -994,6 +1080,9 @@ async def execute_sync_job_task(job_id: int, triggered_by_user_id: int = None) -
         return False
     finally:
         db_session.close()
+        if not handed_off:
+            # Esito finale nel DB: i client ricaricano il job
+            job_events.publish("sync", job_id, status="done")
 
 
 async def _run_sync_job_background(job_id: int, job_key: str, triggered_by_user_id: int = None):
@@ -1,17 +1,40 @@
-"""Stato live job sync (syncoid attivo, progresso trasferimento)."""
+"""Stato live job sync (syncoid attivo, progresso trasferimento).
+
+La lista job non interroga più i nodi: ``SyncJobLiveAggregator`` aggiorna in
+background (ogni ``DAPX_SYNC_LIVE_REFRESH_SEC``) lo stato dei job in corso o
+falliti e il progresso dei gruppi VM, e l'endpoint risponde da DB + questa
+fotografia in memoria.
+"""
 
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import Any, Dict, List, Optional
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional
 
-from database import Node, SyncJob, SyncMethod
+from database import Node, SyncJob, SyncMethod, run_with_async_session
 from services.scheduler import scheduler_service
 from services.syncoid_service import syncoid_service
 
 logger = logging.getLogger(__name__)
 
 
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# Cadenza del refresh in background e richieste SSH contemporanee per refresh
+LIVE_REFRESH_SECONDS = max(5, _env_int("DAPX_SYNC_LIVE_REFRESH_SEC", 15))
+LIVE_REFRESH_CONCURRENCY = max(1, _env_int("DAPX_SYNC_LIVE_CONCURRENCY", 8))
+
+_NO_LIVE_METHODS = (SyncMethod.BTRFS_SEND.value, SyncMethod.PVE_NATIVE.value)
+
+
 async def get_sync_job_live_state(
     job: SyncJob,
     source_node: Node,
@@ -140,3 +163,178 @@ async def compute_vm_group_progress(
         "disks_total": disks_total,
         "label": f"{dst_h} / {src_h} — {disks_done}/{disks_total} dischi ({percent}%)",
     }
+
+
+def _is_probed(job: SyncJob) -> bool:
+    """Job syncoid per cui serve lo stato dai nodi: in esecuzione o fallito
+    (un syncoid può essere ancora vivo dopo la caduta della sessione SSH)."""
+    if (job.sync_method or SyncMethod.SYNCOID.value) in _NO_LIVE_METHODS:
+        return False
+    return scheduler_service.is_running(f"sync_{job.id}") or (
+        (job.last_status or "").lower() in ("failed", "running")
+    )
+
+
+class SyncJobLiveAggregator:
+    """Fotografia in memoria dello stato live dei job sync e dei gruppi VM."""
+
+    def __init__(self, interval: Optional[int] = None, concurrency: Optional[int] = None):
+        self.interval = interval or LIVE_REFRESH_SECONDS
+        self.concurrency = concurrency or LIVE_REFRESH_CONCURRENCY
+        # job_id -> (last_status letto al refresh, stato live)
+        self._states: Dict[int, tuple] = {}
+        # vm_group_id -> progresso cumulativo (None se non calcolabile)
+        self._groups: Dict[str, Optional[Dict[str, Any]]] = {}
+        # vm_group_id -> firma dei membri con cui è stato calcolato il progresso
+        self._group_sigs: Dict[str, tuple] = {}
+        self._refreshed_at: Optional[float] = None
+        self._refresh_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def live_state(self, job: SyncJob, dest_node: Optional[Node] = None) -> Dict[str, Any]:
+        """Stato live del job senza I/O: scheduler + DB + ultima fotografia
+        (o avanzamento in streaming del run in corso su questo processo)."""
+        base = {
+            "is_replicating": False,
+            "transfer_progress": None,
+            "last_status": job.last_status,
+            "current_status": getattr(job, "current_status", None),
+        }
+        if (job.sync_method or SyncMethod.SYNCOID.value) in _NO_LIVE_METHODS:
+            return base
+        cached = self._states.get(job.id)
+        # Fotografia valida solo se il job non ha cambiato stato nel frattempo
+        state = cached[1] if cached and cached[0] == job.last_status else None
+        replicating = scheduler_service.is_running(f"sync_{job.id}") or (
+            (job.last_status or "").lower() == "running"
+        ) or bool(state and state.get("is_replicating"))
+        if not replicating:
+            return base
+        progress = state.get("transfer_progress") if state else None
+        if dest_node is not None:
+            progress = syncoid_service.get_live_progress(dest_node.hostname, job.dest_dataset) or progress
+        return {
+            "is_replicating": True,
+            "transfer_progress": progress,
+            "last_status": "running",
+            "current_status": "running",
+        }
+
+    def group_progress(self, vm_group_id: str) -> Optional[Dict[str, Any]]:
+        return self._groups.get(vm_group_id)
+
+    @property
+    def refreshed_at(self) -> Optional[float]:
+        return self._refreshed_at
+
+    async def refresh(
+        self,
+        jobs: Optional[Iterable[SyncJob]] = None,
+        nodes_by_id: Optional[Dict[int, Node]] = None,
+    ) -> None:
+        """Aggiorna la fotografia interrogando i nodi (al più ``concurrency``
+        job alla volta). Senza argomenti rilegge tutti i job dal DB e
+        sostituisce la fotografia; con ``jobs`` aggiorna solo quelli."""
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            full = jobs is None
+            if full:
+                jobs, nodes_by_id = await run_with_async_session(_load_jobs_and_nodes)
+            jobs = list(jobs)
+            nodes_by_id = nodes_by_id or {}
+            sem = asyncio.Semaphore(self.concurrency)
+
+            async def _job_state(job: SyncJob):
+                source_node = nodes_by_id.get(job.source_node_id)
+                dest_node = nodes_by_id.get(job.dest_node_id)
+                if not source_node or not dest_node:
+                    return job, None
+                async with sem:
+                    try:
+                        return job, await get_sync_job_live_state(job, source_node, dest_node)
+                    except Exception as e:
+                        logger.debug("live state job %s: %s", job.id, e)
+                        return job, None
+
+            results = await asyncio.gather(*(_job_state(j) for j in jobs if _is_probed(j)))
+            states = {job.id: (job.last_status, st) for job, st in results if st is not None}
+            if full:
+                self._states = states
+            else:
+                self._states.update(states)
+
+            groups: Dict[str, List[SyncJob]] = {}
+            for job in jobs:
+                if job.vm_group_id:
+                    groups.setdefault(job.vm_group_id, []).append(job)
+            live_by_id = {jid: st for jid, (_, st) in self._states.items()}
+
+            async def _group(gid: str, group_jobs: List[SyncJob]):
+                async with sem:
+                    try:
+                        return gid, await compute_vm_group_progress(group_jobs, live_by_id, nodes_by_id)
+                    except Exception as e:
+                        logger.debug("progress gruppo %s: %s", gid, e)
+                        return gid, self._groups.get(gid)
+
+            # Gruppi fermi: il progresso non cambia, si ricalcola solo la prima
+            # volta, quando un loro job è in corso, quando cambia la firma dei
+            # membri (es. run appena concluso) o su refresh forzato.
+            sigs = {
+                gid: tuple(sorted(
+                    (j.id, j.last_status, str(j.last_run),
+                     bool(self.live_state(j).get("is_replicating")))
+                    for j in group_jobs
+                ))
+                for gid, group_jobs in groups.items()
+            }
+            todo = [
+                (gid, group_jobs) for gid, group_jobs in groups.items()
+                if not full or gid not in self._groups
+                or self._group_sigs.get(gid) != sigs[gid]
+                or any(replicating for *_, replicating in sigs[gid])
+            ]
+            computed = dict(await asyncio.gather(*(_group(g, gj) for g, gj in todo)))
+            if full:
+                self._groups = {gid: computed.get(gid, self._groups.get(gid)) for gid in groups}
+                self._group_sigs = {
+                    gid: sigs[gid] if gid in computed else self._group_sigs.get(gid)
+                    for gid in groups
+                }
+            else:
+                self._groups.update(computed)
+                self._group_sigs.update({gid: sigs[gid] for gid in computed})
+            self._refreshed_at = time.monotonic()
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Refresh stato live job sync fallito: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+def _load_jobs_and_nodes(db):
+    jobs = db.query(SyncJob).all()
+    nodes_by_id = {n.id: n for n in db.query(Node).all()}
+    return jobs, nodes_by_id
+
+
+sync_job_live_aggregator = SyncJobLiveAggregator()
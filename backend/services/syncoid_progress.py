@@ -0,0 +1,172 @@
+"""Avanzamento syncoid in streaming: eventi strutturati dall'output live.
+
+Con ``--pv-options='-f -n -b -i N'`` il ``pv`` che syncoid mette nella
+pipeline ``zfs send | pv | mbuffer | ssh`` stampa su stderr, ogni N secondi,
+i byte passati finora (una riga numerica). Qui le righe vengono trasformate
+in eventi (byte fatti/totali, percentuale, velocità, ETA) come
+``nas_sync/events.py::SyncEvent`` per gli engine NAS.
+
+Ogni ``zfs send`` (snapshot completo, incrementale, figli con --recursive)
+riparte da zero: le righe ``Sending ... (~ 4.2 GB)`` di syncoid aprono un
+nuovo segmento e i byte del precedente si sommano al totale fatto.
+"""
+
+from __future__ import annotations
+
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from services.nas_sync.events import eta_human, human_bytes
+
+# pv -n -b: una riga con il solo contatore di byte
+_PV_BYTES_RE = re.compile(r"^\s*(\d+)\s*$")
+# "Sending incremental pool/ds@a ... pool/ds@b (~ 4.2 GB):"
+# "INFO: Sending oldest full snapshot pool/ds@a (~ 12.3 GB):"
+_SENDING_RE = re.compile(r"Sending\s.*\(~\s*([\d.,]+)\s*([KMGTP]?i?B)\)", re.IGNORECASE)
+_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4, "P": 1024 ** 5}
+
+# Opzioni pv passate a syncoid: -f forza l'output senza tty (canale SSH),
+# -n -b contatore numerico di byte, -i intervallo in secondi.
+PV_STREAM_OPTIONS = "-f -n -b -i 2"
+
+
+def parse_size(value: str, unit: str = "B") -> Optional[int]:
+    """'4.2', 'GB' -> byte (syncoid usa multipli di 1024 anche con 'GB')."""
+    try:
+        number = float(value.replace(",", "."))
+    except (TypeError, ValueError):
+        return None
+    prefix = (unit or "B").strip().upper()[:1]
+    if prefix == "B":
+        prefix = ""
+    return int(number * _UNITS.get(prefix, 1))
+
+
+def strip_pv_lines(text: str) -> str:
+    """Toglie dall'output salvato i contatori di pv (una riga ogni 2s)."""
+    if not text:
+        return text
+    lines = re.split(r"[\r\n]", text)
+    return "\n".join(l for l in lines if l and not _PV_BYTES_RE.match(l)) + ("\n" if text.endswith("\n") else "")
+
+
+@dataclass
+class SyncoidProgressEvent:
+    phase: str = "sending"
+    bytes_done: int = 0
+    bytes_total: Optional[int] = None
+    percent: Optional[float] = None
+    rate_bps: Optional[float] = None
+    eta_seconds: Optional[int] = None
+    raw_line: str = ""
+
+    def as_progress(self) -> Dict:
+        """Dict nel formato di ``SyncoidService.get_replication_progress``
+        (source_bytes = totale stimato, dest_bytes = byte inviati) con in più
+        velocità ed ETA."""
+        done_human = human_bytes(self.bytes_done)
+        total_human = human_bytes(self.bytes_total) if self.bytes_total else "—"
+        rate_human = f"{human_bytes(int(self.rate_bps))}/s" if self.rate_bps else None
+        label = f"{done_human} / {total_human}"
+        if self.percent is not None:
+            label += f" ({self.percent}%)"
+        return {
+            "percent": self.percent,
+            "source_bytes": self.bytes_total,
+            "dest_bytes": self.bytes_done,
+            "source_human": total_human,
+            "dest_human": done_human,
+            "rate_bps": self.rate_bps,
+            "rate_human": rate_human,
+            "eta_seconds": self.eta_seconds,
+            "eta_human": eta_human(self.eta_seconds),
+            "phase": self.phase,
+            "label": label,
+            "streamed": True,
+        }
+
+
+class SyncoidProgressTracker:
+    """Consuma le righe di output di syncoid e produce eventi di avanzamento.
+
+    ``total_bytes``: stima a priori (``zfs send -nvP``); se assente si usa la
+    somma delle stime ``(~ X)`` stampate da syncoid per ogni send.
+    """
+
+    # Peso del campione più recente nella media mobile della velocità
+    _RATE_ALPHA = 0.3
+
+    def __init__(self, total_bytes: Optional[int] = None):
+        self.total_bytes = total_bytes if total_bytes and total_bytes > 0 else None
+        self._estimated_total = 0
+        self._done_before = 0
+        self._segment_bytes = 0
+        self._last_sample: Optional[tuple] = None
+        self._rate: Optional[float] = None
+        self.last_event: Optional[SyncoidProgressEvent] = None
+
+    @property
+    def bytes_done(self) -> int:
+        return self._done_before + self._segment_bytes
+
+    def feed(self, line: str, now: Optional[float] = None) -> Optional[SyncoidProgressEvent]:
+        """Elabora una riga; ritorna un evento se cambia l'avanzamento."""
+        now = time.monotonic() if now is None else now
+        text = (line or "").strip()
+        if not text:
+            return None
+
+        m = _PV_BYTES_RE.match(text)
+        if m:
+            count = int(m.group(1))
+            if count < self._segment_bytes:
+                # pv ripartito senza una riga "Sending": nuovo segmento
+                self._done_before += self._segment_bytes
+            self._segment_bytes = count
+            self._update_rate(now)
+            return self._emit("sending", text)
+
+        m = _SENDING_RE.search(text)
+        if m:
+            self._done_before += self._segment_bytes
+            self._segment_bytes = 0
+            estimate = parse_size(m.group(1), m.group(2))
+            if estimate:
+                self._estimated_total += estimate
+            return self._emit("sending", text)
+        return None
+
+    def _update_rate(self, now: float) -> None:
+        done = self.bytes_done
+        if self._last_sample is not None:
+            t0, b0 = self._last_sample
+            dt = now - t0
+            if dt > 0 and done >= b0:
+                sample = (done - b0) / dt
+                self._rate = sample if self._rate is None else (
+                    self._RATE_ALPHA * sample + (1 - self._RATE_ALPHA) * self._rate
+                )
+        self._last_sample = (now, done)
+
+    def _emit(self, phase: str, raw: str) -> SyncoidProgressEvent:
+        done = self.bytes_done
+        total = self.total_bytes or self._estimated_total or None
+        if total is not None and done > total:
+            # Stima per difetto (metadati, sync snap più grande del previsto)
+            total = done
+        percent = round(done / total * 100.0, 1) if total else None
+        eta = None
+        if total and self._rate and self._rate > 0:
+            eta = int((total - done) / self._rate)
+        self.last_event = SyncoidProgressEvent(
+            phase=phase,
+            bytes_done=done,
+            bytes_total=total,
+            percent=percent,
+            rate_bps=round(self._rate, 1) if self._rate else None,
+            eta_seconds=eta,
+            raw_line=raw,
+        )
+        return self.last_event
@@ -3,12 +3,20 @@ Syncoid Service - Gestione replica ZFS tra nodi
 """
 
 import asyncio
+import time
 from datetime import datetime
-from typing import Optional, Dict, Tuple
+from typing import Callable, Optional, Dict, Tuple
 import logging
 import re
 
 from services.ssh_service import ssh_service, SSHResult
+from services.syncoid_progress import (
+    PV_STREAM_OPTIONS,
+    SyncoidProgressEvent,
+    SyncoidProgressTracker,
+    strip_pv_lines,
+)
+from services.zfs_inventory import last_common_snapshot, zfs_inventory
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +30,12 @@ _HOSTNAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9.\-]*$")
 _USER_RE = re.compile(r"^[A-Za-z0-9_][A-Za-z0-9_\-]*$")
 _COMPRESS_ALLOWED = {"none", "lz4", "gzip", "zstd", "xz", "lzo", "pigz"}
 _MBUFFER_RE = re.compile(r"^\d+[KMG]?$", re.IGNORECASE)
+_PV_OPTIONS_RE = re.compile(r"^[A-Za-z0-9 \-]+$")
+_SNAPNAME_RE = re.compile(r"^[A-Za-z0-9_.:\-]+$")
+
+# Un avanzamento in streaming più vecchio di così non sostituisce più il
+# polling used/refer (run_sync terminato o canale bloccato).
+_LIVE_PROGRESS_TTL_SEC = 60
 
 
 def _assert_dataset(value: str, label: str = "dataset") -> str:
@@ -44,6 +58,12 @@ def _assert_user(value: str, label: str = "user") -> str:
 
 class SyncoidService:
     """Servizio per replica ZFS con Syncoid"""
+
+    def __init__(self):
+        # user@host:port -> syncoid dell'executor accetta --pv-options e ha pv
+        self._stream_support: Dict[str, bool] = {}
+        # (dest_host, dest_dataset) -> (monotonic, progress dict) dei run in streaming
+        self._live_progress: Dict[Tuple[str, str], Tuple[float, Dict]] = {}
     
     def build_syncoid_command(
         self,
@@ -62,7 +82,8 @@ class SyncoidService:
         mbuffer_size: str = "128M",
         no_sync_snap: bool = False,
         force_delete: bool = False,
-        extra_args: str = ""
+        extra_args: str = "",
+        pv_options: Optional[str] = None
     ) -> str:
         """
         Costruisce il comando syncoid.
@@ -94,6 +115,8 @@ class SyncoidService:
         if extra_args:
             if any(c in extra_args for c in ";|&`$<>\n\r"):
                 raise ValueError(f"extra_args contiene metacaratteri non consentiti")
+        if pv_options and not _PV_OPTIONS_RE.match(pv_options):
+            raise ValueError(f"pv_options non valido: {pv_options!r}")
 
         cmd_parts = ["syncoid"]
 
@@ -112,6 +135,9 @@ class SyncoidService:
         
         if force_delete:
             cmd_parts.append("--force-delete")
+
+        if pv_options:
+            cmd_parts.append(f"--pv-options='{pv_options}'")
         
         # SSH options (compatibile con tutte le versioni)
         # NOTA: syncoid viene eseguito sul nodo Proxmox, quindi la chiave SSH
@@ -172,20 +198,33 @@ class SyncoidService:
         no_sync_snap: bool = False,
         force_delete: bool = False,
         extra_args: str = "",
-        timeout: int = 3600
+        timeout: int = 3600,
+        on_progress: Optional[Callable[[SyncoidProgressEvent], None]] = None
     ) -> Dict:
         """
         Esegue una sincronizzazione Syncoid
         
+        ``on_progress``: se indicato e l'executor lo supporta (vedi
+        ``supports_progress_stream``), l'output di syncoid/pv viene letto in
+        streaming e ogni avanzamento arriva come ``SyncoidProgressEvent``
+        (byte, percentuale sulla stima ``zfs send -nvP``, velocità, ETA).
+
         Returns dict con:
             - success: bool
             - output: str
             - error: str
             - duration: int (secondi)
             - transferred: str (es: "1.5G")
+            - progress: ultimo avanzamento in streaming (o None)
         """
         
         start_time = datetime.utcnow()
+
+        stream = False
+        if on_progress is not None:
+            stream = await self.supports_progress_stream(
+                executor_host, executor_port, executor_user, executor_key
+            )
         
         # Costruisci comando
         cmd = self.build_syncoid_command(
@@ -204,7 +243,8 @@ class SyncoidService:
             mbuffer_size=mbuffer_size,
             no_sync_snap=no_sync_snap,
             force_delete=force_delete,
-            extra_args=extra_args
+            extra_args=extra_args,
+            pv_options=PV_STREAM_OPTIONS if stream else None
         )
         
         # Pre-fetch host keys of any remote endpoints into the executor's
@@ -276,115 +316,290 @@ class SyncoidService:
                 dest_dataset=dest_dataset,
             )
 
-        # Esegui comando
-        result = await ssh_service.execute(
-            hostname=executor_host,
-            command=cmd,
-            port=executor_port,
-            username=executor_user,
-            key_path=executor_key,
-            timeout=timeout
-        )
-
-        combined_out = (result.stderr or "") + (result.stdout or "")
-
-        # Auto-recovery: il dataset destinazione può rimanere "locked" da un
-        # processo `zfs receive` orfano (parent SSH morto) o da un receive
-        # parziale interrotto. Sintomo tipico:
-        #   "cannot receive: <ds> is already target of a zfs receive process"
-        # Se rileviamo questo errore proviamo a sbloccare il dataset e a
-        # rieseguire syncoid una sola volta.
-        if (
-            not result.success
-            and dest_host
-            and self._is_stuck_receive_error(combined_out)
-        ):
-            logger.warning(
-                f"Rilevato lock di receive su {dest_host}:{dest_dataset}, "
-                f"tento auto-unstick e retry"
-            )
-            unstuck = await self._unstick_dest(
+        tracker: Optional[SyncoidProgressTracker] = None
+        total_estimate: Optional[int] = None
+        live_key = (dest_host or executor_host, dest_dataset)
+        if stream and not recursive:
+            total_estimate = await self.estimate_send_size(
+                executor_host=executor_host,
+                executor_port=executor_port,
+                executor_user=executor_user,
+                executor_key=executor_key,
+                source_dataset=source_dataset,
                 dest_host=dest_host,
-                dest_port=dest_port,
-                dest_user=dest_user,
-                dest_key=executor_key,  # il server dapx ha SSH a tutti i nodi
                 dest_dataset=dest_dataset,
-            )
-            if unstuck:
-                result = await ssh_service.execute(
-                    hostname=executor_host,
-                    command=cmd,
-                    port=executor_port,
-                    username=executor_user,
-                    key_path=executor_key,
-                    timeout=timeout,
-                )
-                combined_out = (result.stderr or "") + (result.stdout or "")
-
-        # Placeholder vuoto rimasto: syncoid "Cowardly refusing to destroy"
-        if (
-            not result.success
-            and dest_host
-            and self._is_empty_dest_placeholder_error(combined_out)
-        ):
-            logger.warning(
-                f"Placeholder vuoto su {dest_host}:{dest_dataset}, "
-                f"rimuovo e retry syncoid"
-            )
-            removed = await self._remove_empty_dest_placeholder(
-                dest_host=dest_host,
                 dest_port=dest_port,
                 dest_user=dest_user,
-                dest_key=executor_key,
-                dest_dataset=dest_dataset,
+                no_sync_snap=no_sync_snap,
             )
-            if removed:
-                result = await ssh_service.execute(
+
+        async def _exec() -> SSHResult:
+            nonlocal tracker
+            if not stream:
+                return await ssh_service.execute(
                     hostname=executor_host,
                     command=cmd,
                     port=executor_port,
                     username=executor_user,
                     key_path=executor_key,
-                    timeout=timeout,
+                    timeout=timeout
                 )
+            # Ogni tentativo (anche i retry di auto-recovery) riparte da zero
+            tracker = SyncoidProgressTracker(total_estimate)
+            run_tracker = tracker
 
-        end_time = datetime.utcnow()
-        duration = int((end_time - start_time).total_seconds())
+            def _on_line(_stream: str, line: str) -> None:
+                ev = run_tracker.feed(line)
+                if ev is None:
+                    return
+                self._live_progress[live_key] = (time.monotonic(), ev.as_progress())
+                on_progress(ev)
 
-        still_running = False
-        if not result.success and dest_host:
-            still_running = await self.is_replication_active(
-                executor_host=executor_host,
-                executor_port=executor_port,
-                executor_user=executor_user,
-                executor_key=executor_key,
-                source_dataset=source_dataset,
-                dest_host=dest_host,
-                dest_port=dest_port,
-                dest_user=dest_user,
-                dest_key=dest_key,
-                dest_dataset=dest_dataset,
+            res = await ssh_service.execute_streaming(
+                hostname=executor_host,
+                command=cmd,
+                on_line=_on_line,
+                port=executor_port,
+                username=executor_user,
+                key_path=executor_key,
+                timeout=timeout
             )
-            if still_running:
-                logger.info(
-                    f"Syncoid fallito lato SSH ma replica ancora attiva su "
-                    f"{executor_host} -> {dest_host}:{dest_dataset}; "
-                    f"non segnalare come failed"
+            res.stdout = strip_pv_lines(res.stdout)
+            res.stderr = strip_pv_lines(res.stderr)
+            return res
+
+        try:
+            # Esegui comando
+            result = await _exec()
+
+            combined_out = (result.stderr or "") + (result.stdout or "")
+
+            # Auto-recovery: il dataset destinazione può rimanere "locked" da un
+            # processo `zfs receive` orfano (parent SSH morto) o da un receive
+            # parziale interrotto. Sintomo tipico:
+            #   "cannot receive: <ds> is already target of a zfs receive process"
+            # Se rileviamo questo errore proviamo a sbloccare il dataset e a
+            # rieseguire syncoid una sola volta.
+            if (
+                not result.success
+                and dest_host
+                and self._is_stuck_receive_error(combined_out)
+            ):
+                logger.warning(
+                    f"Rilevato lock di receive su {dest_host}:{dest_dataset}, "
+                    f"tento auto-unstick e retry"
                 )
+                unstuck = await self._unstick_dest(
+                    dest_host=dest_host,
+                    dest_port=dest_port,
+                    dest_user=dest_user,
+                    dest_key=executor_key,  # il server dapx ha SSH a tutti i nodi
+                    dest_dataset=dest_dataset,
+                )
+                if unstuck:
+                    result = await _exec()
+                    combined_out = (result.stderr or "") + (result.stdout or "")
+
+            # Placeholder vuoto rimasto: syncoid "Cowardly refusing to destroy"
+            if (
+                not result.success
+                and dest_host
+                and self._is_empty_dest_placeholder_error(combined_out)
+            ):
+                logger.warning(
+                    f"Placeholder vuoto su {dest_host}:{dest_dataset}, "
+                    f"rimuovo e retry syncoid"
+                )
+                removed = await self._remove_empty_dest_placeholder(
+                    dest_host=dest_host,
+                    dest_port=dest_port,
+                    dest_user=dest_user,
+                    dest_key=executor_key,
+                    dest_dataset=dest_dataset,
+                )
+                if removed:
+                    result = await _exec()
+
+            end_time = datetime.utcnow()
+            duration = int((end_time - start_time).total_seconds())
+
+            still_running = False
+            if not result.success and dest_host:
+                still_running = await self.is_replication_active(
+                    executor_host=executor_host,
+                    executor_port=executor_port,
+                    executor_user=executor_user,
+                    executor_key=executor_key,
+                    source_dataset=source_dataset,
+                    dest_host=dest_host,
+                    dest_port=dest_port,
+                    dest_user=dest_user,
+                    dest_key=dest_key,
+                    dest_dataset=dest_dataset,
+                )
+                if still_running:
+                    logger.info(
+                        f"Syncoid fallito lato SSH ma replica ancora attiva su "
+                        f"{executor_host} -> {dest_host}:{dest_dataset}; "
+                        f"non segnalare come failed"
+                    )
         
-        # Parse output per trasferimento
-        transferred = self._parse_transferred(result.stdout + result.stderr)
+            # Snapshot di sync creati/ruotati e dati ricevuti: rilettura dei due
+            # dataset all'accesso successivo all'inventario ZFS
+            zfs_inventory.invalidate(
+                precheck_host, precheck_port, precheck_user, source_dataset, recursive=True
+            )
+            zfs_inventory.invalidate(
+                dest_host or executor_host,
+                dest_port if dest_host else executor_port,
+                dest_user if dest_host else executor_user,
+                dest_dataset,
+                recursive=True,
+            )
+
+            # Parse output per trasferimento
+            transferred = self._parse_transferred(result.stdout + result.stderr)
+            progress = tracker.last_event.as_progress() if tracker and tracker.last_event else None
+            if not transferred and progress and progress["dest_bytes"]:
+                transferred = progress["dest_human"]
         
-        return {
-            "success": result.success,
-            "still_running": still_running,
-            "output": result.stdout,
-            "error": result.stderr,
-            "duration": duration,
-            "transferred": transferred,
-            "command": cmd
-        }
+            return {
+                "success": result.success,
+                "still_running": still_running,
+                "output": result.stdout,
+                "error": result.stderr,
+                "duration": duration,
+                "transferred": transferred,
+                "command": cmd,
+                "progress": progress,
+            }
+        finally:
+            # Anche se run_sync solleva: niente avanzamento live orfano
+            self._live_progress.pop(live_key, None)
     
+    async def supports_progress_stream(
+        self,
+        executor_host: str,
+        executor_port: int = 22,
+        executor_user: str = "root",
+        executor_key: str = "/root/.ssh/id_rsa",
+    ) -> bool:
+        """True se sull'executor c'è ``pv`` e syncoid accetta ``--pv-options``
+        (syncoid >= 2.2). Esito in cache per host: con syncoid più vecchi
+        un'opzione sconosciuta farebbe fallire la replica."""
+        key = f"{executor_user}@{executor_host}:{executor_port}"
+        cached = self._stream_support.get(key)
+        if cached is not None:
+            return cached
+        result = await ssh_service.execute(
+            hostname=executor_host,
+            command="command -v pv >/dev/null 2>&1 && syncoid --help 2>&1 | grep -q -- '--pv-options' && echo STREAM_OK",
+            port=executor_port,
+            username=executor_user,
+            key_path=executor_key,
+            timeout=20,
+        )
+        if not result.success and result.exit_code == -1:
+            # Errore SSH: non memorizzare, si riprova al prossimo run
+            return False
+        supported = "STREAM_OK" in (result.stdout or "")
+        self._stream_support[key] = supported
+        if not supported:
+            logger.info(
+                f"Avanzamento syncoid in streaming non disponibile su {executor_host} "
+                f"(serve pv e syncoid con --pv-options): uso il polling used/refer"
+            )
+        return supported
+
+    async def estimate_send_size(
+        self,
+        executor_host: str,
+        executor_port: int,
+        executor_user: str,
+        executor_key: str,
+        source_dataset: str,
+        dest_host: Optional[str],
+        dest_dataset: str,
+        dest_port: int = 22,
+        dest_user: str = "root",
+        no_sync_snap: bool = False,
+    ) -> Optional[int]:
+        """Byte che il prossimo run invierà, stimati a priori.
+
+        Incrementale dall'ultimo snapshot comune all'ultimo snapshot sorgente
+        con ``zfs send -nvP -I``, più i dati scritti dopo quest'ultimo
+        (``written@``) che finiranno nello snapshot di sync di syncoid. Senza
+        snapshot comune: ``zfs send -nvP`` completo (o ``referenced`` se la
+        sorgente non ha snapshot). None se la stima non è disponibile.
+        """
+        common = None
+        if dest_host:
+            try:
+                common = await self.get_last_common_snapshot(
+                    source_host=executor_host,
+                    source_dataset=source_dataset,
+                    dest_host=dest_host,
+                    dest_dataset=dest_dataset,
+                    source_port=executor_port,
+                    dest_port=dest_port,
+                    source_user=executor_user,
+                    dest_user=dest_user,
+                    source_key=executor_key,
+                    dest_key=executor_key,
+                )
+            except Exception as e:
+                logger.debug(f"snapshot comune {source_dataset}: {e}")
+        if common and not _SNAPNAME_RE.match(common):
+            common = None
+
+        ds = _assert_dataset(source_dataset, "source_dataset")
+        if common:
+            send = (
+                f'[ "$N" != "{ds}@{common}" ] && '
+                f'zfs send -nvP -I "{ds}@{common}" "$N" 2>&1 | awk \'$1=="size"{{print "send", $2}}\''
+            )
+        else:
+            send = 'zfs send -nvP "$N" 2>&1 | awk \'$1=="size"{print "send", $2}\''
+        script = (
+            f'N=$(zfs list -H -t snapshot -o name -s createtxg -d 1 "{ds}" 2>/dev/null | tail -1); '
+            f'if [ -z "$N" ]; then echo "refer $(zfs get -Hp -o value referenced "{ds}")"; exit 0; fi; '
+            f'{send}; '
+            f'echo "written $(zfs get -Hp -o value "written@${{N#*@}}" "{ds}")"'
+        )
+        result = await ssh_service.execute(
+            hostname=executor_host,
+            command=script,
+            port=executor_port,
+            username=executor_user,
+            key_path=executor_key,
+            timeout=60,
+        )
+        return self._parse_send_estimate(result.stdout or "", no_sync_snap)
+
+    @staticmethod
+    def _parse_send_estimate(output: str, no_sync_snap: bool = False) -> Optional[int]:
+        values: Dict[str, int] = {}
+        for line in output.splitlines():
+            parts = line.split()
+            if len(parts) == 2 and parts[1].isdigit():
+                values[parts[0]] = values.get(parts[0], 0) + int(parts[1])
+        if "refer" in values:
+            return values["refer"] or None
+        total = values.get("send", 0)
+        if not no_sync_snap:
+            total += values.get("written", 0)
+        return total or None
+
+    def get_live_progress(self, dest_host: str, dest_dataset: str) -> Optional[Dict]:
+        """Ultimo avanzamento in streaming di un run in corso (o None)."""
+        entry = self._live_progress.get((dest_host, dest_dataset))
+        if not entry:
+            return None
+        ts, progress = entry
+        if time.monotonic() - ts > _LIVE_PROGRESS_TTL_SEC:
+            return None
+        return dict(progress)
+
     async def _ensure_known_hosts(
         self,
         executor_host: str,
@@ -728,20 +943,9 @@ class SyncoidService:
         username: str = "root",
         key_path: str = "/root/.ssh/id_rsa"
     ) -> Dict[str, bool]:
-        """Verifica che i dataset esistano su un nodo"""
-        results = {}
-        
-        for ds in datasets:
-            result = await ssh_service.execute(
-                hostname=hostname,
-                command=f"zfs list -H -o name {ds} 2>/dev/null",
-                port=port,
-                username=username,
-                key_path=key_path
-            )
-            results[ds] = result.success and ds in result.stdout
-        
-        return results
+        """Verifica che i dataset esistano su un nodo (inventario in cache)"""
+        inv = await zfs_inventory.get(hostname, port, username, key_path)
+        return {ds: bool(inv and inv.exists(ds)) for ds in datasets}
     
     async def create_dataset(
         self,
@@ -756,13 +960,16 @@ class SyncoidService:
         flags = "-p" if not parent_must_exist else ""
         cmd = f"zfs create {flags} {dataset}"
         
-        return await ssh_service.execute(
+        result = await ssh_service.execute(
             hostname=hostname,
             command=cmd,
             port=port,
             username=username,
             key_path=key_path
         )
+        # Con -p possono nascere anche i padri: rilettura completa
+        zfs_inventory.invalidate(hostname, port, username)
+        return result
     
     async def get_last_common_snapshot(
         self,
@@ -777,47 +984,15 @@ class SyncoidService:
         source_key: str = "/root/.ssh/id_rsa",
         dest_key: str = "/root/.ssh/id_rsa"
     ) -> Optional[str]:
-        """Trova l'ultimo snapshot comune tra sorgente e destinazione"""
-        
-        # Ottieni snapshot sorgente
-        source_result = await ssh_service.execute(
-            hostname=source_host,
-            command=f"zfs list -H -t snapshot -o name -s creation {source_dataset}",
-            port=source_port,
-            username=source_user,
-            key_path=source_key
+        """Trova l'ultimo snapshot comune tra sorgente e destinazione
+        (per guid, dagli inventari ZFS dei due nodi)"""
+        source_inv, dest_inv = await asyncio.gather(
+            zfs_inventory.get(source_host, source_port, source_user, source_key),
+            zfs_inventory.get(dest_host, dest_port, dest_user, dest_key),
         )
-        
-        if not source_result.success:
+        if source_inv is None or dest_inv is None:
             return None
-        
-        source_snaps = set()
-        for line in source_result.stdout.strip().split('\n'):
-            if '@' in line:
-                snap_name = line.split('@')[1]
-                source_snaps.add(snap_name)
-        
-        # Ottieni snapshot destinazione
-        dest_result = await ssh_service.execute(
-            hostname=dest_host,
-            command=f"zfs list -H -t snapshot -o name -s creation {dest_dataset}",
-            port=dest_port,
-            username=dest_user,
-            key_path=dest_key
-        )
-        
-        if not dest_result.success:
-            return None
-        
-        dest_snaps = []
-        for line in dest_result.stdout.strip().split('\n'):
-            if '@' in line:
-                snap_name = line.split('@')[1]
-                if snap_name in source_snaps:
-                    dest_snaps.append(snap_name)
-        
-        # Ritorna l'ultimo comune (il più recente per creation time)
-        return dest_snaps[-1] if dest_snaps else None
+        return last_common_snapshot(source_inv, source_dataset, dest_inv, dest_dataset)
 
     @staticmethod
     def format_bytes(num: Optional[int]) -> str:
@@ -841,10 +1016,17 @@ class SyncoidService:
         port: int = 22,
         username: str = "root",
         key_path: str = "/root/.ssh/id_rsa",
+        cached: bool = True,
     ) -> Optional[int]:
+        """Proprietà numerica di un dataset. ``cached=False`` per i valori che
+        cambiano durante la replica (used della destinazione): un solo
+        ``zfs list`` sul dataset invece di rileggere l'inventario del nodo."""
         ds = dataset.replace("'", "").replace('"', "")
         if prop not in ("used", "refer"):
             return None
+        if cached:
+            inv = await zfs_inventory.get(hostname, port, username, key_path)
+            return inv.prop(ds, prop) if inv is not None else None
         result = await ssh_service.execute(
             hostname=hostname,
             command=f"zfs list -Hp -o {prop} {ds} 2>/dev/null | head -1",
@@ -879,7 +1061,13 @@ class SyncoidService:
         """
         Stima avanzamento replica ZFS: dest.used / source.refer.
         Ritorna percent, byte e label human-readable.
+
+        Se la replica è in corso in streaming su questo processo ritorna
+        l'ultimo evento (byte reali, velocità, ETA) senza comandi SSH.
         """
+        live = self.get_live_progress(dest_host, dest_dataset)
+        if live:
+            return live
         source_refer, dest_used = await asyncio.gather(
             self._dataset_prop_bytes(
                 executor_host, source_dataset, "refer",
@@ -887,7 +1075,7 @@ class SyncoidService:
             ),
             self._dataset_prop_bytes(
                 dest_host, dest_dataset, "used",
-                dest_port, dest_user, dest_key,
+                dest_port, dest_user, dest_key, cached=False,
             ),
         )
         if source_refer is None or dest_used is None or source_refer <= 0:
@@ -0,0 +1,178 @@
+"""
+Cache in memoria condivisa (TTL + LRU) per i servizi che interrogano i nodi.
+
+Sostituisce le cache scritte a mano nei singoli servizi (cluster, HA,
+inventario e ticket PBS), che non avevano limite di dimensione né metriche
+e lasciavano partire una chiamata ``pvesh``/SSH per ogni richiesta
+concorrente a cache vuota. Qui:
+
+- ogni voce scade dopo ``ttl`` secondi; oltre ``max_entries`` viene
+  eliminata la voce usata meno di recente;
+- ``get_or_load`` deduplica i miss concorrenti sulla stessa chiave (una
+  sola lettura, gli altri chiamanti attendono lo stesso risultato);
+- con ``stale_ttl`` > 0 una voce scaduta da meno di ``stale_ttl`` secondi
+  viene restituita subito mentre si rilegge in background;
+- ``invalidate`` (chiave, prefisso o tutto) è l'hook per chi modifica i
+  dati: una lettura in corso iniziata prima non riscrive la voce;
+- ``None`` non viene mai messo in cache (lettura fallita);
+- hit/miss/stale/evizioni sono esposti per cache da ``cache_stats()``
+  (``GET /api/settings/diagnostics/caches``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Orologio delle scadenze (sostituibile nei test)
+_now = time.monotonic
+
+_registry: Dict[str, "TTLCache"] = {}
+
+
+class TTLCache:
+    """Cache chiave → valore con TTL, LRU e letture single-flight."""
+
+    def __init__(self, name: str, ttl: float, max_entries: int = 256, stale_ttl: float = 0):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        # chiave -> (valore, scadenza monotonic)
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._counters = dict.fromkeys(
+            ("hits", "misses", "stale", "loads", "errors", "evictions", "invalidations"), 0
+        )
+        _registry[name] = self
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, key: str) -> Tuple[Any, bool]:
+        """(valore, fresco); valore ``None`` se assente o oltre la finestra stale."""
+        item = self._entries.get(key)
+        if item is None:
+            return None, False
+        value, expires = item
+        now = _now()
+        if now < expires:
+            self._entries.move_to_end(key)
+            return value, True
+        if now < expires + self.stale_ttl:
+            return value, False
+        del self._entries[key]
+        return None, False
+
+    def get(self, key: str) -> Optional[Any]:
+        """Valore fresco o ``None`` (non avvia letture)."""
+        value, fresh = self._lookup(key)
+        if fresh:
+            self._counters["hits"] += 1
+            return value
+        self._counters["misses"] += 1
+        return None
+
+    def peek(self, key: str) -> Optional[Any]:
+        """Valore anche scaduto (entro la finestra stale), senza contatori."""
+        return self._lookup(key)[0]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        if value is None:
+            return
+        self._entries[key] = (value, _now() + (self.ttl if ttl is None else ttl))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def invalidate(self, key: Optional[str] = None, prefix: Optional[str] = None) -> int:
+        """Elimina una chiave, le chiavi con ``prefix`` o (senza argomenti) tutto."""
+        if key is not None:
+            keys = [key] if key in self._entries or key in self._inflight else []
+        elif prefix is not None:
+            keys = [k for k in set(self._entries) | set(self._inflight) if k.startswith(prefix)]
+        else:
+            keys = list(set(self._entries) | set(self._inflight))
+        for k in keys:
+            self._entries.pop(k, None)
+            # La lettura in corso completa per chi la attende ma non scrive
+            self._inflight.pop(k, None)
+        self._counters["invalidations"] += len(keys)
+        return len(keys)
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+        force: bool = False,
+    ) -> Any:
+        """Valore in cache o risultato di ``loader()``; con ``force`` rilegge
+        sempre (ma si accoda a una lettura già in corso)."""
+        if not force:
+            value, fresh = self._lookup(key)
+            if fresh:
+                self._counters["hits"] += 1
+                return value
+            if value is not None:
+                self._counters["stale"] += 1
+                self._start_load(key, loader, ttl)
+                return value
+        self._counters["misses"] += 1
+        task = self._inflight.get(key) or self._start_load(key, loader, ttl)
+        return await asyncio.shield(task)
+
+    def _start_load(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: Optional[float]) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is not None:
+            return task
+        task = asyncio.ensure_future(self._load(key, loader, ttl))
+        # Un refresh in background fallito non ha nessuno che lo attende
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        return task
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: Optional[float]) -> Any:
+        me = asyncio.current_task()
+        self._counters["loads"] += 1
+        try:
+            value = await loader()
+        except Exception as e:
+            self._counters["errors"] += 1
+            logger.debug(f"Cache {self.name}: lettura {key} fallita: {e}")
+            raise
+        finally:
+            owned = self._inflight.get(key) is me
+            if owned:
+                self._inflight.pop(key, None)
+        if owned:
+            self.set(key, value, ttl)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._counters["hits"] + self._counters["misses"] + self._counters["stale"]
+        return {
+            "name": self.name,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+            "inflight": len(self._inflight),
+            **self._counters,
+            "hit_ratio": round((self._counters["hits"] + self._counters["stale"]) / lookups, 3) if lookups else None,
+        }
+
+
+def get_cache(name: str) -> Optional[TTLCache]:
+    return _registry.get(name)
+
+
+def cache_stats() -> List[Dict[str, Any]]:
+    """Metriche di tutte le cache registrate."""
+    return [cache.stats() for _, cache in sorted(_registry.items())]
@@ -8,6 +8,7 @@ from datetime import datetime
 from typing import Optional
 
 from database import JobLog, Node, SessionLocal
+from services.job_events import job_events
 from services.proxmox_service import proxmox_service
 from services.vm_snapshot.models import VmSnapshotJob
 from services.vm_snapshot.naming import build_description, build_snapshot_name
@@ -16,7 +17,8 @@ from services.vm_snapshot.retention import prune_vm
 
 logger = logging.getLogger(__name__)
 
-_RUNNING: dict[int, dict] = {}
+# Progresso dei run in corso, pubblicato sul bus eventi a ogni assegnazione
+_RUNNING = job_events.registry("vm_snapshot", node_scoped=True)
 _NODE_PARALLELISM = 3
 
 
@@ -50,8 +52,12 @@ async def _snapshot_one_vm(
     target: dict,
     job: VmSnapshotJob,
     snapname: str,
+    existing: Optional[list[dict]] = None,
 ) -> dict:
-    """Snapshot + retention su una singola VM. Non solleva: ogni errore finisce nel result."""
+    """Snapshot + retention su una singola VM. Non solleva: ogni errore finisce nel result.
+
+    ``existing`` è il listing snapshot pre-creazione (dal batch del nodo): se
+    presente la retention non rilegge gli snapshot via SSH."""
     result: dict = {
         "node_id": target["node_id"],
         "node_name": target.get("node_name") or node.name,
@@ -90,8 +96,11 @@ async def _snapshot_one_vm(
             return result
         result["created"] = True
 
+        # Il listing batch è precedente alla creazione: aggiungiamo lo snapshot
+        # appena creato (la retention ordina per timestamp nel nome).
+        listing = existing + [{"name": snapname}] if existing is not None else None
         pruned, prune_errors = await prune_vm(
-            node, target["vmid"], vm_type, job.label, job.keep
+            node, target["vmid"], vm_type, job.label, job.keep, snapshots=listing
         )
         result["pruned"] = pruned
         if prune_errors:
@@ -114,15 +123,39 @@ async def _run_node_batch(
     job_id: int,
     progress_lock: asyncio.Lock,
 ) -> list[dict]:
-    """Sequenziale dentro il nodo: un solo qm/pct alla volta per host."""
+    """Sequenziale dentro il nodo: un solo qm/pct alla volta per host.
+
+    Gli snapshot esistenti di tutte le VM del nodo sono letti una volta sola
+    (listing batch); le VM assenti dal listing ripiegano sul listing singolo."""
     results: list[dict] = []
+    listing: dict[int, list[dict]] = {}
+    guests = [
+        (t["vmid"], t.get("vm_type") or "qemu")
+        for t in targets
+        if t.get("warning") != "not_found"
+    ]
+    try:
+        listing = await proxmox_service.get_snapshots_batch(
+            hostname=node.hostname,
+            guests=guests,
+            port=node.ssh_port,
+            username=node.ssh_user,
+            key_path=node.ssh_key_path,
+        )
+    except Exception as exc:  # noqa: BLE001 — senza batch si usa il listing per-VM
+        logger.warning("vm_snapshot: listing batch su %s fallito: %s", node.name, exc)
     for target in targets:
         async with progress_lock:
             prog = _RUNNING.get(job_id)
             if prog is not None:
                 prog["current"] = int(prog.get("current") or 0) + 1
                 prog["vm"] = f"{target.get('name') or ''} ({target['vmid']}) @ {node.name}"
-        results.append(await _snapshot_one_vm(node, target, job, snapname))
+                _RUNNING.touch(job_id)
+        results.append(
+            await _snapshot_one_vm(
+                node, target, job, snapname, existing=listing.get(target["vmid"])
+            )
+        )
     return results
 
 
@@ -198,7 +231,10 @@ async def execute_vm_snapshot_job(job_id: int, *, is_scheduled: bool = False) ->
             for n in db.query(Node).filter(Node.id.in_(list(by_node.keys()))).all()
         }
 
-        _RUNNING[job_id].update({"phase": "snapshot", "total": len(targets), "current": 0})
+        _RUNNING.set_nodes(job_id, by_node.keys())
+        _RUNNING[job_id] = {
+            **_RUNNING[job_id], "phase": "snapshot", "total": len(targets), "current": 0,
+        }
         progress_lock = asyncio.Lock()
         semaphore = asyncio.Semaphore(_NODE_PARALLELISM)
 
@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import logging
 from datetime import datetime
+from typing import Optional
 
 from database import Node
 from services.proxmox_service import proxmox_service
@@ -39,24 +40,28 @@ async def prune_vm(
     vm_type: str,
     label: str,
     keep: int,
+    snapshots: Optional[list[dict]] = None,
 ) -> tuple[list[str], list[str]]:
     """Applica la retention su una VM. Ritorna (nomi_potati, errori).
 
+    ``snapshots`` è il listing già noto (es. dal listing batch del nodo); se
+    ``None`` viene letto ora con un round-trip dedicato.
     Se il listing fallisce, NON si pota (evita di scambiare l'errore per "zero
     snapshot" e lasciar crescere gli snapshot senza limite): l'errore finisce
     nella lista errori e la retention viene saltata per questa VM (C-07/B4)."""
-    try:
-        snapshots = await proxmox_service.get_snapshots(
-            hostname=node.hostname,
-            vmid=vmid,
-            vm_type=vm_type,
-            port=node.ssh_port,
-            username=node.ssh_user,
-            key_path=node.ssh_key_path,
-            raise_on_error=True,
-        )
-    except Exception as exc:  # noqa: BLE001 — listing fallito → niente pruning
-        return [], [f"retention saltata (listing snapshot fallito): {exc}"]
+    if snapshots is None:
+        try:
+            snapshots = await proxmox_service.get_snapshots(
+                hostname=node.hostname,
+                vmid=vmid,
+                vm_type=vm_type,
+                port=node.ssh_port,
+                username=node.ssh_user,
+                key_path=node.ssh_key_path,
+                raise_on_error=True,
+            )
+        except Exception as exc:  # noqa: BLE001 — listing fallito → niente pruning
+            return [], [f"retention saltata (listing snapshot fallito): {exc}"]
     pruned: list[str] = []
     errors: list[str] = []
     for snapname in select_prunable(snapshots, label, keep):
@@ -0,0 +1,369 @@
+"""
+Inventario ZFS per nodo: un solo ``zfs list`` in cache per tutte le letture.
+
+``get_zfs_datasets``, ``get_snapshots``, lo snapshot comune di syncoid, la
+verifica dei dataset e il progress delle repliche lanciavano ciascuno il
+proprio ``zfs list``/``zfs get``, più volte per run. Sui nodi con decine di
+migliaia di snapshot ogni ``zfs list -t snapshot`` costa secondi.
+
+Qui ogni nodo (``user@host:port``) ha un inventario completo
+(dataset, volumi, snapshot con ``guid`` e ``createtxg``) letto con un solo
+comando e tenuto in memoria per ``DAPX_ZFS_INVENTORY_TTL`` secondi:
+
+- richieste concorrenti sullo stesso nodo condividono la stessa lettura;
+- le nostre modifiche (create/destroy snapshot, create dataset, run syncoid)
+  non buttano l'inventario: lo snapshot distrutto viene tolto in memoria,
+  gli altri dataset toccati vengono riletti da soli (``zfs list -d 1``/``-r``)
+  alla lettura successiva;
+- a ogni rilettura completa si registra il diff con la precedente
+  (aggiunti/rimossi/cambiati) per la diagnostica.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services.ssh_service import sanitize_zfs_name, ssh_service
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+ZFS_INVENTORY_TTL_SECONDS = max(0, _env_int("DAPX_ZFS_INVENTORY_TTL", 30))
+
+_PROPS = ("name", "type", "used", "avail", "refer", "creation", "guid", "createtxg", "mountpoint")
+_TYPES = "filesystem,volume,snapshot"
+_LIST_CMD = f"zfs list -Hp -t {_TYPES} -o {','.join(_PROPS)}"
+_NUMERIC_PROPS = ("used", "avail", "refer", "creation", "createtxg")
+
+
+def zfs_nicenum(num: Optional[int]) -> str:
+    """Byte -> formato di ``zfs list`` senza ``-p`` ('0B', '96K', '1.23G')."""
+    if num is None:
+        return "-"
+    if num < 1024:
+        return f"{num}B"
+    value = float(num)
+    suffix = "B"
+    for suffix in "KMGTPE":
+        value /= 1024.0
+        if value < 1024:
+            break
+    if value == int(value):
+        return f"{int(value)}{suffix}"
+    for precision in (2, 1, 0):
+        text = f"{value:.{precision}f}{suffix}"
+        if len(text) <= 5:
+            return text
+    return text
+
+
+def zfs_date(epoch: Optional[int]) -> str:
+    """Epoch -> data come ``zfs list -o creation`` ('Mon Jan  5 10:30 2026')."""
+    if not epoch:
+        return "-"
+    return time.strftime("%a %b %e %k:%M %Y", time.localtime(epoch))
+
+
+@dataclass
+class ZFSEntry:
+    name: str
+    type: str
+    used: Optional[int] = None
+    avail: Optional[int] = None
+    refer: Optional[int] = None
+    creation: Optional[int] = None
+    guid: Optional[str] = None
+    createtxg: Optional[int] = None
+    mountpoint: Optional[str] = None
+
+    @property
+    def is_snapshot(self) -> bool:
+        return self.type == "snapshot"
+
+    @property
+    def dataset(self) -> str:
+        return self.name.split("@", 1)[0]
+
+    @property
+    def snapshot(self) -> str:
+        return self.name.split("@", 1)[1] if "@" in self.name else ""
+
+    @classmethod
+    def parse(cls, line: str) -> Optional["ZFSEntry"]:
+        parts = line.rstrip("\n").split("\t")
+        if len(parts) < len(_PROPS) or not parts[0]:
+            return None
+        values = dict(zip(_PROPS, parts))
+        for prop in _NUMERIC_PROPS:
+            try:
+                values[prop] = int(values[prop])
+            except (TypeError, ValueError):
+                values[prop] = None
+        for prop in ("guid", "mountpoint"):
+            if values[prop] in ("-", "", "none"):
+                values[prop] = None
+        return cls(**values)
+
+    def sort_key(self) -> Tuple[int, int]:
+        return (self.creation or 0, self.createtxg or 0)
+
+
+def _in_scope(name: str, root: str, recursive: bool) -> bool:
+    """``name`` è ``root``, un suo snapshot o (se ricorsivo) un discendente."""
+    if name == root or name.startswith(root + "@"):
+        return True
+    return recursive and name.startswith(root + "/")
+
+
+class NodeInventory:
+    """Dataset e snapshot di un nodo, indicizzati per nome e per dataset."""
+
+    def __init__(self, entries: Iterable[ZFSEntry], fetched_at: Optional[float] = None):
+        self.fetched_at = time.monotonic() if fetched_at is None else fetched_at
+        self._entries: Dict[str, ZFSEntry] = {}
+        self._snapshots: Dict[str, List[ZFSEntry]] = {}
+        for entry in entries:
+            self._entries[entry.name] = entry
+        self._reindex()
+
+    def _reindex(self) -> None:
+        snaps: Dict[str, List[ZFSEntry]] = {}
+        for entry in self._entries.values():
+            if entry.is_snapshot:
+                snaps.setdefault(entry.dataset, []).append(entry)
+        for items in snaps.values():
+            items.sort(key=lambda e: e.createtxg or 0)
+        self._snapshots = snaps
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, name: str) -> Optional[ZFSEntry]:
+        return self._entries.get(name)
+
+    def exists(self, name: str) -> bool:
+        return name in self._entries
+
+    def prop(self, name: str, prop: str) -> Optional[int]:
+        entry = self._entries.get(name)
+        return getattr(entry, prop, None) if entry and prop in _NUMERIC_PROPS else None
+
+    def datasets(self) -> List[ZFSEntry]:
+        """Filesystem e volumi nell'ordine di ``zfs list``."""
+        return [e for e in self._entries.values() if not e.is_snapshot]
+
+    def snapshots(self, dataset: Optional[str] = None, recursive: bool = True) -> List[ZFSEntry]:
+        """Snapshot di ``dataset`` (e discendenti se ``recursive``) o di tutto
+        il nodo, in ordine di creazione."""
+        if dataset and not recursive:
+            return list(self._snapshots.get(dataset, []))
+        items = [
+            snap
+            for ds, snaps in self._snapshots.items()
+            if not dataset or _in_scope(ds, dataset, True)
+            for snap in snaps
+        ]
+        items.sort(key=ZFSEntry.sort_key)
+        return items
+
+    def replace_scope(self, root: str, recursive: bool, entries: Iterable[ZFSEntry]) -> None:
+        """Sostituisce ``root`` (con snapshot e, se ricorsivo, discendenti)
+        con il risultato di una rilettura parziale."""
+        for name in [n for n in self._entries if _in_scope(n, root, recursive)]:
+            del self._entries[name]
+        for entry in entries:
+            if _in_scope(entry.name, root, recursive):
+                self._entries[entry.name] = entry
+        self._reindex()
+
+    def discard(self, name: str) -> None:
+        """Toglie uno snapshot appena distrutto da noi."""
+        entry = self._entries.pop(name, None)
+        if entry is not None and entry.is_snapshot:
+            snaps = self._snapshots.get(entry.dataset, [])
+            if entry in snaps:
+                snaps.remove(entry)
+
+    def diff(self, previous: Optional["NodeInventory"]) -> Dict[str, int]:
+        """Conteggio aggiunti/rimossi/cambiati (guid o used) rispetto a ``previous``."""
+        if previous is None:
+            return {"added": len(self._entries), "removed": 0, "changed": 0}
+        old, new = previous._entries, self._entries
+        changed = sum(
+            1 for name, entry in new.items()
+            if name in old and (old[name].guid != entry.guid or old[name].used != entry.used)
+        )
+        return {
+            "added": sum(1 for name in new if name not in old),
+            "removed": sum(1 for name in old if name not in new),
+            "changed": changed,
+        }
+
+
+def last_common_snapshot(
+    source: NodeInventory, source_dataset: str, dest: NodeInventory, dest_dataset: str
+) -> Optional[str]:
+    """Ultimo snapshot di destinazione con lo stesso ``guid`` di uno
+    snapshot sorgente (confronto per guid: nomi uguali non bastano)."""
+    source_guids = {s.guid for s in source.snapshots(source_dataset, recursive=False) if s.guid}
+    if not source_guids:
+        return None
+    for snap in reversed(dest.snapshots(dest_dataset, recursive=False)):
+        if snap.guid in source_guids:
+            return snap.snapshot
+    return None
+
+
+class ZFSInventoryService:
+    """Inventari ZFS per nodo con TTL, lettura single-flight e riletture
+    parziali dei dataset modificati da noi."""
+
+    def __init__(self, ttl: Optional[int] = None):
+        self.ttl = ZFS_INVENTORY_TTL_SECONDS if ttl is None else ttl
+        self._inventories: Dict[str, NodeInventory] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # nodo -> {dataset: ricorsivo} da rileggere prima della prossima lettura
+        self._dirty: Dict[str, Dict[str, bool]] = {}
+        self._last_diff: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def _key(hostname: str, port: int = 22, username: str = "root") -> str:
+        return f"{username or 'root'}@{hostname}:{port or 22}"
+
+    async def get(
+        self,
+        hostname: str,
+        port: int = 22,
+        username: str = "root",
+        key_path: Optional[str] = None,
+        refresh: bool = False,
+    ) -> Optional[NodeInventory]:
+        """Inventario del nodo (None se ``zfs list`` fallisce)."""
+        key = self._key(hostname, port, username)
+        inv = self._inventories.get(key)
+        if inv is not None and not refresh and not self._dirty.get(key) and self._fresh(inv):
+            return inv
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            inv = self._inventories.get(key)
+            if refresh or inv is None or not self._fresh(inv):
+                return await self._fetch_full(key, hostname, port, username, key_path)
+            dirty = self._dirty.pop(key, None)
+            if dirty and not await self._fetch_partial(inv, dirty, hostname, port, username, key_path):
+                return await self._fetch_full(key, hostname, port, username, key_path)
+            return inv
+
+    def _fresh(self, inv: NodeInventory) -> bool:
+        return self.ttl > 0 and time.monotonic() - inv.fetched_at < self.ttl
+
+    async def _fetch_full(self, key, hostname, port, username, key_path) -> Optional[NodeInventory]:
+        started = time.monotonic()
+        result = await ssh_service.execute(
+            hostname=hostname,
+            command=_LIST_CMD,
+            port=port,
+            username=username,
+            key_path=key_path or ssh_service.DEFAULT_KEY_PATH,
+            timeout=120,
+        )
+        self._dirty.pop(key, None)
+        if not result.success:
+            logger.warning(f"Inventario ZFS {key} non disponibile: {(result.stderr or '').strip()[:200]}")
+            self._inventories.pop(key, None)
+            return None
+        inv = NodeInventory(filter(None, map(ZFSEntry.parse, result.stdout.splitlines())))
+        diff = inv.diff(self._inventories.get(key))
+        self._inventories[key] = inv
+        self._last_diff[key] = diff
+        logger.debug(
+            f"Inventario ZFS {key}: {len(inv)} voci in {time.monotonic() - started:.2f}s "
+            f"(+{diff['added']} -{diff['removed']} ~{diff['changed']})"
+        )
+        return inv
+
+    async def _fetch_partial(
+        self, inv: NodeInventory, dirty: Dict[str, bool], hostname, port, username, key_path
+    ) -> bool:
+        """Rilegge solo i dataset modificati. False se serve una lettura completa."""
+        for recursive in (False, True):
+            roots = sorted(ds for ds, rec in dirty.items() if rec == recursive)
+            if not roots:
+                continue
+            depth = "-r" if recursive else "-d 1"
+            result = await ssh_service.execute(
+                hostname=hostname,
+                command=f"{_LIST_CMD} {depth} {' '.join(roots)}",
+                port=port,
+                username=username,
+                key_path=key_path or ssh_service.DEFAULT_KEY_PATH,
+                timeout=60,
+            )
+            # Un dataset distrutto fa uscire zfs list con errore ma gli altri
+            # vengono comunque stampati; senza output è un errore vero.
+            if not result.success and "does not exist" not in (result.stderr or ""):
+                return False
+            entries = list(filter(None, map(ZFSEntry.parse, (result.stdout or "").splitlines())))
+            for root in roots:
+                inv.replace_scope(root, recursive, entries)
+        return True
+
+    def invalidate(
+        self,
+        hostname: str,
+        port: int = 22,
+        username: str = "root",
+        dataset: Optional[str] = None,
+        recursive: bool = False,
+    ) -> None:
+        """Segnala una modifica fatta da noi: con ``dataset`` verrà riletto
+        solo quello (e i discendenti se ``recursive``), altrimenti tutto."""
+        key = self._key(hostname, port, username)
+        if key not in self._inventories:
+            return
+        if not dataset:
+            self._inventories.pop(key, None)
+            self._dirty.pop(key, None)
+            return
+        try:
+            dataset = sanitize_zfs_name(dataset.split("@", 1)[0])
+        except ValueError:
+            self._inventories.pop(key, None)
+            return
+        dirty = self._dirty.setdefault(key, {})
+        dirty[dataset] = dirty.get(dataset, False) or recursive
+
+    def discard_snapshot(
+        self, hostname: str, full_snapshot_name: str, port: int = 22, username: str = "root"
+    ) -> None:
+        """Snapshot distrutto da noi: lo toglie senza rileggere nulla."""
+        inv = self._inventories.get(self._key(hostname, port, username))
+        if inv is not None:
+            inv.discard(full_snapshot_name)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per nodo: voci in cache, età, dataset da rileggere, ultimo diff."""
+        now = time.monotonic()
+        return {
+            key: {
+                "entries": len(inv),
+                "age_seconds": round(now - inv.fetched_at, 1),
+                "dirty": sorted(self._dirty.get(key, {})),
+                "last_diff": self._last_diff.get(key),
+            }
+            for key, inv in self._inventories.items()
+        }
+
+
+zfs_inventory = ZFSInventoryService()
@@ -2,11 +2,14 @@
 Pytest Configuration e Fixtures
 """
 
+import asyncio
 import pytest
 import os
 import tempfile
 from fastapi.testclient import TestClient
+import aiosqlite
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
@@ -17,9 +20,13 @@ os.environ.setdefault("DAPX_SECRET_KEY", "test-secret-key-for-testing-only")
 os.environ.setdefault("SANOID_MANAGER_SECRET_KEY", "test-secret-key-for-testing-only")
 os.environ.setdefault("SANOID_MANAGER_DB", ":memory:")
 
-from database import Base, get_db, User, Node, SyncJob, Dataset
+from database import Base, get_db, get_async_db, User, Node, SyncJob, Dataset
 from main import app
 from services.auth_service import auth_service
+from services.job_log_rollup import install_listeners
+
+# Come nel lifespan dell'app (non eseguito dal TestClient senza context manager)
+install_listeners()
 
 
 # Test database setup
@@ -45,6 +52,59 @@ def override_get_db():
 app.dependency_overrides[get_db] = override_get_db
 
 
+_async_engines = []
+
+
+def async_sessionmaker_for(sync_engine):
+    """Sessionmaker async sulla stessa connessione sqlite3 di un engine sync
+    in-memory con StaticPool: sessioni sync e async vedono gli stessi dati."""
+    raw = sync_engine.raw_connection().driver_connection
+
+    async def _creator():
+        return await aiosqlite.Connection(lambda: raw, 64)
+
+    async_engine = create_async_engine(
+        "sqlite+aiosqlite://", async_creator=_creator, poolclass=StaticPool
+    )
+    _async_engines.append(async_engine)
+    return async_sessionmaker(
+        async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+
+
+def async_db_override(session_factory):
+    """Override di get_async_db per un sessionmaker async di test."""
+    async def _override():
+        async with session_factory() as db:
+            yield db
+    return _override
+
+
+TestingAsyncSessionLocal = async_sessionmaker_for(engine)
+app.dependency_overrides[get_async_db] = async_db_override(TestingAsyncSessionLocal)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _dispose_async_engines():
+    """Chiude le connessioni aiosqlite (thread worker non daemon) a fine sessione."""
+    yield
+    for eng in _async_engines:
+        asyncio.run(eng.dispose())
+
+
+@pytest.fixture
+def async_session_local(db):
+    """Sessionmaker async sul DB di test (per codice che usa AsyncSessionLocal)."""
+    return TestingAsyncSessionLocal
+
+
+@pytest.fixture
+def async_db_for():
+    """Factory per i test con engine proprio: ``async_db_for(engine)`` ritorna
+    la dipendenza da usare come override di ``get_async_db``."""
+    return lambda sync_engine: async_db_override(async_sessionmaker_for(sync_engine))
+
+
 @pytest.fixture(scope="function")
 def db():
     """Create fresh database for each test"""
@@ -55,6 +115,35 @@ def db():
     Base.metadata.drop_all(bind=engine)
 
 
+@pytest.fixture
+def file_replication_job(db):
+    """Factory: endpoint Linux (sorgente) e QNAP (destinazione) con un
+    FileReplicationJob tra i due; ``file_replication_job(**campi)`` ritorna
+    ``(job, src, dest)``."""
+    from database import FileEndpoint, FileEndpointRole, FileEndpointType, FileReplicationJob
+
+    def _make(**fields):
+        src = FileEndpoint(
+            name="linux", endpoint_type=FileEndpointType.LINUX, role=FileEndpointRole.SOURCE,
+            host="10.0.0.1", port=22, protocol="ssh", username="root", ssh_key_path="/root/.ssh/id",
+        )
+        dest = FileEndpoint(
+            name="qnap", endpoint_type=FileEndpointType.QNAP, role=FileEndpointRole.DESTINATION,
+            host="10.0.0.2", port=8080, protocol="api", username="admin", ssh_key_path="/root/.ssh/id",
+        )
+        db.add_all([src, dest])
+        db.commit()
+        job = FileReplicationJob(
+            name="t", source_endpoint_id=src.id, dest_endpoint_id=dest.id,
+            **{"source_paths": ["/srv/data/docs"], "dest_staging_path": "/share/DATI", **fields},
+        )
+        db.add(job)
+        db.commit()
+        return job, src, dest
+
+    return _make
+
+
 @pytest.fixture(scope="function")
 def client(db):
     """Create test client with fresh database"""
@@ -0,0 +1,67 @@
+"""Test layer sessioni async (aiosqlite): pragmi, helper, executor e scheduler."""
+
+import asyncio
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import database
+import services.scheduler as scheduler
+from database import JobLog, SyncJob, run_with_async_session
+from services.job_log_output import full_output
+from services.scheduler import SchedulerService
+
+
+def test_async_engine_applies_sqlite_pragmas(tmp_path):
+    assert event.contains(database.async_engine.sync_engine, "connect", database._sqlite_pragmas)
+
+    eng = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'a.db'}")
+    event.listen(eng.sync_engine, "connect", database._sqlite_pragmas)
+
+    async def _run():
+        async with eng.connect() as conn:
+            mode = (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+            fks = (await conn.execute(text("PRAGMA foreign_keys"))).scalar()
+        await eng.dispose()
+        return mode, fks
+
+    assert asyncio.run(_run()) == ("wal", 1)
+
+
+def test_persist_sync_progress_uses_async_session(db, sample_sync_job, async_session_local, monkeypatch):
+    from services import sync_job_execution
+
+    monkeypatch.setattr(database, "AsyncSessionLocal", async_session_local)
+    log = JobLog(job_type="sync", job_id=sample_sync_job.id, status="started", output="HEAD")
+    db.add(log)
+    db.commit()
+    progress = {"percent": 40, "dest_human": "4G", "source_human": "10G", "label": "4G/10G"}
+
+    asyncio.run(sync_job_execution._persist_sync_progress(sample_sync_job.id, log.id, progress))
+    # Stessa riga ripetuta: non viene appesa due volte
+    asyncio.run(sync_job_execution._persist_sync_progress(sample_sync_job.id, log.id, progress))
+
+    db.expire_all()
+    assert db.get(SyncJob, sample_sync_job.id).last_transferred == "4G/10G"
+    out = full_output(db, log)
+    assert out.count("Avanzamento: 40%") == 1
+
+
+def test_scheduler_resync_through_async_session(db, sample_sync_job, async_session_local, monkeypatch):
+    monkeypatch.setattr(database, "AsyncSessionLocal", async_session_local)
+    svc = SchedulerService()
+
+    asyncio.run(run_with_async_session(svc._resync_schedule))
+    assert f"sync_{sample_sync_job.id}" in svc._jobs
+    assert svc._last_resync is not None
+    # Il dispatch senza slot scaduti non apre transazioni né lancia nulla
+    asyncio.run(run_with_async_session(svc._dispatch_due))
+    assert scheduler._MAX_IDLE_SLEEP_SEC >= svc._seconds_until_next(svc._last_resync) > 0
+
+
+def test_logs_endpoint_reads_through_async_session(client, db, auth_headers):
+    db.add(JobLog(job_type="sync", job_id=1, status="success", output="ok"))
+    db.commit()
+    r = client.get("/api/logs/?output_tail=10", headers=auth_headers)
+    assert r.status_code == 200
+    assert [l["output"] for l in r.json()] == ["ok\n"]
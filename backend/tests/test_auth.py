@@ -208,6 +208,43 @@ class TestCurrentUser:
         
         assert response.status_code == 401
 
+    def test_principal_cache_skips_hashing_and_queries(self, client, admin_user, admin_token, monkeypatch):
+        """Test requests after the first are served from the principal cache"""
+        from routers import auth as auth_router
+
+        def _no_bcrypt(*a, **kw):
+            raise AssertionError("bcrypt nella richiesta autenticata")
+
+        monkeypatch.setattr(auth_service, "get_password_hash", _no_bcrypt)
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        assert client.get("/api/auth/me", headers=headers).status_code == 200
+
+        hits = auth_router._principal_cache.stats()["hits"]
+        response = client.get("/api/auth/me", headers=headers)
+        assert response.status_code == 200 and response.json()["role"] == "admin"
+        assert auth_router._principal_cache.stats()["hits"] == hits + 1
+
+    def test_principal_cache_invalidated_on_logout_and_update(self, client, db, admin_user, operator_user):
+        """Test logout and user changes are seen by tokens already cached"""
+        def _login(username, password):
+            return client.post(
+                "/api/auth/login", json={"username": username, "password": password}
+            ).json()["access_token"]
+
+        from database import SystemConfig
+        db.add(SystemConfig(key="auth_method", value="local"))
+        db.commit()
+
+        admin_headers = {"Authorization": f"Bearer {_login('admin', 'Admin123!')}"}
+        op_headers = {"Authorization": f"Bearer {_login('operator', 'Operator123!')}"}
+        assert client.get("/api/auth/me", headers=op_headers).json()["role"] == "operator"
+
+        client.put(f"/api/auth/users/{operator_user.id}", headers=admin_headers, json={"role": "viewer"})
+        assert client.get("/api/auth/me", headers=op_headers).json()["role"] == "viewer"
+
+        assert client.post("/api/auth/logout", headers=op_headers).status_code == 200
+        assert client.get("/api/auth/me", headers=op_headers).status_code == 401
+
 
 class TestPasswordChange:
     """Test password change endpoint"""
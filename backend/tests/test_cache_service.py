@@ -0,0 +1,104 @@
+"""Test refresh cache VM: un fetch /cluster/resources per cluster, upsert bulk."""
+
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base, Node, VirtualMachine
+from services import cache_service as cs
+
+
+@pytest.fixture()
+def db():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _resources(*guests, nodes=("px1", "px2", "px3")):
+    out = [{"type": "node", "node": n, "status": "online"} for n in nodes]
+    for node, vmid, name in guests:
+        out.append({"type": "qemu", "node": node, "vmid": vmid, "name": name,
+                    "status": "running", "maxmem": 1024, "maxcpu": 2, "uptime": 10})
+    return out
+
+
+def test_cluster_resources_fetched_once_per_cluster(db, monkeypatch):
+    db.add_all([
+        Node(name="px1", hostname="10.0.0.1"),
+        Node(name="px2", hostname="10.0.0.2"),
+        Node(name="px3", hostname="10.0.0.3"),
+        Node(name="solo", hostname="10.0.0.9"),
+        Node(name="pbs1", hostname="10.0.0.20", node_type="pbs"),
+    ])
+    db.commit()
+    px1 = db.query(Node).filter_by(name="px1").one()
+    # VM già in cache: una da aggiornare e una rimossa dal cluster
+    db.add_all([
+        VirtualMachine(node_id=px1.id, vmid=100, name="old-name", status="stopped"),
+        VirtualMachine(node_id=px1.id, vmid=999, name="gone"),
+    ])
+    db.commit()
+
+    calls = []
+
+    async def fake_resources(hostname, port=22, username="root", key_path=None):
+        calls.append(hostname)
+        if hostname == "10.0.0.9":
+            return _resources(("solo", 500, "standalone-vm"), nodes=("solo",))
+        return _resources(("px1", 100, "web"), ("px1", 101, "db"), ("px2", 200, "app"))
+
+    async def fake_guests(**kwargs):
+        calls.append(("legacy", kwargs["hostname"]))
+        return [{"vmid": 300, "name": "ct", "type": "lxc", "status": "running"}]
+
+    monkeypatch.setattr(cs.proxmox_service, "get_cluster_resources", fake_resources)
+    monkeypatch.setattr(cs.proxmox_service, "get_all_guests", fake_guests)
+
+    results = asyncio.run(cs.CacheService().refresh_all_nodes(db))
+
+    # un fetch per il cluster px1..px3 + uno per il nodo standalone; px3 non ha
+    # guest nella risposta → fallback qm/pct list. Il PBS non viene interrogato.
+    assert sorted(c for c in calls if isinstance(c, str)) == ["10.0.0.1", "10.0.0.9"]
+    assert [c for c in calls if isinstance(c, tuple)] == [("legacy", "10.0.0.3")]
+    assert set(results) == {"px1", "px2", "px3", "solo"}
+
+    vms = {(vm.node.name, vm.vmid): vm for vm in db.query(VirtualMachine).all()}
+    assert set(vms) == {("px1", 100), ("px1", 101), ("px2", 200), ("px3", 300), ("solo", 500)}
+    assert vms[("px1", 100)].name == "web"
+    assert vms[("px1", 100)].status == "running"
+    assert vms[("px1", 100)].memory == 1024
+
+
+def test_overlapping_refresh_is_skipped(db, monkeypatch):
+    db.add(Node(name="px1", hostname="10.0.0.1"))
+    db.commit()
+    gate = {}
+
+    async def slow_resources(**kwargs):
+        gate["started"].set()
+        await gate["release"].wait()
+        return _resources(("px1", 100, "web"), nodes=("px1",))
+
+    monkeypatch.setattr(cs.proxmox_service, "get_cluster_resources", slow_resources)
+    svc = cs.CacheService()
+
+    async def _run():
+        gate["started"], gate["release"] = asyncio.Event(), asyncio.Event()
+        first = asyncio.create_task(svc.refresh_all_nodes(db))
+        await gate["started"].wait()
+        assert svc.is_refreshing()
+        second = await svc.refresh_all_nodes(db)
+        gate["release"].set()
+        return await first, second
+
+    first, second = asyncio.run(_run())
+    assert first == {"px1": "OK"}
+    assert second == {}
@@ -1,7 +1,7 @@
 """Test riepilogo giornaliero esteso a tutti i moduli."""
 
 import asyncio
-from datetime import datetime
+from datetime import datetime, timedelta
 
 import pytest
 from sqlalchemy import create_engine
@@ -82,3 +82,41 @@ def test_daily_summary_covers_all_modules(env):
     assert by_type["nas_sync"]["dest_node"] == "qnap"
     assert by_type["vm_snapshot"]["source_dataset"] == "label daily"
     assert "keep 7" in by_type["vm_snapshot"]["dest_dataset"]
+
+
+def test_job_log_stats_aggregates_in_constant_queries():
+    from sqlalchemy import event
+
+    from database import JobLog
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    now = datetime.utcnow()
+    t = lambda minutes: now - timedelta(minutes=minutes)  # noqa: E731
+    logs = []
+    for job_id in range(1, 41):
+        logs += [
+            JobLog(job_type="sync", job_id=job_id, status="success", duration=10, transferred="1.0G", started_at=t(300)),
+            JobLog(job_type="sync", job_id=job_id, status="failed", duration=5, error="old " + "x" * 500, started_at=t(200)),
+            JobLog(job_type="sync", job_id=job_id, status="failed", duration=5, error=f"errore {job_id}", started_at=t(100)),
+            JobLog(job_type="sync", job_id=job_id, status="success", duration=10, transferred="2.0G", started_at=t(50)),
+        ]
+    logs += [
+        JobLog(job_type="backup", job_id=1, status="success", duration=30, started_at=t(60)),
+        JobLog(job_type="sync", job_id=1, status="failed", error="troppo vecchio", started_at=now - timedelta(hours=30)),
+    ]
+    db.add_all(logs)
+    db.commit()
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+    stats = ns_module.job_log_stats(db, now - timedelta(hours=24))
+    assert len(statements) == 3
+
+    assert len(stats) == 41
+    st = stats[("sync", 7)]
+    assert (st["runs"], st["success"], st["failed"], st["duration"]) == (4, 2, 2, 30)
+    assert st["last_error"] == "errore 7" and st["last_transferred"] == "2.0G"
+    assert stats[("backup", 1)]["duration"] == 30 and stats[("backup", 1)]["last_error"] is None
+    db.close()
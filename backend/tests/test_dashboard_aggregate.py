@@ -0,0 +1,85 @@
+"""Test aggregato dashboard (host_info + cache VM, niente SSH nella richiesta)."""
+
+import asyncio
+
+import routers.host_info as host_info_router
+from database import Node
+from services import cache_service as cache_module
+from services import host_info_service as his
+from services.dashboard_aggregate import DashboardAggregate, compose_totals, summarize_node
+
+
+def _host_info(shared_used=100):
+    return {
+        "cpu": {"cores": 16},
+        "memory": {"total_gb": 64, "used_gb": 20},
+        "storage": [
+            {"name": "local-zfs", "shared": False, "total_gb": 500, "used_gb": 50},
+            {"name": "ceph", "shared": True, "total_gb": 1000, "used_gb": shared_used},
+        ],
+        "guests": [{"vmid": 1, "status": "running"}, {"vmid": 2, "status": "stopped"}],
+    }
+
+
+def test_compose_totals_counts_shared_storage_once():
+    a = summarize_node(1, _host_info(), (3, 2))
+    b = summarize_node(2, _host_info(), None)  # niente cache VM: guest di host_info
+    assert (b["vm_count"], b["running_vm_count"]) == (2, 1)
+    totals = compose_totals([a, b])
+    assert totals["total_storage_gb"] == 500 + 500 + 1000
+    assert totals["used_storage_gb"] == 50 + 50 + 100
+    assert (totals["total_vms"], totals["running_vms"], totals["total_cpu_cores"]) == (5, 3, 32)
+    assert a["storage_total_gb"] == 1500
+
+
+def test_overview_from_cache_and_background_refresh(client, db, auth_headers, monkeypatch):
+    agg = DashboardAggregate()
+    monkeypatch.setattr(host_info_router, "dashboard_aggregate", agg)
+    monkeypatch.setattr(cache_module, "dashboard_aggregate", agg)
+    monkeypatch.setattr(his, "dashboard_aggregate", agg)
+
+    ready = Node(name="pve1", hostname="10.0.0.1", is_online=True, host_info=_host_info())
+    missing = Node(name="pve2", hostname="10.0.0.2", is_online=True)
+    offline = Node(name="pve3", hostname="10.0.0.3", is_online=False, host_info=_host_info())
+    db.add_all([ready, missing, offline])
+    db.commit()
+    cache_module.CacheService()._upsert_node_vms(db, ready, [
+        {"vmid": 100, "type": "qemu", "status": "running"},
+        {"vmid": 101, "type": "lxc", "status": "stopped"},
+        {"vmid": 102, "type": "qemu", "status": "running"},
+    ])
+
+    refreshed = []
+
+    async def _fake_update(node_id):
+        refreshed.append(node_id)
+        return None
+
+    monkeypatch.setattr(his.host_info_service, "update_host_details", _fake_update)
+
+    async def _no_ssh(*a, **kw):
+        raise AssertionError("SSH nella richiesta dashboard")
+
+    monkeypatch.setattr(host_info_router.proxmox_service, "get_all_guests", _no_ssh)
+
+    body = client.get("/api/dashboard/overview", headers=auth_headers).json()
+    assert (body["total_nodes"], body["online_nodes"]) == (3, 2)
+    assert (body["total_vms"], body["running_vms"]) == (3, 2)
+    assert body["total_storage_gb"] == 1500
+    assert [n["node_name"] for n in body["nodes_summary"]] == ["pve1"]
+    assert body["refreshing_nodes"] == [missing.id]
+
+    # Nuova lettura della cache VM: l'aggregato si ricalcola
+    cache_module.CacheService()._upsert_node_vms(db, ready, [{"vmid": 100, "type": "qemu", "status": "stopped"}])
+    body = client.get("/api/dashboard/overview", headers=auth_headers).json()
+    assert (body["total_vms"], body["running_vms"]) == (1, 0)
+
+    # Refresh fallito: niente nuovo tentativo immediato
+    asyncio.run(agg._refresh(missing.id))
+    agg.schedule_refresh([missing.id])
+    assert refreshed[-1] == missing.id and agg._refreshing == set()
+
+    nodes = client.get("/api/dashboard/nodes", headers=auth_headers).json()
+    by_name = {n["name"]: n for n in nodes}
+    assert by_name["pve1"]["vm_count"] == 1 and by_name["pve1"]["storage_total_gb"] == 1500
+    assert by_name["pve2"]["vm_count"] == 0 and by_name["pve3"]["vm_count"] == 0
@@ -0,0 +1,115 @@
+"""Test stream tar diretto (blocchi per cartella, checksum, ripresa, compressione).
+
+SSH sostituito da ``sh -c`` locale: tar, tee, sha256sum e zstd/lz4 girano davvero.
+"""
+
+import asyncio
+import os
+
+from database import FileEndpoint, FileEndpointType
+from services.file_replication import direct_stream
+from services.file_replication import file_replication_execution as exec_mod
+
+_source_script = direct_stream._source_script
+
+
+def _local_ssh(monkeypatch, fail_chunks=()):
+    streamed = []
+
+    def _script(src_base, chunk, exclude_body, compression):
+        streamed.append(chunk)
+        if chunk in fail_chunks:
+            return "echo 'tar: lettura fallita' >&2; exit 2"
+        return _source_script(src_base, chunk, exclude_body, compression)
+
+    monkeypatch.setattr(direct_stream, "_remote_argv", lambda ep, script: (["sh", "-c", script], None))
+    monkeypatch.setattr(direct_stream, "_source_script", _script)
+    return streamed
+
+
+def _tree(root):
+    for rel, body in {
+        "root.txt": "r",
+        "d1/a.txt": "a" * 5000,
+        "d1/@eaDir/thumb": "t",
+        "d2/sub/b.txt": "b" * 3000,
+        "#snapshot/old.txt": "s",
+    }.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(body)
+
+
+def _endpoints():
+    src = FileEndpoint(name="linux", endpoint_type=FileEndpointType.LINUX, host="h", username="u")
+    dest = FileEndpoint(name="qnap", endpoint_type=FileEndpointType.QNAP, host="q", username="u")
+    return src, dest
+
+
+def test_stream_chunks_verified_and_resumable(tmp_path, monkeypatch):
+    streamed = _local_ssh(monkeypatch)
+    src_dir, dest_dir = tmp_path / "src", tmp_path / "dest"
+    _tree(src_dir)
+    exclude = tmp_path / "exclude.txt"
+    exclude.write_text("#snapshot\n@eaDir\n")
+    source, dest = _endpoints()
+    done, views = [], []
+
+    async def _run(**kw):
+        compression = await direct_stream.resolve_compression(source, dest, "zstd")
+        return await direct_stream.stream_synology_to_qnap(
+            source, dest, str(src_dir), str(dest_dir), str(exclude),
+            compression=compression, on_chunk_done=lambda c, n: done.append((c, n)),
+            on_progress=views.append, **kw,
+        )
+
+    result = asyncio.run(_run())
+    assert streamed == ["", "d1", "d2"]  # #snapshot escluso già dall'elenco
+    assert (dest_dir / "root.txt").read_text() == "r"
+    assert (dest_dir / "d2/sub/b.txt").read_text() == "b" * 3000
+    assert not (dest_dir / "d1/@eaDir").exists() and not (dest_dir / "#snapshot").exists()
+    assert result.bytes_sent == sum(n for _, n in done) > 0
+    assert views[-1]["folders_done"] == 3 and views[-1]["percent"] == "100%"
+
+    # Ripresa: i blocchi conclusi non vengono ritrasmessi, ETA/% dalle misure precedenti
+    sizes = dict(done)
+    os.remove(dest_dir / "root.txt")
+    streamed.clear()
+    views.clear()
+    result = asyncio.run(_run(completed=["", "d1"], sizes=sizes))
+    assert streamed == ["d2"] and result.chunks_resumed == 2
+    assert not (dest_dir / "root.txt").exists()
+    assert views[0]["percent"] == "0%" and views[-1]["percent"] == "100%"
+
+
+def test_failed_run_resumes_from_checkpoint(db, file_replication_job, tmp_path, monkeypatch):
+    src_dir = tmp_path / "src"
+    _tree(src_dir)
+    job, _, _ = file_replication_job(
+        source_paths=[str(src_dir)], dest_staging_path=str(tmp_path / "qnap"),
+        sync_method="tar_stream", stream_compression="lz4",
+    )
+
+    async def _no_notify(**kw):
+        return None
+
+    monkeypatch.setattr(exec_mod, "SessionLocal", lambda: db)
+    monkeypatch.setattr(db, "close", lambda: None)
+    monkeypatch.setattr(exec_mod, "_preflight_stream_tools", lambda s, d: None)
+    monkeypatch.setattr(exec_mod, "notify_file_replication_result", _no_notify)
+
+    streamed = _local_ssh(monkeypatch, fail_chunks={"d2"})
+    asyncio.run(exec_mod.execute_file_replication_job(job.id))
+    db.refresh(job)
+    assert job.last_run_status == "failed"
+    assert "tar sorgente exit 2" in exec_mod.get_job_progress(job.id)["error"]
+    assert job.stream_checkpoint[str(src_dir)]["done"] == ["", "d1"]
+
+    streamed = _local_ssh(monkeypatch)
+    asyncio.run(exec_mod.execute_file_replication_job(job.id))
+    db.refresh(job)
+    assert job.last_run_status == "success" and streamed == ["d2"]
+    assert (tmp_path / "qnap/src/d2/sub/b.txt").exists()
+    entry = job.stream_checkpoint[str(src_dir)]
+    assert entry["done"] == [] and set(entry["sizes"]) == {"", "d1", "d2"}
+    assert job.last_bytes_transferred == entry["sizes"]["d2"]
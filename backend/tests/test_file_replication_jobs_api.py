@@ -87,3 +87,60 @@ def test_reject_non_qnap_destination(client, auth_headers, db):
         },
     )
     assert r.status_code == 400
+
+
+def test_tar_stream_checkpoint_reset_on_source_change(client, auth_headers, db):
+    src, dest = _seed_endpoints(db)
+    r = client.post(
+        "/api/file-replication",
+        headers=auth_headers,
+        json={
+            "name": "stream",
+            "source_endpoint_id": src.id,
+            "dest_endpoint_id": dest.id,
+            "source_paths": ["/documenti"],
+            "dest_staging_path": "/share/DATI",
+            "sync_method": "tar_stream",
+            "stream_compression": "zstd",
+        },
+    )
+    assert r.status_code == 200
+    job_id = r.json()["id"]
+    job = db.get(FileReplicationJob, job_id)
+    job.stream_checkpoint = {"/documenti": {"done": ["a"], "sizes": {"a": 10}}}
+    db.commit()
+
+    r = client.put(f"/api/file-replication/{job_id}", headers=auth_headers,
+                   json={"source_paths": ["/documenti"], "stream_compression": "lz4"})
+    assert r.json()["stream_resume_pending"] is True
+    r = client.put(f"/api/file-replication/{job_id}", headers=auth_headers,
+                   json={"source_paths": ["/documenti", "/foto"]})
+    assert r.json()["stream_resume_pending"] is False
+    assert client.put(f"/api/file-replication/{job_id}", headers=auth_headers,
+                      json={"stream_compression": "gzip"}).status_code == 422
+
+
+def test_staging_reenabled_during_run_is_kept(client, auth_headers, db, tmp_path, monkeypatch):
+    import asyncio
+    import os
+
+    from services.file_replication import staging_cache
+
+    monkeypatch.setattr(staging_cache, "STAGING_ROOT", str(tmp_path))
+    monkeypatch.setattr(staging_cache, "STAGING_MIN_FREE_BYTES", 0)
+    src, dest = _seed_endpoints(db)
+    job = FileReplicationJob(
+        name="p", source_endpoint_id=src.id, dest_endpoint_id=dest.id,
+        source_paths=["/documenti"], dest_staging_path="/share/DATI", persistent_staging=True,
+    )
+    db.add(job)
+    db.commit()
+    path = staging_cache.acquire(job.id, ["documenti"])
+
+    # Disattivato e riattivato mentre il run è in corso: lo staging resta
+    for enabled in (False, True):
+        r = client.put(f"/api/file-replication/{job.id}", headers=auth_headers,
+                       json={"persistent_staging": enabled})
+        assert r.status_code == 200
+    asyncio.run(staging_cache.release(job.id))
+    assert os.path.isdir(path)
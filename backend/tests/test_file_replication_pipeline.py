@@ -0,0 +1,132 @@
+"""Test pipeline pull/push della replica file (sovrapposizione tratte, cancellazione)."""
+
+import asyncio
+
+from services.file_replication import file_replication_execution as exec_mod
+from services.file_replication.leg_pipeline import EndpointGates, LegProgress
+
+
+class _FakeRsync:
+    """Processo rsync finto: resta attivo finché il test non lo rilascia."""
+
+    def __init__(self, name, events, fail=False):
+        self.name = name
+        self.events = events
+        self.fail = fail
+        self.returncode = None
+        self.released = asyncio.Event()
+        self.lines = [b"      1,024  50%    1.00MB/s    0:00:01\n"]
+        self.stderr = self
+
+    async def readline(self):
+        if self.lines:
+            return self.lines.pop(0)
+        await self.released.wait()
+        return b""
+
+    async def communicate(self):
+        self.returncode = 23 if self.fail else 0
+        self.events.append(("end", self.name))
+        return b"", b"rsync error\n" if self.fail else b""
+
+    def terminate(self):
+        self.events.append(("terminated", self.name))
+        self.returncode = -15
+        self.released.set()
+
+    async def wait(self):
+        return self.returncode
+
+
+def _setup(db, make_job, monkeypatch, paths, fail=None):
+    job, _, _ = make_job(source_paths=paths)
+    events, procs = [], {}
+
+    async def _fake_exec(*cmd, **kw):
+        leg = "pull" if "dapx-fr-" in cmd[-1] else "push"
+        path = next(p for p in paths if p.strip("/").replace("/", "_") in " ".join(cmd))
+        name = f"{leg}:{path}"
+        events.append(("start", name))
+        procs[name] = _FakeRsync(name, events, fail=(name == fail))
+        return procs[name]
+
+    async def _no_notify(**kw):
+        return None
+
+    monkeypatch.setattr(exec_mod, "SessionLocal", lambda: db)
+    monkeypatch.setattr(db, "close", lambda: None)
+    monkeypatch.setattr(exec_mod, "_preflight_rsync_tools", lambda s, d: None)
+    monkeypatch.setattr(exec_mod, "notify_file_replication_result", _no_notify)
+    monkeypatch.setattr(exec_mod, "endpoint_gates", EndpointGates(1))
+    monkeypatch.setattr(exec_mod.asyncio, "create_subprocess_exec", _fake_exec)
+    return job, events, procs
+
+
+async def _wait_running(procs, *names):
+    """Attende che i processi esistano e abbiano emesso la riga di progresso."""
+    while not all(n in procs and not procs[n].lines for n in names):
+        await asyncio.sleep(0)
+
+
+async def _release(procs, name):
+    await _wait_running(procs, name)
+    procs[name].released.set()
+
+
+def test_push_overlaps_next_pull(db, file_replication_job, monkeypatch):
+    job, events, procs = _setup(db, file_replication_job, monkeypatch, ["/srv/a", "/srv/b"])
+    views = []
+
+    async def _run():
+        run = asyncio.create_task(exec_mod.execute_file_replication_job(job.id))
+        await _release(procs, "pull:/srv/a")
+        await _wait_running(procs, "pull:/srv/b", "push:/srv/a")
+        # Entrambe le tratte attive: push di a e pull di b sui due link
+        views.append(exec_mod.get_job_progress(job.id))
+        for name in ("pull:/srv/b", "push:/srv/a", "push:/srv/b"):
+            await _release(procs, name)
+        await run
+
+    asyncio.run(_run())
+    starts = [name for kind, name in events if kind == "start"]
+    assert starts[0] == "pull:/srv/a" and starts[-1] == "push:/srv/b"
+    assert set(starts[1:3]) == {"pull:/srv/b", "push:/srv/a"}
+    assert events.index(("start", "push:/srv/a")) < events.index(("end", "pull:/srv/b"))
+    view = views[0]
+    assert {(leg["leg"], leg["path"]) for leg in view["legs"]} == {("push", "/srv/a"), ("pull", "/srv/b")}
+    assert view["percent"] == "50%" and "(0/2 path)" in view["message"]
+    db.refresh(job)
+    assert job.last_run_status == "success" and job.last_bytes_transferred == 2048
+
+
+def test_failure_terminates_other_leg(db, file_replication_job, monkeypatch):
+    job, events, procs = _setup(
+        db, file_replication_job, monkeypatch, ["/srv/a", "/srv/b"], fail="pull:/srv/b"
+    )
+
+    async def _run():
+        run = asyncio.create_task(exec_mod.execute_file_replication_job(job.id))
+        await _release(procs, "pull:/srv/a")
+        await _wait_running(procs, "pull:/srv/b", "push:/srv/a")
+        await _release(procs, "pull:/srv/b")  # fallisce mentre push a è attivo
+        await run
+
+    asyncio.run(_run())
+    assert ("terminated", "push:/srv/a") in events
+    assert ("start", "push:/srv/b") not in events
+    db.refresh(job)
+    assert job.last_run_status == "failed" and job.current_status == "failed"
+    assert "rsync exit 23" in exec_mod.get_job_progress(job.id)["error"]
+
+
+def test_leg_progress_combines_legs():
+    legs = LegProgress(4)
+    legs.update("pull", "/a", {"bytes_transferred": 100, "percent": "100%"})
+    legs.finish("pull", "/a")
+    legs.update("push", "/a", {"bytes_transferred": 40, "percent": "50%", "speed": "2MB/s"})
+    legs.update("pull", "/b", {"bytes_transferred": 10, "percent": "10%", "speed": "9MB/s"})
+    view = legs.view()
+    assert view["percent"] == "40%"
+    assert view["bytes_pulled"] == 110 and view["bytes_pushed"] == 40
+    assert view["speed"] == "2MB/s"
+    assert view["message"] == "push /a 50% · pull /b 10% (0/2 path)"
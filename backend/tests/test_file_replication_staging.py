@@ -0,0 +1,98 @@
+"""Test staging persistente della replica file (pull incrementale, quota LRU)."""
+
+import asyncio
+import os
+
+from services.file_replication import file_replication_execution as exec_mod
+from services.file_replication import staging_cache
+from services.file_replication.file_sync_service import build_sync_plan
+
+
+def test_persistent_pull_mirrors_source(file_replication_job):
+    job, src, dest = file_replication_job(persistent_staging=True)
+    pull, push = build_sync_plan(job, src, dest, "/tmp/ex.txt", "/staging/job-1")
+    assert pull["cmd"][-1] == "/staging/job-1/srv_data_docs/"
+    assert "--delete" in pull["cmd"] and "--delete-excluded" in pull["cmd"]
+    assert push["cmd"][-2] == "/staging/job-1/srv_data_docs/"
+
+    job.persistent_staging = False
+    pull, _ = build_sync_plan(job, src, dest, "/tmp/ex.txt", "/tmp/x")
+    assert "--delete" not in pull["cmd"]
+
+
+def test_quota_evicts_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(staging_cache, "STAGING_ROOT", str(tmp_path))
+    monkeypatch.setattr(staging_cache, "STAGING_MIN_FREE_BYTES", 0)
+    for job_id, (last_used, size) in {1: (100, 60), 2: (200, 30), 3: (300, 30)}.items():
+        path = staging_cache.acquire(job_id, ["data"])
+        staging_cache._write_meta(path, last_used=last_used, size_bytes=size)
+    staging_cache._in_use.discard(2)
+    staging_cache._in_use.discard(3)
+
+    # Job 1 in esecuzione: si salta e si elimina il successivo più vecchio
+    assert staging_cache.enforce_quota(100, 0) == [2]
+    staging_cache._in_use.discard(1)
+    assert staging_cache.enforce_quota(50, 0) == [1]
+    assert staging_cache.enforce_quota(0, 10, disk_free=lambda p: 0) == [3]
+    assert staging_cache.list_entries() == []
+
+
+def test_staging_kept_between_runs(db, file_replication_job, tmp_path, monkeypatch):
+    monkeypatch.setattr(staging_cache, "STAGING_ROOT", str(tmp_path))
+    monkeypatch.setattr(staging_cache, "STAGING_MIN_FREE_BYTES", 0)
+    job, _, _ = file_replication_job(persistent_staging=True)
+    os.makedirs(tmp_path / f"job-{job.id}" / "removed_path")
+    commands = []
+
+    class _Proc:
+        returncode = 0
+
+        class stderr:
+            @staticmethod
+            async def readline():
+                return b""
+
+        async def communicate(self):
+            return b"", b""
+
+    async def _fake_exec(*cmd, **kw):
+        commands.append(cmd)
+        target = cmd[-1]
+        if cmd[0] == "rsync" and target.startswith(str(tmp_path)):  # pull
+            os.makedirs(target, exist_ok=True)
+            with open(os.path.join(target, f"f{len(commands)}"), "w") as fh:
+                fh.write("x" * 10)
+        return _Proc()
+
+    async def _no_notify(**kw):
+        return None
+
+    monkeypatch.setattr(exec_mod, "SessionLocal", lambda: db)
+    monkeypatch.setattr(db, "close", lambda: None)
+    monkeypatch.setattr(exec_mod, "_preflight_rsync_tools", lambda s, d: None)
+    monkeypatch.setattr(exec_mod, "notify_file_replication_result", _no_notify)
+    monkeypatch.setattr(exec_mod.asyncio, "create_subprocess_exec", _fake_exec)
+
+    asyncio.run(exec_mod.execute_file_replication_job(job.id))
+    asyncio.run(exec_mod.execute_file_replication_job(job.id))
+
+    db.refresh(job)
+    assert job.last_run_status == "success"
+    staged = tmp_path / f"job-{job.id}" / "srv_data_docs"
+    pulls = [c for c in commands if c[0] == "rsync" and c[-1].startswith(str(tmp_path))]
+    assert len(pulls) == 2 and len(os.listdir(staged)) == 2  # stesso staging nei due run
+    assert not (tmp_path / f"job-{job.id}" / "removed_path").exists()
+    (entry,) = staging_cache.list_entries()
+    assert entry["size_bytes"] >= 20 and not entry["in_use"]
+
+
+def test_remove_during_run_deferred_to_release(tmp_path, monkeypatch):
+    monkeypatch.setattr(staging_cache, "STAGING_ROOT", str(tmp_path))
+    monkeypatch.setattr(staging_cache, "STAGING_MIN_FREE_BYTES", 0)
+    path = staging_cache.acquire(9, ["data"])
+    # Job cancellato / staging disattivato mentre il run è in corso
+    assert staging_cache.remove(9) is False
+    assert os.path.isdir(path)
+    asyncio.run(staging_cache.release(9))
+    assert not os.path.exists(path)
+    assert 9 not in staging_cache._in_use and 9 not in staging_cache._pending_removal
@@ -0,0 +1,88 @@
+"""Test raccolta host_info: probe in parallelo (limitato) e timing per sezione."""
+
+import asyncio
+import json
+
+from services import host_info_service as his
+from services.ssh_service import SSHResult
+
+
+def _fake_ssh(monkeypatch, delay=0.02):
+    state = {"running": 0, "peak": 0, "commands": []}
+
+    async def fake_execute(hostname, command, port=22, username="root", key_path=None, timeout=300):
+        state["commands"].append(command)
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            state["running"] -= 1
+        if command.startswith('echo "$(hostname)"'):
+            out = "pve1\n8.2.4\n6.8.12-1-pve\n12345\n"
+        elif command.startswith("lscpu"):
+            out = "Model name: Xeon\nCPU(s): 16\nSocket(s): 1\nThread(s) per core: 2\n"
+        elif "meminfo" in command:
+            out = "MemTotal: 16777216 kB\nMemAvailable: 8388608 kB\n"
+        elif command.startswith("ip route show default"):
+            out = "default via 10.0.0.254 dev vmbr0 proto kernel onlink\n"
+        elif command.startswith("ip -j addr"):
+            out = json.dumps([
+                {"ifname": "lo", "operstate": "UNKNOWN"},
+                {"ifname": "vmbr0", "operstate": "UP", "address": "aa:bb:cc:dd:ee:ff",
+                 "addr_info": [{"family": "inet", "local": "10.0.0.1", "prefixlen": 24}]},
+                {"ifname": "vmbr1", "operstate": "UP", "address": "aa:bb:cc:dd:ee:00",
+                 "addr_info": []},
+            ])
+        elif command.endswith("/qemu --output-format json 2>/dev/null"):
+            out = json.dumps([{"vmid": 100, "name": "web", "status": "running"}])
+        elif command.endswith("/lxc --output-format json 2>/dev/null"):
+            out = json.dumps([{"vmid": 200, "name": "ct", "status": "stopped"}])
+        elif "/config --output-format json" in command:
+            out = json.dumps({"net0": "virtio=AA:BB:CC:00:11:22,bridge=vmbr0,tag=10"})
+        else:
+            return SSHResult(False, "", "not found", 1)
+        return SSHResult(True, out, "", 0)
+
+    monkeypatch.setattr(his.ssh_service, "execute", fake_execute)
+    return state
+
+
+def test_fetch_host_details_runs_sections_concurrently(monkeypatch):
+    state = _fake_ssh(monkeypatch)
+    svc = his.HostInfoService()
+    result = asyncio.run(svc.fetch_host_details("10.0.0.1", node_type="pve"))
+
+    assert result["node_name"] == "pve1"
+    assert result["proxmox_version"] == "8.2.4"
+    assert result["uptime_seconds"] == 12345
+    assert result["cpu"]["model"] == "Xeon"
+    assert result["memory"]["total_gb"] == 16.0
+    assert {g["id"] for g in result["guests"]} == {100, 200}
+    assert result["guests"][0]["networks"][0]["bridge"] == "vmbr0"
+
+    # gateway: route di default letta una sola volta, fallback sul gateway principale
+    nets = {n["name"]: n for n in result["network"]}
+    assert nets["vmbr0"]["gateway"] == "10.0.0.254"
+    assert nets["vmbr1"]["gateway"] == "10.0.0.254"
+    assert sum(1 for c in state["commands"] if c.startswith("ip route")) == 1
+
+    # probe in parallelo ma entro il limite per host (+ fan-out interno guest/network)
+    assert state["peak"] > 1
+    sections = result["collection"]["sections_ms"]
+    assert {"node", "cpu", "memory", "storage", "network", "guests", "license"} <= set(sections)
+    assert result["collection"]["total_ms"] < sum(sections.values())
+
+
+def test_failing_section_does_not_break_collection(monkeypatch):
+    _fake_ssh(monkeypatch, delay=0)
+
+    async def boom(*args, **kwargs):
+        raise RuntimeError("sensors esploso")
+
+    svc = his.HostInfoService()
+    monkeypatch.setattr(svc, "_get_temperature_readings", boom)
+    result = asyncio.run(svc.fetch_host_details("10.0.0.1", node_type="pve"))
+    assert result["temperature"] == {}
+    assert result["cpu"]["model"] == "Xeon"
+    assert "temperature" in result["collection"]["sections_ms"]
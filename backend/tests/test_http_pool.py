@@ -0,0 +1,92 @@
+"""Test client HTTP keep-alive condivisi e cache sessione QNAP."""
+
+import asyncio
+
+import httpx
+
+from services import http_pool as http_pool_module
+from services.file_replication import qnap_client as qnap_module
+from services.file_replication import synology_client as synology_module
+from services.file_replication.qnap_client import QnapClient
+from services.http_pool import HttpClientPool
+
+LOGIN_OK = "<QDocRoot><authPassed>1</authPassed><authSid>{sid}</authSid></QDocRoot>"
+
+
+def test_pool_reuses_client_per_endpoint_and_loop(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(http_pool_module, "_now", lambda: clock[0])
+
+    def _handler(request):
+        return httpx.Response(200, json={"ok": True}, headers={"Set-Cookie": "id=abc; Path=/"})
+
+    pool = HttpClientPool(idle_timeout=60, transport=httpx.MockTransport(_handler))
+
+    async def _run():
+        a = pool.client("https://nas:5001/")
+        assert pool.client("https://nas:5001") is a
+        assert pool.client("https://nas:5001", verify=True) is not a
+        await a.get("https://nas:5001/webapi/entry.cgi")
+        assert not a.cookies  # niente cookie condivisi tra utenti
+        return a
+
+    first = asyncio.run(_run())
+    second = asyncio.run(_run())  # loop nuovo: client nuovo
+    assert first is not second
+    assert pool.stats()["clients"] == 2 and pool.stats()["created_total"] == 4
+
+    clock[0] += 120
+    assert pool.evict_idle() == 2 and pool.stats()["clients"] == 0
+
+
+def test_qnap_session_reused_across_clients(monkeypatch):
+    calls = []
+    logins = iter(["sid1", "sid2"])
+
+    def _handler(request):
+        calls.append((request.url.host, request.url.port, request.url.path))
+        if request.url.port == 8080:
+            raise httpx.ConnectError("refused", request=request)
+        if request.url.path == "/cgi-bin/authLogin.cgi":
+            return httpx.Response(200, text=LOGIN_OK.format(sid=next(logins)))
+        sid = request.url.params["sid"]
+        if sid == "sid1" and request.url.params["path"] == "/Public/b":
+            return httpx.Response(200, json={"status": 3})
+        return httpx.Response(200, json={"datas": [{"filename": f"x-{sid}", "isfolder": 1}]})
+
+    pool = HttpClientPool(transport=httpx.MockTransport(_handler))
+    monkeypatch.setattr(qnap_module, "http_pool", pool)
+    monkeypatch.setattr(qnap_module, "_session_cache", {})
+    monkeypatch.setattr(qnap_module, "_base_cache", {})
+
+    async def _run():
+        a = await QnapClient("nas", 8080, "u", "p").list_children("/Public/a")
+        # Nuova istanza (nuova richiesta browse): stesso SID, base HTTPS già nota
+        b = await QnapClient("nas", 8080, "u", "p").list_children("/Public/b")
+        return a, b
+
+    a, b = asyncio.run(_run())
+    assert a[0].name == "x-sid1" and b[0].name == "x-sid2"  # SID scaduto: nuovo login
+    paths = [c[2] for c in calls]
+    assert paths.count("/cgi-bin/authLogin.cgi") == 3  # 8080 fallito + 443, poi re-login
+    assert [c[1] for c in calls].count(8080) == 1
+    assert qnap_module._session_cache["nas:8080:u"][0] == "sid2"
+
+
+def test_synology_uses_shared_client(monkeypatch):
+    def _handler(request):
+        if request.url.path == "/webapi/auth.cgi":
+            return httpx.Response(200, json={"success": True, "data": {"sid": "s1"}})
+        return httpx.Response(200, json={"success": True, "data": {"shares": [{"name": "home"}]}})
+
+    pool = HttpClientPool(transport=httpx.MockTransport(_handler))
+    monkeypatch.setattr(synology_module, "http_pool", pool)
+    monkeypatch.setattr(synology_module, "_session_cache", {})
+
+    async def _run():
+        client = synology_module.SynologyClient("dsm", 5001, "u", "p")
+        await client.list_children("/")
+        await client.list_children("/")
+
+    asyncio.run(_run())
+    assert pool.stats()["clients"] == 1 and pool.stats()["endpoints"][0]["requests"] == 3
@@ -0,0 +1,175 @@
+"""Test admission controller dei job (budget per risorsa, coda equa, priorità)."""
+
+import asyncio
+
+from services.job_admission import (
+    AdmissionController,
+    nas_resource,
+    node_resource,
+    pool_resource,
+)
+
+
+def _budgets(**kw):
+    base = {"global": 0, "node": 0, "pool": 0, "pbs": 0, "nas": 0}
+    base.update(kw)
+    return base
+
+
+async def _hold(ctrl, key, resources, started, release, **kw):
+    async with ctrl.slot(key, resources, **kw):
+        started.append(key)
+        await release.wait()
+
+
+def test_node_budget_limits_concurrency():
+    ctrl = AdmissionController(_budgets(node=2))
+
+    async def _run():
+        started, release = [], asyncio.Event()
+        tasks = [
+            asyncio.create_task(_hold(ctrl, f"j{i}", [node_resource(1)], started, release))
+            for i in range(4)
+        ]
+        await asyncio.sleep(0.01)
+        snap = ctrl.snapshot()
+        assert len(started) == 2
+        assert [q["key"] for q in snap["queued"]] == ["j2", "j3"]
+        assert snap["usage"] == {"node:1": 2}
+        release.set()
+        await asyncio.gather(*tasks)
+        return started, ctrl.snapshot()
+
+    started, snap = asyncio.run(_run())
+    assert started == ["j0", "j1", "j2", "j3"]
+    assert snap["running"] == [] and snap["queued"] == [] and snap["usage"] == {}
+
+
+def test_free_resources_are_not_blocked_by_queue():
+    """Un job su un nodo libero parte anche se davanti c'è un job in attesa
+    su un altro nodo saturo."""
+    ctrl = AdmissionController(_budgets(node=1))
+
+    async def _run():
+        started, release = [], asyncio.Event()
+        tasks = [
+            asyncio.create_task(_hold(ctrl, "a1", [node_resource(1)], started, release)),
+            asyncio.create_task(_hold(ctrl, "a2", [node_resource(1)], started, release)),
+            asyncio.create_task(_hold(ctrl, "b1", [node_resource(2)], started, release)),
+        ]
+        await asyncio.sleep(0.01)
+        snapshot_started = list(started)
+        release.set()
+        await asyncio.gather(*tasks)
+        return snapshot_started
+
+    assert asyncio.run(_run()) == ["a1", "b1"]
+
+
+def test_queued_job_reserves_its_resources():
+    """Niente starvation: un job in coda su node:1+pool non viene scavalcato
+    da job arrivati dopo che usano le stesse risorse."""
+    ctrl = AdmissionController(_budgets(node=2, pool=1))
+    pool = pool_resource(1, "rpool/data")
+
+    async def _run():
+        started, release = [], asyncio.Event()
+        first = asyncio.create_task(_hold(ctrl, "p1", [node_resource(1), pool], started, release))
+        await asyncio.sleep(0.01)
+        waiting = asyncio.create_task(_hold(ctrl, "p2", [node_resource(1), pool], started, release))
+        await asyncio.sleep(0.01)
+        # node:1 avrebbe ancora posto, ma p2 lo ha prenotato
+        late = asyncio.create_task(_hold(ctrl, "n1", [node_resource(1)], started, release))
+        await asyncio.sleep(0.01)
+        before = list(started)
+        release.set()
+        await asyncio.gather(first, waiting, late)
+        return before
+
+    assert asyncio.run(_run()) == ["p1"]
+
+
+def test_priority_orders_queue():
+    ctrl = AdmissionController(_budgets(**{"global": 1}))
+
+    async def _run():
+        started, release = [], asyncio.Event()
+        blocker = asyncio.create_task(_hold(ctrl, "x", [], started, release))
+        await asyncio.sleep(0.01)
+        low = asyncio.create_task(_hold(ctrl, "nas", [nas_resource(1)], started, release, kind="nas_sync"))
+        high = asyncio.create_task(_hold(ctrl, "snap", [node_resource(1)], started, release, kind="vm_snapshot"))
+        await asyncio.sleep(0.01)
+        queued = [q["key"] for q in ctrl.snapshot()["queued"]]
+        release.set()
+        await asyncio.gather(blocker, low, high)
+        return queued, started
+
+    queued, started = asyncio.run(_run())
+    assert queued == ["snap", "nas"]
+    assert started == ["x", "snap", "nas"]
+
+
+def test_cancel_while_queued_and_budget_update():
+    ctrl = AdmissionController(_budgets(nas=1))
+
+    async def _run():
+        started, release = [], asyncio.Event()
+        first = asyncio.create_task(_hold(ctrl, "a", [nas_resource(7)], started, release))
+        second = asyncio.create_task(_hold(ctrl, "b", [nas_resource(7)], started, release))
+        third = asyncio.create_task(_hold(ctrl, "c", [nas_resource(7)], started, release))
+        await asyncio.sleep(0.01)
+        second.cancel()
+        await asyncio.sleep(0.01)
+        assert [q["key"] for q in ctrl.snapshot()["queued"]] == ["c"]
+        # Alzare il budget ammette subito chi è in coda
+        ctrl.set_budgets({"nas": 2})
+        await asyncio.sleep(0.01)
+        snap_started = list(started)
+        release.set()
+        await asyncio.gather(first, third)
+        return snap_started
+
+    assert asyncio.run(_run()) == ["a", "c"]
+
+
+def test_detached_slot_held_until_release():
+    """Un posto sganciato (replica proseguita nel monitor) resta occupato
+    dopo l'uscita da ``slot`` finché non viene rilasciato."""
+    ctrl = AdmissionController(_budgets(node=1))
+
+    async def _run():
+        async with ctrl.slot("a", [node_resource(1)]) as ticket:
+            release = ctrl.detach(ticket)
+        started, never = [], asyncio.Event()
+        waiting = asyncio.create_task(_hold(ctrl, "b", [node_resource(1)], started, never))
+        await asyncio.sleep(0.01)
+        before = (list(started), [r["key"] for r in ctrl.snapshot()["running"]])
+        release()
+        release()  # idempotente
+        await asyncio.sleep(0.01)
+        after = list(started)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        return before, after, ctrl.snapshot()
+
+    before, after, snap = asyncio.run(_run())
+    assert before == ([], ["a"])
+    assert after == ["b"]
+    assert snap["running"] == [] and snap["usage"] == {}
+
+
+def test_queue_endpoint(client, auth_headers):
+    r = client.get("/api/schedule/queue", headers=auth_headers)
+    assert r.status_code == 200
+    body = r.json()
+    assert set(body) == {"budgets", "running", "queued", "usage"}
+
+
+def test_update_admission_budgets(client, auth_headers):
+    r = client.put("/api/settings/admission", json={"budgets": {"node": 3}}, headers=auth_headers)
+    assert r.status_code == 200
+    assert r.json()["budgets"]["node"] == 3
+    r = client.put("/api/settings/admission", json={"budgets": {"boh": 1}}, headers=auth_headers)
+    assert r.status_code == 422
+    from services.job_admission import admission_controller, DEFAULT_BUDGETS
+    admission_controller.set_budgets(DEFAULT_BUDGETS)
@@ -0,0 +1,156 @@
+"""Test bus eventi job (coalescenza, registry degli executor) e stream SSE filtrato per nodo."""
+
+import asyncio
+
+from sqlalchemy.orm import sessionmaker
+
+import routers.events as events_router
+import services.sync_job_execution as sync_exec
+from database import Node, SyncJob
+from services.auth_service import auth_service
+from services.job_events import JobProgressBus
+
+
+def test_bus_coalesces_per_job_and_tracks_active():
+    bus = JobProgressBus()
+
+    async def _run():
+        async with bus.subscribe() as sub:
+            for pct in (10, 20, 30):
+                bus.publish("sync", 1, progress={"percent": pct}, status="running", node_ids=(1, 2))
+            bus.publish("nas_sync", 7, progress={"status": "running", "percent": 5})
+            batch = await bus.next_batch(sub, timeout=1)
+            bus.publish("sync", 1, status="done")
+            final = await bus.next_batch(sub, timeout=1)
+            empty = await bus.next_batch(sub, timeout=0.01)
+            return batch, final, empty
+
+    batch, final, empty = asyncio.run(_run())
+    assert [(e.kind, e.job_id) for e in batch] == [("sync", 1), ("nas_sync", 7)]
+    assert batch[0].progress == {"percent": 30}
+    # node_ids ereditati dall'ultimo evento dello stesso job
+    assert final[0].final and final[0].node_ids == (1, 2)
+    assert empty == []
+    assert [e.key for e in bus.active()] == ["nas_sync:7"]
+    assert bus.subscriber_count == 0
+
+
+def test_registry_publishes_assignments():
+    bus = JobProgressBus()
+    reg = bus.registry("vm_snapshot")
+    reg[3] = {"status": "running", "current": 0}
+    reg.set_nodes(3, [5])
+    reg[3]["current"] = 2
+    reg.touch(3)
+    assert bus.active()[0].progress == {"status": "running", "current": 2}
+    assert bus.active()[0].node_ids == (5,)
+    # Rimozione senza stato finale: evento "done"
+    reg.pop(3)
+    assert bus.active() == [] and 3 not in reg
+
+
+def test_node_scoped_registry_holds_until_nodes_known():
+    bus = JobProgressBus()
+    reg = bus.registry("vm_snapshot", node_scoped=True)
+    reg[4] = {"status": "running", "phase": "resolve"}
+    reg.touch(4)
+    assert bus.active() == []  # nodi ignoti: niente evento visibile a tutti
+    reg.set_nodes(4, [7])
+    assert [(e.job_id, e.node_ids) for e in bus.active()] == [(4, (7,))]
+    reg.pop(4)
+    assert bus.active() == []
+
+    async def _unscoped_job():
+        # Job mai associato a nodi: nessun evento nemmeno alla rimozione
+        async with bus.subscribe() as sub:
+            reg[5] = {"status": "running"}
+            reg.pop(5)
+            return await bus.next_batch(sub, timeout=0.01)
+
+    assert asyncio.run(_unscoped_job()) == []
+
+
+def test_sync_run_without_monitor_publishes_done(db, monkeypatch):
+    """Un run sync che termina in linea (es. schedulato fallito) chiude
+    l'evento: niente job "running" rimasti nel bus."""
+    node = Node(name="px1", hostname="10.0.0.1")
+    db.add(node)
+    db.commit()
+    job = SyncJob(name="bt", source_node_id=node.id, dest_node_id=node.id,
+                  source_dataset="/disk", dest_dataset="/dest", sync_method="btrfs_send")
+    db.add(job)
+    db.commit()
+    bus = JobProgressBus()
+
+    async def _failed_sync(**kw):
+        return {"success": False, "duration": 1, "error": "send fallito"}
+
+    async def _no_notify(**kw):
+        return None
+
+    monkeypatch.setattr("database.SessionLocal", lambda: db)
+    monkeypatch.setattr(db, "close", lambda: None)
+    monkeypatch.setattr(sync_exec, "job_events", bus)
+    monkeypatch.setattr(sync_exec, "send_job_notification_helper", _no_notify)
+    monkeypatch.setattr(sync_exec.btrfs_service, "run_sync", _failed_sync)
+
+    assert asyncio.run(sync_exec.execute_sync_job_task(job.id)) is False
+    assert bus.active() == []
+    db.refresh(job)
+    assert job.last_status == "failed"
+
+
+def test_event_stream_filters_by_node(monkeypatch):
+    bus = JobProgressBus()
+    monkeypatch.setattr(events_router, "job_events", bus)
+
+    async def _run():
+        gen = events_router.event_stream(
+            lambda ev: not ev.node_ids or 2 not in ev.node_ids,
+            lambda: asyncio.sleep(0, result=False),
+            keepalive=0.05,
+            min_interval=0,
+        )
+        head = await gen.__anext__()
+        bus.publish("sync", 1, progress={"percent": 50}, status="running", node_ids=(1,))
+        bus.publish("sync", 2, progress={"percent": 60}, status="running", node_ids=(1, 2))
+        chunk = await gen.__anext__()
+        keepalive = await gen.__anext__()
+        await gen.aclose()
+        return head, chunk, keepalive
+
+    head, chunk, keepalive = asyncio.run(_run())
+    assert head.startswith("retry:")
+    assert chunk.startswith("id: ") and "event: job" in chunk
+    assert '"job_id": 1' in chunk and '"job_id": 2' not in chunk
+    assert keepalive == ": keepalive\n\n"
+
+
+def test_active_endpoint_respects_allowed_nodes(client, db, operator_user, sample_sync_job, monkeypatch):
+    bus = JobProgressBus()
+    monkeypatch.setattr(events_router, "job_events", bus)
+    monkeypatch.setattr(events_router, "SessionLocal", sessionmaker(bind=db.get_bind()))
+    source_id, dest_id = sample_sync_job.source_node_id, sample_sync_job.dest_node_id
+    operator_user.allowed_nodes = [source_id]
+    db.commit()
+    token = auth_service.create_access_token(data={
+        "sub": str(operator_user.id), "username": operator_user.username,
+        "role": operator_user.role, "auth_method": operator_user.auth_method,
+    })
+
+    bus.publish("sync", sample_sync_job.id, status="running", node_ids=(source_id, dest_id))
+    bus.publish("vm_snapshot", 4, progress={"status": "running"}, node_ids=(source_id,))
+    bus.publish("nas_sync", 9, progress={"status": "running"})
+
+    r = client.get("/api/events/jobs/active", headers={"Authorization": f"Bearer {token}"})
+    assert r.status_code == 200
+    assert [(e["kind"], e["job_id"]) for e in r.json()] == [("vm_snapshot", 4), ("nas_sync", 9)]
+
+    # Nodo creato dopo l'apertura del filtro: il filtro si ricarica
+    node_filter = events_router._NodeFilter(operator_user)
+    late = Node(name="late", hostname="10.9.9.9", ssh_port=22, ssh_user="root")
+    db.add(late)
+    db.commit()
+    operator_user.allowed_nodes = [source_id, late.id]
+    assert node_filter.visible(bus.publish("vm_snapshot", 5, status="running", node_ids=(late.id,)))
+    assert client.get("/api/events/jobs").status_code == 401
@@ -0,0 +1,116 @@
+"""Test output JobLog append-only (job_log_chunks): append, stitching, tail/range."""
+
+from database import JobLog, JobLogChunk
+from services.job_log_output import (
+    append_output,
+    full_output,
+    full_outputs,
+    last_chunk_text,
+    read_output,
+)
+
+
+def _log(db, output=None):
+    log = JobLog(job_type="sync", job_id=1, status="started", output=output)
+    db.add(log)
+    db.commit()
+    return log
+
+
+def test_append_is_insert_only_and_stitches(db):
+    log = _log(db, output="[00:00:00] Job avviato\n")
+    append_output(db, log.id, "[00:00:30] Avanzamento: 10%")
+    append_output(db, log.id, "[00:01:00] Avanzamento: 20%")
+
+    db.refresh(log)
+    # La colonna output non viene riscritta
+    assert log.output == "[00:00:00] Job avviato\n"
+    seqs = [c.seq for c in db.query(JobLogChunk).filter(JobLogChunk.log_id == log.id).order_by(JobLogChunk.seq)]
+    assert seqs == [1, 2]
+    assert full_output(db, log) == (
+        "[00:00:00] Job avviato\n"
+        "[00:00:30] Avanzamento: 10%\n"
+        "[00:01:00] Avanzamento: 20%\n"
+    )
+    assert last_chunk_text(db, log.id) == "[00:01:00] Avanzamento: 20%\n"
+
+
+def test_legacy_output_without_chunks(db):
+    log = _log(db, output="vecchio output")
+    assert full_output(db, log) == "vecchio output\n"
+    assert read_output(db, log)["last_seq"] == 0
+
+
+def test_full_outputs_batch(db):
+    a = _log(db, output="a")
+    b = _log(db)
+    append_output(db, b.id, "b1")
+    append_output(db, a.id, "a1")
+    out = full_outputs(db, [a, b])
+    assert out == {a.id: "a\na1\n", b.id: "b1\n"}
+
+
+def test_read_tail_and_range(db):
+    log = _log(db, output="HEAD\n")
+    for i in range(5):
+        append_output(db, log.id, f"line{i}")
+    full = full_output(db, log)
+
+    tail = read_output(db, log, tail=12)
+    assert tail["text"] == full[-12:]
+    assert tail["offset"] == len(full) - 12
+    assert tail["size"] == len(full)
+    assert tail["last_seq"] == 5
+
+    part = read_output(db, log, offset=3, limit=10)
+    assert part["text"] == full[3:13]
+    assert part["offset"] == 3
+
+    beyond = read_output(db, log, offset=len(full) + 10, limit=5)
+    assert beyond["text"] == ""
+    assert beyond["offset"] == len(full)
+
+
+def test_read_after_seq_follows_new_chunks(db):
+    log = _log(db, output="HEAD\n")
+    append_output(db, log.id, "uno")
+    first = read_output(db, log, after_seq=0)
+    assert first["text"] == "HEAD\nuno\n"
+
+    append_output(db, log.id, "due")
+    nxt = read_output(db, log, after_seq=first["last_seq"])
+    assert nxt["text"] == "due\n"
+    assert nxt["last_seq"] == 2
+    assert nxt["offset"] == len("HEAD\nuno\n")
+
+
+def test_log_endpoints_tail(client, db, auth_headers):
+    log = _log(db, output="HEAD\n")
+    append_output(db, log.id, "progress 50%")
+
+    r = client.get(f"/api/logs/{log.id}?tail=5", headers=auth_headers)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["output"] == " 50%\n"
+    assert body["output_size"] == len("HEAD\nprogress 50%\n")
+
+    r = client.get(f"/api/logs/{log.id}/output?after_seq=1", headers=auth_headers)
+    assert r.status_code == 200
+    assert r.json()["text"] == ""
+
+
+def test_recent_failures_and_history_return_full_output(client, db, auth_headers):
+    log = _log(db, output="HEAD\n")
+    append_output(db, log.id, "errore syncoid")
+    log.status = "failed"
+    db.commit()
+    full = "HEAD\nerrore syncoid\n"
+
+    r = client.get("/api/logs/recent/failed", headers=auth_headers)
+    assert r.status_code == 200
+    (body,) = r.json()
+    assert body["id"] == log.id and body["output"] == full
+
+    r = client.get(f"/api/logs/job/{log.job_id}/history", headers=auth_headers)
+    assert r.status_code == 200
+    assert [item["output"] for item in r.json()] == [full]
@@ -0,0 +1,84 @@
+"""Test rollup orari/giornalieri dei JobLog (aggiornati al flush, ricostruibili in SQL)."""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base, JobLog, JobLogRollup
+from services.job_log_rollup import install_listeners, rebuild_rollups, window_totals
+
+
+def _session():
+    install_listeners()
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def _rollups(db, period):
+    return {
+        (r.job_type, r.bucket_start): (r.runs, r.success, r.failed, r.duration_sum, r.transferred_bytes)
+        for r in db.scalars(select(JobLogRollup).where(JobLogRollup.period == period))
+    }
+
+
+def test_flush_maintains_buckets_and_transferred_bytes():
+    db = _session()
+    at = datetime(2026, 3, 10, 14, 25)
+    log = JobLog(job_type="sync", job_id=1, status="running", started_at=at)
+    db.add_all([
+        log,
+        JobLog(job_type="sync", job_id=2, status="failed", duration=5, started_at=at + timedelta(minutes=10)),
+    ])
+    db.commit()
+    # Il log in corso non è ancora nel bucket
+    assert _rollups(db, "hour") == {("sync", datetime(2026, 3, 10, 14)): (1, 0, 1, 5, 0)}
+
+    log.status = "success"
+    log.duration = 30
+    log.transferred = "1.5 GiB"
+    db.commit()
+    assert log.transferred_bytes == int(1.5 * 1024 ** 3)
+    assert _rollups(db, "hour")[("sync", datetime(2026, 3, 10, 14))] == (2, 1, 1, 35, log.transferred_bytes)
+    assert _rollups(db, "day") == {("sync", datetime(2026, 3, 10)): (2, 1, 1, 35, log.transferred_bytes)}
+
+    # Correzione di stato successiva: bucket ricalcolato, non sommato due volte
+    log.status = "failed"
+    db.commit()
+    assert _rollups(db, "day")[("sync", datetime(2026, 3, 10))][:3] == (2, 0, 2)
+
+    db.delete(log)
+    db.commit()
+    assert _rollups(db, "day")[("sync", datetime(2026, 3, 10))] == (1, 0, 1, 5, 0)
+
+
+def test_rebuild_matches_listener_and_window_composition():
+    db = _session()
+    now = datetime(2026, 3, 20, 9, 30)
+    db.add_all([
+        JobLog(job_type="backup", status="success", duration=10, transferred="2G", started_at=now - timedelta(days=d, hours=h))
+        for d in range(0, 10) for h in (0, 5)
+    ])
+    db.commit()
+    expected_hours = _rollups(db, "hour")
+    expected_days = _rollups(db, "day")
+
+    conn = db.connection()
+    conn.exec_driver_sql("UPDATE job_logs SET transferred_bytes = NULL")
+    assert rebuild_rollups(conn) == len(expected_hours)
+    db.commit()
+    assert _rollups(db, "hour") == expected_hours
+    assert _rollups(db, "day") == expected_days
+
+    # Finestra di 3 giorni: 2 ore di bordo il giorno d'inizio, 2 giorni
+    # interi dai rollup giornalieri, le ore di oggi dagli orari
+    totals = db.execute(window_totals(now - timedelta(days=3), now)).one()
+    in_window = [
+        l for l in db.scalars(select(JobLog))
+        if l.started_at >= (now - timedelta(days=3)).replace(minute=0)
+    ]
+    assert totals.runs == len(in_window) == 7
+    assert totals.transferred_bytes == 7 * 2 * 1024 ** 3
+    assert db.execute(window_totals(now - timedelta(days=3), now, job_type="sync")).one().runs == 0
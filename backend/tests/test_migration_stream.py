@@ -0,0 +1,92 @@
+"""Test copia VM in streaming (vzdump --stdout in pipe SSH verso il restore)."""
+
+import asyncio
+import shlex
+
+from services import migration_service as migration_module
+from services.migration_service import MigrationService, build_stream_command, parse_config_disk_bytes
+from services.ssh_service import SSHResult
+
+QM_CONFIG = """boot: order=scsi0
+ide2: local:iso/debian.iso,media=cdrom,size=600M
+scsi0: local-zfs:vm-100-disk-0,iothread=1,size=32G
+scsi1: local-zfs:vm-100-disk-1,size=512M
+efidisk0: local-zfs:vm-100-disk-2,efitype=4m,size=1M
+"""
+
+
+class _FakeSSH:
+    def __init__(self, tools=("pv", "zstd", "mbuffer"), stream_results=None):
+        self.tools = tools
+        self.stream_results = list(stream_results or [])
+        self.streamed = []
+
+    async def execute(self, hostname, command, **kw):
+        if command.startswith("command -v"):
+            return SSHResult(True, "\n".join(self.tools) + "\n", "", 0)
+        if " config " in command:
+            return SSHResult(True, QM_CONFIG, "", 0)
+        return SSHResult(True, "", "", 0)
+
+    async def execute_streaming(self, hostname, command, on_line, **kw):
+        self.streamed.append(command)
+        lines, result = self.stream_results.pop(0)
+        for stream, line in lines:
+            on_line(stream, line)
+        return result
+
+
+def test_parse_config_disk_bytes_skips_cdrom():
+    assert parse_config_disk_bytes(QM_CONFIG) == 32 * 1024 ** 3 + 512 * 1024 ** 2 + 1024 ** 2
+    assert parse_config_disk_bytes("rootfs: local-zfs:subvol-101-disk-0,size=8G\nmp0: tank:subvol-101-disk-1,mp=/data,size=2T") == (
+        8 * 1024 ** 3 + 2 * 1024 ** 4
+    )
+
+
+def test_build_stream_command_pipeline():
+    cmd = build_stream_command(
+        100, "qemu", "snapshot", 200, "local-zfs", "pve2", 2222, "root", "/root/.ssh/id_rsa",
+        compress_level=3, mbuffer_size="256M", with_pv=True,
+    )
+    inner = shlex.split(cmd)[-1]
+    assert inner.startswith(
+        "vzdump 100 --stdout --mode snapshot | pv -f -n -b -i 2 | zstd -q -T0 -3 | mbuffer -q -m 256M | ssh "
+    )
+    assert "-p 2222 root@pve2" in inner
+    remote = shlex.split(inner)[-1]
+    assert remote == "set -o pipefail; mbuffer -q -m 256M | zstd -q -d | qmrestore - 200 --storage local-zfs"
+
+    lxc = shlex.split(build_stream_command(101, "lxc", "stop", 101, "tank", "pve2", 22, "root", "/k"))[-1]
+    assert "| pv " not in lxc and "zstd" not in lxc
+    assert shlex.split(lxc)[-1] == "set -o pipefail; pct restore 101 - --storage tank"
+
+
+def test_stream_reports_bytes_and_retries_only_before_data(monkeypatch):
+    fake = _FakeSSH(stream_results=[
+        ([("stderr", "ERROR: snapshot feature is not available")], SSHResult(False, "", "snapshot feature is not available", 255)),
+        ([("stderr", "INFO: starting new backup job"), ("stderr", "1073741824"), ("stderr", "4294967296")],
+         SSHResult(True, "", "", 0)),
+    ])
+    monkeypatch.setattr(migration_module, "ssh_service", fake)
+    events = []
+
+    result = asyncio.run(MigrationService()._stream_vzdump_restore(
+        "pve1", "pve2", 100, "qemu", 100, "local-zfs",
+        compress_level=3, mbuffer_size="128M", progress_callback=events.append,
+    ))
+    assert result == {"success": True, "mode": "suspend", "bytes": 4294967296}
+    assert "--mode snapshot" in fake.streamed[0] and "--mode suspend" in fake.streamed[1]
+    assert [e["bytes"] for e in events] == [1073741824, 4294967296]
+    assert events[-1]["mode"] == "suspend" and 0 < events[-1]["percent"] < 99
+
+    # Errore dopo che i dati sono passati: niente nuovo tentativo
+    fake = _FakeSSH(tools=("pv",), stream_results=[
+        ([("stderr", "1048576"), ("stderr", "ERROR: network error")], SSHResult(False, "", "network error", 1)),
+    ])
+    monkeypatch.setattr(migration_module, "ssh_service", fake)
+    result = asyncio.run(MigrationService()._stream_vzdump_restore(
+        "pve1", "pve2", 100, "qemu", 100, "local-zfs", compress_level=3, mbuffer_size="128M",
+    ))
+    assert not result["success"] and result["phase"] == "stream" and len(fake.streamed) == 1
+    # zstd/mbuffer assenti sulla destinazione: pipe senza compressione né buffer
+    assert "zstd" not in fake.streamed[0] and "mbuffer" not in fake.streamed[0]
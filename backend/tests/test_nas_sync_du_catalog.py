@@ -29,3 +29,128 @@ def test_parse_du_output_ignores_malformed_lines():
     folders, total = parse_du_output("garbage\n123\n", "/volume1/X/", "/X")
     assert folders == []
     assert total == 0
+
+
+def test_parse_probe_output_signatures_and_loose_files():
+    from services.nas_sync.du_catalog import parse_probe_output
+
+    text = (
+        "d\t1700000000.5\t4096\tProgetti\0"
+        "f\t1700000500.0\t10\tProgetti/a.txt\0"
+        "d\t1700000100.0\t4096\tProgetti/2024\0"
+        "d\t1600000000.0\t4096\tArchivio\0"
+        "f\t1700000000.0\t300\tleggimi.txt\0"
+        "garbage\0"
+    )
+    folders, loose = parse_probe_output(text, "/Condivisa")
+    assert loose == 300
+    assert folders == {
+        "/Condivisa/Archivio": {"name": "Archivio", "mtime": 1600000000, "entries": 0},
+        "/Condivisa/Progetti": {"name": "Progetti", "mtime": 1700000500, "entries": 2},
+    }
+
+
+def _catalog_job(monkeypatch):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    from database import Base, FileEndpoint, FileEndpointType
+    from services.nas_sync import du_catalog
+    from services.nas_sync.models import NasSyncJob
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    TestSession = sessionmaker(bind=engine)
+    monkeypatch.setattr(du_catalog, "SessionLocal", TestSession)
+    db = TestSession()
+    src = FileEndpoint(name="s", endpoint_type=FileEndpointType.SYNOLOGY, host="1", port=22,
+                       protocol="ssh", username="u", password_enc="", extra_config={})
+    db.add(src)
+    db.commit()
+    job = NasSyncJob(name="j", source_endpoint_id=src.id, dest_endpoint_id=src.id,
+                     source_paths=["/Condivisa"], dest_base_path="")
+    db.add(job)
+    db.commit()
+    return db, job
+
+
+def test_incremental_refresh_rescans_only_changed_folders(monkeypatch):
+    import asyncio
+
+    from services.nas_sync import du_catalog
+    from services.nas_sync.models import NasSyncJob
+
+    db, job = _catalog_job(monkeypatch)
+
+    probe = {"A": "d\t100\t0\tA\0", "B": "d\t200\t0\tB\0f\t5\t7\tloose\0"}
+    scripts = []
+
+    async def fake_remote(argv, env, script, timeout=3600):
+        scripts.append(script)
+        if script.startswith("find") and "-printf" in script:
+            return 0, "".join(probe.values())
+        root = "/volume1/Condivisa"
+        sizes = {"A": 1000, "B": 2000}
+        names = [n for n in sizes if f"{root}/{n}" in script] or list(sizes)
+        return 0, "".join(f"{sizes[n]}\t{root}/{n}\n" for n in names)
+
+    monkeypatch.setattr(du_catalog, "_run_remote", fake_remote)
+
+    asyncio.run(du_catalog.refresh_job_du_catalog(job.id))
+    db.expire_all()
+    entry = db.query(NasSyncJob).get(job.id).run_state["catalog"]["/Condivisa"]
+    assert entry["total_bytes"] == 3007 and entry["loose_bytes"] == 7 and entry["full_at"]
+    assert len(scripts) == 2 and "find '/volume1/Condivisa' -mindepth 1 -maxdepth 1" in scripts[1]
+
+    # Cambia solo B (nuovo figlio): du solo su B, A riusata dal catalogo
+    probe["B"] = "d\t300\t0\tB\0d\t300\t0\tB/new\0f\t5\t7\tloose\0"
+    scripts.clear()
+    asyncio.run(du_catalog.refresh_job_du_catalog(job.id))
+    assert len(scripts) == 2 and "/volume1/Condivisa/B" in scripts[1]
+    assert "/volume1/Condivisa/A" not in scripts[1]
+    db.expire_all()
+    folders = {f["name"]: f for f in db.query(NasSyncJob).get(job.id).run_state["catalog"]["/Condivisa"]["folders"]}
+    assert folders["B"]["entries"] == 1 and folders["A"]["bytes"] == 1000
+
+    # Nulla cambiato: solo la sonda
+    scripts.clear()
+    asyncio.run(du_catalog.refresh_job_du_catalog(job.id))
+    assert len(scripts) == 1
+    db.close()
+
+
+def test_probe_failure_falls_back_to_full_du_and_keeps_catalog(monkeypatch):
+    """find senza -printf (busybox): du completo per cartella; se anche du
+    non restituisce nulla il catalogo precedente non viene azzerato."""
+    import asyncio
+
+    from services.nas_sync import du_catalog
+    from services.nas_sync.models import NasSyncJob
+
+    db, job = _catalog_job(monkeypatch)
+    du_out = {"text": "1000\t/volume1/Condivisa/A\n2000\t/volume1/Condivisa/B\n"}
+    scripts = []
+
+    async def fake_remote(argv, env, script, timeout=3600):
+        scripts.append(script)
+        if "-printf" in script:
+            return 1, ""  # find: unrecognized: -printf
+        return 0, du_out["text"]
+
+    monkeypatch.setattr(du_catalog, "_run_remote", fake_remote)
+
+    asyncio.run(du_catalog.refresh_job_du_catalog(job.id))
+    assert len(scripts) == 2 and "-maxdepth 1" in scripts[1]
+    db.expire_all()
+    entry = db.query(NasSyncJob).get(job.id).run_state["catalog"]["/Condivisa"]
+    assert entry["total_bytes"] == 3000
+    assert {f["name"]: f["bytes"] for f in entry["folders"]} == {"A": 1000, "B": 2000}
+
+    du_out["text"] = ""
+    asyncio.run(du_catalog.refresh_job_du_catalog(job.id))
+    assert du_catalog.get_catalog_progress(job.id)["status"] == "failed"
+    db.expire_all()
+    entry = db.query(NasSyncJob).get(job.id).run_state["catalog"]["/Condivisa"]
+    assert entry["total_bytes"] == 3000 and len(entry["folders"]) == 2
+    db.close()
@@ -134,3 +134,81 @@ def test_build_steps_without_catalog_is_single_root(db_session):
     assert len(steps) == 1
     assert steps[0]["src_path"] == "/Condivisa/docs"
     assert "exclude_dirs" not in steps[0]
+
+
+def _catalog_job(db, job_id, workers):
+    from services.nas_sync.state import assign_run_state, set_du_catalog
+
+    job = db.query(NasSyncJob).get(job_id)
+    job.parallel_workers = workers
+    folders = [
+        {"path": f"/Condivisa/docs/{name}", "name": name, "bytes": size}
+        for name, size in (("a", 10), ("b", 400), ("c", 30), ("d", 200))
+    ]
+    assign_run_state(job, set_du_catalog({}, "/Condivisa/docs", folders, 1000, None, "t"))
+    db.commit()
+    return job
+
+
+def test_parallel_steps_largest_first_with_aggregated_progress(db_session):
+    from services.nas_sync.events import SyncEvent
+
+    db, TestSession, job_id = db_session
+    job = _catalog_job(db, job_id, workers=2)
+    steps = execution._build_steps(job, job.run_state)
+    # file sciolti stimati 1000 - 640 = 360 byte
+    assert [s["folder_path"] or "loose" for s in steps[1:]] == [
+        "/Condivisa/docs/b", "loose", "/Condivisa/docs/d", "/Condivisa/docs/c", "/Condivisa/docs/a",
+    ]
+
+    running, peak, started, views = set(), [0], [], []
+
+    async def fake_engine(ctx):
+        key = ctx["folder_path"] or ctx["src_path"]
+        started.append(key)
+        running.add(key)
+        peak[0] = max(peak[0], len(running))
+        ctx["on_event"](SyncEvent(phase="copying", files_new=1, bytes_done=100, percent=50))
+        views.append(execution.get_job_progress(job_id))
+        await asyncio.sleep(0.01)
+        running.discard(key)
+        return StepResult(output_lines=["x"], exit_code=0)
+
+    asyncio.run(execution.execute_nas_sync_job(job_id, _engine_runner=fake_engine))
+
+    assert peak[0] == 2
+    assert started[0] == "/Condivisa/docs" and started[1] == "/Condivisa/docs/b"
+    assert any(len(v.get("active_folders") or []) == 2 for v in views)
+    check = TestSession()
+    job = check.query(NasSyncJob).get(job_id)
+    assert job.last_run_status == "success"
+    # 5 step di copia + ensure, 100 byte ciascuno sommati tra i worker
+    assert job.last_bytes_transferred == 600 and job.last_files_transferred == 6
+    check.close()
+
+
+def test_parallel_failure_stops_other_workers(db_session):
+    db, TestSession, job_id = db_session
+    _catalog_job(db, job_id, workers=3)
+    started = []
+
+    async def fake_engine(ctx):
+        started.append(ctx["folder_path"])
+        if ctx["folder_path"] == "/Condivisa/docs/d":
+            raise RuntimeError("boom rete")
+        await asyncio.sleep(0.05)
+        # Gli altri worker vedono l'errore e escono come un rsync interrotto
+        if "/Condivisa/docs/d" in started:
+            raise EngineCancelled("stop")
+        return StepResult(exit_code=0)
+
+    asyncio.run(execution.execute_nas_sync_job(job_id, _engine_runner=fake_engine))
+
+    check = TestSession()
+    job = check.query(NasSyncJob).get(job_id)
+    assert job.last_run_status == "failed"
+    log = check.query(JobLog).filter(JobLog.job_type == "nas_sync").first()
+    assert log.status == "failed" and "boom rete" in log.error
+    # Nessuno step nuovo dopo l'errore: a e c non partono
+    assert "/Condivisa/docs/a" not in started and "/Condivisa/docs/c" not in started
+    check.close()
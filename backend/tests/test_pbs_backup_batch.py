@@ -0,0 +1,143 @@
+"""Test backup PBS in batch (un vzdump per più guest dello stesso nodo)."""
+
+import asyncio
+from types import SimpleNamespace
+
+import services.scheduler as scheduler
+from services import pbs_service as pbs_module
+from services.pbs_service import PBSService, VzdumpBatchParser
+from services.scheduler import SchedulerService
+from services.ssh_service import SSHResult
+
+VZDUMP_LOG = """INFO: starting new backup job: vzdump 100 101 102 --mode snapshot
+INFO: Starting Backup of VM 100 (qemu)
+INFO: creating Proxmox Backup Server archive 'vm/100/2026-10-17T01:00:02Z'
+INFO:  42% (4.2 GiB of 10.0 GiB) in 3s, read: 1.4 GiB/s, write: 100 MiB/s
+INFO: transferred 10.00 GiB in 30 seconds (341.3 MiB/s)
+INFO: Finished Backup of VM 100 (00:00:31)
+INFO: Starting Backup of VM 101 (lxc)
+INFO: creating Proxmox Backup Server archive 'ct/101/2026-10-17T01:00:33Z'
+ERROR: Backup of VM 101 failed - command 'lxc-freeze' failed
+INFO: Backup job finished with errors"""
+
+
+class _FakeSSH:
+    def __init__(self):
+        self.commands = []
+        self.streamed = []
+
+    async def execute(self, hostname, command, **kw):
+        self.commands.append(command)
+        return SSHResult(True, "", "", 0)
+
+    async def execute_streaming(self, hostname, command, on_line, **kw):
+        self.streamed.append(command)
+        for line in VZDUMP_LOG.splitlines():
+            on_line("stdout", line)
+        return SSHResult(False, VZDUMP_LOG, "job errors", 255)
+
+
+def test_parser_tracks_each_guest():
+    parser = VzdumpBatchParser([100, 101, 102])
+    changed = [parser.feed(line) for line in VZDUMP_LOG.splitlines()]
+    assert changed.count(100) == 3  # start, percent, finish
+    results = parser.finalize("job errors")
+    assert results[100]["status"] == "success" and results[100]["backup_id"] == "vm/100/2026-10-17T01:00:02Z"
+    assert results[100]["transferred_bytes"] == 10 * 1024 ** 3
+    assert results[101]["status"] == "failed" and "lxc-freeze" in results[101]["error"]
+    assert results[102]["status"] == "failed" and results[102]["error"] == "job errors"
+
+
+def test_run_backup_batch_checks_storage_once(monkeypatch):
+    fake = _FakeSSH()
+    monkeypatch.setattr(pbs_module, "ssh_service", fake)
+    progress = []
+
+    result = asyncio.run(PBSService().run_backup_batch(
+        "pve1", [100, 101, 102, 100], "pbs1", "store1", pbs_storage_id="pbs-store1",
+        bwlimit_kb=50000, progress_callback=lambda vm_id, e: progress.append((vm_id, e["status"], e["percent"])),
+    ))
+    assert len(fake.commands) == 1 and "pvesm status" in fake.commands[0]
+    assert fake.streamed == [
+        "vzdump 100 101 102 --mode snapshot --compress zstd --storage pbs-store1 --remove 0 --bwlimit 50000"
+    ]
+    assert not result["success"]
+    assert result["results"][100]["success"] and result["results"][100]["backup_id"].startswith("vm/100/")
+    assert not result["results"][101]["success"] and not result["results"][102]["success"]
+    assert progress[:3] == [(100, "running", 0), (100, "running", 42), (100, "success", 100)]
+
+    bad = asyncio.run(PBSService().run_backup_batch("pve1", [100, 5], "pbs1", "store1"))
+    assert not bad["success"] and set(bad["results"]) == {100, 5} and len(fake.streamed) == 1
+
+
+def test_scheduler_coalesces_compatible_backup_fires(monkeypatch):
+    monkeypatch.setattr(scheduler, "_PBS_BATCH_WINDOW_SEC", 0.05)
+    monkeypatch.setattr(scheduler, "_PBS_BATCH_MAX_VMS", 3)
+    svc = SchedulerService()
+    batches = []
+
+    async def _fake_batch(job_ids):
+        batches.append(sorted(job_ids))
+
+    monkeypatch.setattr(svc, "_execute_backup_pbs_batch", _fake_batch)
+
+    def _job(job_id, node=1, mode="snapshot"):
+        return SimpleNamespace(
+            id=job_id, source_node_id=node, pbs_node_id=9, pbs_storage_id="pbs", backup_mode=mode,
+            backup_compress="zstd", bandwidth_limit=None, include_all_disks=True,
+        )
+
+    async def _run():
+        jobs = [_job(1), _job(2), _job(3, node=2), _job(4, mode="stop"), _job(5), _job(6), _job(7)]
+        for job in jobs:
+            key = f"backup_pbs_{job.id}"
+            assert svc._try_lock(key)
+            svc._queue_backup_pbs(key, job, [f"node:{job.source_node_id}"])
+        await asyncio.sleep(0.2)
+
+    asyncio.run(_run())
+    # 1, 2, 5 riempiono il batch (max 3), 6 e 7 partono a fine finestra
+    assert sorted(batches) == [[1, 2, 5], [3], [4], [6, 7]]
+    assert not svc._running_jobs and not svc._backup_batches
+
+
+def test_batch_task_records_each_job(db, monkeypatch):
+    import database
+    import routers.backup_jobs as backup_router
+    from database import BackupJob, JobLog, Node
+    from sqlalchemy.orm import sessionmaker
+
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=db.get_bind()))
+    src = Node(name="pve1", hostname="10.0.0.1")
+    pbs = Node(name="pbs1", hostname="10.0.0.9", node_type="pbs", pbs_datastore="store1")
+    db.add_all([src, pbs])
+    db.commit()
+    jobs = [
+        BackupJob(name=f"b{vm}", source_node_id=src.id, vm_id=vm, pbs_node_id=pbs.id, pbs_storage_id="pbs-store1")
+        for vm in (100, 101)
+    ]
+    db.add_all(jobs)
+    db.commit()
+    calls = []
+
+    async def _fake_batch(**kw):
+        calls.append(kw)
+        kw["progress_callback"](100, {"status": "running", "percent": 50})
+        return {"duration": 40, "results": {
+            100: {"success": True, "backup_id": "vm/100/x", "output": "ok", "error": None,
+                  "duration": 30, "transferred_bytes": 1024},
+            101: {"success": False, "backup_id": None, "output": "", "error": "lxc-freeze failed",
+                  "duration": 0, "transferred_bytes": None},
+        }}
+
+    monkeypatch.setattr(pbs_module.pbs_service, "run_backup_batch", _fake_batch)
+    asyncio.run(backup_router.execute_backup_batch_task([j.id for j in jobs]))
+
+    assert len(calls) == 1 and calls[0]["vm_ids"] == [100, 101] and calls[0]["pbs_storage_id"] == "pbs-store1"
+    db.expire_all()
+    ok, failed = db.query(BackupJob).order_by(BackupJob.vm_id).all()
+    assert (ok.last_status, ok.last_backup_id, ok.last_backup_size) == ("success", "vm/100/x", 1024)
+    assert failed.last_status == "failed" and failed.last_error == "lxc-freeze failed"
+    logs = {l.job_id: l.status for l in db.query(JobLog).filter(JobLog.job_type == "backup")}
+    assert logs == {ok.id: "success", failed.id: "failed"}
+    assert 100 not in backup_router._progress and ok.id not in backup_router._progress
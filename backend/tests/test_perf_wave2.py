@@ -9,13 +9,13 @@ from sqlalchemy import create_engine, inspect
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
-from database import Base, JobLog, get_db
+from database import Base, JobLog, get_async_db, get_db
 from routers import logs as logs_router
 from routers.auth import get_current_user
 
 
 @pytest.fixture()
-def client():
+def client(async_db_for):
     engine = create_engine(
         "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
     )
@@ -49,6 +49,7 @@ def client():
             s.close()
 
     app.dependency_overrides[get_db] = _fake_db
+    app.dependency_overrides[get_async_db] = async_db_for(engine)
     app.dependency_overrides[get_current_user] = lambda: object()
     return TestClient(app)
 
@@ -116,7 +117,7 @@ def test_ssh_pool_close_all_thread_safe():
     assert svc._connections == {}
 
 
-def test_logs_filtered_by_allowed_nodes():
+def test_logs_filtered_by_allowed_nodes(async_db_for):
     """S-14: utente non-admin con allowed_nodes vede solo i log dei propri nodi."""
     from fastapi import FastAPI
     from fastapi.testclient import TestClient
@@ -124,7 +125,7 @@ def test_logs_filtered_by_allowed_nodes():
     from sqlalchemy.orm import sessionmaker
     from sqlalchemy.pool import StaticPool
     from datetime import datetime
-    from database import Base, JobLog, Node, get_db
+    from database import Base, JobLog, Node, get_async_db, get_db
     from routers import logs as logs_router
     from routers.auth import get_current_user
 
@@ -154,6 +155,7 @@ def test_logs_filtered_by_allowed_nodes():
         try: yield s
         finally: s.close()
     app.dependency_overrides[get_db] = _fake_db
+    app.dependency_overrides[get_async_db] = async_db_for(engine)
     app.dependency_overrides[get_current_user] = lambda: _RestrictedUser()
     c = TestClient(app)
     r = c.get("/api/logs/")
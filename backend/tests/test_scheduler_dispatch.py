@@ -0,0 +1,140 @@
+"""Test dispatcher event-driven dello scheduler (coda next-fire, hook, wake)."""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import services.scheduler as scheduler
+from database import Base, Node, SyncJob
+from services.scheduler import SchedulerService
+
+
+@pytest.fixture()
+def sync_job(monkeypatch):
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    TestSession = sessionmaker(bind=engine)
+    monkeypatch.setattr(scheduler, "SessionLocal", TestSession)
+    db = TestSession()
+    src = Node(name="src", hostname="10.0.0.1")
+    dst = Node(name="dst", hostname="10.0.0.2")
+    db.add_all([src, dst])
+    db.commit()
+    job = SyncJob(name="j", source_node_id=src.id, source_dataset="rpool/a",
+                  dest_node_id=dst.id, dest_dataset="rpool/b", schedule="0 */4 * * *")
+    db.add(job)
+    db.commit()
+    yield db, job
+    db.close()
+
+
+def test_hooks_maintain_heap_and_registry():
+    svc = SchedulerService()
+    svc.update_backup_pbs_schedule(1, "0 2 * * *")
+    svc.update_migration_schedule(2, "0 3 * * *")
+    assert set(svc._jobs) == {"backup_pbs_1", "migration_2"}
+    assert svc._schedules["backup_pbs_1"] == "0 2 * * *"
+
+    svc.remove_backup_pbs_schedule(1)
+    svc.update_migration_schedule(2, "")
+    assert svc._jobs == {}
+    # Le voci superate restano nell'heap ma non vengono più considerate
+    assert svc._pop_due(datetime.utcnow() + timedelta(days=3)) == []
+    assert svc._seconds_until_next(datetime.utcnow()) == scheduler._MAX_IDLE_SLEEP_SEC
+
+
+def test_pop_due_only_valid_entries():
+    svc = SchedulerService()
+    now = datetime.utcnow()
+    svc._set_next("nas_sync_1", now - timedelta(seconds=1), "* * * * *")
+    svc._set_next("nas_sync_2", now + timedelta(hours=1), "0 * * * *")
+    # Riprogrammazione: la vecchia voce di nas_sync_1 diventa stantia
+    svc._set_next("nas_sync_1", now + timedelta(minutes=5))
+
+    assert svc._pop_due(now) == []
+    assert 299 <= svc._seconds_until_next(now) <= 300
+    assert svc._pop_due(now + timedelta(minutes=6)) == ["nas_sync_1"]
+    assert "nas_sync_1" not in svc._jobs
+
+
+def test_split_job_key_longest_prefix():
+    kinds = scheduler._job_kinds()
+    assert scheduler._split_job_key("nas_sync_12", kinds) == ("nas_sync", "12")
+    assert scheduler._split_job_key("sync_3", kinds) == ("sync", "3")
+    assert scheduler._split_job_key("vmgroup_ab_cd", kinds) == ("vmgroup", "ab_cd")
+    assert scheduler._split_job_key("boh_1", kinds) == (None, "boh_1")
+
+
+def test_resync_and_fire_sync_job(sync_job, monkeypatch):
+    _, sample_sync_job = sync_job
+    svc = SchedulerService()
+    fired = []
+
+    async def _fake_exec(key, job_id, resources=None, label=None):
+        if "pool:1:rpool" in resources and "node:2" in resources:
+            fired.append((key, job_id))
+        svc._unlock(key)
+
+    monkeypatch.setattr(svc, "_guarded_execute_sync_job", _fake_exec)
+    key = f"sync_{sample_sync_job.id}"
+
+    async def _run():
+        svc._resync_schedule()
+        assert key in svc._jobs
+        # Forza lo slot a scaduto e lascia girare il dispatcher
+        svc._set_next(key, datetime.utcnow() - timedelta(seconds=1))
+        svc._dispatch_due()
+        await asyncio.sleep(0)
+        return svc._jobs[key]
+
+    next_run = asyncio.run(_run())
+    assert fired == [(key, sample_sync_job.id)]
+    assert next_run > datetime.utcnow()
+
+
+def test_fire_busy_job_retries_later(sync_job):
+    db, sample_sync_job = sync_job
+    sample_sync_job.last_status = "running"
+    db.commit()
+    svc = SchedulerService()
+    key = f"sync_{sample_sync_job.id}"
+    now = datetime.utcnow()
+    svc._set_next(key, now - timedelta(seconds=1), sample_sync_job.schedule)
+
+    svc._dispatch_due()
+    retry = svc._jobs[key]
+    assert timedelta(seconds=50) < retry - now <= timedelta(seconds=scheduler._BUSY_RETRY_SEC + 5)
+
+
+def test_fire_drops_inactive_job(sync_job):
+    db, sample_sync_job = sync_job
+    sample_sync_job.is_active = False
+    db.commit()
+    svc = SchedulerService()
+    key = f"sync_{sample_sync_job.id}"
+    svc._set_next(key, datetime.utcnow() - timedelta(seconds=1), sample_sync_job.schedule)
+
+    svc._dispatch_due()
+    assert key not in svc._jobs
+
+
+def test_hook_wakes_sleeping_loop():
+    svc = SchedulerService()
+
+    async def _run():
+        svc._loop = asyncio.get_running_loop()
+        svc._wake = asyncio.Event()
+        waiter = asyncio.create_task(svc._wake.wait())
+        await asyncio.sleep(0)
+        # Hook chiamato da un thread (endpoint sync nel threadpool)
+        await asyncio.to_thread(svc.update_nas_sync_schedule, 5, "*/5 * * * *")
+        await asyncio.wait_for(waiter, timeout=1)
+        return True
+
+    assert asyncio.run(_run())
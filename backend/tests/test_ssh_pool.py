@@ -0,0 +1,150 @@
+"""Test del pool SSH multiplexato (transport per host, gate canali, metriche)."""
+
+import asyncio
+import time
+
+from services.ssh_service import SSHService
+
+
+class _FakeChannel:
+    def __init__(self, delay):
+        self._delay = delay
+
+    def recv_exit_status(self):
+        time.sleep(self._delay)
+        return 0
+
+
+class _FakeStream:
+    def __init__(self, data=b"", delay=0.0):
+        self._data = data
+        self.channel = _FakeChannel(delay)
+
+    def read(self):
+        return self._data
+
+
+class _FakeTransport:
+    def __init__(self, client):
+        self._client = client
+
+    def is_active(self):
+        return not self._client.closed
+
+
+class _FakeClient:
+    def __init__(self, delay):
+        self.closed = False
+        self._delay = delay
+
+    def get_transport(self):
+        return _FakeTransport(self)
+
+    def exec_command(self, command, timeout=None):
+        return None, _FakeStream(b"ok\n", self._delay), _FakeStream(b"")
+
+    def close(self):
+        self.closed = True
+
+
+def _make_service(monkeypatch, delay=0.05, **kwargs):
+    svc = SSHService(**kwargs)
+    tracker = {"connects": 0}
+
+    def _new_client(hostname, port, username, key_path):
+        tracker["connects"] += 1
+        return _FakeClient(delay)
+
+    monkeypatch.setattr(svc, "_new_client", _new_client)
+    return svc, tracker
+
+
+def test_pool_limits_channels_per_host(monkeypatch):
+    svc, _ = _make_service(
+        monkeypatch, delay=0.05,
+        max_transports_per_host=2, max_channels_per_host=3, executor_workers=16,
+    )
+
+    async def _run():
+        return await asyncio.gather(*[
+            svc.execute("10.0.0.1", "echo ok") for _ in range(9)
+        ])
+
+    results = asyncio.run(_run())
+    assert all(r.success and r.stdout == "ok\n" for r in results)
+
+    stats = svc.get_pool_stats()["hosts"]["root@10.0.0.1:22"]
+    assert stats["acquired_total"] == 9
+    assert stats["active_channels"] == 0
+    assert stats["queue_depth"] == 0
+    # Il gate lascia passare al massimo 3 canali alla volta: con 9 comandi da
+    # 50ms almeno qualcuno ha dovuto attendere in coda.
+    assert stats["channel_wait_max_ms"] >= 40
+    assert 1 <= stats["transports"] <= 2
+    svc.close_all()
+
+
+def test_pool_opens_at_most_n_transports(monkeypatch):
+    svc, tracker = _make_service(
+        monkeypatch, delay=0.05,
+        max_transports_per_host=2, max_channels_per_host=8, executor_workers=16,
+    )
+
+    async def _run():
+        await asyncio.gather(*[svc.execute("10.0.0.2", "true") for _ in range(8)])
+
+    asyncio.run(_run())
+    assert tracker["connects"] == 2
+    assert svc.get_pool_stats()["hosts"]["root@10.0.0.2:22"]["connects"] == 2
+    svc.close_all()
+
+
+def test_hosts_are_isolated(monkeypatch):
+    """Un host saturo non blocca i comandi verso un altro host."""
+    svc, _ = _make_service(
+        monkeypatch, delay=0.2,
+        max_transports_per_host=1, max_channels_per_host=1, executor_workers=8,
+    )
+
+    async def _run():
+        slow = [asyncio.create_task(svc.execute("busy", "sleep")) for _ in range(4)]
+        await asyncio.sleep(0.01)
+        t0 = time.monotonic()
+        await svc.execute("idle", "true")
+        elapsed = time.monotonic() - t0
+        await asyncio.gather(*slow)
+        return elapsed
+
+    elapsed = asyncio.run(_run())
+    assert elapsed < 0.5
+    svc.close_all()
+
+
+def test_evict_idle_closes_unused_transports(monkeypatch):
+    svc, _ = _make_service(monkeypatch, delay=0.0, idle_timeout=60)
+    asyncio.run(svc.execute("10.0.0.3", "true"))
+    pool = svc._connections["root@10.0.0.3:22"]
+    client = pool.clients[0]
+
+    assert svc.evict_idle(now=time.monotonic() + 10) == 0
+    assert svc.evict_idle(now=time.monotonic() + 120) == 1
+    assert client.closed
+    assert pool.clients == []
+    assert svc.get_pool_stats()["hosts"]["root@10.0.0.3:22"]["evicted_idle"] == 1
+    svc.close_all()
+
+
+def test_connect_failure_is_reported(monkeypatch):
+    svc = SSHService()
+
+    def _boom(*a, **kw):
+        raise OSError("connection refused")
+
+    monkeypatch.setattr(svc, "_new_client", _boom)
+    result = asyncio.run(svc.execute("10.0.0.4", "true"))
+    assert not result.success
+    assert "connection refused" in result.stderr
+    stats = svc.get_pool_stats()["hosts"]["root@10.0.0.4:22"]
+    assert stats["connect_failures"] == 1
+    assert stats["transports"] == 0
+    svc.close_all()
@@ -0,0 +1,129 @@
+"""Test aggregatore dello stato live dei job sync (lista senza SSH, ?live=fresh)."""
+
+import asyncio
+
+import routers.sync_jobs as sync_jobs_router
+import services.sync_job_live_state as live_module
+from services.sync_job_live_state import SyncJobLiveAggregator
+
+_PROGRESS = {"percent": 40.0, "source_bytes": 10, "dest_bytes": 4, "label": "4 / 10 (40.0%)"}
+
+
+def _fake_live_state(calls, active=True, delay=0.0, track=None):
+    async def _state(job, source_node, dest_node):
+        calls.append(job.id)
+        if track is not None:
+            track["now"] += 1
+            track["max"] = max(track["max"], track["now"])
+        await asyncio.sleep(delay)
+        if track is not None:
+            track["now"] -= 1
+        return {
+            "is_replicating": active,
+            "transfer_progress": _PROGRESS if active else None,
+            "last_status": "running" if active else job.last_status,
+            "current_status": "running" if active else None,
+        }
+    return _state
+
+
+def test_live_state_uses_snapshot_without_io(db, sample_sync_job, monkeypatch):
+    calls = []
+    monkeypatch.setattr(live_module, "get_sync_job_live_state", _fake_live_state(calls))
+    agg = SyncJobLiveAggregator()
+    sample_sync_job.last_status = "failed"
+    db.commit()
+    nodes = {n.id: n for n in db.query(live_module.Node).all()}
+
+    # Prima del refresh: solo DB, nessuna chiamata ai nodi
+    assert agg.live_state(sample_sync_job)["is_replicating"] is False
+    asyncio.run(agg.refresh([sample_sync_job], nodes))
+    assert calls == [sample_sync_job.id]
+
+    state = agg.live_state(sample_sync_job)
+    assert state["is_replicating"] and state["last_status"] == "running"
+    assert state["transfer_progress"] == _PROGRESS
+    # Il job ha cambiato stato dopo la fotografia: non la si usa più
+    sample_sync_job.last_status = "success"
+    assert agg.live_state(sample_sync_job)["is_replicating"] is False
+    assert calls == [sample_sync_job.id]
+
+
+def test_refresh_is_bounded_and_skips_idle_jobs(db, sample_sync_job, monkeypatch):
+    jobs = []
+    for i in range(6):
+        job = live_module.SyncJob(
+            name=f"j{i}", source_node_id=sample_sync_job.source_node_id,
+            source_dataset=f"rpool/a{i}", dest_node_id=sample_sync_job.dest_node_id,
+            dest_dataset=f"rpool/b{i}", last_status="running" if i < 5 else "success",
+        )
+        db.add(job)
+        jobs.append(job)
+    db.commit()
+    calls, track = [], {"now": 0, "max": 0}
+    monkeypatch.setattr(
+        live_module, "get_sync_job_live_state", _fake_live_state(calls, delay=0.01, track=track)
+    )
+    agg = SyncJobLiveAggregator(concurrency=2)
+    nodes = {n.id: n for n in db.query(live_module.Node).all()}
+
+    asyncio.run(agg.refresh(jobs, nodes))
+    assert sorted(calls) == sorted(j.id for j in jobs[:5])
+    assert track["max"] == 2
+
+
+def test_list_endpoint_answers_from_snapshot(client, db, auth_headers, sample_sync_job, monkeypatch):
+    calls = []
+    monkeypatch.setattr(live_module, "get_sync_job_live_state", _fake_live_state(calls))
+    monkeypatch.setattr(sync_jobs_router, "sync_job_live_aggregator", SyncJobLiveAggregator())
+    sample_sync_job.last_status = "failed"
+    db.commit()
+
+    r = client.get("/api/sync-jobs", headers=auth_headers)
+    assert r.status_code == 200
+    assert calls == [] and r.json()[0]["is_replicating"] is False
+
+    r = client.get("/api/sync-jobs?live=fresh", headers=auth_headers)
+    assert calls == [sample_sync_job.id]
+    body = r.json()[0]
+    assert body["is_replicating"] and body["transfer_progress"]["percent"] == 40.0
+
+    # La fotografia resta valida per le richieste successive
+    r = client.get("/api/sync-jobs", headers=auth_headers)
+    assert r.json()[0]["is_replicating"] and calls == [sample_sync_job.id]
+    assert client.get("/api/sync-jobs?live=stale", headers=auth_headers).status_code == 422
+
+
+def test_group_progress_recomputed_after_run_ends(db, sample_sync_job, monkeypatch):
+    jobs = []
+    for i in range(2):
+        job = live_module.SyncJob(
+            name=f"d{i}", source_node_id=sample_sync_job.source_node_id,
+            source_dataset=f"rpool/vm-1-disk-{i}", dest_node_id=sample_sync_job.dest_node_id,
+            dest_dataset=f"rpool/r{i}", vm_group_id="g1",
+            last_status="success" if i == 0 else "running",
+        )
+        db.add(job)
+        jobs.append(job)
+    db.commit()
+    calls = []
+    monkeypatch.setattr(live_module, "get_sync_job_live_state", _fake_live_state(calls))
+
+    async def _remote_progress(**kw):
+        return {"source_bytes": 10, "dest_bytes": 10}
+
+    monkeypatch.setattr(live_module.syncoid_service, "get_replication_progress", _remote_progress)
+    monkeypatch.setattr(live_module, "run_with_async_session", lambda fn: asyncio.sleep(0, result=fn(db)))
+    agg = SyncJobLiveAggregator()
+
+    asyncio.run(agg.refresh())
+    mid = agg.group_progress("g1")
+    assert mid["disks_done"] == 1 and mid["percent"] == 70.0
+
+    # Fine del run del gruppo: il refresh successivo mostra lo stato concluso
+    jobs[1].last_status = "success"
+    db.commit()
+    monkeypatch.setattr(live_module, "get_sync_job_live_state", _fake_live_state(calls, active=False))
+    asyncio.run(agg.refresh())
+    done = agg.group_progress("g1")
+    assert done["disks_done"] == 2 and done["disks_total"] == 2 and done["percent"] == 100.0
@@ -0,0 +1,169 @@
+"""Test avanzamento syncoid in streaming (parser pv/syncoid, stima send, run_sync)."""
+
+import asyncio
+
+import pytest
+
+from services import syncoid_service as syncoid_module
+from services import zfs_inventory as inventory_module
+from services.ssh_service import SSHResult, _LineSplitter
+from services.syncoid_progress import SyncoidProgressTracker, parse_size, strip_pv_lines
+from services.syncoid_service import SyncoidService
+
+GiB = 1024 ** 3
+
+
+def test_tracker_bytes_rate_and_eta():
+    tr = SyncoidProgressTracker(total_bytes=10 * GiB)
+    assert tr.feed("INFO: Sending incremental rpool/a@s1 ... syncoid_x (~ 9.5 GB):", now=0).percent == 0
+    tr.feed(str(1 * GiB), now=2)
+    ev = tr.feed(str(3 * GiB), now=4)
+    assert ev.bytes_done == 3 * GiB
+    assert ev.percent == 30.0
+    assert ev.rate_bps and ev.rate_bps > 0
+    assert ev.eta_seconds and ev.eta_seconds > 0
+    prog = ev.as_progress()
+    assert prog["dest_bytes"] == 3 * GiB and prog["source_bytes"] == 10 * GiB
+    assert prog["streamed"] and prog["rate_human"].endswith("/s")
+    assert tr.feed("qualcos'altro") is None
+
+
+def test_tracker_segments_and_syncoid_estimates():
+    """Senza stima a priori: totale = somma delle stime (~ X) di syncoid;
+    ogni send riparte da zero e i byte si accumulano."""
+    tr = SyncoidProgressTracker()
+    tr.feed("Sending oldest full snapshot rpool/a@s1 (~ 2.0 GB):", now=0)
+    tr.feed(str(2 * GiB), now=1)
+    tr.feed("Sending incremental rpool/a@s1 ... syncoid_x (~ 2.0 GB):", now=2)
+    ev = tr.feed(str(1 * GiB), now=3)
+    assert ev.bytes_done == 3 * GiB
+    assert ev.bytes_total == 4 * GiB
+    assert ev.percent == 75.0
+
+
+def test_parse_helpers():
+    assert parse_size("4.2", "GB") == int(4.2 * GiB)
+    assert parse_size("512", "KiB") == 512 * 1024
+    assert parse_size("x", "GB") is None
+    assert strip_pv_lines("Sending...\n123\n456\r789\nfatto\n") == "Sending...\nfatto\n"
+    assert SyncoidService._parse_send_estimate("send 1000\nwritten 24\n") == 1024
+    assert SyncoidService._parse_send_estimate("send 1000\nwritten 24\n", no_sync_snap=True) == 1000
+    assert SyncoidService._parse_send_estimate("refer 5000\n") == 5000
+    assert SyncoidService._parse_send_estimate("") is None
+
+
+def test_line_splitter_handles_cr_and_split_utf8():
+    sp = _LineSplitter()
+    raw = "10\r20\nè".encode()
+    assert sp.feed(sp.decoder.decode(raw[:-1])) == ["10", "20"]
+    assert sp.feed(sp.decoder.decode(raw[-1:] + b"\n")) == ["è"]
+    assert sp.flush() == ""
+
+
+def test_build_command_pv_options():
+    svc = SyncoidService()
+    cmd = svc.build_syncoid_command(None, "rpool/a", "10.0.0.2", "rpool/b", pv_options="-f -n -b -i 2")
+    assert "--pv-options='-f -n -b -i 2'" in cmd
+    with pytest.raises(ValueError):
+        svc.build_syncoid_command(None, "rpool/a", "10.0.0.2", "rpool/b", pv_options="-f; rm")
+
+
+class _FakeSSH:
+    def __init__(self, stream_ok=True):
+        self.stream_ok = stream_ok
+        self.commands = []
+        self.streamed = []
+
+    async def execute(self, hostname, command, **kw):
+        self.commands.append(command)
+        if "pv-options" in command:
+            return SSHResult(True, "STREAM_OK\n" if self.stream_ok else "", "", 0)
+        if command.startswith("zfs list -H -o name"):
+            return SSHResult(True, "rpool/a\n", "", 0)
+        if command.startswith("zfs list -Hp -t filesystem,volume,snapshot"):
+            ds = "rpool/a" if hostname == "10.0.0.1" else "rpool/b"
+            rows = [f"{ds}\tfilesystem\t100\t100\t100\t1\t9\t1\t-"]
+            rows += [f"{ds}@{s}\tsnapshot\t0\t-\t100\t{i}\t{i}0\t{i}\t-" for i, s in ((2, "s1"), (3, "s2"))]
+            return SSHResult(True, "\n".join(rows) + "\n", "", 0)
+        if "zfs send -nvP" in command:
+            return SSHResult(True, f"send {3 * GiB}\nwritten {1 * GiB}\n", "", 0)
+        return SSHResult(True, "", "", 0)
+
+    async def execute_streaming(self, hostname, command, on_line, **kw):
+        self.streamed.append(command)
+        lines = ["Sending incremental rpool/a@s2 ... syncoid_x (~ 4.0 GB):", str(GiB), str(2 * GiB)]
+        for line in lines:
+            on_line("stderr", line)
+            await asyncio.sleep(0)
+        return SSHResult(True, "", "\n".join(lines) + "\n", 0)
+
+
+def test_run_sync_streams_progress(monkeypatch):
+    fake = _FakeSSH()
+    monkeypatch.setattr(syncoid_module, "ssh_service", fake)
+    monkeypatch.setattr(syncoid_module, "zfs_inventory", inventory_module.ZFSInventoryService())
+    monkeypatch.setattr(inventory_module, "ssh_service", fake)
+    svc = SyncoidService()
+    events, live_seen = [], []
+
+    def _on_progress(ev):
+        events.append(ev)
+        live_seen.append(svc.get_live_progress("10.0.0.2", "rpool/b"))
+
+    result = asyncio.run(svc.run_sync(
+        executor_host="10.0.0.1", source_host=None, source_dataset="rpool/a",
+        dest_host="10.0.0.2", dest_dataset="rpool/b", on_progress=_on_progress,
+    ))
+
+    assert result["success"]
+    assert "--pv-options=" in fake.streamed[0]
+    # Stima a priori: incrementale s1..s2 (-I) + written dopo s2 (sync snap)
+    assert any('zfs send -nvP -I "rpool/a@s2"' in c for c in fake.commands)
+    assert events[-1].bytes_total == 4 * GiB and events[-1].percent == 50.0
+    assert live_seen[-1]["dest_bytes"] == 2 * GiB
+    # Contatori pv fuori dall'output salvato, registro live ripulito a fine run
+    assert str(GiB) not in result["error"]
+    assert result["progress"]["percent"] == 50.0
+    assert svc.get_live_progress("10.0.0.2", "rpool/b") is None
+
+
+def test_run_sync_error_clears_live_progress(monkeypatch):
+    class _DroppedSSH(_FakeSSH):
+        async def execute_streaming(self, hostname, command, on_line, **kw):
+            on_line("stderr", "Sending incremental rpool/a@s2 ... syncoid_x (~ 4.0 GB):")
+            on_line("stderr", str(GiB))
+            raise ConnectionError("sessione SSH caduta")
+
+    fake = _DroppedSSH()
+    monkeypatch.setattr(syncoid_module, "ssh_service", fake)
+    monkeypatch.setattr(syncoid_module, "zfs_inventory", inventory_module.ZFSInventoryService())
+    monkeypatch.setattr(inventory_module, "ssh_service", fake)
+    svc = SyncoidService()
+    live_seen = []
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(svc.run_sync(
+            executor_host="10.0.0.1", source_host=None, source_dataset="rpool/a",
+            dest_host="10.0.0.2", dest_dataset="rpool/b",
+            on_progress=lambda ev: live_seen.append(svc.get_live_progress("10.0.0.2", "rpool/b")),
+        ))
+    assert live_seen and live_seen[-1] is not None
+    assert svc.get_live_progress("10.0.0.2", "rpool/b") is None
+
+
+def test_run_sync_without_stream_support_uses_plain_execute(monkeypatch):
+    fake = _FakeSSH(stream_ok=False)
+    monkeypatch.setattr(syncoid_module, "ssh_service", fake)
+    monkeypatch.setattr(inventory_module, "ssh_service", fake)
+    svc = SyncoidService()
+
+    result = asyncio.run(svc.run_sync(
+        executor_host="10.0.0.1", source_host=None, source_dataset="rpool/a",
+        dest_host="10.0.0.2", dest_dataset="rpool/b", on_progress=lambda ev: None,
+    ))
+    assert result["success"] and result["progress"] is None
+    assert fake.streamed == []
+    assert not any("--pv-options=" in c for c in fake.commands)
+    # Esito del probe in cache per host
+    asyncio.run(svc.supports_progress_stream("10.0.0.1"))
+    assert sum("pv-options" in c and c.startswith("command -v pv") for c in fake.commands) == 1
@@ -0,0 +1,95 @@
+"""Test cache condivisa TTL/LRU (single-flight, stale-while-revalidate, invalidazione)."""
+
+import asyncio
+
+from services import ha_service as ha_module
+from services import pbs_service as pbs_module
+from services import ttl_cache
+from services.ha_service import HAService
+from services.ssh_service import SSHResult
+from services.ttl_cache import TTLCache
+
+
+def test_lru_eviction_and_invalidation():
+    cache = TTLCache("test_lru", ttl=60, max_entries=2)
+    cache.set("a:1", 1)
+    cache.set("a:2", 2)
+    assert cache.get("a:1") == 1  # a:1 ora è la più recente
+    cache.set("b:1", 3)
+    assert cache.get("a:2") is None and len(cache) == 2
+    cache.set("none", None)
+    assert cache.peek("none") is None
+
+    assert cache.invalidate(prefix="a:") == 1
+    assert cache.get("b:1") == 3
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["invalidations"]) == (2, 1, 1, 1)
+
+
+def test_single_flight_and_stale_while_revalidate(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(ttl_cache, "_now", lambda: clock[0])
+    cache = TTLCache("test_swr", ttl=10, stale_ttl=10)
+    calls = []
+
+    async def _loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def _run():
+        values = await asyncio.gather(*(cache.get_or_load("k", _loader) for _ in range(10)))
+        assert values == [1] * 10 and len(calls) == 1
+
+        clock[0] += 15  # scaduta ma entro la finestra stale
+        assert await cache.get_or_load("k", _loader) == 1
+        await asyncio.sleep(0.05)
+        assert cache.get("k") == 2 and len(calls) == 2
+
+        # Invalidazione durante una lettura: il risultato non viene scritto
+        clock[0] += 100
+        pending = asyncio.ensure_future(cache.get_or_load("k", _loader))
+        await asyncio.sleep(0)
+        cache.invalidate("k")
+        assert await pending == 3 and cache.peek("k") is None
+
+    asyncio.run(_run())
+    stats = cache.stats()
+    assert (stats["loads"], stats["stale"], stats["inflight"]) == (3, 1, 0)
+
+
+def test_ha_mutation_invalidates_every_node(monkeypatch):
+    commands = []
+
+    class _FakeSSH:
+        async def execute(self, hostname, command, **kw):
+            commands.append(command)
+            if command.startswith("pvesh"):
+                return SSHResult(True, '[{"sid": "vm:100"}]', "", 0)
+            return SSHResult(True, "", "", 0)
+
+    monkeypatch.setattr(ha_module, "ssh_service", _FakeSSH())
+    ha_module._ha_cache.invalidate()
+    svc = HAService()
+
+    async def _run():
+        await asyncio.gather(*(svc.get_ha_resources(h) for h in ("pve1", "pve1", "pve2")))
+        assert len(commands) == 2
+        await svc.get_ha_resources("pve1")
+        assert len(commands) == 2
+        await svc.set_resource_state("pve1", 100, state="stopped")
+        await svc.get_ha_resources("pve2")
+        assert len(commands) == 4
+
+    asyncio.run(_run())
+
+
+def test_cache_stats_endpoint(client, auth_headers):
+    pbs_module.invalidate_inventory()
+    body = client.get("/api/settings/diagnostics/caches", headers=auth_headers).json()
+    names = {c["name"] for c in body["caches"]}
+    assert {"cluster", "ha", "pbs_inventory", "pbs_tickets"} <= names
+
+    r = client.delete("/api/settings/diagnostics/caches/pbs_inventory", headers=auth_headers)
+    assert r.status_code == 200 and r.json()["invalidated"] == 0
+    assert client.delete("/api/settings/diagnostics/caches/boh", headers=auth_headers).status_code == 404
@@ -49,10 +49,15 @@ def env(monkeypatch):
 
     monkeypatch.setattr(execution, "resolve_targets", fake_resolve)
 
-    async def fake_prune(node_arg, vmid, vm_type, label, keep):
+    async def fake_prune(node_arg, vmid, vm_type, label, keep, snapshots=None):
         return ([f"auto{label}_20260701_030000"], [])
 
     monkeypatch.setattr(execution, "prune_vm", fake_prune)
+
+    async def fake_batch(**kwargs):
+        return {vmid: [] for vmid, _ in kwargs["guests"]}
+
+    monkeypatch.setattr(execution.proxmox_service, "get_snapshots_batch", fake_batch)
     return TestSession, job_id, targets, monkeypatch
 
 
@@ -43,3 +43,65 @@ def test_keep_minimum_one():
 def test_empty_input():
     assert select_prunable([], "daily", 3) == []
     assert select_prunable(None, "daily", 3) == []
+
+
+def test_prune_vm_uses_prefetched_listing(monkeypatch):
+    """Con il listing batch già disponibile la retention non rilegge via SSH."""
+    import asyncio
+
+    from services.vm_snapshot import retention
+
+    class _Node:
+        hostname = "h"; ssh_port = 22; ssh_user = "root"; ssh_key_path = "/k"
+
+    async def no_listing(**kwargs):
+        raise AssertionError("listing singolo non atteso")
+
+    deleted = []
+
+    async def fake_delete(**kwargs):
+        deleted.append(kwargs["snapname"])
+        return True, "ok"
+
+    monkeypatch.setattr(retention.proxmox_service, "get_snapshots", no_listing)
+    monkeypatch.setattr(retention.proxmox_service, "delete_snapshot", fake_delete)
+    pruned, errors = asyncio.run(
+        retention.prune_vm(_Node(), 100, "qemu", "daily", 2, snapshots=SNAPSHOTS)
+    )
+    assert errors == []
+    assert pruned == deleted == ["autodaily_20260719_030000", "autodaily_20260718_030000"]
+
+
+def test_snapshots_batch_parses_single_round_trip(monkeypatch):
+    import asyncio
+
+    from services import proxmox_service as ps
+    from services.ssh_service import SSHResult
+
+    calls = []
+    stdout = (
+        "@node pve1\n"
+        "@vm 100 qemu 0\n"
+        '[{"name":"autodaily_20260721_030000","snaptime":1},{"name":"current"}]\n'
+        "\n"
+        "@vm 101 lxc 2\n"
+        "CT 101 does not exist\n"
+        "\n"
+        "@vm 102 qemu 0\n"
+        "[]\n"
+    )
+
+    async def fake_execute(hostname, command, port=22, username="root", key_path=None, timeout=300):
+        calls.append(command)
+        return SSHResult(True, stdout, "", 0)
+
+    monkeypatch.setattr(ps.ssh_service, "execute", fake_execute)
+    svc = ps.ProxmoxService()
+    listing = asyncio.run(
+        svc.get_snapshots_batch("h", [(100, "qemu"), (101, "lxc"), (102, "qemu")])
+    )
+    assert len(calls) == 1
+    assert listing == {100: [{"name": "autodaily_20260721_030000", "snaptime": 1}], 102: []}
+    # il listing fallito per 101 non diventa "zero snapshot"
+    assert 101 not in listing
+    assert svc._node_names == {"root@h:22": "pve1"}
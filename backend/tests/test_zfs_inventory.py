@@ -0,0 +1,140 @@
+"""Test inventario ZFS per nodo (cache, riletture parziali, snapshot comune per guid)."""
+
+import asyncio
+
+from services import syncoid_service as syncoid_module
+from services import zfs_inventory as inventory_module
+from services.ssh_service import SSHResult, ssh_service
+from services.syncoid_service import SyncoidService
+from services.zfs_inventory import ZFSInventoryService, zfs_nicenum
+
+
+def _row(name, kind="filesystem", used=1024, guid="1", txg=1, creation=1700000000, mnt="-"):
+    avail = "-" if kind == "snapshot" else 4096
+    return f"{name}\t{kind}\t{used}\t{avail}\t{used}\t{creation}\t{guid}\t{txg}\t{mnt}"
+
+
+class _FakeSSH:
+    DEFAULT_KEY_PATH = "/root/.ssh/id_rsa"
+
+    def __init__(self, hosts):
+        self.hosts = hosts  # hostname -> lista di righe zfs list
+        self.commands = []
+
+    async def execute(self, hostname, command, **kw):
+        self.commands.append((hostname, command))
+        rows = self.hosts.get(hostname, [])
+        if command.startswith("zfs destroy") or command.startswith("zfs snapshot"):
+            return SSHResult(True, "", "", 0)
+        if not command.startswith("zfs list -Hp"):
+            return SSHResult(False, "", "comando inatteso", 1)
+        parts = command.split()
+        if "-d" in parts or "-r" in parts:
+            roots = parts[parts.index("-d") + 2:] if "-d" in parts else parts[parts.index("-r") + 1:]
+            rows = [r for r in rows if any(r.split("\t")[0].startswith(root) for root in roots)]
+        return SSHResult(True, "\n".join(rows) + "\n", "", 0)
+
+    def lists(self, hostname=None):
+        return [c for h, c in self.commands if c.startswith("zfs list") and hostname in (None, h)]
+
+
+def _install(monkeypatch, hosts):
+    fake = _FakeSSH(hosts)
+    inventory = ZFSInventoryService(ttl=30)
+    monkeypatch.setattr(inventory_module, "ssh_service", fake)
+    monkeypatch.setattr(inventory_module, "zfs_inventory", inventory)
+    monkeypatch.setattr(syncoid_module, "zfs_inventory", inventory)
+    monkeypatch.setattr(ssh_service, "execute", fake.execute)
+    return fake, inventory
+
+
+NODE = [
+    _row("rpool", used=10 * 1024 ** 3, mnt="/rpool"),
+    _row("rpool/data", used=3 * 1024 ** 3, mnt="/rpool/data"),
+    _row("rpool/data/vm-100-disk-0", kind="volume", used=1536 * 1024 ** 2),
+    _row("rpool/data/vm-100-disk-0@autosnap_1", kind="snapshot", guid="11", txg=10, creation=1700000100),
+    _row("rpool/data/vm-100-disk-0@syncoid_1", kind="snapshot", guid="12", txg=20, creation=1700000200),
+    _row("rpool/data@daily", kind="snapshot", guid="13", txg=15, creation=1700000150),
+]
+
+
+def test_datasets_and_snapshots_share_one_listing(monkeypatch):
+    fake, _ = _install(monkeypatch, {"pve1": NODE})
+    svc = ssh_service
+
+    async def _run():
+        return await asyncio.gather(
+            svc.get_zfs_datasets("pve1"),
+            svc.get_snapshots("pve1"),
+            svc.get_snapshots("pve1", dataset="rpool/data/vm-100-disk-0"),
+        )
+
+    datasets, all_snaps, vm_snaps = asyncio.run(_run())
+    assert len(fake.lists()) == 1
+    assert [d["name"] for d in datasets] == ["rpool", "rpool/data", "rpool/data/vm-100-disk-0"]
+    assert datasets[1]["used"] == "3G" and datasets[1]["mountpoint"] == "/rpool/data"
+    assert datasets[2]["mountpoint"] is None
+    assert [s["full_name"] for s in all_snaps] == [
+        "rpool/data/vm-100-disk-0@autosnap_1", "rpool/data@daily", "rpool/data/vm-100-disk-0@syncoid_1",
+    ]
+    assert [s["snapshot"] for s in vm_snaps] == ["autosnap_1", "syncoid_1"]
+    assert vm_snaps[0]["dataset"] == "rpool/data/vm-100-disk-0" and vm_snaps[0]["creation"].endswith("2023")
+
+
+def test_destroy_and_create_update_inventory_incrementally(monkeypatch):
+    fake, inventory = _install(monkeypatch, {"pve1": list(NODE)})
+    svc = ssh_service
+
+    asyncio.run(svc.get_snapshots("pve1"))
+    asyncio.run(svc.delete_snapshot("pve1", "rpool/data@daily"))
+    snaps = asyncio.run(svc.get_snapshots("pve1"))
+    assert "rpool/data@daily" not in [s["full_name"] for s in snaps]
+    assert len(fake.lists()) == 1
+
+    fake.hosts["pve1"].append(_row("rpool/data@manual", kind="snapshot", guid="14", txg=30, creation=1700000300))
+    asyncio.run(svc.create_snapshot("pve1", "rpool/data", "manual"))
+    assert inventory.stats()["root@pve1:22"]["dirty"] == ["rpool/data"]
+    snaps = asyncio.run(svc.get_snapshots("pve1", dataset="rpool/data"))
+    assert snaps[-1]["full_name"] == "rpool/data@manual"
+    # Riletto solo il dataset toccato (profondità 1), non l'intero nodo
+    assert fake.lists()[-1].endswith("-d 1 rpool/data")
+    assert len(snaps) == 4
+
+
+def test_ttl_and_explicit_refresh(monkeypatch):
+    fake, inventory = _install(monkeypatch, {"pve1": NODE})
+    asyncio.run(inventory.get("pve1"))
+    asyncio.run(inventory.get("pve1"))
+    assert len(fake.lists()) == 1
+    asyncio.run(inventory.get("pve1", refresh=True))
+    assert len(fake.lists()) == 2
+    assert inventory.stats()["root@pve1:22"]["last_diff"] == {"added": 0, "removed": 0, "changed": 0}
+    inventory.ttl = 0
+    asyncio.run(inventory.get("pve1"))
+    assert len(fake.lists()) == 3
+
+
+def test_common_snapshot_by_guid_and_lookups(monkeypatch):
+    src = "rpool/data/vm-100-disk-0"
+    dest = [
+        _row("tank/replica/vm-100-disk-0", kind="volume"),
+        _row("tank/replica/vm-100-disk-0@autosnap_1", kind="snapshot", guid="11", txg=5),
+        # Stesso nome ma guid diverso: non è un antenato comune
+        _row("tank/replica/vm-100-disk-0@syncoid_1", kind="snapshot", guid="99", txg=6),
+    ]
+    fake, _ = _install(monkeypatch, {"pve1": NODE, "pve2": dest})
+    svc = SyncoidService()
+
+    common = asyncio.run(svc.get_last_common_snapshot("pve1", src, "pve2", "tank/replica/vm-100-disk-0"))
+    assert common == "autosnap_1"
+    exists = asyncio.run(svc.verify_datasets_exist("pve1", [src, "rpool/none"]))
+    assert exists == {src: True, "rpool/none": False}
+    assert asyncio.run(svc._dataset_prop_bytes("pve1", src, "refer")) == 1536 * 1024 ** 2
+    assert len(fake.lists("pve1")) == 1 and len(fake.lists("pve2")) == 1
+
+
+def test_zfs_nicenum_matches_zfs_list():
+    assert zfs_nicenum(0) == "0B"
+    assert zfs_nicenum(96 * 1024) == "96K"
+    assert zfs_nicenum(int(1.23 * 1024 ** 3)) == "1.23G"
+    assert zfs_nicenum(int(123.4 * 1024 ** 2)) == "123M"
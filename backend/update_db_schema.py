@@ -62,6 +62,8 @@ def update_schema():
 
             # trigger_source: distingue run schedulati da manuali (NON è il FK triggered_by).
             _ensure_column(conn, "job_logs", "trigger_source", "VARCHAR(20)")
+            # Byte trasferiti numerici (valorizzati dai listener di services/job_log_rollup.py)
+            _ensure_column(conn, "job_logs", "transferred_bytes", "BIGINT")
 
             # --- schedule_config: struttura JSON "human" accanto al cron raw.
             for table in (
@@ -92,12 +94,24 @@ def update_schema():
             _ensure_column(conn, "recovery_jobs", "notify_on_each_run", "BOOLEAN")
             _ensure_column(conn, "backup_jobs", "notify_on_each_run", "BOOLEAN")
 
+            # --- migration_jobs: copia in streaming (vzdump --stdout) ---
+            _ensure_column(conn, "migration_jobs", "transfer_mode", "VARCHAR(20) DEFAULT 'staged'")
+            _ensure_column(conn, "migration_jobs", "stream_compress_level", "INTEGER")
+            _ensure_column(conn, "migration_jobs", "stream_mbuffer", "VARCHAR(20)")
+
             # Repliche dati v2: tabella nuova, creata idempotente via metadata.
             # Il modello è registrato importando services.nas_sync.models.
             from services.nas_sync import models as _nas_sync_models  # noqa: F401
             # Snapshot VM: stessa meccanica di registrazione.
             from services.vm_snapshot import models as _vm_snapshot_models  # noqa: F401
             Base.metadata.create_all(bind=engine)
+            _ensure_column(conn, "nas_sync_jobs", "parallel_workers", "INTEGER NOT NULL DEFAULT 1")
+
+            # Replica file: staging del pull persistente tra i run (opt-in)
+            _ensure_column(conn, "file_replication_jobs", "persistent_staging", "BOOLEAN DEFAULT 0")
+            # Replica file: stream tar diretto (compressione, checkpoint di ripresa)
+            _ensure_column(conn, "file_replication_jobs", "stream_compression", "VARCHAR(10)")
+            _ensure_column(conn, "file_replication_jobs", "stream_checkpoint", "JSON")
 
             # P-07: indici sui percorsi caldi di job_logs (lista per job, stats per
             # finestra temporale). Idempotenti.
@@ -109,6 +123,20 @@ def update_schema():
                 "CREATE INDEX IF NOT EXISTS ix_joblog_started_status "
                 "ON job_logs (started_at, status)"
             ))
+            # Log non conclusi nella finestra stats (il resto viene dai rollup)
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_joblog_status_started "
+                "ON job_logs (status, started_at)"
+            ))
+
+            # Rollup job_logs: ricostruiti una volta se la tabella è nuova
+            # (poi li mantengono i listener al flush)
+            has_rollups = conn.execute(text("SELECT 1 FROM job_log_rollups LIMIT 1")).first()
+            has_logs = conn.execute(text("SELECT 1 FROM job_logs LIMIT 1")).first()
+            if has_logs and not has_rollups:
+                from services.job_log_rollup import rebuild_rollups
+                buckets = rebuild_rollups(conn)
+                logger.info(f"Rollup job_logs ricostruiti: {buckets} bucket orari")
 
             conn.commit()
         except Exception as e:
@@ -127,14 +155,24 @@ def update_schema():
 def cleanup_old_logs(days_jobs: int = 30, days_audit: int = 90) -> dict:
     """Elimina JobLog piu' vecchi di `days_jobs` e AuditLog piu' vecchi
     di `days_audit`. Idempotente; chiamato dallo scheduler giornalmente.
-    Ritorna {jobs_deleted, audits_deleted}.
+    I rollup di job_logs restano ~400 giorni.
+    Ritorna {jobs_deleted, audits_deleted, rollups_deleted}.
     """
     from datetime import datetime, timedelta
     engine = create_engine(f"sqlite:///{DATABASE_PATH}")
-    counts = {"jobs_deleted": 0, "audits_deleted": 0}
+    counts = {"jobs_deleted": 0, "audits_deleted": 0, "rollups_deleted": 0}
     with engine.connect() as conn:
         try:
             cutoff_jobs = (datetime.utcnow() - timedelta(days=days_jobs)).isoformat()
+            # Engine senza PRAGMA foreign_keys: il CASCADE non scatta, i chunk
+            # di output vanno rimossi esplicitamente.
+            conn.execute(
+                text(
+                    "DELETE FROM job_log_chunks WHERE log_id IN "
+                    "(SELECT id FROM job_logs WHERE started_at < :c)"
+                ),
+                {"c": cutoff_jobs},
+            )
             r = conn.execute(
                 text("DELETE FROM job_logs WHERE started_at < :c"),
                 {"c": cutoff_jobs},
@@ -142,6 +180,13 @@ def cleanup_old_logs(days_jobs: int = 30, days_audit: int = 90) -> dict:
             counts["jobs_deleted"] = r.rowcount or 0
         except Exception as e:
             logger.warning(f"cleanup job_logs: {e}")
+        try:
+            # I rollup sopravvivono ai log (stats fino a 365 giorni): si
+            # potano solo oltre la finestra massima
+            from services.job_log_rollup import prune_rollups
+            counts["rollups_deleted"] = prune_rollups(conn)
+        except Exception as e:
+            logger.warning(f"cleanup job_log_rollups: {e}")
         try:
             cutoff_audit = (datetime.utcnow() - timedelta(days=days_audit)).isoformat()
             r = conn.execute(
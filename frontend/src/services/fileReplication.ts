@@ -14,6 +14,9 @@ export interface FileReplicationJob {
   exclude_presets: string[]
   exclude_patterns: string[]
   bandwidth_limit_kb?: number | null
+  persistent_staging?: boolean
+  stream_compression?: 'zstd' | 'lz4' | null
+  stream_resume_pending?: boolean
   immutability_strategy: string
   snapshot_policy_hint?: Record<string, unknown> | null
   schedule?: string | null
@@ -0,0 +1,95 @@
+/**
+ * Stream SSE dell'avanzamento job (backend/routers/events.py).
+ *
+ * Un'unica connessione EventSource condivisa tra le viste: ogni evento porta
+ * l'ultimo stato/progresso di un job (kind + job_id). EventSource non invia
+ * header, quindi il token va in query; se la connessione viene chiusa (es.
+ * token scaduto) si riapre dopo qualche secondo con il token corrente.
+ */
+
+export interface JobEvent {
+  kind: 'sync' | 'vm_snapshot' | 'nas_sync' | 'file_replication' | 'migration' | 'backup_pbs' | string
+  job_id: number | string
+  status: string | null
+  progress: Record<string, any> | null
+  final: boolean
+  seq: number
+  ts: number
+}
+
+type Listener = (ev: JobEvent) => void
+type StateListener = (connected: boolean) => void
+
+const RECONNECT_MS = 5000
+
+let source: EventSource | null = null
+let reconnectTimer: number | null = null
+const listeners = new Set<Listener>()
+const stateListeners = new Set<StateListener>()
+let connected = false
+
+function setConnected(value: boolean) {
+  if (connected === value) return
+  connected = value
+  stateListeners.forEach(l => l(value))
+}
+
+function open() {
+  const token = localStorage.getItem('access_token')
+  if (!token || source) return
+  source = new EventSource(`/api/events/jobs?token=${encodeURIComponent(token)}`)
+  source.onopen = () => setConnected(true)
+  source.addEventListener('job', (msg: MessageEvent) => {
+    try {
+      const ev = JSON.parse(msg.data) as JobEvent
+      listeners.forEach(l => l(ev))
+    } catch { /* evento malformato: ignorato */ }
+  })
+  source.onerror = () => {
+    setConnected(false)
+    // CONNECTING: riconnessione automatica del browser; CLOSED: va riaperta
+    if (source && source.readyState === EventSource.CLOSED) {
+      close()
+      if (listeners.size && reconnectTimer === null) {
+        reconnectTimer = window.setTimeout(() => {
+          reconnectTimer = null
+          if (listeners.size) open()
+        }, RECONNECT_MS)
+      }
+    }
+  }
+}
+
+function close() {
+  if (source) {
+    source.close()
+    source = null
+  }
+  setConnected(false)
+}
+
+/**
+ * Registra un listener degli eventi job; restituisce la funzione per
+ * annullare la registrazione (la connessione si chiude con l'ultimo listener).
+ */
+export function subscribeJobEvents(listener: Listener, onState?: StateListener): () => void {
+  listeners.add(listener)
+  if (onState) {
+    stateListeners.add(onState)
+    onState(connected)
+  }
+  open()
+  return () => {
+    listeners.delete(listener)
+    if (onState) stateListeners.delete(onState)
+    if (!listeners.size) {
+      if (reconnectTimer !== null) {
+        window.clearTimeout(reconnectTimer)
+        reconnectTimer = null
+      }
+      close()
+    }
+  }
+}
+
+export default { subscribeJobEvents }
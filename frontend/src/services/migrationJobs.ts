@@ -12,6 +12,9 @@ export interface MigrationJob {
     dest_node_name?: string;
     dest_vm_id?: string;
     migration_type: string; // 'copy', 'move'
+    transfer_mode?: string; // 'staged', 'stream' (solo copy)
+    stream_compress_level?: number | null;
+    stream_mbuffer?: string | null;
     schedule?: string;
     is_active: boolean;
     last_run?: string;
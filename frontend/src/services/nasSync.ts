@@ -16,6 +16,7 @@ export interface NasSyncJob {
   exclude_presets: string[]
   exclude_patterns: string[]
   bandwidth_limit_kb?: number | null
+  parallel_workers?: number
   snapshot_policy_hint?: Record<string, unknown> | null
   schedule?: string | null
   is_active: boolean
@@ -74,7 +75,8 @@ export const nasSyncApi = {
   logs: (id: number) => apiClient.get(`/nas-sync/${id}/logs`),
   progress: (id: number) => apiClient.get(`/nas-sync/${id}/progress`),
   stats: () => apiClient.get<NasSyncStats>('/nas-sync/stats/summary'),
-  refreshCatalog: (id: number) => apiClient.post(`/nas-sync/${id}/refresh-catalog`),
+  refreshCatalog: (id: number, full = false) =>
+    apiClient.post(`/nas-sync/${id}/refresh-catalog`, null, { params: { full } }),
   preflight: (id: number) => apiClient.post<PreflightCheck[]>(`/nas-sync/${id}/preflight`),
   capabilities: (endpointId: number) =>
     apiClient.get<EndpointCapabilities>(`/nas-sync/endpoints/${endpointId}/capabilities`),
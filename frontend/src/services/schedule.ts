@@ -32,6 +32,25 @@ export interface TranslateResponse {
   next_runs: string[]
 }
 
+export interface QueueTicket {
+  key: string
+  label: string
+  kind: string | null
+  priority: number
+  resources: string[]
+  enqueued_at: string
+  started_at: string | null
+  position?: number
+  waiting_sec?: number
+}
+
+export interface QueueSnapshot {
+  budgets: Record<string, number>
+  running: QueueTicket[]
+  queued: QueueTicket[]
+  usage: Record<string, number>
+}
+
 export const WEEKDAYS_ORDER: WeekDay[] = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
 export const WEEKDAY_LABELS_IT: Record<WeekDay, string> = {
   mon: 'Lun',
@@ -47,4 +66,7 @@ export default {
   translate(payload: { config?: ScheduleConfig; cron?: string | null }) {
     return apiClient.post<TranslateResponse>('/schedule/translate', payload)
   },
+  getQueue() {
+    return apiClient.get<QueueSnapshot>('/schedule/queue')
+  },
 }
@@ -36,8 +36,9 @@ export interface SyncJob {
 }
 
 export default {
-  getJobs() {
-    return apiClient.get<SyncJob[]>('/sync-jobs')
+  // fresh: aggiorna lo stato live dai nodi prima di rispondere (più lento)
+  getJobs(fresh: boolean = false) {
+    return apiClient.get<SyncJob[]>(`/sync-jobs${fresh ? '?live=fresh' : ''}`)
   },
 
   updateJob(id: number | string, job: Record<string, unknown>) {
@@ -11,6 +11,7 @@ import syncJobsService from '../services/syncJobs'
 import backupJobsService from '../services/backupJobs'
 import recoveryJobsService from '../services/recoveryJobs'
 import type { ScheduleConfig } from '../services/schedule'
+import type { JobEvent } from '../services/jobEvents'
 
 export type JobKind = 'syncoid' | 'pve_native' | 'backup_pbs' | 'recovery_pbs'
 
@@ -259,11 +260,11 @@ export const useReplicationStore = defineStore('replication', {
         this.loadingVMs = false
       }
     },
-    async fetchJobs() {
+    async fetchJobs(fresh = false) {
       this.loadingJobs = true
       try {
         const [sync, backup, recovery] = await Promise.all([
-          syncJobsService.getJobs().catch(() => ({ data: [] as any[] })),
+          syncJobsService.getJobs(fresh).catch(() => ({ data: [] as any[] })),
           backupJobsService.getJobs().catch(() => ({ data: [] as any[] })),
           recoveryJobsService.getJobs().catch(() => ({ data: [] as any[] })),
         ])
@@ -277,13 +278,31 @@ export const useReplicationStore = defineStore('replication', {
         this.loadingJobs = false
       }
     },
-    async fetchAll(force = false) {
+    /**
+     * Applica un evento dello stream SSE ai job sync (syncoid/pve_native):
+     * progresso aggiornato in place, lista ricaricata a fine run.
+     */
+    applyJobEvent(ev: JobEvent) {
+      if (ev.kind !== 'sync') return
+      const id = Number(ev.job_id)
+      const job = this.jobs.find(j => j.id === id && (j.kind === 'syncoid' || j.kind === 'pve_native'))
+      if (!job) return
+      if (ev.final) {
+        job.is_replicating = false
+        this.fetchJobs().catch(() => {})
+        return
+      }
+      job.is_replicating = true
+      job.current_status = 'running'
+      if (ev.progress && ev.progress.percent !== undefined) job.transfer_progress = ev.progress as any
+    },
+    async fetchAll(force = false, freshJobs = false) {
       this.error = null
       try {
         await Promise.all([
           this.fetchNodes(force),
           this.fetchVMs(force),
-          this.fetchJobs(),
+          this.fetchJobs(freshJobs),
         ])
       } catch (e: any) {
         this.error = e?.message || String(e)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Benchmark del percorso di autenticazione (richieste/s su un endpoint protetto).
+
+Crea un DB SQLite temporaneo con un admin e una sessione attiva, poi chiama
+l'endpoint con lo stesso bearer token tramite TestClient (niente rete né
+uvicorn: misura solo dipendenze + handler). Eseguire dalla root repo:
+  python3 scripts/dev/bench_auth.py [--requests 500] [--path /api/auth/me]
+
+Con DAPX_AUTH_CACHE_TTL_SEC=0 la cache dei principal è disattivata e ogni
+richiesta rifà le query User/UserSession.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[2] / "backend"
+os.chdir(BACKEND)
+sys.path.insert(0, str(BACKEND))
+
+_tmp = tempfile.mkdtemp(prefix="dapx-bench-")
+os.environ["DAPX_DB"] = os.path.join(_tmp, "bench.db")
+os.environ.setdefault("DAPX_DATA_DIR", _tmp)
+os.environ.setdefault("DAPX_LOG_DIR", os.path.join(_tmp, "logs"))
+os.environ.setdefault("DAPX_SECRET_KEY", "bench-secret-key")
+os.makedirs(os.environ["DAPX_LOG_DIR"], exist_ok=True)
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from database import Base, SessionLocal, User, UserSession, engine  # noqa: E402
+from main import app  # noqa: E402
+from services.auth_service import auth_service  # noqa: E402
+
+
+def _setup() -> str:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        user = User(username="bench", password_hash=auth_service.get_password_hash("Bench123!"),
+                    role="admin", auth_method="local")
+        db.add(user)
+        db.commit()
+        token = auth_service.create_access_token(data={
+            "sub": str(user.id), "username": user.username, "role": user.role, "auth_method": "local",
+        })
+        db.add(UserSession(user_id=user.id, token_hash="bench",
+                           expires_at=datetime.utcnow() + timedelta(hours=1)))
+        db.commit()
+        return token
+    finally:
+        db.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark autenticazione API")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--path", default="/api/auth/me")
+    args = parser.parse_args()
+
+    client = TestClient(app)
+    headers = {"Authorization": f"Bearer {_setup()}"}
+    assert client.get(args.path, headers=headers).status_code == 200
+
+    def _one(_):
+        return client.get(args.path, headers=headers).status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        codes = list(pool.map(_one, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    errors = sum(1 for c in codes if c != 200)
+    print(f"{args.path}: {args.requests} richieste, concorrenza {args.concurrency}, "
+          f"{elapsed:.2f}s -> {args.requests / elapsed:.1f} req/s (errori: {errors})")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())